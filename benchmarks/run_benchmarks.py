@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Measure how fast the poser tools parse and apply poses, without Maya.
+
+:description:
+    Builds synthetic rigs and pose libraries and times:
+        read_pose_xml - parsing libraries of every size
+        create_joints - making rigs of every size
+        apply_pose    - applying one pose with poser.apply_pose, the path behind
+                        PoseLayout.apply_values and the pose browser
+        apply_pose_local - applying one pose with the cmds_local backend, which
+                        solves every joint at once and only sets local channels
+        apply_per_joint - applying one pose with position_joint and rotate_joint per
+                        joint, the way the tool used to
+        preview_pose  - switching the pose a poser.PosePreview shows with the
+                        cmds_local backend, putting back the last pose and showing
+                        the next one, what hovering from tile to tile costs
+        import_time   - importing the core modules in a fresh Python, which must stay
+                        under IMPORT_BUDGET and must not import Maya or Qt
+    maya.cmds is replaced with a FakeScene wrapped in CountingCmds, which counts the
+    commands and can simulate the latency of each command. The results are printed
+    as JSON, or written to a file, to be compared between releases.
+        python -m benchmarks.run_benchmarks --output results.json
+    Contains the following functions:
+        run
+        main
+
+:applications:
+    None
+
+:see_also:
+    benchmarks.synthetic
+    td_maya_testing.fake_scene
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Imports That You Wrote
+from benchmarks import synthetic
+from td_maya_testing.fake_api import install_maya_api, set_maya_api
+from td_maya_testing.fake_scene import (CountingCmds, FakeScene, install_maya_cmds,
+                                        set_maya_cmds)
+
+install_maya_cmds(CountingCmds())
+install_maya_api(FakeScene())
+
+from td_maya_tools import poser, xml_utils
+from td_maya_tools.joint_registry import JointRegistry
+from td_maya_tools.pose_backends import CmdsBackend, LocalCmdsBackend
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+JOINT_COUNTS = (10, 150, 1000, 10000)
+POSE_COUNTS = (1, 100, 1000, 5000)
+# libraries with more joint entries than this are skipped unless asked for
+MAX_ENTRIES = 2000000
+# the modules worker processes and the command line tools import, they must not pull
+# in Maya or Qt, and importing all of them must take less than IMPORT_BUDGET seconds
+CORE_MODULES = ('td_maya_tools.pose', 'td_maya_tools.xml_utils', 'td_maya_tools.pose_cache',
+                'td_maya_tools.pose_index', 'td_maya_tools.poser',
+                'td_maya_tools.batch_poser')
+HOST_MODULES = ('maya', 'PySide2', 'shiboken2')
+IMPORT_BUDGET = 0.2
+# imports the core modules and prints how long it took and the host modules it loaded
+_IMPORT_SCRIPT = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    importlib.import_module(module)
+seconds = time.perf_counter() - start
+hosts = {HOST_MODULES!r}
+print(json.dumps({{'seconds': seconds, 'host_modules': sorted(
+    name for name in sys.modules if name.split('.')[0] in hosts)}}))
+'''
+
+
+def run(joint_counts=JOINT_COUNTS, pose_counts=POSE_COUNTS, max_entries=MAX_ENTRIES,
+        latency=0.0, repeat=3):
+    """
+    Run every benchmark
+
+    :param joint_counts: The sizes of the rigs
+    :type: list
+
+    :param pose_counts: The sizes of the pose libraries
+    :type: list
+
+    :param max_entries: Skip libraries with more joints times poses than this
+    :type: int
+
+    :param latency: How long each Maya command takes, in seconds
+    :type: float
+
+    :param repeat: How many times each benchmark is timed, the best time is kept
+    :type: int
+
+    :return: The results
+    :type: dict
+    """
+    results = {'environment': {'python': platform.python_version(),
+                               'platform': platform.platform(),
+                               'latency': latency,
+                               'repeat': repeat},
+               'read_pose_xml': [],
+               'create_joints': [],
+               'apply_pose': [],
+               'apply_pose_local': [],
+               'apply_per_joint': [],
+               'preview_pose': [],
+               'import_time': bench_import_time(repeat=repeat)}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for joint_count in joint_counts:
+            joints = synthetic.joint_names(joint_count)
+            for pose_count in pose_counts:
+                if joint_count * pose_count > max_entries:
+                    continue
+                path = os.path.join(temp_dir, f'poses_{joint_count}_{pose_count}.xml')
+                synthetic.write_pose_library(path, pose_count, joints)
+                results['read_pose_xml'].append(
+                    bench_read_pose_xml(path, joint_count, pose_count, repeat))
+                os.remove(path)
+
+            results['create_joints'].append(bench_create_joints(joint_count, latency, repeat))
+            path = os.path.join(temp_dir, f'pose_{joint_count}.xml')
+            synthetic.write_pose_library(path, 1, joints)
+            pose = next(iter(xml_utils.read_pose_xml(path).values()))
+            results['apply_pose'].append(bench_apply_pose(pose, latency, repeat))
+            results['apply_pose_local'].append(
+                bench_apply_pose(pose, latency, repeat, LocalCmdsBackend))
+            results['apply_per_joint'].append(bench_apply_per_joint(pose, latency, repeat))
+            results['preview_pose'].append(bench_preview_pose(pose, latency, repeat))
+    return results
+
+
+def bench_read_pose_xml(path=None, joint_count=0, pose_count=0, repeat=3):
+    """
+    Time parsing a pose library
+    """
+    seconds, peak = _measure(lambda: xml_utils.read_pose_xml(path), repeat)
+    return {'joints': joint_count, 'poses': pose_count,
+            'file_bytes': os.path.getsize(path), 'seconds': seconds,
+            'poses_per_second': pose_count / seconds if seconds else None,
+            'peak_memory_bytes': peak}
+
+
+def bench_create_joints(joint_count=0, latency=0.0, repeat=3):
+    """
+    Time making a chain of joints, in a fresh scene every time
+    """
+    names = synthetic.joint_names(joint_count)
+    runs = []
+
+    def create():
+        cmds = CountingCmds(FakeScene(), latency)
+        runs.append(cmds)
+        set_maya_cmds(cmds)
+        set_maya_api(cmds)
+        poser.create_joints(names)
+
+    seconds, peak = _measure(create, repeat)
+    return _with_counts({'joints': joint_count, 'seconds': seconds,
+                         'joints_per_second': joint_count / seconds if seconds else None,
+                         'peak_memory_bytes': peak}, runs[-1], 1)
+
+
+def bench_apply_pose(pose=None, latency=0.0, repeat=3, backend_class=CmdsBackend):
+    """
+    Time applying a pose with the batched apply_pose
+    """
+    cmds = _rig_cmds(len(pose), latency)
+    backend = backend_class(cmds, _registry(cmds))
+    backend.registry.joints
+    cmds.reset_counts()
+    seconds, peak = _measure(lambda: poser.apply_pose(pose, backend=backend), repeat)
+    return _with_counts({'joints': len(pose), 'seconds': seconds,
+                         'joints_per_second': len(pose) / seconds if seconds else None,
+                         'peak_memory_bytes': peak}, cmds, repeat + 1)
+
+
+def bench_apply_per_joint(pose=None, latency=0.0, repeat=3):
+    """
+    Time applying a pose one joint at a time with position_joint and rotate_joint
+    """
+    cmds = _rig_cmds(len(pose), latency)
+    poser.get_joint_registry().invalidate()
+    poser.get_joint_registry().joints
+    cmds.reset_counts()
+
+    def apply():
+        for joint, joint_channels in pose.items():
+            poser.position_joint(joint, *joint_channels.translation)
+            poser.rotate_joint(joint, *joint_channels.rotation)
+
+    seconds, peak = _measure(apply, repeat)
+    return _with_counts({'joints': len(pose), 'seconds': seconds,
+                         'joints_per_second': len(pose) / seconds if seconds else None,
+                         'peak_memory_bytes': peak}, cmds, repeat + 1)
+
+
+def bench_preview_pose(pose=None, latency=0.0, repeat=3):
+    """
+    Time switching the pose a preview shows, once the channels of the rig are kept
+    """
+    cmds = _rig_cmds(len(pose), latency)
+    backend = LocalCmdsBackend(cmds, _registry(cmds))
+    preview = poser.PosePreview(backend)
+    preview.start()
+    preview.show(pose)
+    cmds.reset_counts()
+    seconds, peak = _measure(lambda: preview.show(pose), repeat)
+    preview.stop()
+    return _with_counts({'joints': len(pose), 'seconds': seconds,
+                         'switches_per_second': 1.0 / seconds if seconds else None,
+                         'peak_memory_bytes': peak}, cmds, repeat + 1)
+
+
+def bench_import_time(modules=CORE_MODULES, budget=IMPORT_BUDGET, repeat=3):
+    """
+    Time importing the core modules, each time in a fresh Python so nothing is
+    imported already
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, environment.get('PYTHONPATH')]))
+    script = _IMPORT_SCRIPT.format(HOST_MODULES=HOST_MODULES)
+    best = None
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script, *modules], env=environment,
+                                check=True, capture_output=True, text=True).stdout
+        run = json.loads(output)
+        if best is None or run['seconds'] < best['seconds']:
+            best = run
+    return {'modules': list(modules), 'seconds': best['seconds'], 'budget_seconds': budget,
+            'host_modules': best['host_modules'],
+            'within_budget': best['seconds'] <= budget and not best['host_modules']}
+
+
+def _rig_cmds(joint_count=0, latency=0.0):
+    """
+    Make a scene with a rig and point maya.cmds at it
+    """
+    scene = FakeScene()
+    synthetic.build_rig(scene, joint_count)
+    cmds = CountingCmds(scene, latency)
+    set_maya_cmds(cmds)
+    set_maya_api(scene)
+    poser._backend_instances.clear()
+    poser._joint_registry = None
+    return cmds
+
+
+def _registry(cmds=None):
+    """
+    Make a joint registry that follows the scene, the way it does in Maya
+    """
+    registry = JointRegistry(cmds)
+    registry.install_callbacks()
+    return registry
+
+
+def _measure(function=None, repeat=3):
+    """
+    Time a function, keeping the best of a few runs, then run it once more to find its
+    peak memory, as tracing memory slows it down
+
+    :return: The best time in seconds and the peak memory in bytes
+    :type: tuple
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def _with_counts(result=None, cmds=None, runs=1):
+    """
+    Add the number of Maya commands called per run to a result
+    """
+    counts = cmds.reset_counts()
+    result['commands'] = {name: count // runs for name, count in sorted(counts.items())}
+    result['commands_total'] = sum(counts.values()) // runs
+    return result
+
+
+def main(argv=None):
+    """
+    Run the benchmarks from the command line
+
+    :param argv: The command line arguments, defaults to sys.argv
+    :type: list
+
+    :return: The exit code, 1 if the core modules went over their import budget
+    :type: int
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the poser tools without Maya.')
+    parser.add_argument('--joints', type=int, nargs='+', default=JOINT_COUNTS,
+                        help='Sizes of the rigs')
+    parser.add_argument('--poses', type=int, nargs='+', default=POSE_COUNTS,
+                        help='Sizes of the pose libraries')
+    parser.add_argument('--max-entries', type=int, default=MAX_ENTRIES,
+                        help='Skip libraries with more joints times poses than this')
+    parser.add_argument('--latency-us', type=float, default=0.0,
+                        help='Simulated time each Maya command takes, in microseconds')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='How many times each benchmark is timed')
+    parser.add_argument('--output', help='Write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.joints, args.poses, args.max_entries, args.latency_us / 1e6,
+                  args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output_fh:
+            output_fh.write(text + '\n')
+    else:
+        print(text)
+    if not results['import_time']['within_budget']:
+        print(f'Importing the core modules took {results["import_time"]["seconds"]:.3f}s '
+              f'with {results["import_time"]["host_modules"] or "no"} host modules, the '
+              f'budget is {IMPORT_BUDGET}s with no host modules', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Make up rigs and pose libraries of any size for the benchmarks.
+
+:description:
+    Rigs are trees of joints where every joint has up to three children, so that even
+    the largest rigs stay a few levels deep. Pose libraries are written in the schema
+    read by td_maya_tools.xml_utils.read_pose_xml, with random channel values.
+    Contains the following functions:
+        joint_names
+        build_rig
+        write_pose_library
+
+:applications:
+    None
+
+:see_also:
+    benchmarks.run_benchmarks
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import random
+
+# Imports That You Wrote
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def joint_names(joint_count=0):
+    """
+    :return: The names of the joints of a rig with this many joints
+    :type: list
+    """
+    return [f'joint_{i:05d}' for i in range(joint_count)]
+
+
+def pose_names(pose_count=0):
+    """
+    :return: The names of the poses of a library with this many poses
+    :type: list
+    """
+    return [f'pose_{i:05d}' for i in range(pose_count)]
+
+
+def build_rig(scene=None, joint_count=0):
+    """
+    Add a rig to a scene
+
+    :param scene: The scene to add the joints to
+    :type: td_maya_testing.fake_scene.FakeScene
+
+    :param joint_count: How many joints to make
+    :type: int
+
+    :return: The names of the joints
+    :type: list
+    """
+    names = joint_names(joint_count)
+    for i, name in enumerate(names):
+        parent = names[(i - 1) // 3] if i else None
+        scene.createNode('joint', name, parent)
+    return names
+
+
+def write_pose_library(path=None, pose_count=0, joints=None, seed=0):
+    """
+    Write a pose library with random values
+
+    :param path: Full path to the xml file to write
+    :type: str
+
+    :param pose_count: How many poses to write
+    :type: int
+
+    :param joints: The joints in every pose
+    :type: list
+
+    :param seed: The seed of the random values, the same seed gives the same file
+    :type: int
+
+    :return: The path to the file
+    :type: str
+    """
+    rand = random.Random(seed)
+    with open(path, 'w') as xml_fh:
+        xml_fh.write('<?xml version="1.0" ?>\n<root>\n')
+        for pose in pose_names(pose_count):
+            xml_fh.write(f'    <{pose}>\n')
+            for joint in joints:
+                t = [rand.uniform(-100.0, 100.0) for _ in range(3)]
+                r = [rand.uniform(-180.0, 180.0) for _ in range(3)]
+                xml_fh.write(
+                    f'        <{joint}>\n'
+                    f'            <translations tx="{t[0]!r}" ty="{t[1]!r}" tz="{t[2]!r}"/>\n'
+                    f'            <rotations rx="{r[0]!r}" ry="{r[1]!r}" rz="{r[2]!r}"/>\n'
+                    f'        </{joint}>\n')
+            xml_fh.write(f'    </{pose}>\n')
+        xml_fh.write('</root>\n')
+    return path
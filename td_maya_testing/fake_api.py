@@ -0,0 +1,693 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A pure Python stand in for the parts of the Maya Python API 2.0 used by the poser
+    tools.
+
+:description:
+    install_maya_api makes maya.api.OpenMaya and maya.api.OpenMayaAnim importable
+    outside of Maya, with the classes that td_maya_tools.pose_backends.OpenMayaBackend,
+    td_maya_tools.joint_registry.JointRegistry and td_maya_tools.poser_commands use,
+    answering from a td_maya_testing.fake_scene.FakeScene. Objects, dag paths and plugs
+    hold on to the nodes themselves, so they follow renames and reparenting the way
+    they do in Maya. Modifiers and animation curve changes can be undone and redone,
+    and the scene messages become the callbacks of MDGMessage, MNodeMessage,
+    MDagMessage and MSceneMessage.
+    Only the classes, methods and constants the poser tools call are there.
+    Contains the following functions:
+        install_maya_api
+        set_maya_api
+
+:applications:
+    None
+
+:see_also:
+    td_maya_testing.fake_scene
+    td_maya_tools.pose_backends
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import math
+import sys
+import types
+
+# Imports That You Wrote
+from td_maya_tools import pose_solver
+from td_maya_testing.fake_scene import install_maya_cmds
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the scene the API answers from, see set_maya_api
+_scene = None
+
+# the attributes whose values are angles, given in radians by the API
+_ANGLE_ATTRS = ('rotate', 'jointOrient', 'rotateAxis')
+
+
+def install_maya_api(scene=None):
+    """
+    Make maya.api.OpenMaya and maya.api.OpenMayaAnim importable outside of Maya,
+    answering from a scene. maya.cmds is made importable as well when it is not, with
+    the scene as its stand in
+
+    :param scene: The scene, or a td_maya_testing.fake_scene.CountingCmds around one
+    :type: td_maya_testing.fake_scene.FakeScene
+
+    :return: Whether the stand in was installed, False when Maya is available
+    :type: bool
+    """
+    if 'maya.api.OpenMaya' in sys.modules:
+        if not getattr(sys.modules['maya.api.OpenMaya'], 'fake', False):
+            return False
+        set_maya_api(scene)
+        return True
+    if 'maya.cmds' not in sys.modules and not install_maya_cmds(scene):
+        return False
+    maya_module = sys.modules['maya']
+    api_module = types.ModuleType('maya.api')
+    api_module.__path__ = []
+    om = _module('maya.api.OpenMaya', (
+        MObject, MObjectHandle, MFn, MSelectionList, MDagPath, MMatrix, MAngle, MTime,
+        MTimeArray, MDoubleArray, MPlug, MFnDependencyNode, MFnDagNode, MFnTransform,
+        MDGModifier, MPxCommand, MArgList, MFnPlugin, MMessage, MDGMessage,
+        MNodeMessage, MDagMessage, MSceneMessage))
+    oma = _module('maya.api.OpenMayaAnim', (MFnAnimCurve, MAnimCurveChange))
+    api_module.OpenMaya = om
+    api_module.OpenMayaAnim = oma
+    maya_module.api = api_module
+    sys.modules['maya.api'] = api_module
+    sys.modules['maya.api.OpenMaya'] = om
+    sys.modules['maya.api.OpenMayaAnim'] = oma
+    set_maya_api(scene)
+    return True
+
+
+def set_maya_api(scene=None):
+    """
+    Change the scene an installed maya.api.OpenMaya answers from
+
+    :param scene: The scene, or a td_maya_testing.fake_scene.CountingCmds around one
+    :type: td_maya_testing.fake_scene.FakeScene
+    """
+    global _scene
+    _scene = getattr(scene, 'scene', scene)
+
+
+def _module(name=None, classes=None):
+    """
+    Make a module holding the stand in classes
+    """
+    module = types.ModuleType(name)
+    module.fake = True
+    for cls in classes:
+        setattr(module, cls.__name__, cls)
+    return module
+
+
+def _alive(node=None):
+    """
+    Whether a node is still in the scene it was found in
+    """
+    return node is not None and _scene.nodes.get(node.name) is node
+
+
+def _node_fns(node=None):
+    """
+    The MFn types a node is compatible with
+    """
+    fns = {MFn.kDependencyNode}
+    if node.type in ('transform', 'joint'):
+        fns.update((MFn.kDagNode, MFn.kTransform))
+    if node.type == 'joint':
+        fns.add(MFn.kJoint)
+    if node.type.startswith('animCurve'):
+        fns.add(MFn.kAnimCurve)
+    return fns
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class MFn(object):
+    """
+    The function set types.
+    """
+    kDependencyNode = 4
+    kDagNode = 107
+    kTransform = 110
+    kJoint = 121
+    kAnimCurve = 7
+
+
+class MObject(object):
+    """
+    A node of the scene.
+    """
+    kNullObj = None
+
+    def __init__(self, node=None):
+        self._node = node._node if isinstance(node, MObject) else node
+
+    def __eq__(self, other):
+        return isinstance(other, MObject) and other._node is self._node
+
+    def __hash__(self):
+        return id(self._node)
+
+    def isNull(self):
+        return self._node is None
+
+    def hasFn(self, fn=None):
+        return self._node is not None and fn in _node_fns(self._node)
+
+    def apiType(self):
+        return max(_node_fns(self._node)) if self._node is not None else 0
+
+
+MObject.kNullObj = MObject()
+
+
+class MObjectHandle(object):
+    """
+    A handle that tells whether a node is still in the scene.
+    """
+    def __init__(self, mobject=None):
+        self._node = mobject._node
+
+    def isValid(self):
+        return self._node is not None
+
+    def isAlive(self):
+        return _alive(self._node)
+
+    def hashCode(self):
+        return id(self._node)
+
+    def object(self):
+        return MObject(self._node)
+
+
+class MSelectionList(object):
+    """
+    A list of nodes, found by name.
+    """
+    def __init__(self):
+        self._nodes = []
+
+    def add(self, name=None):
+        try:
+            self._nodes.append(_scene._node(name))
+        except ValueError:
+            raise RuntimeError('(kInvalidParameter): Object does not exist')
+        return self
+
+    def length(self):
+        return len(self._nodes)
+
+    def getDependNode(self, index=0):
+        return MObject(self._nodes[index])
+
+    def getDagPath(self, index=0):
+        node = self._nodes[index]
+        if MFn.kDagNode not in _node_fns(node):
+            raise TypeError('(kInvalidParameter): Object is not a DAG node')
+        return MDagPath._to(node)
+
+
+class MDagPath(object):
+    """
+    The path from the world to a node. Paths are followed from the node up each time
+    they are used, so they stay right through reparenting.
+    """
+    def __init__(self, other=None):
+        self._node = other._node if other is not None else None
+        self._popped = other._popped if other is not None else 0
+
+    @classmethod
+    def _to(cls, node=None):
+        path = cls()
+        path._node = node
+        return path
+
+    @staticmethod
+    def getAPathTo(mobject=None):
+        return MDagPath._to(mobject._node)
+
+    def _nodes(self):
+        nodes = []
+        node = self._node
+        while node is not None:
+            nodes.insert(0, node)
+            node = _scene.nodes.get(node.parent) if node.parent is not None else None
+        return nodes[:len(nodes) - self._popped]
+
+    def isValid(self):
+        return _alive(self._node)
+
+    def length(self):
+        return len(self._nodes())
+
+    def pop(self, count=1):
+        self._popped += count
+        return self
+
+    def node(self):
+        nodes = self._nodes()
+        return MObject(nodes[-1] if nodes else None)
+
+    def fullPathName(self):
+        return ''.join(f'|{node.name}' for node in self._nodes())
+
+    def partialPathName(self):
+        # the names of a FakeScene are unique
+        nodes = self._nodes()
+        return nodes[-1].name if nodes else ''
+
+    def inclusiveMatrix(self):
+        nodes = self._nodes()
+        if not nodes:
+            return MMatrix()
+        return MMatrix(pose_solver.flatten_matrix(_scene.world_transform(nodes[-1].name)))
+
+    def exclusiveMatrix(self):
+        return MDagPath(self).pop().inclusiveMatrix()
+
+
+class MMatrix(object):
+    """
+    A 4x4 matrix, row major.
+    """
+    def __init__(self, values=None):
+        self._values = list(values) if values is not None else [
+            1.0 if row == column else 0.0 for row in range(4) for column in range(4)]
+
+    def getElement(self, row=0, column=0):
+        return self._values[row * 4 + column]
+
+
+class MAngle(object):
+    """
+    An angle and its unit.
+    """
+    kRadians = 1
+    kDegrees = 2
+
+    def __init__(self, value=0.0, unit=kRadians):
+        self._radians = math.radians(value) if unit == self.kDegrees else float(value)
+
+    def asRadians(self):
+        return self._radians
+
+    def asDegrees(self):
+        return math.degrees(self._radians)
+
+
+class MTime(object):
+    """
+    A time and its unit.
+    """
+    kFilm = 6
+
+    def __init__(self, value=0.0, unit=kFilm):
+        self._value = float(value)
+        self.unit = unit
+
+    @staticmethod
+    def uiUnit():
+        return MTime.kFilm
+
+    def value(self):
+        return self._value
+
+
+class MTimeArray(list):
+    """
+    A list of MTime.
+    """
+
+
+class MDoubleArray(list):
+    """
+    A list of floats.
+    """
+
+
+class MArgList(list):
+    """
+    The arguments a command was called with.
+    """
+
+
+class MPlug(object):
+    """
+    An attribute of a node.
+    """
+    def __init__(self, node=None, attribute=None):
+        self._node = node
+        self._attribute = attribute
+
+    def isNull(self):
+        return self._node is None
+
+    def node(self):
+        return MObject(self._node)
+
+    def name(self):
+        return f'{self._node.name}.{self._attribute}'
+
+    def partialName(self, *args, **kwargs):
+        return self._attribute
+
+    def _is_angle(self):
+        return self._attribute.startswith(_ANGLE_ATTRS)
+
+    def _value(self):
+        if not _alive(self._node):
+            raise RuntimeError('(kFailure): Object does not exist')
+        return _scene.plug_value(self._node, self._attribute)
+
+    def asDouble(self):
+        # angles are held in radians
+        return math.radians(self._value()) if self._is_angle() else float(self._value())
+
+    def asInt(self):
+        return int(self._value())
+
+    def asMAngle(self):
+        return MAngle(self._value(), MAngle.kDegrees)
+
+    def connectedTo(self, asDst=False, asSrc=False):
+        if not asDst:
+            return []
+        curve = _scene.curve(self._node, self._attribute)
+        return [MPlug(curve, 'output')] if curve is not None else []
+
+
+class MFnDependencyNode(object):
+    """
+    The function set of any node.
+    """
+    def __init__(self, mobject=None):
+        self._node = mobject._node if mobject is not None else None
+
+    def setObject(self, mobject=None):
+        self._node = mobject._node
+
+    def object(self):
+        return MObject(self._node)
+
+    def name(self):
+        return self._node.name
+
+    def typeName(self):
+        return self._node.type
+
+    def findPlug(self, attribute=None, want_networked=False):
+        return MPlug(self._node, attribute)
+
+
+class MFnDagNode(MFnDependencyNode):
+    """
+    The function set of the nodes in the hierarchy.
+    """
+    def __init__(self, node=None):
+        if isinstance(node, MDagPath):
+            node = node.node()
+        super().__init__(node)
+
+    def getPath(self):
+        return MDagPath._to(self._node)
+
+    def partialPathName(self):
+        return self.getPath().partialPathName()
+
+    def fullPathName(self):
+        return self.getPath().fullPathName()
+
+    def parentCount(self):
+        return 1
+
+    def childCount(self):
+        return sum(1 for node in _scene.nodes.values() if node.parent == self._node.name)
+
+    def parent(self, index=0):
+        parent = self._node.parent
+        return MObject(_scene.nodes[parent] if parent is not None else None)
+
+
+class MFnTransform(MFnDagNode):
+    """
+    The function set of transforms and joints.
+    """
+
+
+class MDGModifier(object):
+    """
+    A list of changes to the scene, done together and undone together.
+    """
+    def __init__(self):
+        # (do, undo) pairs, the ones before done are done
+        self._operations = []
+        self._done = 0
+
+    def newPlugValueDouble(self, plug=None, value=None):
+        if plug._is_angle():
+            value = math.degrees(value)
+        self._set_plug(plug, value)
+
+    def newPlugValueMAngle(self, plug=None, angle=None):
+        self._set_plug(plug, angle.asDegrees())
+
+    def newPlugValueInt(self, plug=None, value=None):
+        self._set_plug(plug, int(value))
+
+    def _set_plug(self, plug=None, value=None):
+        before = []
+
+        def do():
+            before[:] = [_scene.plug_value(plug._node, plug._attribute)]
+            _scene.set_plug_value(plug._node, plug._attribute, value)
+        self._operations.append(
+            (do, lambda: _scene.set_plug_value(plug._node, plug._attribute, before[0])))
+
+    def _add(self, do=None, undo=None):
+        self._operations.append((do, undo))
+
+    def doIt(self):
+        while self._done < len(self._operations):
+            self._operations[self._done][0]()
+            self._done += 1
+        return self
+
+    def undoIt(self):
+        for do, undo in reversed(self._operations[:self._done]):
+            undo()
+        self._done = 0
+        return self
+
+
+class MPxCommand(object):
+    """
+    The base class of the commands plugins register.
+    """
+    def doIt(self, args=None):
+        pass
+
+    def undoIt(self):
+        pass
+
+    def redoIt(self):
+        pass
+
+    def isUndoable(self):
+        return False
+
+
+class MFnPlugin(object):
+    """
+    Registers the commands of a plugin with the scene.
+    """
+    def __init__(self, mobject=None, vendor=None, version=None, apiVersion='Any'):
+        pass
+
+    def registerCommand(self, name=None, creator=None, syntax=None):
+        if name in _scene.commands:
+            raise RuntimeError(f'(kFailure): The command {name} is already registered')
+        _scene.commands[name] = creator
+
+    def deregisterCommand(self, name=None):
+        _scene.commands.pop(name, None)
+
+
+class MMessage(object):
+    """
+    Removes the callbacks of any message class.
+    """
+    @staticmethod
+    def removeCallback(callback_id=None):
+        _scene.remove_callback(callback_id)
+
+    @staticmethod
+    def removeCallbacks(callback_ids=None):
+        for callback_id in callback_ids:
+            _scene.remove_callback(callback_id)
+
+
+class MDGMessage(MMessage):
+    """
+    Nodes being added to and removed from the scene.
+    """
+    @staticmethod
+    def _filtered(node_type=None, function=None, client_data=None):
+        def callback(node):
+            if node_type in ('dependNode', node.type):
+                function(MObject(node), client_data)
+        return callback
+
+    @staticmethod
+    def addNodeAddedCallback(function=None, nodeType='dependNode', clientData=None):
+        return _scene.add_callback(
+            'node_added', MDGMessage._filtered(nodeType, function, clientData))
+
+    @staticmethod
+    def addNodeRemovedCallback(function=None, nodeType='dependNode', clientData=None):
+        return _scene.add_callback(
+            'node_removed', MDGMessage._filtered(nodeType, function, clientData))
+
+
+class MNodeMessage(MMessage):
+    """
+    Changes to a node, or to every node.
+    """
+    kConnectionMade = 1
+    kConnectionBroken = 2
+    kAttributeSet = 8
+
+    @staticmethod
+    def addNameChangedCallback(mobject=None, function=None, clientData=None):
+        return _scene.add_callback(
+            'name_changed',
+            lambda node, previous: function(MObject(node), previous, clientData),
+            mobject._node)
+
+    @staticmethod
+    def addAttributeChangedCallback(mobject=None, function=None, clientData=None):
+        return _scene.add_callback(
+            'attribute_changed',
+            lambda node, attribute: function(MNodeMessage.kAttributeSet,
+                                             MPlug(node, attribute), MPlug(), clientData),
+            mobject._node)
+
+
+class MDagMessage(MMessage):
+    """
+    Nodes being parented and unparented.
+    """
+    @staticmethod
+    def _paths(function=None, client_data=None):
+        def callback(node, parent):
+            parent_path = MDagPath._to(parent) if parent is not None else MDagPath()
+            function(MDagPath._to(node), parent_path, client_data)
+        return callback
+
+    @staticmethod
+    def addParentAddedCallback(function=None, clientData=None):
+        return _scene.add_callback('parent_added',
+                                   MDagMessage._paths(function, clientData))
+
+    @staticmethod
+    def addParentRemovedCallback(function=None, clientData=None):
+        return _scene.add_callback('parent_removed',
+                                   MDagMessage._paths(function, clientData))
+
+
+class MSceneMessage(MMessage):
+    """
+    Scenes being opened and made.
+    """
+    kAfterNew = 'after_new'
+    kAfterOpen = 'after_open'
+
+    @staticmethod
+    def addCallback(message=None, function=None, clientData=None):
+        return _scene.add_callback(message, lambda node: function(clientData))
+
+
+class MFnAnimCurve(MFnDependencyNode):
+    """
+    The function set of animation curves.
+    """
+    kAnimCurveTA = 'animCurveTA'
+    kAnimCurveTL = 'animCurveTL'
+    kTangentAuto = 18
+
+    def create(self, plug=None, curve_type=None, modifier=None):
+        """
+        Make a curve for a plug with a modifier, the curve is there once it is done
+        """
+        made = []
+
+        def do():
+            if made:
+                _scene._restore_curve(made[0], plug._node.name, plug._attribute)
+            else:
+                made.append(_scene.curve(plug._node, plug._attribute, create=True))
+            self._node = made[0]
+        modifier._add(do, lambda: _scene.delete_curve(made[0]))
+        return MObject(None)
+
+    def _target(self):
+        if self._node is None or self._node.name not in _scene.connections:
+            raise RuntimeError('(kInvalidParameter): The curve is not connected')
+        return _scene.connections[self._node.name]
+
+    def numKeys(self):
+        return len(_scene.keys.get(self._target(), {}))
+
+    def addKeys(self, times=None, values=None, tangentInType=None, tangentOutType=None,
+                keepExistingKeys=False, change=None):
+        node, attribute = self._target()
+        frames = [time.value() for time in times]
+        if attribute.startswith(_ANGLE_ATTRS):
+            values = [math.degrees(value) for value in values]
+        values = list(values)
+        target = (node, attribute)
+        before = dict(_scene.keys.get(target, {}))
+        if not keepExistingKeys:
+            # like Maya, every key of the curve goes before the new ones are added
+            _scene.keys.get(target, {}).clear()
+        _scene.add_keys(node, attribute, frames, values)
+        if change is not None:
+            after = dict(_scene.keys[target])
+            change._add(lambda: _scene.keys.__setitem__(target, dict(before)),
+                        lambda: _scene.keys.__setitem__(target, dict(after)))
+
+
+class MAnimCurveChange(object):
+    """
+    Records the keys set on curves, to undo and redo them.
+    """
+    def __init__(self):
+        self._changes = []
+
+    def _add(self, undo=None, redo=None):
+        self._changes.append((undo, redo))
+
+    def undoIt(self):
+        for undo, _ in reversed(self._changes):
+            undo()
+
+    def redoIt(self):
+        for _, redo in self._changes:
+            redo()
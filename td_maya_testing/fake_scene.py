@@ -0,0 +1,887 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A pure Python stand in for the parts of maya.cmds used by the poser tools.
+
+:description:
+    FakeScene keeps a small hierarchy of transforms and joints in memory and answers
+    the maya.cmds functions that the poser tools use, with the same arguments and
+    return values. It can be given to td_maya_tools.pose_backends.CmdsBackend to run
+    the pose code outside of Maya. Scale, shear and constraints are not simulated, and
+    keys are recorded on animation curve nodes but do not drive the channels they are
+    set on.
+    Changes made by commands go into an undo queue grouped by undo chunks, the way they
+    do in Maya, and the scene sends the messages that td_maya_testing.fake_api turns into
+    OpenMaya callbacks. Plugins written against the Maya Python API 2.0 can be loaded,
+    and their commands are called like any other command.
+    CountingCmds wraps a scene to count the commands called on it and to make every
+    command take a set amount of time, like a round trip to Maya would. Scenes can be
+    saved to and opened from JSON files, and install_maya_cmds makes maya.cmds
+    importable outside of Maya, forwarding every command to a scene.
+    Contains the following functions:
+        install_maya_cmds
+        set_maya_cmds
+    Contains the following classes:
+        FakeScene
+        FakeNode
+        CountingCmds
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.pose_backends
+    td_maya_testing.fake_api
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import Counter
+import importlib.util
+import json
+import math
+import os
+import sys
+import time
+import types
+
+# Imports That You Wrote
+from td_maya_tools import pose_solver
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+_VECTOR_ATTRS = {'translate': 'translate', 'rotate': 'rotate',
+                 'jointOrient': 'joint_orient', 'rotateAxis': 'rotate_axis'}
+
+# the type of the curve a setKeyframe makes for each attribute, by its first letter
+_CURVE_TYPES = {'t': 'animCurveTL', 'r': 'animCurveTA'}
+
+# the messages a scene sends, and what their callbacks are given besides the node
+MESSAGES = {'node_added': (), 'node_removed': (), 'name_changed': ('previous name',),
+            'attribute_changed': ('attribute',), 'parent_added': ('parent node',),
+            'parent_removed': ('parent node',), 'after_new': (), 'after_open': ()}
+
+
+def install_maya_cmds(cmds=None):
+    """
+    Make maya.cmds importable outside of Maya, forwarding every command to a stand in
+
+    :param cmds: The stand in for maya.cmds, such as a FakeScene or CountingCmds
+    :type: object
+
+    :return: Whether the stand in was installed, False when Maya is available
+    :type: bool
+    """
+    cmds_module = sys.modules.get('maya.cmds')
+    if isinstance(cmds_module, _CmdsModule):
+        cmds_module.target = cmds
+        return True
+    try:
+        import maya.cmds
+        return False
+    except ImportError:
+        pass
+    maya_module = types.ModuleType('maya')
+    maya_module.__path__ = []
+    cmds_module = _CmdsModule('maya.cmds')
+    cmds_module.target = cmds
+    maya_module.cmds = cmds_module
+    sys.modules['maya'] = maya_module
+    sys.modules['maya.cmds'] = cmds_module
+    return True
+
+
+def set_maya_cmds(cmds=None):
+    """
+    Change the stand in that an installed maya.cmds forwards to
+
+    :param cmds: The stand in for maya.cmds
+    :type: object
+    """
+    cmds_module = sys.modules.get('maya.cmds')
+    if isinstance(cmds_module, _CmdsModule):
+        cmds_module.target = cmds
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class FakeNode(object):
+    """
+    A transform or joint in a FakeScene.
+    """
+    __slots__ = ('name', 'type', 'parent', 'translate', 'rotate', 'joint_orient',
+                 'rotate_axis', 'rotate_order')
+
+    def __init__(self, name=None, type='transform', parent=None):
+        self.name = name
+        self.type = type
+        self.parent = parent
+        self.translate = [0.0, 0.0, 0.0]
+        self.rotate = [0.0, 0.0, 0.0]
+        self.joint_orient = [0.0, 0.0, 0.0]
+        self.rotate_axis = [0.0, 0.0, 0.0]
+        self.rotate_order = 0
+
+
+class FakeScene(object):
+    """
+    An in memory scene answering a subset of maya.cmds.
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.selection = []
+        # (node name, attribute) -> frame -> value
+        self.keys = {}
+        self.warnings = []
+        # curve node name -> the (node name, attribute) it is connected to
+        self.connections = {}
+        self.undo_chunks = 0
+        self._open_chunks = 0
+        self.undo_enabled = True
+        # each step is a list of (undo, redo) functions, undone last to first
+        self.undo_queue = []
+        self.redo_queue = []
+        self._replaying = False
+        # plugin name -> module, and command name -> the creator of the command
+        self.plugins = {}
+        self.commands = {}
+        # (message, id of the node or None for every node) -> callback id -> function
+        self._listeners = {}
+        self._callbacks = {}
+        self._next_callback_id = 1
+        self._last_joint = None
+
+    def __getattr__(self, name):
+        # the commands registered by plugins are called like any other command
+        commands = self.__dict__.get('commands') or {}
+        if name not in commands:
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            return self._run_command(name, args)
+        return command
+
+    @classmethod
+    def open(cls, path=None):
+        """
+        Read a scene saved with save
+
+        :param path: Full path to the JSON file
+        :type: str
+
+        :return: The scene
+        :type: FakeScene
+        """
+        with open(path) as scene_fh:
+            data = json.load(scene_fh)
+        scene = cls()
+        for node_data in data.get('nodes', ()):
+            node = FakeNode(node_data['name'], node_data.get('type', 'transform'),
+                            node_data.get('parent'))
+            for attr in ('translate', 'rotate', 'joint_orient', 'rotate_axis'):
+                if attr in node_data:
+                    setattr(node, attr, [float(value) for value in node_data[attr]])
+            node.rotate_order = int(node_data.get('rotate_order', 0))
+            scene.nodes[node.name] = node
+        return scene
+
+    def file(self, path=None, new=False, open=False, force=False, **kwargs):
+        """
+        Make a new scene or open one saved with save into this scene, sending the
+        messages Maya sends after it
+        """
+        if not new and not open:
+            return None
+        nodes = type(self).open(path).nodes if open else {}
+        self.nodes = nodes
+        self.selection = []
+        self.keys = {}
+        self.connections = {}
+        self.undo_queue = []
+        self.redo_queue = []
+        self._last_joint = None
+        self._notify('after_open' if open else 'after_new')
+        return path
+
+    def save(self, path=None):
+        """
+        Write the nodes of the scene to a JSON file, parents before their children
+
+        :param path: Full path to the JSON file
+        :type: str
+        """
+        nodes = [{'name': node.name, 'type': node.type, 'parent': node.parent,
+                  'translate': node.translate, 'rotate': node.rotate,
+                  'joint_orient': node.joint_orient, 'rotate_axis': node.rotate_axis,
+                  'rotate_order': node.rotate_order}
+                 for node in self.nodes.values() if node.type in ('transform', 'joint')]
+        with open(path, 'w') as scene_fh:
+            json.dump({'nodes': nodes}, scene_fh, indent=1)
+
+    #------------------------------------------------------------------- scene setup --#
+
+    def createNode(self, type=None, name=None, parent=None, **kwargs):
+        """
+        Create a node, named after its type when no name is given
+        """
+        name = self._unique_name(name or type)
+        if parent is not None:
+            parent = self._node(parent).name
+        node = FakeNode(name, type, parent)
+        self.nodes[name] = node
+        self._notify('node_added', node)
+        return name
+
+    def joint(self, name=None, position=None, **kwargs):
+        """
+        Create a joint under the last joint that was created, the way joint does with
+        a joint selected
+        """
+        name = self.createNode('joint', name, self._last_joint)
+        if position is not None:
+            self.move(*position, name, absolute=True)
+        self._last_joint = name
+        return name
+
+    def select(self, *args, clear=False, add=False, **kwargs):
+        if clear:
+            self._last_joint = None
+            self.selection = []
+            return
+        names = [self._node(name).name for name in self._names(args)]
+        self.selection = self.selection + names if add else names
+
+    def delete(self, *args, **kwargs):
+        for name in self._names(args):
+            node = self.nodes.get(name.split('|')[-1])
+            if node is None:
+                continue
+            name = node.name
+            for child in [n for n in self.nodes.values() if n.parent == name]:
+                self.delete(child.name)
+            self._notify('node_removed', node)
+            del self.nodes[name]
+            if self._last_joint == name:
+                self._last_joint = None
+            if name in self.selection:
+                self.selection.remove(name)
+
+    def rename(self, old=None, new=None):
+        node = self._node(old)
+        new = self._unique_name(new)
+        del self.nodes[node.name]
+        for child in self.nodes.values():
+            if child.parent == node.name:
+                child.parent = new
+        for curve, (target, attribute) in list(self.connections.items()):
+            if target == node.name:
+                self.connections[curve] = (new, attribute)
+                self.keys[new, attribute] = self.keys.pop((node.name, attribute), {})
+        old, node.name = node.name, new
+        self.nodes[new] = node
+        self._notify('name_changed', node, old)
+        return new
+
+    def parent(self, child=None, parent=None, world=False, relative=False, **kwargs):
+        """
+        Parent a node under another one, or to the world, keeping its world transform
+        unless relative is on. The translate and rotate channels are changed to keep it,
+        never the joint orient
+        """
+        node = self._node(child)
+        new_parent = None if world or parent is None else self._node(parent)
+        world_transform = self.world_transform(node.name)
+        self._record_change(node)
+        old_parent = self.nodes[node.parent] if node.parent is not None else None
+        node.parent = new_parent.name if new_parent is not None else None
+        self._notify('parent_removed', node, old_parent)
+        self._notify('parent_added', node, new_parent)
+        if not relative:
+            rotation, translation = world_transform
+            order = pose_solver.ROTATE_ORDERS[node.rotate_order]
+            self._solve(node.name, list(translation) + list(pose_solver.matrix_to_euler(
+                pose_solver.orthonormalize(rotation), order)))
+        return [node.name]
+
+    #------------------------------------------------------------------------ queries --#
+
+    def ls(self, *args, type=None, long=False, selection=False, **kwargs):
+        if selection:
+            names = list(self.selection)
+        else:
+            names = self._names(args) if args else list(self.nodes)
+        names = [node.name for node in map(self._find, names) if node is not None]
+        if type is not None:
+            types = [type] if isinstance(type, str) else list(type)
+            names = [name for name in names if self.nodes[name].type in types]
+        if long:
+            names = [self._full_path(name) for name in names]
+        return names
+
+    def objExists(self, name=None):
+        return name in self.nodes
+
+    def nodeType(self, name=None):
+        return self._node(name).type
+
+    def listRelatives(self, name=None, parent=False, children=False, **kwargs):
+        node = self._node(name)
+        if parent:
+            return [node.parent] if node.parent else None
+        return [child.name for child in self.nodes.values() if child.parent == node.name] or None
+
+    def warning(self, message=None):
+        self.warnings.append(message)
+
+    def undoInfo(self, openChunk=False, closeChunk=False, query=False,
+                 stateWithoutFlush=None, **kwargs):
+        if query:
+            return self.undo_enabled
+        if stateWithoutFlush is not None:
+            self.undo_enabled = stateWithoutFlush
+        if openChunk:
+            if not self._open_chunks:
+                self.undo_chunks += 1
+                self.undo_queue.append([])
+            self._open_chunks += 1
+        if closeChunk:
+            self._open_chunks -= 1
+            if not self._open_chunks and self.undo_queue and not self.undo_queue[-1]:
+                self.undo_queue.pop()
+
+    def undo(self, **kwargs):
+        """
+        Undo the last step of the undo queue
+        """
+        if not self.undo_queue:
+            self.warning('There are no more commands to undo.')
+            return
+        step = self.undo_queue.pop()
+        self._replay([undo for undo, _ in reversed(step)])
+        self.redo_queue.append(step)
+
+    def redo(self, **kwargs):
+        """
+        Redo the last step that was undone
+        """
+        if not self.redo_queue:
+            self.warning('There are no more commands to redo.')
+            return
+        step = self.redo_queue.pop()
+        self._replay([redo for _, redo in step])
+        self.undo_queue.append(step)
+
+    #---------------------------------------------------------------------- plugins --#
+
+    def loadPlugin(self, path=None, quiet=False, **kwargs):
+        """
+        Load a plugin written against the Maya Python API 2.0 from its file. Like Maya,
+        the file is loaded as a module of its own, not the one it is imported as
+        """
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name in self.plugins:
+            return [name]
+        om = sys.modules.get('maya.api.OpenMaya')
+        if om is None:
+            raise RuntimeError(f'Plug-in, "{path}", was not found on MAYA_PLUG_IN_PATH.')
+        spec = importlib.util.spec_from_file_location(f'_plugin_{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.initializePlugin(om.MObject())
+        self.plugins[name] = module
+        return [name]
+
+    def unloadPlugin(self, name=None, **kwargs):
+        module = self.plugins.pop(os.path.splitext(os.path.basename(name))[0], None)
+        if module is not None:
+            module.uninitializePlugin(sys.modules['maya.api.OpenMaya'].MObject())
+
+    def pluginInfo(self, name=None, query=True, loaded=False, **kwargs):
+        return os.path.splitext(os.path.basename(name))[0] in self.plugins
+
+    #--------------------------------------------------------------------- messages --#
+
+    def add_callback(self, message=None, function=None, node=None):
+        """
+        Call a function whenever the scene sends a message, with the node the message
+        is about and what MESSAGES lists for it
+
+        :param message: One of MESSAGES
+        :type: str
+
+        :param function: The callback
+        :type: function
+
+        :param node: Only call it for messages about this node
+        :type: FakeNode
+
+        :return: The id of the callback, to remove it with
+        :type: int
+        """
+        if message not in MESSAGES:
+            raise ValueError(f'Unknown message {message}')
+        callback_id = self._next_callback_id
+        self._next_callback_id += 1
+        key = (message, None if node is None else id(node))
+        self._listeners.setdefault(key, {})[callback_id] = function
+        self._callbacks[callback_id] = key
+        return callback_id
+
+    def remove_callback(self, callback_id=None):
+        key = self._callbacks.pop(callback_id, None)
+        if key is not None:
+            del self._listeners[key][callback_id]
+
+    @property
+    def callback_count(self):
+        """
+        The number of callbacks that are installed
+        """
+        return len(self._callbacks)
+
+    #----------------------------------------------------------------- transforms --#
+
+    def move(self, *args, absolute=True, moveX=False, moveY=False, moveZ=False,
+             **kwargs):
+        """
+        Absolute world space move of one or more nodes
+        """
+        values, names = self._split_args(args)
+        channels = self._axis_channels(values, (moveX, moveY, moveZ))
+        for name in names:
+            self._record_change(self._node(name))
+            self._solve(name, channels + [math.nan] * 3)
+            self._notify('attribute_changed', self._node(name), 'translate')
+
+    def rotate(self, *args, absolute=True, rotateX=False, rotateY=False, rotateZ=False,
+               **kwargs):
+        """
+        Absolute world space rotation of one or more nodes
+        """
+        values, names = self._split_args(args)
+        channels = self._axis_channels(values, (rotateX, rotateY, rotateZ))
+        for name in names:
+            self._record_change(self._node(name))
+            self._solve(name, [math.nan] * 3 + channels)
+            self._notify('attribute_changed', self._node(name), 'rotate')
+
+    def xform(self, name=None, query=True, worldSpace=False, matrix=False,
+              translation=False, rotation=False, **kwargs):
+        if isinstance(name, (list, tuple)):
+            # a query of several nodes gives the values of all of them one after another
+            values = []
+            for node_name in name:
+                values.extend(self.xform(node_name, query, worldSpace, matrix,
+                                         translation, rotation))
+            return values
+        if worldSpace:
+            transform = self.world_transform(name)
+        else:
+            node = self._node(name)
+            transform = self._local_transform(node)
+        if matrix:
+            return pose_solver.flatten_matrix(transform)
+        if translation:
+            return list(transform[1])
+        if rotation:
+            order = pose_solver.ROTATE_ORDERS[self._node(name).rotate_order]
+            return list(pose_solver.matrix_to_euler(
+                pose_solver.orthonormalize(transform[0]), order))
+        return None
+
+    def getAttr(self, plug=None, **kwargs):
+        name, attr = plug.split('.', 1)
+        node = self._node(name)
+        if attr == 'rotateOrder':
+            return node.rotate_order
+        if attr in _VECTOR_ATTRS:
+            return [tuple(getattr(node, _VECTOR_ATTRS[attr]))]
+        return getattr(node, _VECTOR_ATTRS[attr[:-1]])['XYZ'.index(attr[-1])]
+
+    def setAttr(self, plug=None, *values, **kwargs):
+        name, attr = plug.split('.', 1)
+        node = self._node(name)
+        self._record_change(node)
+        if attr in _VECTOR_ATTRS:
+            setattr(node, _VECTOR_ATTRS[attr], [float(value) for value in values])
+            self._notify('attribute_changed', node, attr)
+        else:
+            self.set_plug_value(node, attr, values[0])
+
+    def setKeyframe(self, name=None, attribute=None, time=None, value=None, **kwargs):
+        node = self._node(name)
+        if value is None:
+            value = self.getAttr(f'{node.name}.{attribute}')
+        self.add_keys(node, attribute, [time], [value], record=True)
+        return 1
+
+    def plug_value(self, node=None, attr=None):
+        """
+        :param node: The node, or its name
+        :type: FakeNode
+
+        :param attr: A single value attribute, such as translateX or rotateOrder
+        :type: str
+
+        :return: The value of the attribute, in degrees for rotations
+        :type: float
+        """
+        node = self._node(node) if isinstance(node, str) else node
+        if attr == 'rotateOrder':
+            return node.rotate_order
+        return getattr(node, _VECTOR_ATTRS[attr[:-1]])['XYZ'.index(attr[-1])]
+
+    def set_plug_value(self, node=None, attr=None, value=None):
+        """
+        Set a single value attribute, without going through the undo queue
+
+        :param node: The node, or its name
+        :type: FakeNode
+
+        :param attr: A single value attribute, such as translateX or rotateOrder
+        :type: str
+
+        :param value: The value, in degrees for rotations
+        :type: float
+        """
+        node = self._node(node) if isinstance(node, str) else node
+        if node.name not in self.nodes or self.nodes[node.name] is not node:
+            raise RuntimeError(f'The node {node.name} no longer exists')
+        if attr == 'rotateOrder':
+            node.rotate_order = int(value)
+        else:
+            getattr(node, _VECTOR_ATTRS[attr[:-1]])['XYZ'.index(attr[-1])] = float(value)
+        self._notify('attribute_changed', node, attr)
+
+    def curve(self, node=None, attribute=None, create=False):
+        """
+        :param node: The keyed node, or its name
+        :type: FakeNode
+
+        :param attribute: The keyed attribute, such as translateX
+        :type: str
+
+        :param create: Make the curve when the attribute has none, without going
+                       through the undo queue
+        :type: bool
+
+        :return: The animation curve connected to the attribute, if any
+        :type: FakeNode
+        """
+        node = self._node(node) if isinstance(node, str) else node
+        for curve, target in self.connections.items():
+            if target == (node.name, attribute):
+                return self.nodes[curve]
+        if not create:
+            return None
+        name = self.createNode(_CURVE_TYPES[attribute[0]], f'{node.name}_{attribute}')
+        self.connections[name] = (node.name, attribute)
+        return self.nodes[name]
+
+    def delete_curve(self, curve=None):
+        """
+        Delete an animation curve and its keys, without going through the undo queue
+        """
+        target = self.connections.pop(curve.name, None)
+        self.keys.pop(target, None)
+        self.nodes.pop(curve.name, None)
+
+    def add_keys(self, node=None, attribute=None, times=None, values=None, record=False):
+        """
+        Key an attribute on several frames, making its curve when it has none
+
+        :param node: The keyed node, or its name
+        :type: FakeNode
+
+        :param attribute: The keyed attribute, such as translateX
+        :type: str
+
+        :param times: The frames
+        :type: list
+
+        :param values: The value at each frame, in degrees for rotations
+        :type: list
+
+        :param record: Put the keys and the curve into the undo queue
+        :type: bool
+
+        :return: The keys that were on the curve before, for remove_keys
+        :type: dict
+        """
+        node = self._node(node) if isinstance(node, str) else node
+        curve = self.curve(node, attribute)
+        if curve is None:
+            curve = self.curve(node, attribute, create=True)
+            if record:
+                self._record(lambda: self.delete_curve(curve),
+                             lambda: self._restore_curve(curve, node.name, attribute))
+        keys = self.keys.setdefault((node.name, attribute), {})
+        previous = {}
+        for time, value in zip(times, values):
+            previous[float(time)] = keys.get(float(time))
+            keys[float(time)] = float(value)
+        if record:
+            target = (node.name, attribute)
+            added = dict(zip(map(float, times), map(float, values)))
+            self._record(lambda: self.remove_keys(target, previous),
+                         lambda: self.keys.setdefault(target, {}).update(added))
+        return previous
+
+    def remove_keys(self, target=None, previous=None):
+        """
+        Put keys back the way add_keys found them
+
+        :param target: The keyed (node name, attribute)
+        :type: tuple
+
+        :param previous: The keys add_keys returned, None for frames that had no key
+        :type: dict
+        """
+        keys = self.keys.get(target, {})
+        for time, value in previous.items():
+            if value is None:
+                keys.pop(time, None)
+            else:
+                keys[time] = value
+
+    def world_transform(self, name=None):
+        """
+        :return: The world 3x3 matrix and translation of a node
+        :type: tuple
+        """
+        node = self._node(name)
+        transform = self._local_transform(node)
+        if node.parent is not None:
+            transform = pose_solver.compose(transform, self.world_transform(node.parent))
+        return transform
+
+    def joint_state(self, name=None):
+        """
+        :return: What the pose solver needs to know about a node
+        :type: td_maya_tools.pose_solver.JointState
+        """
+        node = self._node(name)
+        parent_world = None
+        if node.parent is not None:
+            parent_world = pose_solver.flatten_matrix(self.world_transform(node.parent))
+        return pose_solver.JointState(
+            name=node.name, parent=node.parent,
+            world=pose_solver.flatten_matrix(self.world_transform(name)),
+            parent_world=parent_world, joint_orient=node.joint_orient,
+            rotate_axis=node.rotate_axis,
+            rotate_order=pose_solver.ROTATE_ORDERS[node.rotate_order])
+
+    #-------------------------------------------------------------------- internals --#
+
+    def _node(self, name=None):
+        node = self._find(name)
+        if node is None:
+            raise ValueError(f'No object matches name: {name}')
+        return node
+
+    def _find(self, name=None):
+        """
+        The node named by its name or by a path, which only finds it when its parents
+        match
+        """
+        node = self.nodes.get(name.split('|')[-1] if name else name)
+        if node is None or '|' not in name:
+            return node
+        path = self._full_path(node.name)
+        if path == name or (not name.startswith('|') and path.endswith(f'|{name}')):
+            return node
+        return None
+
+    def _full_path(self, name=None):
+        node = self._node(name)
+        path = f'|{node.name}'
+        while node.parent is not None:
+            node = self.nodes[node.parent]
+            path = f'|{node.name}{path}'
+        return path
+
+    def _unique_name(self, name=None):
+        if name not in self.nodes:
+            return name
+        base = name.rstrip('0123456789')
+        number = 1
+        while f'{base}{number}' in self.nodes:
+            number += 1
+        return f'{base}{number}'
+
+    @staticmethod
+    def _names(args=None):
+        names = []
+        for arg in args:
+            if isinstance(arg, (list, tuple, set)):
+                names.extend(arg)
+            else:
+                names.append(arg)
+        return names
+
+    def _split_args(self, args=None):
+        values = [arg for arg in args if isinstance(arg, (int, float))]
+        names = self._names([arg for arg in args if not isinstance(arg, (int, float))])
+        return values, names
+
+    @staticmethod
+    def _axis_channels(values=None, axes=None):
+        if not any(axes):
+            return [float(value) for value in values]
+        values = iter(values)
+        return [float(next(values)) if axis else math.nan for axis in axes]
+
+    def _local_transform(self, node=None):
+        return pose_solver.local_matrix(
+            node.translate, node.rotate, pose_solver.ROTATE_ORDERS[node.rotate_order],
+            node.joint_orient, node.rotate_axis)
+
+    def _notify(self, message=None, node=None, *args):
+        listeners = self._listeners
+        if not listeners:
+            return
+        functions = list(listeners.get((message, None), {}).values())
+        if node is not None:
+            functions.extend(listeners.get((message, id(node)), {}).values())
+        for function in functions:
+            function(node, *args)
+
+    def _record(self, undo=None, redo=None):
+        """
+        Add a change to the undo queue, to the open undo chunk if there is one
+        """
+        if not self.undo_enabled or self._replaying:
+            return
+        if self._open_chunks and self.undo_queue:
+            self.undo_queue[-1].append((undo, redo))
+        else:
+            self.undo_queue.append([(undo, redo)])
+        self.redo_queue = []
+
+    def _record_change(self, node=None):
+        """
+        Put the channels a command is about to change into the undo queue
+        """
+        if not self.undo_enabled or self._replaying:
+            return
+        before = self._node_values(node)
+        after = []
+
+        def undo():
+            after[:] = [self._node_values(node)]
+            self._set_node_values(node, before)
+        self._record(undo, lambda: self._set_node_values(node, after[0]))
+
+    def _replay(self, functions=None):
+        self._replaying = True
+        try:
+            for function in functions:
+                function()
+        finally:
+            self._replaying = False
+
+    def _node_values(self, node=None):
+        return (node.parent, list(node.translate), list(node.rotate),
+                list(node.joint_orient), list(node.rotate_axis), node.rotate_order)
+
+    def _set_node_values(self, node=None, values=None):
+        old_parent = node.parent
+        node.parent = values[0]
+        node.translate, node.rotate, node.joint_orient, node.rotate_axis = (
+            list(vector) for vector in values[1:5])
+        node.rotate_order = values[5]
+        if node.parent != old_parent:
+            self._notify('parent_removed', node, self.nodes.get(old_parent))
+            self._notify('parent_added', node, self.nodes.get(node.parent))
+        for attr in ('translate', 'rotate', 'jointOrient', 'rotateAxis', 'rotateOrder'):
+            self._notify('attribute_changed', node, attr)
+
+    def _restore_curve(self, curve=None, name=None, attribute=None):
+        self.nodes[curve.name] = curve
+        self.connections[curve.name] = (name, attribute)
+
+    def _run_command(self, name=None, args=None):
+        command = self.commands[name]()
+        result = command.doIt(list(args))
+        if command.isUndoable():
+            self._record(command.undoIt, command.redoIt)
+        return result
+
+    def _solve(self, name=None, channels=None):
+        node = self._node(name)
+        solved = pose_solver.solve_local_channels([(node.name, channels)],
+                                                  {node.name: self.joint_state(node.name)})
+        translate, rotate = solved[node.name]
+        if translate is not None:
+            node.translate = list(translate)
+        if rotate is not None:
+            node.rotate = list(rotate)
+
+
+class CountingCmds(object):
+    """
+    Count the commands called on a scene, optionally waiting a while on each call.
+    """
+    def __init__(self, scene=None, latency=0.0):
+        """
+        :param scene: The scene to forward the commands to
+        :type: FakeScene
+
+        :param latency: How long every command takes, in seconds
+        :type: float
+        """
+        self.scene = scene if scene is not None else FakeScene()
+        self.latency = latency
+        self.call_counts = Counter()
+
+    def __getattr__(self, name):
+        if 'scene' not in self.__dict__:
+            raise AttributeError(name)
+        function = getattr(self.scene, name)
+        if not callable(function):
+            return function
+
+        def counted(*args, **kwargs):
+            self.call_counts[name] += 1
+            if self.latency:
+                # sleep is far too coarse for latencies of a few microseconds
+                end = time.perf_counter() + self.latency
+                while time.perf_counter() < end:
+                    pass
+            return function(*args, **kwargs)
+
+        # keep the wrapper so the next lookup does not come through here again
+        setattr(self, name, counted)
+        return counted
+
+    def reset_counts(self):
+        """
+        Start counting from zero again
+
+        :return: The counts before they were reset
+        :type: dict
+        """
+        counts = dict(self.call_counts)
+        self.call_counts.clear()
+        return counts
+
+
+class _CmdsModule(types.ModuleType):
+    """
+    A module forwarding every attribute to its target.
+    """
+    target = None
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
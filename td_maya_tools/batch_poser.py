@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Apply poses to many scenes without the GUI.
+
+:description:
+    Every job opens a scene, applies a pose from the pose library to it and saves the
+    result to a new file. The jobs are run on a pool of worker processes, each of
+    which starts its own scene session once and then works through its share of the
+    jobs. The result of every job is collected into a summary:
+        ok      - every joint of the pose was applied
+        partial - the file was saved, but some joints could not be posed
+        failed  - the scene could not be opened, posed or saved
+    Jobs are either every pose on every scene, or listed in a JSON file of
+    {"scene": ..., "pose": ..., "output": ...} objects. Run it with mayapy:
+        mayapy -m td_maya_tools.batch_poser shot_010.ma shot_020.ma
+            --library poses.xml --pose wave --pose sit --output-dir posed
+    The fake session opens and saves td_maya_testing.fake_scene scenes instead, so the
+    whole batch can be run and tested with a plain Python.
+    Contains the following functions:
+        build_jobs
+        read_job_file
+        run_batch
+        main
+    Contains the following classes:
+        BatchJob
+        JobResult
+        MayaSession
+        FakeSession
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+    td_maya_testing.fake_scene
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import argparse
+from collections import namedtuple
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import sys
+import time
+
+# Imports That You Wrote
+from td_maya_tools import pose_index, poser
+from td_maya_tools.joint_registry import JointRegistry
+from td_maya_tools.pose_backends import CmdsBackend
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the file extension used for the files written with each export type
+EXPORT_EXTENSIONS = {'mayaAscii': '.ma', 'mayaBinary': '.mb', 'FBX export': '.fbx'}
+
+# the session of a worker process, started once by _start_worker
+_session = None
+
+
+def build_jobs(scenes=None, poses=None, output_dir=None, export_type=None):
+    """
+    Make a job for every pose on every scene. The output files are named
+    <scene>_<pose> and written to the output folder, or next to the scene.
+
+    :param scenes: Full paths to the scene files
+    :type: list
+
+    :param poses: The names of the poses
+    :type: list
+
+    :param output_dir: The folder the posed scenes are written to
+    :type: str
+
+    :param export_type: The Maya file type the scenes are exported as, see
+                        EXPORT_EXTENSIONS. Defaults to saving them as they are
+    :type: str
+
+    :return: The jobs
+    :type: list
+    """
+    jobs = []
+    for scene in scenes or ():
+        base_name, extension = os.path.splitext(os.path.basename(scene))
+        extension = EXPORT_EXTENSIONS.get(export_type, extension)
+        folder = output_dir or os.path.dirname(os.path.abspath(scene))
+        for pose in poses or ():
+            jobs.append(BatchJob(scene, pose,
+                                 os.path.join(folder, f'{base_name}_{pose}{extension}')))
+    return jobs
+
+
+def read_job_file(path=None):
+    """
+    Read jobs from a JSON file holding a list of {"scene", "pose", "output"} objects.
+    Relative paths are relative to the JSON file.
+
+    :param path: Full path to the JSON file
+    :type: str
+
+    :return: The jobs
+    :type: list
+    """
+    with open(path) as job_fh:
+        data = json.load(job_fh)
+    folder = os.path.dirname(os.path.abspath(path))
+    return [BatchJob(os.path.join(folder, entry['scene']), entry['pose'],
+                     os.path.join(folder, entry['output']))
+            for entry in data]
+
+
+def run_batch(jobs=None, library_paths=None, session='maya', max_workers=None,
+              export_type=None):
+    """
+    Run jobs on a pool of worker processes and collect their results
+
+    :param jobs: The jobs to run
+    :type: list
+
+    :param library_paths: Full paths to the pose xml files the poses come from
+    :type: list
+
+    :param session: The name of the scene session the workers use, see SESSIONS
+    :type: str
+
+    :param max_workers: The number of worker processes, defaults to the number of
+                        cores. 0 runs the jobs one by one in this process
+    :type: int
+
+    :param export_type: The Maya file type to export the scenes as, defaults to
+                        saving them as they are
+    :type: str
+
+    :return: The summary of the batch, with the result of every job in order
+    :type: dict
+    """
+    if session not in SESSIONS:
+        raise ValueError(f'Unknown session {session}, expected one of '
+                         f'{", ".join(sorted(SESSIONS))}')
+    start = time.perf_counter()
+    jobs = list(jobs or ())
+    results = [None] * len(jobs)
+
+    # the library is read once here, every job only gets sent the pose it needs
+    poses = pose_index.build_pose_index(library_paths)
+    pending = []
+    for position, job in enumerate(jobs):
+        if job.pose in poses:
+            pending.append(position)
+        else:
+            results[position] = JobResult(job, status='failed',
+                                          error=f'The pose {job.pose} is not in the library')
+
+    if pending and max_workers == 0:
+        _start_worker(session)
+        for position in pending:
+            results[position] = _run_job(jobs[position], poses[jobs[position].pose],
+                                         export_type)
+    elif pending:
+        if max_workers is None:
+            max_workers = min(len(pending), os.cpu_count() or 1)
+        with futures.ProcessPoolExecutor(max_workers=max_workers,
+                                         initializer=_start_worker,
+                                         initargs=(session,)) as executor:
+            submitted = {executor.submit(_run_job, jobs[position],
+                                         poses[jobs[position].pose], export_type): position
+                         for position in pending}
+            for future in futures.as_completed(submitted):
+                position = submitted[future]
+                try:
+                    results[position] = future.result()
+                except BrokenProcessPool:
+                    # a worker died, most likely Maya crashing on a scene
+                    results[position] = JobResult(jobs[position], status='failed',
+                                                  error='The worker process died')
+
+    summary = {'jobs': len(results), 'seconds': time.perf_counter() - start,
+               'ok': 0, 'partial': 0, 'failed': 0}
+    for result in results:
+        summary[result.status] += 1
+    summary['results'] = [result.as_dict() for result in results]
+    return summary
+
+
+def main(argv=None):
+    """
+    Apply poses to scenes from the command line
+
+    :param argv: The command line arguments, defaults to sys.argv
+    :type: list
+
+    :return: The exit code, 1 if any job failed
+    :type: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Apply poses to many scenes and save the posed scenes.')
+    parser.add_argument('scenes', nargs='*', help='The scene files to pose')
+    parser.add_argument('--library', action='append', required=True,
+                        help='A pose xml file, can be given several times')
+    parser.add_argument('--pose', action='append', default=[],
+                        help='A pose to apply to every scene, can be given several times')
+    parser.add_argument('--jobs', help='A JSON file listing the scene, pose and output '
+                                       'of every job, instead of scenes and poses')
+    parser.add_argument('--output-dir', help='Where the posed scenes are written, '
+                                             'defaults to next to each scene')
+    parser.add_argument('--export', dest='export_type', choices=sorted(EXPORT_EXTENSIONS),
+                        help='Export the posed scenes as this file type')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of worker processes, 0 runs every job in '
+                             'this process')
+    parser.add_argument('--session', default='maya', choices=sorted(SESSIONS),
+                        help='Pose Maya scenes, or fake_scene JSON scenes')
+    parser.add_argument('--summary', help='Write the summary to this JSON file')
+    args = parser.parse_args(argv)
+
+    if args.jobs:
+        jobs = read_job_file(args.jobs)
+    elif args.scenes and args.pose:
+        jobs = build_jobs(args.scenes, args.pose, args.output_dir, args.export_type)
+    else:
+        parser.error('give scenes and --pose, or --jobs')
+
+    summary = run_batch(jobs, args.library, args.session, args.workers, args.export_type)
+    for result in summary['results']:
+        line = f'{result["status"]} {result["scene"]} {result["pose"]}'
+        if result['status'] == 'failed':
+            print(f'{line}: {result["error"]}', file=sys.stderr)
+        elif result['failures']:
+            print(f'{line} -> {result["output"]}, '
+                  f'{len(result["failures"])} joints could not be posed')
+        else:
+            print(f'{line} -> {result["output"]}')
+    print(f'{summary["ok"]} ok, {summary["partial"]} partial, {summary["failed"]} failed '
+          f'in {summary["seconds"]:.1f}s')
+    if args.summary:
+        with open(args.summary, 'w') as summary_fh:
+            json.dump(summary, summary_fh, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+def _start_worker(session_name=None):
+    """
+    Start the scene session of a worker process
+    """
+    global _session
+    if _session is None:
+        _session = SESSIONS[session_name]()
+        _session.start()
+
+
+def _run_job(job=None, pose=None, export_type=None):
+    """
+    Open a scene, apply a pose to it and save it, in a worker process
+
+    :return: What happened
+    :type: JobResult
+    """
+    result = JobResult(job)
+    start = time.perf_counter()
+    try:
+        _session.open_scene(job.scene)
+        # every scene gets its own backend, the joints of the last one mean nothing here
+        cmds = _session.cmds
+        applied = poser.apply_pose(pose, backend=CmdsBackend(cmds, JointRegistry(cmds)))
+        result.applied = len(applied.applied)
+        result.failures = dict(applied.failures)
+        _session.save_scene(job.output, export_type)
+        result.status = 'partial' if result.failures else 'ok'
+    except Exception as error:
+        result.status = 'failed'
+        result.error = f'{type(error).__name__}: {error}'
+    result.seconds = time.perf_counter() - start
+    return result
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+BatchJob = namedtuple('BatchJob', ('scene', 'pose', 'output'))
+
+
+class JobResult(object):
+    """
+    What happened to one job.
+    """
+    def __init__(self, job=None, status='failed', error=None):
+        self.job = job
+        self.status = status
+        self.error = error
+        self.applied = 0
+        self.failures = {}
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f'JobResult({self.job.scene!r}, {self.job.pose!r}, {self.status!r})'
+
+    def as_dict(self):
+        """
+        :return: The result as plain values, to be saved as JSON
+        :type: dict
+        """
+        return {'scene': self.job.scene, 'pose': self.job.pose, 'output': self.job.output,
+                'status': self.status, 'error': self.error, 'applied': self.applied,
+                'failures': self.failures, 'seconds': self.seconds}
+
+
+class MayaSession(object):
+    """
+    Open and save scenes with a standalone Maya.
+    """
+    def __init__(self):
+        self.cmds = None
+
+    def start(self):
+        """
+        Start Maya in this process
+        """
+        import maya.standalone
+        maya.standalone.initialize(name='python')
+        from maya import cmds
+        self.cmds = cmds
+
+    def open_scene(self, path=None):
+        """
+        :param path: Full path to the scene file
+        :type: str
+        """
+        self.cmds.file(path, open=True, force=True, prompt=False)
+
+    def save_scene(self, path=None, export_type=None):
+        """
+        :param path: Full path to the file to write
+        :type: str
+
+        :param export_type: The Maya file type to export as, defaults to saving the
+                            scene as a Maya file
+        :type: str
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if export_type:
+            if export_type.startswith('FBX'):
+                self.cmds.loadPlugin('fbxmaya', quiet=True)
+            self.cmds.file(path, exportAll=True, type=export_type, force=True)
+        else:
+            file_type = 'mayaAscii' if path.lower().endswith('.ma') else 'mayaBinary'
+            self.cmds.file(rename=path)
+            self.cmds.file(save=True, type=file_type, force=True)
+
+
+class FakeSession(object):
+    """
+    Open and save td_maya_testing.fake_scene scenes, to run batches without Maya.
+    """
+    def __init__(self):
+        self.cmds = None
+        self._scene_type = None
+
+    def start(self):
+        """
+        Load the fake scenes, they are plain Python so nothing else needs starting
+        """
+        from td_maya_testing.fake_scene import FakeScene
+        self._scene_type = FakeScene
+
+    def open_scene(self, path=None):
+        """
+        :param path: Full path to the JSON scene file
+        :type: str
+        """
+        self.cmds = self._scene_type.open(path)
+
+    def save_scene(self, path=None, export_type=None):
+        """
+        :param path: Full path to the JSON file to write, every export type is saved
+                     the same way
+        :type: str
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.cmds.save(path)
+
+
+SESSIONS = {'maya': MayaSession, 'fake': FakeSession}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
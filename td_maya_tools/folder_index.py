@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Keep track of the files of a folder and tell what changed between two scans.
+
+:description:
+    FolderIndex lists the files of a folder with a single os.scandir pass and records
+    the modified time and size of each one. Scanning again compares the folder with
+    what was recorded and returns the files that were added, changed or removed, so
+    that only those need to be read again.
+    Contains the following classes:
+        FolderIndex
+        FolderChanges
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.guis.poser_gui
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import logging
+import os
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class FolderIndex(object):
+    """
+    The files of a folder with their modified time and size.
+    """
+    def __init__(self, path=None, extensions=('png', 'xml')):
+        """
+        :param path: Full path to the folder
+        :type: str
+
+        :param extensions: The extensions of the files to keep track of, without the
+                           dot. Defaults to images and pose files
+        :type: tuple
+        """
+        self.path = path
+        self.extensions = tuple(f'.{extension}' for extension in extensions)
+        # file name -> (modified time in ns, size)
+        self.files = {}
+
+    def __repr__(self):
+        return f'FolderIndex({self.path!r}, {len(self.files)} files)'
+
+    def __contains__(self, file_name):
+        return file_name in self.files
+
+    @instrumentation.timed('folder_index.scan')
+    def scan(self):
+        """
+        List the folder again and record what changed since the last scan. The first
+        scan reports every file as added.
+
+        :return: The files that were added, changed or removed
+        :type: FolderChanges
+        """
+        files = {}
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(self.extensions):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        entry_stat = entry.stat()
+                    except OSError:
+                        # removed while the folder was being listed
+                        continue
+                    files[entry.name] = (entry_stat.st_mtime_ns, entry_stat.st_size)
+        except OSError as error:
+            logger.warning(f'Could not list {self.path}: {error}')
+
+        changes = FolderChanges(
+            added=sorted(name for name in files if name not in self.files),
+            changed=sorted(name for name, stamp in files.items()
+                           if name in self.files and self.files[name] != stamp),
+            removed=sorted(name for name in self.files if name not in files))
+        self.files = files
+        return changes
+
+    def files_of_type(self, type=None):
+        """
+        :param type: The file extension, without the dot
+        :type: str
+
+        :return: The names of the files with the extension, sorted
+        :type: list
+        """
+        return sorted(name for name in self.files if name.endswith(f'.{type}'))
+
+    def full_path(self, file_name=None):
+        """
+        :return: The full path to a file of the folder
+        :type: str
+        """
+        return os.path.join(self.path, file_name)
+
+
+class FolderChanges(object):
+    """
+    The names of the files that were added, changed or removed between two scans.
+    """
+    def __init__(self, added=None, changed=None, removed=None):
+        self.added = list(added or ())
+        self.changed = list(changed or ())
+        self.removed = list(removed or ())
+
+    def __repr__(self):
+        return (f'FolderChanges({len(self.added)} added, {len(self.changed)} changed, '
+                f'{len(self.removed)} removed)')
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def of_type(self, type=None):
+        """
+        :param type: The file extension, without the dot
+        :type: str
+
+        :return: The changes to the files with the extension
+        :type: FolderChanges
+        """
+        extension = f'.{type}'
+        return FolderChanges(*([name for name in names if name.endswith(extension)]
+                               for names in (self.added, self.changed, self.removed)))
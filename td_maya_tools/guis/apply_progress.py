@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Apply a large pose in chunks behind a progress bar that can cancel it.
+
+:description:
+    ApplyProgressDialog runs a td_maya_tools.poser.ChunkedApply one chunk at a time
+    from a zero interval timer, so Maya redraws and handles its events between chunks.
+    The dialog shows how many joints were applied, and its cancel button puts back
+    every joint that was already applied. The dialog is application modal and shows up
+    before the first chunk, so nothing else can change the scene while the undo chunk
+    of the apply is open.
+    Contains the following classes:
+        ApplyProgressDialog
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+    td_maya_tools.guis.pose_browser
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from PySide2 import QtCore, QtWidgets
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class ApplyProgressDialog(QtWidgets.QProgressDialog):
+    """
+    Run a chunked apply while the event loop is idle, with a bar to follow and cancel it.
+    """
+    # the result of the apply, once it finished or was cancelled
+    applied = QtCore.Signal(object)
+
+    def __init__(self, job=None, parent=None):
+        """
+        :param job: The apply to run
+        :type: td_maya_tools.poser.ChunkedApply
+        """
+        super().__init__(parent)
+        self.job = job
+        pose_name = job.pose.name if job.pose is not None else ''
+        self.setWindowTitle('Applying Pose')
+        self.setLabelText(f'Applying {pose_name}')
+        self.setCancelButtonText('Cancel')
+        # the undo chunk stays open between chunks, block the input of every window so
+        # nothing the user does ends up in it
+        self.setWindowModality(QtCore.Qt.ApplicationModal)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.setRange(0, 0)
+        self.canceled.connect(self.cancel_apply)
+        # a zero interval timer fires once the events waiting in the queue are handled
+        self._step_timer = QtCore.QTimer(self)
+        self._step_timer.setInterval(0)
+        self._step_timer.timeout.connect(self.apply_chunk)
+
+    def start(self):
+        """
+        Show the dialog and start applying, the first chunk is applied once the event
+        loop is idle
+
+        :return: The result of the apply, filled in as the chunks are applied
+        :type: td_maya_tools.poser.ApplyResult
+        """
+        self.show()
+        self._step_timer.start()
+        return self.job.result
+
+    def apply_chunk(self):
+        """
+        Apply the next chunk of joints and show the progress
+
+        :return: Whether there are joints left to apply
+        :type: bool
+        """
+        try:
+            with instrumentation.phase('apply_progress.apply_chunk'):
+                running = self.job.step()
+        except Exception:
+            # the apply was rolled back, do not try again
+            self._step_timer.stop()
+            self.close()
+            raise
+        if self.job.total:
+            self.setMaximum(self.job.total)
+            self.setValue(self.job.done)
+        if not running:
+            self._finish()
+        return running
+
+    def cancel_apply(self):
+        """
+        Stop applying and put back every joint that was already applied
+
+        :return: Whether every joint was put back
+        :type: bool
+        """
+        if self.job.state not in ('pending', 'running'):
+            return False
+        restored = self.job.cancel()
+        self._finish()
+        return restored
+
+    def _finish(self):
+        """
+        Stop stepping, close the dialog and hand out the result
+        """
+        self._step_timer.stop()
+        self.close()
+        self.applied.emit(self.job.result)
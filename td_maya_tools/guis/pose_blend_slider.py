@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A slider that blends the rig from its current pose to a target pose.
+
+:description:
+    PoseBlendSlider reads the current pose of the joints of its target pose once, when
+    the slider first leaves zero, and stacks it with the target in a
+    td_maya_tools.pose_blend.PoseStack. Every step of a drag after that only blends the
+    two stacked poses and applies the result, and steps that arrive faster than they
+    can be applied are merged into one. A whole drag is a single undo step.
+    Contains the following classes:
+        PoseBlendSlider
+
+:applications:
+    Maya, requires NumPy
+
+:see_also:
+    td_maya_tools.pose_blend
+    td_maya_tools.guis.poser_gui
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from contextlib import ExitStack
+from PySide2 import QtCore, QtWidgets
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation, poser
+from td_maya_tools.pose_blend import PoseStack
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseBlendSlider(QtWidgets.QWidget):
+    """
+    Blend from the current pose of the rig to a target pose.
+    """
+    def __init__(self, method='slerp', parent=None):
+        """
+        :param method: How rotations are mixed, see td_maya_tools.pose_blend.BLEND_METHODS
+        :type: str
+        """
+        super().__init__(parent)
+        self.method = method
+        # the rules that map the joints of the target to the scene joints
+        self.retarget = None
+        self.target = None
+        self.stack = None
+        self.backend = None
+        self._amount = 0.0
+        self._undo = None
+        # slider steps are merged until the event loop is idle
+        self._apply_timer = QtCore.QTimer(self)
+        self._apply_timer.setSingleShot(True)
+        self._apply_timer.setInterval(0)
+        self._apply_timer.timeout.connect(self.apply_blend)
+
+        self.label = QtWidgets.QLabel('Blend')
+        self.slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.slider.setRange(0, 100)
+        self.slider.setEnabled(False)
+        self.value_label = QtWidgets.QLabel('0%')
+        self.value_label.setMinimumWidth(32)
+
+        layout = QtWidgets.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label)
+        layout.addWidget(self.slider)
+        layout.addWidget(self.value_label)
+
+        self.slider.sliderPressed.connect(self._drag_started)
+        self.slider.sliderReleased.connect(self._drag_finished)
+        self.slider.valueChanged.connect(self._value_changed)
+
+    def set_target(self, pose=None):
+        """
+        Blend towards a new pose, starting again from zero
+
+        :param pose: The pose to blend to
+        :type: td_maya_tools.pose.Pose
+        """
+        self._drag_finished()
+        self.target = pose
+        self.stack = None
+        self.slider.blockSignals(True)
+        self.slider.setValue(0)
+        self.slider.blockSignals(False)
+        self.value_label.setText('0%')
+        self.slider.setEnabled(pose is not None)
+
+    def apply_blend(self):
+        """
+        Apply the blend at the current slider position
+
+        :return: The joints that were posed and the ones that failed
+        :type: poser.ApplyResult
+        """
+        self._apply_timer.stop()
+        if self.stack is None and not self._capture():
+            return None
+        with instrumentation.phase('pose_blend_slider.apply_blend'):
+            pose = self.stack.interpolate(self._amount, self.method,
+                                          name=f'blend {self.target.name}')
+            return poser.apply_pose(pose, self.stack.joints, self.backend)
+
+    def _capture(self):
+        """
+        Stack the current pose of the joints of the target with the target
+
+        :return: The success of the operation
+        :type: bool
+        """
+        if self.target is None:
+            return None
+        self.backend = poser.get_backend()
+        target = self.target
+        if self.retarget is not None:
+            retarget_map = poser.get_retarget_map(self.retarget, self.backend)
+            target, _ = retarget_map.retarget(target)
+        valid_joints, _ = self.backend.verify_joints(target.joints)
+        joints = [joint for joint in target.joints if joint in valid_joints]
+        if not joints:
+            return None
+        current = self.backend.read_pose(joints, 'current')
+        self.stack = PoseStack((current, target), joints,
+                               self.backend.rotate_orders(joints))
+        return True
+
+    def _drag_started(self):
+        if self.slider.value() == 0:
+            # start from wherever the rig is now
+            self.stack = None
+        if self._undo is None and (self.stack is not None or self._capture()):
+            self._undo = ExitStack()
+            self._undo.enter_context(self.backend.undo_chunk(
+                f'blend {self.target.name}'))
+
+    def _drag_finished(self):
+        if self._apply_timer.isActive():
+            self.apply_blend()
+        if self._undo is not None:
+            self._undo.close()
+            self._undo = None
+
+    def _value_changed(self, value=0):
+        self._amount = value / 100.0
+        self.value_label.setText(f'{value}%')
+        if self.slider.isSliderDown():
+            self._apply_timer.start()
+        else:
+            # a click or a key press, applied straight away as its own undo step
+            self.apply_blend()
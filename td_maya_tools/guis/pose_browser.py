@@ -0,0 +1,477 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A list view of pose tiles that only draws the tiles on screen.
+
+:description:
+    PoseBrowser shows the poses of a pose index as tiles in a QListView in icon mode.
+    The poses live in a PoseListModel and the tiles are painted by PoseTileDelegate,
+    so no widget is made per pose and only the visible tiles are painted or have their
+    thumbnail loaded. A pose is applied by double clicking its tile or from the right
+    click menu. Selecting a tile emits pose_selected with its pose. Poses with
+    CHUNKED_APPLY_JOINTS joints or more are applied in chunks behind a progress bar
+    that can cancel them, so Maya does not freeze on very large rigs. When the browser
+    has targets, such as the namespaces of the characters of a crowd, a pose is applied
+    to all of them at once. With a preview, the pose of the tile under the cursor is
+    shown on the rig, and put back when the cursor leaves it, without going through
+    the undo queue.
+    Contains the following functions:
+        apply_pose
+        apply_pose_chunked
+    Contains the following classes:
+        PoseListModel
+        PoseTileDelegate
+        PoseBrowser
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.guis.poser_gui
+    td_maya_tools.guis.thumbnail_loader
+    td_maya_tools.guis.apply_progress
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import logging
+import os
+from PySide2 import QtCore, QtGui, QtWidgets
+
+# Imports That You Wrote
+from .apply_progress import ApplyProgressDialog
+from td_maya_tools import instrumentation, poser
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+logger = logging.getLogger(__name__)
+
+# poses with this many joints or more are applied in chunks with a progress bar
+CHUNKED_APPLY_JOINTS = 500
+
+def apply_pose(pose=None, retarget=None, parent=None, targets=None):
+    """
+    Apply a pose to the scene and warn about the joints that could not be posed. Poses
+    with CHUNKED_APPLY_JOINTS joints or more are applied with apply_pose_chunked,
+    unless they are applied to targets
+
+    :param pose: The pose to apply
+    :type: td_maya_tools.pose.Pose
+
+    :param retarget: The rules that map the joints of the pose to the scene joints
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :param parent: The widget to show the progress of a chunked apply over
+    :type: QtWidgets.QWidget
+
+    :param targets: The namespaces or root nodes of the characters to apply the pose
+                    to, see poser.apply_pose_to_characters
+    :type: list
+
+    :return: The joints that were posed and the ones that failed. The result of a
+             chunked apply is filled in as its chunks are applied. With targets, a
+             dictionary of each target to its result
+    :type: poser.ApplyResult
+    """
+    if targets:
+        with instrumentation.profile('poser_gui.apply_pose_to_characters'):
+            results = poser.apply_pose_to_characters(
+                pose, targets, tolerance=poser.DEFAULT_TOLERANCE, retarget=retarget)
+        for target, result in results.items():
+            _log_result(pose, result, target=target)
+        diff = next((result.diff for result in results.values()), None)
+        if diff is not None:
+            logger.info(f'{pose.name}: {diff.channels_changed} of {diff.channels_checked} '
+                        f'channels changed on {len(results)} characters')
+        return results
+    if pose is not None and len(pose) >= CHUNKED_APPLY_JOINTS:
+        return apply_pose_chunked(pose, retarget, parent).job.result
+    # only the channels that are not already at the pose are written
+    with instrumentation.profile('poser_gui.apply_pose'):
+        result = poser.apply_pose(pose, tolerance=poser.DEFAULT_TOLERANCE,
+                                  retarget=retarget)
+    _log_result(pose, result)
+    return result
+
+
+def apply_pose_chunked(pose=None, retarget=None, parent=None):
+    """
+    Start applying a pose a chunk of joints at a time while Maya is idle, behind a
+    progress bar that can cancel it and put the joints back
+
+    :param pose: The pose to apply
+    :type: td_maya_tools.pose.Pose
+
+    :param retarget: The rules that map the joints of the pose to the scene joints
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :param parent: The widget to show the progress over
+    :type: QtWidgets.QWidget
+
+    :return: The progress dialog, whose applied signal gives the result once the pose
+             is applied or cancelled
+    :type: td_maya_tools.guis.apply_progress.ApplyProgressDialog
+    """
+    job = poser.ChunkedApply(pose, tolerance=poser.DEFAULT_TOLERANCE, retarget=retarget)
+    dialog = ApplyProgressDialog(job, parent)
+    dialog.applied.connect(lambda result: _log_result(pose, result, job.state))
+    dialog.start()
+    return dialog
+
+
+def _log_result(pose=None, result=None, state=None, target=None):
+    """
+    Log what an apply changed and warn about the joints that could not be posed
+    """
+    if state == 'cancelled':
+        logger.info(f'{pose.name}: cancelled, the joints were put back')
+        return
+    if target is not None:
+        # the targets of an apply share its diff, only the failures are their own
+        if not result.applied and not result.failures:
+            logger.warning(f'{pose.name}: no joints found for {target}')
+    elif result.diff is not None:
+        logger.info(f'{pose.name}: {result.diff.channels_changed} of '
+                    f'{result.diff.channels_checked} channels changed')
+    if result.failures:
+        on_target = f' on {target}' if target is not None else ''
+        logger.warning(f'{len(result.failures)} joints could not be posed{on_target}: '
+                       f'{", ".join(sorted(result.failures))}')
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseListModel(QtCore.QAbstractListModel):
+    """
+    The poses shown in a PoseBrowser, one row per pose that has both an image and data.
+    """
+    PoseRole = QtCore.Qt.UserRole + 1
+    ImagePathRole = QtCore.Qt.UserRole + 2
+
+    def __init__(self, thumbnail_loader=None, parent=None):
+        """
+        :param thumbnail_loader: Loads the images of the poses in the background
+        :type: td_maya_tools.guis.thumbnail_loader.ThumbnailLoader
+        """
+        super().__init__(parent)
+        self.thumbnail_loader = thumbnail_loader
+        self.pose_dict = {}
+        self._rows = []
+        self._path_rows = {}
+        if thumbnail_loader is not None:
+            thumbnail_loader.pixmap_ready.connect(self._thumbnail_ready)
+
+    def set_poses(self, pose_dict=None, img_paths=None):
+        """
+        Replace the poses of the model
+
+        :param pose_dict: A mapping of pose names to poses
+        :type: dict
+
+        :param img_paths: Full paths to the pose images, named after their pose
+        :type: list
+        """
+        self.beginResetModel()
+        self.pose_dict = pose_dict or {}
+        self._rows = []
+        for img_path in img_paths or ():
+            pose_name = os.path.splitext(os.path.basename(img_path))[0]
+            # if the pose is not in the xml file don't add it
+            if pose_name in self.pose_dict:
+                self._rows.append((pose_name, img_path))
+        self._path_rows = {img_path: row for row, (_, img_path) in enumerate(self._rows)}
+        self.endResetModel()
+
+    def update_poses(self, pose_dict=None, img_paths=None, changed=None):
+        """
+        Bring the model up to date with new poses and images, removing and inserting
+        only the rows that differ and repainting the rows that changed
+
+        :param pose_dict: A mapping of pose names to poses
+        :type: dict
+
+        :param img_paths: Full paths to the pose images, named after their pose
+        :type: list
+
+        :param changed: The image paths of the rows whose image or pose changed
+        :type: list
+        """
+        self.pose_dict = pose_dict or {}
+        rows = []
+        for img_path in img_paths or ():
+            pose_name = os.path.splitext(os.path.basename(img_path))[0]
+            if pose_name in self.pose_dict:
+                rows.append((pose_name, img_path))
+        new_rows = set(rows)
+        for row in reversed(range(len(self._rows))):
+            if self._rows[row] not in new_rows:
+                self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                del self._rows[row]
+                self.endRemoveRows()
+        old_rows = set(self._rows)
+        if [row for row in rows if row in old_rows] != self._rows:
+            # the rows that are kept moved around, there is nothing to gain over a reset
+            self.set_poses(pose_dict, img_paths)
+            return
+        for position, row in enumerate(rows):
+            if position >= len(self._rows) or self._rows[position] != row:
+                self.beginInsertRows(QtCore.QModelIndex(), position, position)
+                self._rows.insert(position, row)
+                self.endInsertRows()
+        self._path_rows = {img_path: row for row, (_, img_path) in enumerate(self._rows)}
+        for img_path in changed or ():
+            row = self._path_rows.get(img_path)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        pose_name, img_path = self._rows[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return pose_name
+        if role == QtCore.Qt.DecorationRole:
+            # only asked for the tiles that are painted
+            if self.thumbnail_loader is None:
+                return QtGui.QPixmap(img_path)
+            return self.thumbnail_loader.request(img_path)
+        if role == QtCore.Qt.ToolTipRole:
+            source = getattr(self.pose_dict, 'source', None)
+            return source(pose_name) if source else pose_name
+        if role == self.PoseRole:
+            return self.pose_dict[pose_name]
+        if role == self.ImagePathRole:
+            return img_path
+        return None
+
+    def _thumbnail_ready(self, img_path=None, pixmap=None):
+        """
+        Repaint the tile of a thumbnail that finished loading
+        """
+        row = self._path_rows.get(img_path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+
+class PoseTileDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paint a pose as its thumbnail with its name underneath.
+    """
+    def __init__(self, tile_size=QtCore.QSize(100, 90), parent=None):
+        super().__init__(parent)
+        self.tile_size = tile_size
+        self.font = QtGui.QFont()
+        self.font.setPointSize(10)
+        self.font.setBold(True)
+
+    def sizeHint(self, option, index):
+        return self.tile_size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        if option.state & QtWidgets.QStyle.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+        elif option.state & QtWidgets.QStyle.State_MouseOver:
+            painter.fillRect(rect, option.palette.midlight())
+
+        text_height = QtGui.QFontMetrics(self.font).height()
+        pixmap = index.data(QtCore.Qt.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            image_rect = rect.adjusted(0, 2, 0, -text_height - 2)
+            size = pixmap.size().scaled(image_rect.size(), QtCore.Qt.KeepAspectRatio)
+            target = QtCore.QRect(QtCore.QPoint(0, 0), size)
+            target.moveCenter(image_rect.center())
+            painter.drawPixmap(target, pixmap)
+
+        painter.setFont(self.font)
+        text_rect = QtCore.QRect(rect.left(), rect.bottom() - text_height,
+                                 rect.width(), text_height)
+        painter.drawText(text_rect, QtCore.Qt.AlignCenter, index.data(QtCore.Qt.DisplayRole))
+        painter.restore()
+
+
+class PoseBrowser(QtWidgets.QListView):
+    """
+    A grid of pose tiles, double click a tile to apply its pose. Poses are applied
+    through the retarget rules of the browser, to each of its targets when it has any.
+    With a preview, hovering a tile shows its pose until the cursor leaves the tile.
+    """
+    pose_applied = QtCore.Signal(object)
+    pose_selected = QtCore.Signal(object)
+    # the pose under the cursor, None when the cursor leaves the tiles
+    pose_hovered = QtCore.Signal(object)
+
+    def __init__(self, thumbnail_loader=None, parent=None):
+        super().__init__(parent)
+        self.retarget = None
+        self.targets = None
+        self.preview = None
+        # the name of the pose under the cursor
+        self._hovered = None
+        self.pose_model = PoseListModel(thumbnail_loader, self)
+        self.setModel(self.pose_model)
+        self.setItemDelegate(PoseTileDelegate(parent=self))
+
+        self.setViewMode(QtWidgets.QListView.IconMode)
+        self.setResizeMode(QtWidgets.QListView.Adjust)
+        self.setMovement(QtWidgets.QListView.Static)
+        # every tile has the same size, the view does not need to measure them
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QtWidgets.QListView.Batched)
+        self.setBatchSize(200)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.setMouseTracking(True)
+        self.setMinimumWidth(340)
+
+        self.apply_action = QtWidgets.QAction('Apply', self)
+        self.apply_action.triggered.connect(self.apply_current)
+        self.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
+        self.addAction(self.apply_action)
+        self.doubleClicked.connect(self.apply_index)
+
+    def set_poses(self, pose_dict=None, img_paths=None):
+        """
+        Show the poses of a pose dictionary that have an image
+
+        :param pose_dict: A mapping of pose names to poses
+        :type: dict
+
+        :param img_paths: Full paths to the pose images, named after their pose
+        :type: list
+        """
+        self.pose_model.set_poses(pose_dict, img_paths)
+
+    def update_poses(self, pose_dict=None, img_paths=None, changed=None):
+        """
+        Update the tiles after poses or images were added, changed or removed, see
+        PoseListModel.update_poses
+        """
+        self.pose_model.update_poses(pose_dict, img_paths, changed)
+
+    def currentChanged(self, current, previous):
+        super().currentChanged(current, previous)
+        self.pose_selected.emit(current.data(PoseListModel.PoseRole)
+                                if current.isValid() else None)
+
+    def set_preview(self, preview=None):
+        """
+        Show the pose of the tile under the cursor with a preview, putting back the one
+        the last preview showed
+
+        :param preview: The preview, or None to stop previewing
+        :type: poser.PosePreview
+        """
+        if self.preview is not None:
+            self.preview.stop()
+        self.preview = preview
+        self._hovered = None
+        if preview is not None and self.underMouse():
+            preview.start()
+
+    def hover_index(self, index=None):
+        """
+        Preview the pose of the tile under the cursor
+
+        :param index: The index of the tile, or an invalid index when the cursor is
+                      not over a tile
+        :type: QtCore.QModelIndex
+
+        :return: The joints that were previewed and the ones that failed
+        :type: poser.ApplyResult
+        """
+        # every look up of a pose gives a new Pose, the tiles are told apart by name
+        pose_name = index.data(QtCore.Qt.DisplayRole) if index.isValid() else None
+        if pose_name == self._hovered:
+            return None
+        self._hovered = pose_name
+        pose = index.data(PoseListModel.PoseRole) if pose_name is not None else None
+        self.pose_hovered.emit(pose)
+        if self.preview is None:
+            return None
+        with instrumentation.profile('poser_gui.preview_pose'):
+            return self.preview.show(pose)
+
+    def enterEvent(self, event):
+        super().enterEvent(event)
+        # the rig as it is before any pose is previewed
+        if self.preview is not None:
+            self.preview.start()
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self._hovered = None
+        self.pose_hovered.emit(None)
+        if self.preview is not None:
+            self.preview.stop()
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        self.hover_index(self.indexAt(event.pos()))
+
+    def apply_current(self):
+        """
+        Apply the pose of the selected tile
+
+        :return: The joints that were posed and the ones that failed
+        :type: poser.ApplyResult
+        """
+        return self.apply_index(self.currentIndex())
+
+    def apply_index(self, index=None):
+        """
+        Apply the pose of a tile
+
+        :param index: The index of the tile
+        :type: QtCore.QModelIndex
+
+        :return: The joints that were posed and the ones that failed, for each target
+                 when the browser has targets
+        :type: poser.ApplyResult
+        """
+        if index is None or not index.isValid():
+            return None
+        pose = index.data(PoseListModel.PoseRole)
+        if self.preview is not None:
+            # put the rig back first, so undoing the apply goes back to where it was
+            # before the preview
+            self.preview.clear()
+        if self.targets:
+            results = apply_pose(pose, self.retarget, targets=self.targets)
+            self._restart_preview()
+            self.pose_applied.emit(results)
+            return results
+        if len(pose) >= CHUNKED_APPLY_JOINTS:
+            dialog = apply_pose_chunked(pose, self.retarget, self)
+            dialog.applied.connect(self.pose_applied.emit)
+            dialog.applied.connect(self._restart_preview)
+            return dialog.job.result
+        result = apply_pose(pose, self.retarget)
+        self._restart_preview()
+        self.pose_applied.emit(result)
+        return result
+
+    def _restart_preview(self, result=None):
+        """
+        Keep the channels of the rig again once a pose was applied over the preview
+        """
+        if self.preview is not None and self.preview.active:
+            self.preview.start()
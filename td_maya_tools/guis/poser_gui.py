@@ -25,38 +25,65 @@
 #----------------------------------------------------------------------------- IMPORTS --#
 
 # Default Python Imports
+from array import array
 import os
-from maya import cmds
 from PySide2 import QtGui, QtWidgets, QtCore
 
 # Imports That You Wrote
-from .maya_gui_utils import get_maya_window, VLine, HLine
-from td_maya_tools import poser, xml_utils
+from .maya_gui_utils import get_maya_window
+from .pose_browser import PoseBrowser, apply_pose
+from .target_picker import TargetPicker
+from .thumbnail_loader import ThumbnailLoader
+from td_maya_tools import instrumentation, poser, pose_index, pose_validation
+from td_maya_tools.folder_index import FolderIndex
+from td_maya_tools.pose import Pose
+from td_maya_tools.retarget import RetargetRules
+try:
+    from .pose_blend_slider import PoseBlendSlider
+    from td_maya_tools.pose_search import PoseSearchIndex
+except ImportError:
+    # blending and searching need NumPy, without it poses can only be applied whole
+    PoseBlendSlider = None
+    PoseSearchIndex = None
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+# how many poses the similar poses filter shows
+SIMILAR_POSE_COUNT = 20
+IMAGES_DIR = os.path.join(os.path.dirname(__file__), 'images')
+# how long to wait for the folder to settle after a change before reading it, in ms
+REFRESH_DELAY = 300
+
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
 
 class PoseLayout(QtWidgets.QHBoxLayout):
     """
-    This is the small layout box that presents a pose and its apply button. A number of
-    these will be created based on the amount of provided pose
+    This is the small layout box that presents a pose and its apply button. PoserGUI
+    shows its poses with a PoseBrowser instead, this layout is kept for tools that show
+    a single pose
     """
 
-    def __init__(self, path_to_img=None, joint_dict=None):
+    def __init__(self, path_to_img=None, pose=None, thumbnail_loader=None, retarget=None):
         super().__init__()
         self.img_path = path_to_img
-        self.joint_dict = joint_dict
+        self.pose = pose
+        self.thumbnail_loader = thumbnail_loader
+        self.retarget = retarget
         
 
     def build_layout(self):
         """
         Build the layout
         """
-        # create the image
+        # create the image, with a thumbnail loader the image starts as a placeholder
+        # and is filled in once it has been loaded in the background
         pose_img = QtWidgets.QLabel()
-        pose_img.setPixmap(QtGui.QPixmap(self.img_path))
+        if self.thumbnail_loader is None:
+            pose_img.setPixmap(QtGui.QPixmap(self.img_path))
+        else:
+            pose_img.setPixmap(self.thumbnail_loader.request(self.img_path,
+                                                             pose_img.setPixmap))
 
         # crate the layout for the text and apply button
         vbox = QtWidgets.QVBoxLayout()
@@ -90,69 +117,91 @@ class PoseLayout(QtWidgets.QHBoxLayout):
     
     def apply_values(self):
         """
-        Apply the input transform and rotate values to the selected joint in Maya
-        """
-        for joint, attrib_dict in self.joint_dict.items():
-            tx = attrib_dict['translations']['tx']
-            ty = attrib_dict['translations']['ty']
-            tz = attrib_dict['translations']['tz']
-            rx = attrib_dict['rotations']['rx']
-            ry = attrib_dict['rotations']['ry']
-            rz = attrib_dict['rotations']['rz']
-
-            # wrap values into float or None if empty
-            # set to None rather than 0 so that the functions in poser will ignore them
-            tx = float(tx) if tx.strip() else None
-            ty = float(ty) if ty.strip() else None
-            tz = float(tz) if tz.strip() else None
-            rx = float(rx) if rx.strip() else None
-            ry = float(ry) if ry.strip() else None
-            rz = float(rz) if rz.strip() else None
-
-            # apply translations and rotations
-            poser.position_joint(joint, tx, ty, tz)
-            poser.rotate_joint(joint, rx, ry, rz)
+        Apply the input transform and rotate values to the selected joint in Maya,
+        through the retarget rules of the layout. Large poses are applied in chunks
+        behind a progress bar
+
+        :return: The joints that were posed and the ones that failed
+        :type: poser.ApplyResult
+        """
+        return apply_pose(self.pose, self.retarget, self.parentWidget())
         
 class PoserGUI(QtWidgets.QDialog):
     """
     This class asseembles the main GUI that will be displayed
     """
 
-    def _init_(self):
+    def __init__(self):
         super().__init__(parent=get_maya_window())
+        self.joint_registry = None
+        self.joint_list = None
+        self.thumbnail_loader = None
+        self.pose_browser = None
+        self.blend_slider = None
+        self.target_picker = None
+        self.preview_btn = None
+        # pose joints are matched to the scene joints without their namespace, so
+        # poses apply to referenced characters
+        self.retarget = RetargetRules()
         self.img_paths = None
         self.pose_names = None
         self.pose_dict = None
+        self.pose_search = None
+        self.validation = None
+        self._validation_generation = None
+        self.folder_index = None
+        self.folder_watcher = None
+        self._refresh_timer = None
         self.xml_lw = None
+        self.similar_btn = None
         self.msg_label = None
 
     def init_gui(self):
         """
         Set up and display the GUI to the user.
         """
-        # make a main layout
-        main_hb = QtWidgets.QHBoxLayout(self)
-
-        # List and sort all joints in the scene
-        joint_list = cmds.ls(type='joint')
-        if not joint_list:
-            self.display_message(title='No Joints',
-            message='There are no joints in the scene')
-        joint_list.sort()
-
-        # get path to image
-        self.img_paths, self.pose_names = self.get_images()
-
-        # get pose dictionary
-        self.pose_dict = self.get_pose_dict()
-
-        # create pose layout and add to main layout
-        pose_layout_grid = self.build_pose_layout()
-        main_hb.addLayout(pose_layout_grid)
-
-        # create xml layout and add to main layout
-        xml_layout = self.build_xml_list_layout()
-        main_hb.addLayout(xml_layout)
+        # every phase is timed when td_maya_tools.instrumentation is enabled
+        with instrumentation.profile('poser_gui.init_gui'):
+            # make a main layout
+            main_hb = QtWidgets.QHBoxLayout(self)
+
+            # List and sort all joints in the scene, the registry keeps them up to
+            # date so the scene does not need to be queried again when poses are applied
+            with instrumentation.phase('poser_gui.init_gui.joints'):
+                self.joint_registry = poser.get_joint_registry()
+                self.joint_list = self.joint_registry.sorted_joints()
+            if not self.joint_list:
+                self.display_message(title='No Joints',
+                message='There are no joints in the scene')
+
+            # get path to image, the images folder is listed once for the images and
+            # the xml files
+            with instrumentation.phase('poser_gui.init_gui.scan'):
+                self.folder_index = FolderIndex(IMAGES_DIR)
+                self.folder_index.scan()
+                self.img_paths, self.pose_names = self.get_images(self.folder_index)
+
+            # get pose dictionary
+            with instrumentation.phase('poser_gui.init_gui.parse'):
+                self.pose_dict = self.get_pose_dict(self.folder_index)
+
+            # check every pose against the joints in the scene once, the list and its
+            # messages read from the result
+            with instrumentation.phase('poser_gui.init_gui.validate'):
+                self.get_validation()
+
+            with instrumentation.phase('poser_gui.init_gui.layout'):
+                # create pose layout and add to main layout
+                self.thumbnail_loader = ThumbnailLoader(parent=self)
+                pose_layout = self.build_pose_layout()
+                main_hb.addLayout(pose_layout)
+
+                # create xml layout and add to main layout
+                xml_layout = self.build_xml_list_layout()
+                main_hb.addLayout(xml_layout)
+
+            # pick up the files that are dropped into the images folder
+            self.watch_images_folder()
 
         # Configure the window
         self.setGeometry(600, 600, 300, 200)
@@ -162,80 +211,233 @@ class PoserGUI(QtWidgets.QDialog):
 
     def build_pose_layout(self):
         """
-        Instanciate PoseLayout classes based on the number of valid pose, then create a
-        layout containing those instances
-
-        :return: A grid layout containing all pose layouts
-        :type: QtWidgets.QGridLayout
-        """
-        pose_layout_grid = QtWidgets.QGridLayout()
-
-        column = 0
-        row = 0
-        for image in self.img_paths:
-            pose_name = os.path.splitext(os.path.basename(image))[0]
-            # check if the poser is valid
-            ### if the pose is not in the xml file don't add it !!!!! ###
-            # This cause me so much pain as the autovivi will add the key automatically
-            # Caused a series of bugs afterward took me 3 hours to debug
-            if not pose_name in self.pose_dict:
-                continue
-            pose_layout = PoseLayout(image, self.pose_dict[pose_name])
-            pose_layout.build_layout()
-            # wrap the layout into a container to control its size
-            container = QtWidgets.QWidget()
-            container.setLayout(pose_layout)
-            container.setMinimumWidth(160)
-            container.setMaximumWidth(180)
-            pose_layout_grid.addWidget(container, row, column)
-
-            # row and column increments
-            # leaving empty slots in between for partition lines
-            # that will be added later
-            column += 2
-            if column > 4:
-                row += 2
-                column = 0
-
-        # loop over the grid and add partition line at appropriate slots
-        for row in range(pose_layout_grid.rowCount()):
-            for col in range(pose_layout_grid.columnCount()):
-                if row % 2 == 0 and col % 2 == 1:
-                    vline = VLine()
-                    vline.make_line()
-                    pose_layout_grid.addWidget(vline, row, col)
-                elif row % 2 == 1 and col % 2 == 0:
-                    hline = HLine()
-                    hline.make_line()
-                    pose_layout_grid.addWidget(hline, row, col)
-
-        return pose_layout_grid
+        Create the pose browser showing every valid pose as a tile. Only the tiles that
+        are on screen are painted, so it stays responsive with thousands of poses.
+        Under it, a slider blends the rig towards the selected pose when NumPy is
+        available. A button above it turns on the preview of the pose under the cursor.
+
+        :return: A layout containing the pose browser
+        :type: QtWidgets.QVBoxLayout
+        """
+        pose_layout = QtWidgets.QVBoxLayout()
+        self.preview_btn = QtWidgets.QPushButton('Preview')
+        self.preview_btn.setCheckable(True)
+        self.preview_btn.setToolTip('Show the pose under the cursor on the rig, without '
+                                    'adding to the undo queue')
+        self.preview_btn.toggled.connect(self.set_preview)
+        pose_layout.addWidget(self.preview_btn)
+        self.pose_browser = PoseBrowser(self.thumbnail_loader)
+        self.pose_browser.set_poses(self.pose_dict, self.img_paths)
+        self.pose_browser.retarget = self.retarget
+        pose_layout.addWidget(self.pose_browser)
+        if PoseBlendSlider is not None:
+            self.blend_slider = PoseBlendSlider()
+            self.blend_slider.retarget = self.retarget
+            self.pose_browser.pose_selected.connect(self.blend_slider.set_target)
+            pose_layout.addWidget(self.blend_slider)
+        return pose_layout
     
     def build_xml_list_layout(self):
         """
         This is a list widget that displays all joints found in the image folder
-        As well as highlighting ones that do not have matching data in the xml file.
+        As well as highlighting ones that do not have matching data in the xml file,
+        or whose joints are not all in the scene. Each pose shows the part of its
+        joints that are in the scene.
+        With NumPy, a button above it narrows the list down to the poses closest to
+        the current pose of the rig. Under it, the characters to apply poses to are
+        picked.
 
         :return: A layout that include the list widget
         :type: QtWidget.QVBoxLayout
         """
         xml_layout = QtWidgets.QVBoxLayout()
         self.xml_lw = QtWidgets.QListWidget()
+        self.populate_xml_list(self.pose_names)
+        self.target_picker = self.build_target_picker()
+
+        self.msg_label = QtWidgets.QLabel('Click list widget item for more info')
+        self.xml_lw.itemClicked.connect(self.list_item_clicked)
+
+        if PoseSearchIndex is not None:
+            self.similar_btn = QtWidgets.QPushButton('Similar Poses')
+            self.similar_btn.setCheckable(True)
+            self.similar_btn.setToolTip('Only list the poses closest to the rig')
+            self.similar_btn.toggled.connect(self.filter_similar_poses)
+            xml_layout.addWidget(self.similar_btn)
+        xml_layout.addWidget(self.xml_lw)
+        xml_layout.addWidget(self.msg_label)
+        xml_layout.addWidget(self.target_picker)
+
+        return xml_layout
 
-        for pose in self.pose_names:
+    def build_target_picker(self):
+        """
+        Create the list of the characters in the scene, to apply poses to several of
+        them at once
+
+        :return: The target picker
+        :type: td_maya_tools.guis.target_picker.TargetPicker
+        """
+        target_picker = TargetPicker(self.joint_registry)
+        target_picker.targets_changed.connect(self.set_targets)
+        self.set_targets(target_picker.targets())
+        return target_picker
+
+    def set_targets(self, targets=None):
+        """
+        Apply the poses of the browser to a set of characters
+
+        :param targets: The namespaces and roots of the characters, or nothing to apply
+                        poses to the joints named in them
+        :type: list
+        """
+        if self.pose_browser is not None:
+            self.pose_browser.targets = list(targets or ()) or None
+            if self.pose_browser.preview is not None:
+                self.pose_browser.preview.targets = self.pose_browser.targets
+
+    def set_preview(self, checked=False):
+        """
+        Turn the preview of the pose under the cursor on or off. Poses are previewed
+        with the fastest backend available
+
+        :param checked: Whether to preview poses
+        :type: bool
+        """
+        preview = None
+        if checked:
+            preview = poser.PosePreview(retarget=self.retarget,
+                                        targets=self.pose_browser.targets)
+        self.pose_browser.set_preview(preview)
+
+    def populate_xml_list(self, pose_names=None, distances=None):
+        """
+        Fill the list widget with poses
+
+        :param pose_names: The names of the poses, in the order to list them
+        :type: list
+
+        :param distances: The distance of each pose to the rig, shown in its tool tip
+        :type: dict
+        """
+        validation = self.get_validation()
+        self.xml_lw.clear()
+        for pose in pose_names or ():
             lw_item = QtWidgets.QListWidgetItem(pose)
+            lw_item.setData(QtCore.Qt.UserRole, pose)
+            tool_tip = []
             # change the color if a pose if not in the xml file
             if not pose in self.pose_dict:
                 lw_item.setBackground(QtGui.QColor('#CC3333'))
+            elif validation is not None and pose in validation:
+                report = validation[pose]
+                lw_item.setText(f'{pose}  {report.coverage:.0%}')
+                tool_tip.append(report.summary())
+                # the pose has joints that are not in the scene, or broken values
+                if not report:
+                    lw_item.setBackground(QtGui.QColor('#CC8833'))
+            if distances and pose in distances:
+                tool_tip.append(f'{distances[pose]:.3f} away from the rig')
+            lw_item.setToolTip('\n'.join(tool_tip))
             self.xml_lw.addItem(lw_item)
 
-        self.msg_label = QtWidgets.QLabel('Click list widget item for more info')
-        self.xml_lw.itemClicked.connect(self.list_item_clicked)
-            
-        xml_layout.addWidget(self.xml_lw)
-        xml_layout.addWidget(self.msg_label)
+    def get_validation(self):
+        """
+        Get the report of every pose checked against the joints in the scene. It is
+        made again only when the joints in the scene have changed.
 
-        return xml_layout
+        :return: The report, None without poses
+        :type: td_maya_tools.pose_validation.LibraryReport
+        """
+        if not self.pose_dict or self.joint_registry is None:
+            return None
+        if self._validation_generation != self.joint_registry.generation:
+            retarget_map = poser.get_retarget_map(self.retarget)
+            self.validation = pose_validation.validate_library(
+                self.pose_dict, self.joint_registry.joints, retarget_map)
+            self._validation_generation = self.joint_registry.generation
+        return self.validation
+
+    def filter_similar_poses(self, checked=False):
+        """
+        List only the poses closest to the current pose of the rig, closest first, or
+        go back to listing every pose
+
+        :param checked: Whether the filter is on
+        :type: bool
+
+        :return: Pairs of pose names and their distance to the rig, empty when the
+                 filter is off
+        :type: list
+        """
+        if not checked:
+            self.populate_xml_list(self.pose_names)
+            self.msg_label.setText('Click list widget item for more info')
+            return []
+        with instrumentation.profile('poser_gui.filter_similar_poses'):
+            results = self.find_similar_poses()
+        self.populate_xml_list([name for name, _ in results], dict(results))
+        self.msg_label.setText(f'{len(results)} poses closest to the rig')
+        return results
+
+    def find_similar_poses(self, count=SIMILAR_POSE_COUNT):
+        """
+        Find the poses of the library closest to the current pose of the rig, reading
+        the rig through the retarget rules of the GUI
+
+        :param count: How many poses to find
+        :type: int
+
+        :return: Pairs of pose names and their distance to the rig, closest first
+        :type: list
+        """
+        search = self.get_pose_search()
+        if search is None:
+            return []
+        backend = poser.get_backend()
+        retarget_map = poser.get_retarget_map(self.retarget, backend)
+        # scene joints -> the joints of the library they were mapped from
+        pose_joints = {}
+        for joint in search.joints:
+            target = retarget_map.resolve(joint)
+            if target is not None:
+                pose_joints[target] = joint
+        valid_joints, _ = backend.verify_joints(pose_joints)
+        current = backend.read_pose([joint for joint in pose_joints if joint in valid_joints])
+        values = current.values
+        signs = retarget_map.rules.signs
+        if signs is not None:
+            # the signs of a mirror undo themselves
+            values = array('d', (value * signs[i % len(signs)]
+                                 for i, value in enumerate(values)))
+        query = Pose('current', [pose_joints[joint] for joint in current.joints], values)
+        return search.query(query, count)
+
+    def get_pose_search(self):
+        """
+        Get the search index over the poses of the library, made the first time
+
+        :return: The search index, None without poses
+        :type: td_maya_tools.pose_search.PoseSearchIndex
+        """
+        if self.pose_search is None and self.pose_dict and PoseSearchIndex is not None:
+            backend = poser.get_backend()
+            retarget_map = poser.get_retarget_map(self.retarget, backend)
+            poses = [self.pose_dict[pose] for pose in self.pose_dict]
+            scene_joints = {}
+            for pose in poses:
+                for joint in pose.joints:
+                    if joint not in scene_joints:
+                        scene_joints[joint] = retarget_map.resolve(joint)
+            valid_joints, _ = backend.verify_joints(
+                [target for target in scene_joints.values() if target is not None])
+            # library rotations are in the rotate orders of the rig
+            scene_orders = backend.rotate_orders(list(valid_joints))
+            rotate_orders = {joint: scene_orders[target]
+                             for joint, target in scene_joints.items()
+                             if target in scene_orders}
+            self.pose_search = PoseSearchIndex(poses, rotate_orders=rotate_orders)
+        return self.pose_search
 
     def list_item_clicked(self):
         """
@@ -244,43 +446,138 @@ class PoserGUI(QtWidgets.QDialog):
         :return: wheteher the pose is valid or not. True if valid, false otherwise
         :type: bool
         """
-        current_item_text = self.xml_lw.currentItem().text()
+        current_item_text = self.xml_lw.currentItem().data(QtCore.Qt.UserRole)
         if not current_item_text in self.pose_dict:
             self.msg_label.setText(f'{current_item_text} is not a valid pose')
             return None
+        validation = self.get_validation()
+        if validation is not None and current_item_text in validation:
+            report = validation[current_item_text]
+            self.msg_label.setText(report.summary())
+            return True if report else None
         self.msg_label.setText(f'{current_item_text} is a valid pose')
         return True
 
 
+    def watch_images_folder(self):
+        """
+        Follow the images folder, and refresh the poses and images once files stop
+        being added, changed or removed in it
+        """
+        if self.folder_watcher is None:
+            self._refresh_timer = QtCore.QTimer(self)
+            self._refresh_timer.setSingleShot(True)
+            self._refresh_timer.setInterval(REFRESH_DELAY)
+            self._refresh_timer.timeout.connect(self.refresh_library)
+            self.folder_watcher = QtCore.QFileSystemWatcher(self)
+            self.folder_watcher.directoryChanged.connect(self._refresh_timer.start)
+            self.folder_watcher.fileChanged.connect(self._refresh_timer.start)
+            self.folder_watcher.addPath(self.folder_index.path)
+        # the folder only changes when files are added or removed, the xml files are
+        # watched to see them being saved over
+        watched = set(self.folder_watcher.files())
+        xml_paths = {self.folder_index.full_path(xml_file)
+                     for xml_file in self.folder_index.files_of_type('xml')}
+        if watched - xml_paths:
+            self.folder_watcher.removePaths(list(watched - xml_paths))
+        if xml_paths - watched:
+            self.folder_watcher.addPaths(sorted(xml_paths - watched))
+
+    def refresh_library(self):
+        """
+        Read the images folder again and update the GUI with what changed. Only the xml
+        files that changed are loaded again, and only the tiles of the poses and images
+        that changed are rebuilt.
+
+        :return: The files that were added, changed or removed
+        :type: td_maya_tools.folder_index.FolderChanges
+        """
+        changes = self.folder_index.scan()
+        if not changes:
+            return changes
+        with instrumentation.profile('poser_gui.refresh_library'):
+            changed_poses = set()
+            xml_changes = changes.of_type('xml')
+            if xml_changes:
+                if not isinstance(self.pose_dict, pose_index.PoseIndex):
+                    self.pose_dict = pose_index.PoseIndex()
+                for xml_file in xml_changes.removed:
+                    changed_poses.update(self.pose_dict.remove_source(
+                        self.folder_index.full_path(xml_file)))
+                for xml_file in xml_changes.changed + xml_changes.added:
+                    changed_poses.update(self.pose_dict.load_source(
+                        self.folder_index.full_path(xml_file)))
+                # both are made again from the new poses when they are next needed
+                self.pose_search = None
+                self._validation_generation = None
+
+            png_changes = changes.of_type('png')
+            changed_paths = [self.folder_index.full_path(img)
+                             for img in png_changes.changed]
+            for img_path in changed_paths:
+                self.thumbnail_loader.forget(img_path)
+            img_files = self.folder_index.files_of_type('png')
+            self.img_paths = [self.folder_index.full_path(img) for img in img_files]
+            self.pose_names = [os.path.splitext(img)[0].strip() for img in img_files]
+            changed_paths.extend(img_path for img_path, pose in zip(self.img_paths,
+                                                                    self.pose_names)
+                                 if pose in changed_poses)
+
+            self.pose_browser.update_poses(self.pose_dict, self.img_paths, changed_paths)
+            if self.similar_btn is not None and self.similar_btn.isChecked():
+                self.filter_similar_poses(True)
+            else:
+                self.populate_xml_list(self.pose_names)
+            self.watch_images_folder()
+        return changes
+
     @classmethod
-    def get_pose_dict(cls):
+    def get_pose_dict(cls, folder_index=None):
         """
-        Get the dictionary containing poses and their respective information
+        Get the dictionary containing poses and their respective information, merged
+        from all the xml files in the images folder
+
+        :param folder_index: The files of the images folder, listed beforehand.
+                             Defaults to listing the folder
+        :type: td_maya_tools.folder_index.FolderIndex
 
         :return: A dictionary containing information on poses
         :type: dict
         """
-        img_dir = os.path.join(os.path.dirname(__file__), 'images')
-        xml_files = cls.get_files_of_type(img_dir, 'xml')
+        img_dir = IMAGES_DIR
+        if folder_index is None:
+            xml_files = cls.get_files_of_type(img_dir, 'xml')
+        else:
+            xml_files = folder_index.files_of_type('xml')
 
         if not xml_files:
             cls.display_message('No XML', 'No xml file found in the images folder')
             return None
-        pose_dict = xml_utils.read_pose_xml(os.path.join(img_dir, xml_files[0]))
+        # every xml file is loaded at the same time and merged into one index, each
+        # file is loaded from the compiled cache next to it unless it has changed
+        xml_paths = [os.path.join(img_dir, xml_file) for xml_file in sorted(xml_files)]
+        pose_dict = pose_index.build_pose_index(xml_paths)
         return pose_dict
 
     @classmethod
-    def get_images(cls):
+    def get_images(cls, folder_index=None):
         """
         Get paths and names to all png files from the image folder
 
-        :return: A tuple containing 2 items
+        :param folder_index: The files of the images folder, listed beforehand.
+                             Defaults to listing the folder
+        :type: td_maya_tools.folder_index.FolderIndex
+
+        :return: A tuple containing 2 items, both empty when there are no images
                  1. A list of paths to all the png files and
                  2. A list of all names of the png files
         :type: tuple
         """
-        img_dir = os.path.join(os.path.dirname(__file__), 'images')
-        img_files = cls.get_files_of_type(img_dir, 'png')
+        img_dir = IMAGES_DIR
+        if folder_index is None:
+            img_files = cls.get_files_of_type(img_dir, 'png')
+        else:
+            img_files = folder_index.files_of_type('png')
         path_list = []
         pose_list = []
 
@@ -290,7 +587,6 @@ class PoserGUI(QtWidgets.QDialog):
 
         if not img_files:
             cls.display_message('No Images', 'No images found in the images folder!')
-            return None
         return path_list, pose_list
     
     @classmethod
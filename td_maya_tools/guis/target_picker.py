@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Pick the characters a pose is applied to.
+
+:description:
+    TargetPicker lists the namespaces of the joints in the scene, such as the
+    referenced characters of a crowd, with a check box each. Characters that are not
+    in a namespace are added from the nodes selected in Maya, by their root. The
+    checked characters are the targets that td_maya_tools.poser.apply_pose_to_characters
+    applies a pose to, all at once. With none checked, poses are applied to the joints
+    with the names in the pose.
+    Contains the following classes:
+        TargetPicker
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+    td_maya_tools.guis.poser_gui
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from PySide2 import QtCore, QtWidgets
+
+# Imports That You Wrote
+from td_maya_tools.retarget import find_namespaces
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class TargetPicker(QtWidgets.QWidget):
+    """
+    A list of the characters in the scene to check the ones a pose is applied to.
+    """
+    # the checked characters, whenever one is checked or unchecked
+    targets_changed = QtCore.Signal(list)
+
+    def __init__(self, joint_registry=None, parent=None):
+        """
+        :param joint_registry: The joints in the scene, to find the namespaces in
+        :type: td_maya_tools.joint_registry.JointRegistry
+        """
+        super().__init__(parent)
+        self.joint_registry = joint_registry
+        # the roots added from the selection, they stay listed through a refresh
+        self.roots = []
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QtWidgets.QLabel('Apply To'))
+        self.target_lw = QtWidgets.QListWidget()
+        self.target_lw.setToolTip('Apply poses to every checked character at once, or '
+                                  'to the joints named in the pose when none are checked')
+        self.target_lw.itemChanged.connect(self._item_changed)
+        layout.addWidget(self.target_lw)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        add_btn = QtWidgets.QPushButton('Add Selected')
+        add_btn.setToolTip('Add the characters under the selected root nodes')
+        add_btn.clicked.connect(self.add_selected)
+        refresh_btn = QtWidgets.QPushButton('Refresh')
+        refresh_btn.setToolTip('List the namespaces in the scene again')
+        refresh_btn.clicked.connect(self.refresh)
+        button_layout.addWidget(add_btn)
+        button_layout.addWidget(refresh_btn)
+        layout.addLayout(button_layout)
+
+        self.refresh()
+
+    def targets(self):
+        """
+        :return: The checked characters, namespaces and roots
+        :type: list
+        """
+        return [self.target_lw.item(row).text() for row in range(self.target_lw.count())
+                if self.target_lw.item(row).checkState() == QtCore.Qt.Checked]
+
+    def refresh(self):
+        """
+        List the namespaces in the scene and the roots that were added, keeping the
+        characters that were checked and are still there
+        """
+        checked = set(self.targets())
+        namespaces = (find_namespaces(self.joint_registry.joints)
+                      if self.joint_registry is not None else [])
+        self.set_characters(namespaces + self.roots, checked)
+
+    def set_characters(self, characters=None, checked=None):
+        """
+        Fill the list with characters
+
+        :param characters: The namespaces and roots of the characters
+        :type: list
+
+        :param checked: The characters to check
+        :type: set
+        """
+        checked = checked or set()
+        self.target_lw.blockSignals(True)
+        self.target_lw.clear()
+        for character in characters or ():
+            item = QtWidgets.QListWidgetItem(character)
+            item.setCheckState(QtCore.Qt.Checked if character in checked
+                               else QtCore.Qt.Unchecked)
+            self.target_lw.addItem(item)
+        self.target_lw.blockSignals(False)
+        self.targets_changed.emit(self.targets())
+
+    def add_selected(self):
+        """
+        Add the nodes selected in Maya as the roots of characters, checked
+
+        :return: The roots that were added
+        :type: list
+        """
+        from maya import cmds
+        listed = [self.target_lw.item(row).text() for row in range(self.target_lw.count())]
+        added = [node for node in cmds.ls(selection=True, long=True) or ()
+                 if node not in listed]
+        self.roots.extend(added)
+        self.set_characters(listed + added, set(self.targets()) | set(added))
+        return added
+
+    def _item_changed(self, item=None):
+        """
+        Hand out the targets when a character is checked or unchecked
+        """
+        self.targets_changed.emit(self.targets())
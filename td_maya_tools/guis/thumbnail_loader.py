@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Load pose thumbnails in the background.
+
+:description:
+    ThumbnailLoader decodes pose images on a thread pool, scaled down to the size of
+    the pose tiles, and hands them back to the GUI as pixmaps. Scaled images are kept
+    in a thumbnail folder on disk keyed by the path, modified time and size of the
+    original image, so they are only decoded at full size once. A bounded number of
+    pixmaps are kept in memory, the least recently used ones are dropped first.
+    Contains the following classes:
+        ThumbnailLoader
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.guis.poser_gui
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+from PySide2 import QtCore, QtGui
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the size the pose images are shown at
+THUMBNAIL_SIZE = 60
+# overrides the folder scaled thumbnails are kept in
+CACHE_DIR_ENV_VAR = 'TD_POSER_THUMBNAIL_CACHE'
+
+
+def thumbnail_cache_dir():
+    """
+    :return: The folder scaled thumbnails are kept in
+    :type: str
+    """
+    return os.environ.get(CACHE_DIR_ENV_VAR,
+                          os.path.join(tempfile.gettempdir(), 'td_maya_tools_thumbnails'))
+
+
+def thumbnail_cache_path(image_path=None, size=THUMBNAIL_SIZE, cache_dir=None):
+    """
+    Get where the scaled thumbnail of an image is kept. The name changes whenever the
+    image is modified, so an out of date thumbnail is never used.
+
+    :param image_path: Full path to the image
+    :type: str
+
+    :param size: The size of the thumbnail
+    :type: int
+
+    :param cache_dir: The folder thumbnails are kept in
+    :type: str
+
+    :return: Full path to the thumbnail
+    :type: str
+    """
+    image_stat = os.stat(image_path)
+    key = f'{os.path.abspath(image_path)}|{image_stat.st_mtime_ns}|{image_stat.st_size}|{size}'
+    file_name = hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png'
+    return os.path.join(cache_dir or thumbnail_cache_dir(), file_name)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class ThumbnailLoader(QtCore.QObject):
+    """
+    Load thumbnails on a thread pool and keep the most recent ones in memory.
+    """
+    pixmap_ready = QtCore.Signal(str, QtGui.QPixmap)
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_pixmaps=512, cache_dir=None, parent=None):
+        """
+        :param size: The size of the thumbnails, in pixels
+        :type: int
+
+        :param max_pixmaps: How many pixmaps to keep in memory
+        :type: int
+
+        :param cache_dir: The folder scaled thumbnails are kept in
+        :type: str
+        """
+        super().__init__(parent)
+        self.size = size
+        self.max_pixmaps = max_pixmaps
+        self.cache_dir = cache_dir or thumbnail_cache_dir()
+        self.thread_pool = QtCore.QThreadPool(self)
+        self.placeholder = QtGui.QPixmap(size, size)
+        self.placeholder.fill(QtGui.QColor('#444444'))
+        self._pixmaps = OrderedDict()
+        self._callbacks = {}
+        self._signals = _JobSignals(self)
+        self._signals.finished.connect(self._job_finished)
+
+    def request(self, image_path=None, callback=None):
+        """
+        Ask for the thumbnail of an image. A thumbnail already in memory is returned
+        straight away, otherwise it is loaded in the background and the placeholder is
+        returned in the meantime.
+
+        :param image_path: Full path to the image
+        :type: str
+
+        :param callback: Called with the pixmap once it is loaded
+        :type: function
+
+        :return: The thumbnail, or the placeholder
+        :type: QtGui.QPixmap
+        """
+        pixmap = self._pixmaps.get(image_path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(image_path)
+            return pixmap
+        if image_path in self._callbacks:
+            # already loading
+            if callback is not None:
+                self._callbacks[image_path].append(callback)
+            return self.placeholder
+        self._callbacks[image_path] = [callback] if callback is not None else []
+        self.thread_pool.start(_ThumbnailJob(image_path, self.size, self.cache_dir,
+                                             self._signals))
+        return self.placeholder
+
+    def cached_pixmap(self, image_path=None):
+        """
+        :return: The thumbnail of an image if it is in memory, None otherwise
+        :type: QtGui.QPixmap
+        """
+        return self._pixmaps.get(image_path)
+
+    def forget(self, image_path=None):
+        """
+        Drop the thumbnail of an image from memory, so it is loaded again next time
+        """
+        self._pixmaps.pop(image_path, None)
+
+    def _job_finished(self, image_path=None, image=None):
+        """
+        Turn a loaded image into a pixmap on the GUI thread
+        """
+        callbacks = self._callbacks.pop(image_path, [])
+        if image.isNull():
+            return
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self._pixmaps[image_path] = pixmap
+        while len(self._pixmaps) > self.max_pixmaps:
+            self._pixmaps.popitem(last=False)
+        for callback in callbacks:
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # the widget waiting for the thumbnail was deleted in the meantime
+                pass
+        self.pixmap_ready.emit(image_path, pixmap)
+
+
+class _JobSignals(QtCore.QObject):
+    """
+    QRunnable can not emit signals, the jobs report back through this object instead.
+    """
+    finished = QtCore.Signal(str, QtGui.QImage)
+
+
+class _ThumbnailJob(QtCore.QRunnable):
+    """
+    Read one scaled thumbnail, from the thumbnail folder if it is there, otherwise from
+    the original image which is then saved to the thumbnail folder.
+    """
+    def __init__(self, image_path=None, size=THUMBNAIL_SIZE, cache_dir=None, signals=None):
+        super().__init__()
+        self.image_path = image_path
+        self.size = size
+        self.cache_dir = cache_dir
+        self.signals = signals
+
+    def run(self):
+        with instrumentation.phase('thumbnail_loader.decode'):
+            image = self._load()
+        self.signals.finished.emit(self.image_path, image)
+
+    def _load(self):
+        """
+        :return: The scaled image, a null image if it could not be read
+        :type: QtGui.QImage
+        """
+        image = QtGui.QImage()
+        try:
+            cache_path = thumbnail_cache_path(self.image_path, self.size, self.cache_dir)
+        except OSError:
+            return image
+
+        if os.path.isfile(cache_path):
+            image = QtGui.QImageReader(cache_path).read()
+        if image.isNull():
+            reader = QtGui.QImageReader(self.image_path)
+            full_size = reader.size()
+            if full_size.isValid():
+                # let the reader decode straight to the scaled size when it can
+                reader.setScaledSize(full_size.scaled(self.size, self.size,
+                                                      QtCore.Qt.KeepAspectRatio))
+            image = reader.read()
+            if not image.isNull():
+                instrumentation.count('thumbnail_loader.decoded')
+                self._save(image, cache_path)
+        return image
+
+    @staticmethod
+    def _save(image=None, cache_path=None):
+        """
+        Save a thumbnail without ever leaving half a file behind
+        """
+        temp_path = f'{cache_path}.{os.getpid()}.{id(image)}.png'
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            if image.save(temp_path, 'PNG'):
+                os.replace(temp_path, cache_path)
+        except OSError:
+            # the thumbnail folder is only an optimization
+            pass
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
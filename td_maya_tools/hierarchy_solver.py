@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Solve the local channels of a whole hierarchy of joints with NumPy.
+
+:description:
+    HierarchySolver does what td_maya_tools.pose_solver.solve_local_channels does, for
+    many joints at once. It is built once for a set of joints, sorting them parents
+    first and grouping them by depth, and keeps their parents, joint orients, rotate
+    axes and rotate orders as arrays. Solving a pose then only needs the current world
+    matrices of the joints, and every joint of a depth is solved in the same matrix
+    operations. Joints of the hierarchy that are not in the pose move with their
+    parents, so the joints under them are solved against where they end up.
+    Contains the following functions:
+        euler_to_matrices
+        matrices_to_euler
+    Contains the following classes:
+        HierarchySolver
+
+:applications:
+    None, requires NumPy
+
+:see_also:
+    td_maya_tools.pose_solver
+    td_maya_tools.pose_backends
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import numpy as np
+
+# Imports That You Wrote
+from td_maya_tools.pose import CHANNELS
+from td_maya_tools.pose_solver import ROTATE_ORDERS, hierarchy_order
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the axes of each rotate order, in the order they are applied
+_ORDER_AXES = np.array([['xyz'.index(axis) for axis in order] for order in ROTATE_ORDERS])
+
+
+def euler_to_matrices(angles=None, orders=None):
+    """
+    Build the matrices of many euler rotations, see pose_solver.euler_to_matrix
+
+    :param angles: The x, y and z angles in degrees, in an array of shape (N, 3)
+    :type: numpy.ndarray
+
+    :param orders: The index in ROTATE_ORDERS of the rotate order of each rotation
+    :type: numpy.ndarray
+
+    :return: The rotation matrices, in an array of shape (N, 3, 3)
+    :type: numpy.ndarray
+    """
+    radians = np.radians(angles)
+    cos, sin = np.cos(radians), np.sin(radians)
+    count = len(radians)
+    # the matrix of the rotation around each axis, for every rotation
+    axes = np.zeros((3, count, 3, 3))
+    axes[0, :, 0, 0] = 1.0
+    axes[0, :, 1, 1] = axes[0, :, 2, 2] = cos[:, 0]
+    axes[0, :, 1, 2] = sin[:, 0]
+    axes[0, :, 2, 1] = -sin[:, 0]
+    axes[1, :, 1, 1] = 1.0
+    axes[1, :, 0, 0] = axes[1, :, 2, 2] = cos[:, 1]
+    axes[1, :, 0, 2] = -sin[:, 1]
+    axes[1, :, 2, 0] = sin[:, 1]
+    axes[2, :, 2, 2] = 1.0
+    axes[2, :, 0, 0] = axes[2, :, 1, 1] = cos[:, 2]
+    axes[2, :, 0, 1] = sin[:, 2]
+    axes[2, :, 1, 0] = -sin[:, 2]
+
+    rows = np.arange(count)
+    sequence = _ORDER_AXES[orders]
+    matrices = axes[sequence[:, 0], rows]
+    for position in (1, 2):
+        matrices = matrices @ axes[sequence[:, position], rows]
+    return matrices
+
+
+def matrices_to_euler(matrices=None, orders=None):
+    """
+    Extract the euler angles of many rotation matrices, see
+    pose_solver.matrix_to_euler
+
+    :param matrices: Rotation matrices without scale, in an array of shape (N, 3, 3)
+    :type: numpy.ndarray
+
+    :param orders: The index in ROTATE_ORDERS of the rotate order of each rotation
+    :type: numpy.ndarray
+
+    :return: The x, y and z angles in degrees, in an array of shape (N, 3)
+    :type: numpy.ndarray
+    """
+    # work on the column vector form of the matrices, where the first axis of the order
+    # is the rightmost rotation
+    col = np.swapaxes(matrices, -1, -2)
+    i, j, k = _ORDER_AXES[orders].T
+    rows = np.arange(len(col))
+    # even orders are the cyclic ones, xyz, yzx and zxy
+    sign = np.where((j - i) % 3 == 1, 1.0, -1.0)
+    first = np.arctan2(sign * col[rows, k, j], col[rows, k, k])
+    second = np.arcsin(np.clip(-sign * col[rows, k, i], -1.0, 1.0))
+    third = np.arctan2(sign * col[rows, j, i], col[rows, i, i])
+    # gimbal lock, put all of the rotation on the first axis
+    locked = np.abs(col[rows, k, i]) > 0.9999999
+    third = np.where(locked, 0.0, third)
+    first = np.where(locked, np.arctan2(-sign * col[rows, j, k], col[rows, j, j]), first)
+    angles = np.empty((len(col), 3))
+    angles[rows, i] = np.degrees(first)
+    angles[rows, j] = np.degrees(second)
+    angles[rows, k] = np.degrees(third)
+    return angles
+
+
+def _orthonormalize(matrices=None):
+    """
+    Remove the scale from the rows of many 3x3 matrices
+    """
+    lengths = np.linalg.norm(matrices, axis=-1, keepdims=True)
+    return matrices / np.where(lengths == 0.0, 1.0, lengths)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class HierarchySolver(object):
+    """
+    A set of joints sorted parents first, to solve world space poses into local
+    channels for all of them at once.
+    """
+    def __init__(self, states=None):
+        """
+        :param states: A dictionary of joint names to their state. Only the parents,
+                       joint orients, rotate axes and rotate orders are kept, the world
+                       matrices are given to solve
+        :type: dict
+        """
+        states = states or {}
+        self.joints = tuple(hierarchy_order(states, states))
+        self._index = {joint: position for position, joint in enumerate(self.joints)}
+        self.parents = tuple(states[joint].parent for joint in self.joints)
+        # the parents that are not joints of the solver, whose world matrices are
+        # given to solve along with the ones of the joints
+        self.outside_parents = tuple(dict.fromkeys(
+            parent for parent in self.parents
+            if parent is not None and parent not in self._index))
+        outside = {parent: len(self.joints) + position
+                   for position, parent in enumerate(self.outside_parents)}
+        identity = len(self.joints) + len(self.outside_parents)
+        # where the world matrix of the parent of each joint is, in the joints followed
+        # by the outside parents and an identity matrix for the joints at the top
+        self._parent_slots = np.array(
+            [self._index.get(parent, outside.get(parent, identity))
+             for parent in self.parents], dtype=int)
+
+        depths = np.zeros(len(self.joints), dtype=int)
+        for position, slot in enumerate(self._parent_slots):
+            if slot < len(self.joints):
+                depths[position] = depths[slot] + 1
+        self._levels = [np.flatnonzero(depths == depth)
+                        for depth in range(depths.max() + 1 if len(depths) else 0)]
+
+        self.orders = np.array([ROTATE_ORDERS.index(states[joint].rotate_order)
+                                for joint in self.joints], dtype=int)
+        xyz = np.zeros(len(self.joints), dtype=int)
+        self._orients = np.swapaxes(euler_to_matrices(
+            np.array([states[joint].joint_orient for joint in self.joints],
+                     dtype=float).reshape(-1, 3), xyz), -1, -2)
+        self._axes = np.swapaxes(euler_to_matrices(
+            np.array([states[joint].rotate_axis for joint in self.joints],
+                     dtype=float).reshape(-1, 3), xyz), -1, -2)
+
+    def __repr__(self):
+        return f'HierarchySolver({len(self.joints)} joints, {len(self._levels)} levels)'
+
+    def __len__(self):
+        return len(self.joints)
+
+    def __contains__(self, joint):
+        return joint in self._index
+
+    def solve(self, targets=None, worlds=None, outside_worlds=None):
+        """
+        Work out the local channel values that place a set of joints at absolute world
+        space translations and rotations, see pose_solver.solve_local_channels
+
+        :param targets: Pairs of joint names and their six target channels, NaN for the
+                        ones that are not set, in the order of td_maya_tools.pose.CHANNELS.
+                        Every joint must be one of the joints of the solver
+        :type: list
+
+        :param worlds: The flat world matrices of all the joints of the solver, one
+                       after another in the order of joints
+        :type: list
+
+        :param outside_worlds: The flat world matrices of the outside_parents, one after
+                               another
+        :type: list
+
+        :return: A dictionary of joint names to their local translate and rotate values.
+                 Either one is None if none of its channels were set in the target.
+        :type: dict
+        """
+        count = len(self.joints)
+        channels = np.full((count, len(CHANNELS)), np.nan)
+        for joint, values in targets or ():
+            channels[self._index[joint]] = values
+        posed = ~np.isnan(channels).all(axis=1)
+        translated = ~np.isnan(channels[:, :3]).all(axis=1)
+        rotated = ~np.isnan(channels[:, 3:]).all(axis=1)
+
+        old = np.concatenate((np.asarray(worlds, dtype=float).reshape(-1, 4, 4),
+                              np.asarray(outside_worlds or (), dtype=float).reshape(-1, 4, 4),
+                              np.eye(4)[None]))
+        new = old.copy()
+        local_translates = np.empty((count, 3))
+        local_rotates = np.empty((count, 3))
+        for level in self._levels:
+            slots = self._parent_slots[level]
+            old_parent, new_parent = old[slots], new[slots]
+            # the current local transform, carried along with the new parent transform
+            default = old[level] @ np.linalg.inv(old_parent) @ new_parent
+            level_channels = channels[level]
+            orders = self.orders[level]
+
+            translation = np.where(np.isnan(level_channels[:, :3]), default[:, 3, :3],
+                                   level_channels[:, :3])
+            default_rotation = matrices_to_euler(_orthonormalize(default[:, :3, :3]),
+                                                 orders)
+            rotation = np.where(np.isnan(level_channels[:, 3:]), default_rotation,
+                                level_channels[:, 3:])
+            world_rotation = euler_to_matrices(rotation, orders)
+
+            # the joints that are not posed keep their local transform
+            world = default.copy()
+            is_posed = posed[level]
+            world[is_posed, :3, :3] = world_rotation[is_posed]
+            world[is_posed, 3, :3] = translation[is_posed]
+            new[level] = world
+
+            offset = translation - new_parent[:, 3, :3]
+            local_translates[level] = np.einsum(
+                'ni,nij->nj', offset, np.linalg.inv(new_parent[:, :3, :3]))
+            # world = rotateAxis * rotate * jointOrient * parent
+            local = (self._axes[level] @ world_rotation
+                     @ np.swapaxes(_orthonormalize(new_parent[:, :3, :3]), -1, -2)
+                     @ self._orients[level])
+            local_rotates[level] = matrices_to_euler(local, orders)
+
+        solved = {}
+        for position in np.flatnonzero(posed):
+            solved[self.joints[position]] = (
+                tuple(local_translates[position].tolist()) if translated[position] else None,
+                tuple(local_rotates[position].tolist()) if rotated[position] else None)
+        return solved
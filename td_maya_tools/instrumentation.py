@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Timing and counters for the slow parts of the poser tools.
+
+:description:
+    The poser tools time their main phases and count the Maya commands they call, but
+    only while instrumentation is enabled. It is off by default, and then every hook
+    costs a single flag check. Turn it on with the TD_POSER_PROFILE environment
+    variable or with enable(). With a profile folder, given by TD_POSER_PROFILE_DIR or
+    to enable(), the top level phases are also run under cProfile and dumped there.
+    After reproducing the problem, write_report saves the phase times and counters as
+    JSON to attach to the ticket:
+        from td_maya_tools import instrumentation
+        instrumentation.enable()
+        ... apply a few poses ...
+        instrumentation.write_report('poser_report.json')
+    Contains the following functions:
+        enable
+        disable
+        reset
+        phase
+        timed
+        count
+        profile
+        report
+        write_report
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import Counter
+from contextlib import contextmanager
+import cProfile
+import functools
+import json
+import os
+import platform
+import threading
+import time
+
+# Imports That You Wrote
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+ENV_VAR = 'TD_POSER_PROFILE'
+PROFILE_DIR_ENV_VAR = 'TD_POSER_PROFILE_DIR'
+
+# checked by every hook, everything else only happens when it is True
+enabled = bool(os.environ.get(ENV_VAR)) or bool(os.environ.get(PROFILE_DIR_ENV_VAR))
+profile_dir = os.environ.get(PROFILE_DIR_ENV_VAR) or None
+
+_lock = threading.Lock()
+_phases = {}
+_counters = Counter()
+# how many profile contexts each thread is inside, only one cProfile runs per thread
+_profiling = threading.local()
+
+
+def enable(profile_folder=None):
+    """
+    Start recording phase times and counters
+
+    :param profile_folder: Also dump cProfile stats of the top level phases here
+    :type: str
+    """
+    global enabled, profile_dir
+    enabled = True
+    if profile_folder:
+        profile_dir = profile_folder
+
+
+def disable():
+    """
+    Stop recording, what was recorded so far is kept until reset
+    """
+    global enabled, profile_dir
+    enabled = False
+    profile_dir = None
+
+
+def reset():
+    """
+    Forget everything that was recorded
+    """
+    with _lock:
+        _phases.clear()
+        _counters.clear()
+
+
+@contextmanager
+def phase(name=None):
+    """
+    Time everything done inside the context as a phase
+
+    :param name: The name of the phase
+    :type: str
+    """
+    if not enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def timed(name=None):
+    """
+    Decorate a function so that every call is timed as a phase
+
+    :param name: The name of the phase, defaults to the module and function name
+    :type: str
+    """
+    def decorator(function):
+        phase_name = name or f'{function.__module__}.{function.__qualname__}'
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(phase_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(name=None, amount=1):
+    """
+    Add to a counter, such as the number of times a Maya command was called
+
+    :param name: The name of the counter
+    :type: str
+
+    :param amount: How much to add
+    :type: int
+    """
+    if enabled:
+        with _lock:
+            _counters[name] += amount
+
+
+@contextmanager
+def profile(name=None):
+    """
+    Time everything done inside the context as a phase, and when a profile folder is
+    set, run it under cProfile and dump the stats to <profile folder>/<name>-<time>-<pid>.prof
+    Only the outermost profile context of a thread runs cProfile, the ones nested in
+    it are timed as phases and show up in its stats.
+
+    :param name: The name of the phase
+    :type: str
+    """
+    if not enabled:
+        yield
+        return
+    depth = getattr(_profiling, 'depth', 0)
+    if not profile_dir or depth:
+        with phase(name):
+            yield
+        return
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    _profiling.depth = depth + 1
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profiling.depth = depth
+        _record(name, time.perf_counter() - start)
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(
+            profile_dir, f'{name}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.prof'))
+
+
+def report():
+    """
+    :return: The phase times and counters recorded so far
+    :type: dict
+    """
+    with _lock:
+        phases = {name: dict(stats) for name, stats in sorted(_phases.items())}
+        counters = dict(sorted(_counters.items()))
+    for stats in phases.values():
+        stats['mean_seconds'] = stats['total_seconds'] / stats['calls']
+    return {'environment': {'python': platform.python_version(),
+                            'platform': platform.platform(),
+                            'profile_dir': profile_dir},
+            'phases': phases,
+            'counters': counters}
+
+
+def write_report(path=None):
+    """
+    Save the report as JSON
+
+    :param path: Full path to the file to write
+    :type: str
+
+    :return: The path to the file
+    :type: str
+    """
+    with open(path, 'w') as report_fh:
+        json.dump(report(), report_fh, indent=2)
+        report_fh.write('\n')
+    return path
+
+
+def _record(name=None, seconds=0.0):
+    """
+    Add a timing to a phase
+    """
+    with _lock:
+        stats = _phases.get(name)
+        if stats is None:
+            stats = _phases[name] = {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+        stats['calls'] += 1
+        stats['total_seconds'] += seconds
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Keep track of the joints in the scene without querying it every time.
+
+:description:
+    JointRegistry takes a snapshot of the joints in the scene the first time it is
+    asked about them and answers from that snapshot afterwards. The joints are named
+    the way ls names them, by their shortest unique path, and nodes named by a longer
+    path are looked up under the name ls gives them. Once its callbacks are
+    installed, it follows joints being added, removed, renamed and reparented one by
+    one, and takes a new snapshot after a scene is opened or a new scene is made, or
+    when a change makes the names of other joints ambiguous. Every joint also gets a
+    callback for changes to its joint orient, rotate axis and rotate order, which the
+    solvers built from the joints depend on. Without the callbacks,
+    nodes are verified against the scene itself, as the snapshot can be out of date.
+    Contains the following classes:
+        JointRegistry
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the attributes of a joint that change how its channels are solved, besides its parent
+STATIC_ATTRIBUTES = ('jointOrient', 'rotateAxis', 'rotateOrder')
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class JointRegistry(object):
+    """
+    A cached set of the joints in the scene.
+    """
+    def __init__(self, cmds=None):
+        """
+        :param cmds: The maya.cmds module, or a stand in with the same functions
+        :type: module
+        """
+        if cmds is None:
+            from maya import cmds
+        self.cmds = cmds
+        self.callback_ids = []
+        # hash code of a joint -> the id of its attribute changed callback
+        self.attribute_callback_ids = {}
+        self._om = None
+        self._joints = None
+        self._sorted_joints = None
+        # the short names shared by several joints, whose paths are in the snapshot
+        self._ambiguous = set()
+        # counts the changes to the joints, so that anything built from them can tell
+        # when it is out of date
+        self.generation = 0
+
+    @property
+    def joints(self):
+        """
+        The names of all the joints in the scene, taken from the scene the first time
+        """
+        if self._joints is None:
+            instrumentation.count('cmds.ls')
+            self._joints = set(self.cmds.ls(type='joint') or [])
+            self._sorted_joints = None
+            self._ambiguous = {joint.rpartition('|')[2] for joint in self._joints
+                               if '|' in joint}
+        return self._joints
+
+    @property
+    def follows_scene(self):
+        """
+        Whether the callbacks are installed, without them the snapshot is only as
+        recent as the last invalidate
+        """
+        return bool(self.callback_ids)
+
+    def sorted_joints(self):
+        """
+        :return: The names of all the joints in the scene, sorted
+        :type: list
+        """
+        if self._sorted_joints is None:
+            self._sorted_joints = sorted(self.joints)
+        return self._sorted_joints
+
+    def is_joint(self, node=None):
+        """
+        :param node: The name of a node
+        :type: str
+
+        :return: Whether the node is a joint in the scene
+        :type: bool
+        """
+        if self.follows_scene:
+            return self.shortest_paths([node]).get(node, node) in self.joints
+        instrumentation.count('cmds.ls')
+        return bool(self.cmds.ls(node, type='joint'))
+
+    def verify_joints(self, nodes=None):
+        """
+        Verify a whole list of nodes at once. While the registry follows the scene, the
+        scene is only queried for the nodes that are not known joints, to tell why they
+        failed. Nodes can be named by any path that ls would find them by.
+
+        :param nodes: The nodes you want to verify
+        :type: list
+
+        :return: A tuple containing 2 items
+                 1. A set of the nodes that are joints
+                 2. A dictionary of the other nodes and why they failed
+        :type: tuple
+        """
+        nodes = list(nodes or ())
+        if self.follows_scene:
+            joints = self.joints
+        elif nodes:
+            instrumentation.count('cmds.ls')
+            joints = set(self.cmds.ls(nodes, type='joint') or [])
+        else:
+            return set(), {}
+        # the joints are listed by their shortest unique path, look up the nodes given
+        # by a longer one under the name ls gives them
+        names = self.shortest_paths([node for node in nodes if node not in joints])
+        valid_joints = set()
+        invalid = []
+        for node in nodes:
+            if names.get(node, node) in joints:
+                valid_joints.add(node)
+            else:
+                invalid.append(node)
+        failures = {}
+        if invalid:
+            instrumentation.count('cmds.ls')
+            existing = set(self.cmds.ls(invalid) or [])
+            for node in invalid:
+                if names.get(node, node) in existing:
+                    failures[node] = 'not a joint'
+                else:
+                    failures[node] = 'does not exist'
+        return valid_joints, failures
+
+    def shortest_paths(self, nodes=None):
+        """
+        The names ls gives the nodes named by a path, a query for each of them
+
+        :param nodes: The names of nodes
+        :type: list
+
+        :return: A dictionary of the nodes named by a path to the shortest unique path
+                 of the node, the ones that do not exist are left out
+        :type: dict
+        """
+        names = {}
+        for node in nodes or ():
+            if '|' not in node:
+                continue
+            instrumentation.count('cmds.ls')
+            found = self.cmds.ls(node) or []
+            if len(found) == 1:
+                names[node] = found[0]
+        return names
+
+    def invalidate(self):
+        """
+        Forget the snapshot, the scene will be queried again on the next lookup
+        """
+        self._joints = None
+        self._sorted_joints = None
+        self.generation += 1
+
+    def node_added(self, name=None):
+        """
+        Record a joint that was added to the scene
+
+        :param name: The shortest unique path of the joint
+        :type: str
+        """
+        if self._joints is None:
+            return
+        if '|' in name:
+            # its short name is shared, the paths of the other joints changed too
+            self.invalidate()
+            return
+        self._joints.add(name)
+        self._sorted_joints = None
+        self.generation += 1
+
+    def node_removed(self, name=None):
+        """
+        Record a joint that was removed from the scene
+
+        :param name: The shortest unique path of the joint
+        :type: str
+        """
+        if self._joints is None:
+            return
+        if '|' in name:
+            # the joints that shared its short name may not need a path anymore
+            self.invalidate()
+            return
+        self._joints.discard(name)
+        self._sorted_joints = None
+        self.generation += 1
+
+    def node_renamed(self, old_name=None, new_name=None):
+        """
+        Record a joint that was renamed
+
+        :param old_name: The short name the joint had
+        :type: str
+
+        :param new_name: The shortest unique path of the joint
+        :type: str
+        """
+        if self._joints is None:
+            return
+        if '|' in new_name or old_name not in self._joints:
+            self.invalidate()
+            return
+        self._joints.discard(old_name)
+        self._joints.add(new_name)
+        self._sorted_joints = None
+        self.generation += 1
+
+    def other_node_renamed(self, old_name=None, new_name=None):
+        """
+        Record a node that is not a joint being renamed, which changes the paths of
+        the joints it shares a short name with
+
+        :param old_name: The short name the node had
+        :type: str
+
+        :param new_name: The short name of the node
+        :type: str
+        """
+        if self._joints is None:
+            return
+        if (new_name in self._joints or new_name in self._ambiguous
+                or old_name in self._ambiguous):
+            self.invalidate()
+
+    def node_reparented(self, name=None):
+        """
+        Record a joint, or a node with joints under it, being parented or unparented.
+        The names stay the same, but anything built from the hierarchy is out of date
+
+        :param name: The shortest unique path of the node, None for a node that is not
+                     a joint
+        :type: str
+        """
+        if self._joints is None:
+            return
+        if self._ambiguous or (name is not None and name not in self._joints):
+            # the paths that tell joints with the same short name apart changed
+            self.invalidate()
+            return
+        self.generation += 1
+
+    def static_attribute_changed(self):
+        """
+        Record a change to the joint orient, rotate axis or rotate order of a joint.
+        The names stay the same, but anything solved from them is out of date
+        """
+        self.generation += 1
+
+    def install_callbacks(self, om=None):
+        """
+        Keep the registry up to date with Maya scene messages
+
+        :param om: The maya.api.OpenMaya module, or a stand in with the same classes
+        :type: module
+
+        :return: The ids of the callbacks
+        :type: list
+        """
+        if self.callback_ids:
+            return self.callback_ids
+        if om is None:
+            import maya.api.OpenMaya as om
+        self._om = om
+        # the attribute changed messages that can change a value
+        self._changes = (om.MNodeMessage.kAttributeSet | om.MNodeMessage.kConnectionMade
+                         | om.MNodeMessage.kConnectionBroken)
+        self.callback_ids = [
+            om.MDGMessage.addNodeAddedCallback(self._on_node_added, 'joint'),
+            om.MDGMessage.addNodeRemovedCallback(self._on_node_removed, 'joint'),
+            om.MNodeMessage.addNameChangedCallback(om.MObject.kNullObj,
+                                                   self._on_name_changed),
+            om.MDagMessage.addParentAddedCallback(self._on_parent_changed),
+            om.MDagMessage.addParentRemovedCallback(self._on_parent_changed),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen,
+                                         self._on_scene_changed),
+            om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew,
+                                         self._on_scene_changed),
+        ]
+        self._watch_joints()
+        return self.callback_ids
+
+    def remove_callbacks(self):
+        """
+        Stop following the scene, the snapshot is dropped as it can go out of date
+        """
+        if self.callback_ids:
+            self._om.MMessage.removeCallbacks(self.callback_ids)
+        self._unwatch_joints()
+        self.callback_ids = []
+        self.invalidate()
+
+    def _watch_joints(self):
+        """
+        Add an attribute changed callback to every joint in the scene
+        """
+        self._unwatch_joints()
+        selection = self._om.MSelectionList()
+        for joint in self.joints:
+            selection.add(joint)
+        for index in range(selection.length()):
+            self._watch(selection.getDependNode(index))
+
+    def _unwatch_joints(self):
+        if self.attribute_callback_ids:
+            self._om.MMessage.removeCallbacks(list(self.attribute_callback_ids.values()))
+        self.attribute_callback_ids = {}
+
+    def _watch(self, mobject=None):
+        key = self._om.MObjectHandle(mobject).hashCode()
+        if key not in self.attribute_callback_ids:
+            add_callback = self._om.MNodeMessage.addAttributeChangedCallback
+            self.attribute_callback_ids[key] = add_callback(mobject,
+                                                            self._on_attribute_changed)
+
+    def _unwatch(self, mobject=None):
+        callback_id = self.attribute_callback_ids.pop(
+            self._om.MObjectHandle(mobject).hashCode(), None)
+        if callback_id is not None:
+            self._om.MMessage.removeCallback(callback_id)
+
+    def _path_name(self, mobject=None):
+        """
+        The shortest unique path of a dag node, the way ls names it
+        """
+        return self._om.MDagPath.getAPathTo(mobject).partialPathName()
+
+    def _on_node_added(self, mobject=None, client_data=None):
+        self._watch(mobject)
+        self.node_added(self._path_name(mobject))
+
+    def _on_node_removed(self, mobject=None, client_data=None):
+        self._unwatch(mobject)
+        self.node_removed(self._path_name(mobject))
+
+    def _on_attribute_changed(self, message=None, plug=None, other_plug=None,
+                              client_data=None):
+        # this fires for every channel a pose sets, keep it cheap
+        if (message & self._changes
+                and plug.partialName(useLongNames=True).startswith(STATIC_ATTRIBUTES)):
+            self.static_attribute_changed()
+
+    def _on_name_changed(self, mobject=None, previous_name=None, client_data=None):
+        # this fires for every node in the scene, most of them can be skipped
+        if mobject.hasFn(self._om.MFn.kJoint):
+            self.node_renamed(previous_name, self._path_name(mobject))
+        elif mobject.hasFn(self._om.MFn.kDagNode):
+            self.other_node_renamed(previous_name,
+                                    self._om.MFnDependencyNode(mobject).name())
+
+    def _on_parent_changed(self, child=None, parent=None, client_data=None):
+        if child.node().hasFn(self._om.MFn.kJoint):
+            self.node_reparented(child.partialPathName())
+        elif self._om.MFnDagNode(child).childCount():
+            # a new node has no children, only a group of joints can move joints
+            self.node_reparented()
+
+    def _on_scene_changed(self, client_data=None):
+        self.invalidate()
+        self._watch_joints()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A compact representation of poses.
+
+:description:
+    Poses store the translations and rotations of all their joints as floats in a single
+    array, with NaN standing for a channel that is not set. Joints that are missing from
+    a pose are never added to it when they are looked up.
+    Contains the following functions:
+        parse_channel
+    Contains the following classes:
+        Pose
+        JointChannels
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.xml_utils
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from array import array
+import math
+
+# Imports That You Wrote
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# order of the channels of a joint inside the pose values
+CHANNELS = ('tx', 'ty', 'tz', 'rx', 'ry', 'rz')
+# the xml element holding each group of channels
+CHANNEL_GROUPS = {'translations': ('tx', 'ty', 'tz'),
+                  'rotations': ('rx', 'ry', 'rz')}
+NOT_SET = float('nan')
+
+
+def parse_channel(value=None):
+    """
+    Convert a channel value read from a file into a float
+
+    :param value: The value of the channel
+    :type: str
+
+    :return: The value as a float, NaN if the value is empty
+    :type: float
+    """
+    if value is None or not value.strip():
+        return NOT_SET
+    return float(value)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class Pose(object):
+    """
+    The channels of all the joints of a pose. The six channels of each joint are stored
+    one after the other in a flat array of floats, in the order of CHANNELS.
+    """
+    __slots__ = ('name', 'joints', 'values', '_index')
+
+    def __init__(self, name=None, joints=(), values=None, index=None):
+        """
+        :param name: The name of the pose
+        :type: str
+
+        :param joints: The names of the joints in the pose
+        :type: tuple
+
+        :param values: The channel values, six per joint. Defaults to all NaN
+        :type: array.array
+
+        :param index: A dictionary mapping joint names to their position in joints.
+                      Poses sharing the same joints can share the same index
+        :type: dict
+        """
+        self.name = name
+        self.joints = tuple(joints)
+        if values is None:
+            values = array('d', [NOT_SET]) * (len(self.joints) * len(CHANNELS))
+        self.values = values
+        if index is None:
+            index = {joint: i for i, joint in enumerate(self.joints)}
+        self._index = index
+
+    def __repr__(self):
+        return f'Pose({self.name!r}, {len(self.joints)} joints)'
+
+    def __contains__(self, joint):
+        return joint in self._index
+
+    def __iter__(self):
+        return iter(self.joints)
+
+    def __len__(self):
+        return len(self.joints)
+
+    def __getitem__(self, joint):
+        """
+        Look up the channels of a joint. A joint missing from the pose gives channels
+        that are all unset, without adding the joint to the pose.
+        """
+        return JointChannels(self, self._index.get(joint))
+
+    def __getstate__(self):
+        return self.name, self.joints, self.values
+
+    def __setstate__(self, state):
+        name, joints, values = state
+        self.name = name
+        self.joints = joints
+        self.values = values
+        self._index = {joint: i for i, joint in enumerate(joints)}
+
+    def get(self, joint=None, default=None):
+        """
+        Look up the channels of a joint
+
+        :param joint: The name of the joint
+        :type: str
+
+        :param default: What to return if the joint is not in the pose
+        :type: object
+
+        :return: The channels of the joint, or default
+        :type: JointChannels
+        """
+        position = self._index.get(joint)
+        if position is None:
+            return default
+        return JointChannels(self, position)
+
+    def items(self):
+        """
+        Iterate over the joints of the pose and their channels
+
+        :return: Pairs of joint names and channels
+        :type: generator
+        """
+        for position, joint in enumerate(self.joints):
+            yield joint, JointChannels(self, position)
+
+    def channels(self, joint=None):
+        """
+        Get the raw channel values of a joint
+
+        :param joint: The name of the joint
+        :type: str
+
+        :return: The six channel values of the joint, NaN for the ones that are not set
+        :type: tuple
+        """
+        position = self._index.get(joint)
+        if position is None:
+            return (NOT_SET,) * len(CHANNELS)
+        start = position * len(CHANNELS)
+        return tuple(self.values[start:start + len(CHANNELS)])
+
+    def translation(self, joint=None):
+        """
+        :return: tx, ty and tz of the joint, None for the ones that are not set
+        :type: tuple
+        """
+        return self[joint].translation
+
+    def rotation(self, joint=None):
+        """
+        :return: rx, ry and rz of the joint, None for the ones that are not set
+        :type: tuple
+        """
+        return self[joint].rotation
+
+    def as_dict(self):
+        """
+        Convert the pose to the nested dictionary layout of the xml file
+            dict[joint][translations/rotations][x/y/z value] = '<x/y/z value>'
+        Channels that are not set are given as empty strings.
+
+        :return: The pose as a dictionary
+        :type: dict
+        """
+        pose_dict = {}
+        for joint, joint_channels in self.items():
+            pose_dict[joint] = joint_channels.as_dict()
+        return pose_dict
+
+
+class JointChannels(object):
+    """
+    A light view on the channels of a single joint inside a pose.
+    """
+    __slots__ = ('pose', 'position')
+
+    def __init__(self, pose=None, position=None):
+        self.pose = pose
+        self.position = position
+
+    def __repr__(self):
+        return f'JointChannels({self.values})'
+
+    def __bool__(self):
+        return self.position is not None
+
+    def get(self, channel=None):
+        """
+        :param channel: One of CHANNELS
+        :type: str
+
+        :return: The value of the channel, None if it is not set
+        :type: float
+        """
+        value = self.values[CHANNELS.index(channel)]
+        return None if math.isnan(value) else value
+
+    @property
+    def values(self):
+        """
+        The six channel values, NaN for the ones that are not set
+        """
+        if self.position is None:
+            return (NOT_SET,) * len(CHANNELS)
+        start = self.position * len(CHANNELS)
+        return tuple(self.pose.values[start:start + len(CHANNELS)])
+
+    @property
+    def translation(self):
+        """
+        tx, ty and tz, None for the ones that are not set
+        """
+        return tuple(None if math.isnan(v) else v for v in self.values[:3])
+
+    @property
+    def rotation(self):
+        """
+        rx, ry and rz, None for the ones that are not set
+        """
+        return tuple(None if math.isnan(v) else v for v in self.values[3:])
+
+    def as_dict(self):
+        """
+        :return: The channels as dict[translations/rotations][x/y/z value]
+        :type: dict
+        """
+        joint_dict = {}
+        values = dict(zip(CHANNELS, self.values))
+        for group, channels in CHANNEL_GROUPS.items():
+            joint_dict[group] = {}
+            for channel in channels:
+                value = values[channel]
+                joint_dict[group][channel] = '' if math.isnan(value) else repr(value)
+        return joint_dict
@@ -0,0 +1,885 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    The different ways poses can be written into the scene.
+
+:description:
+    A backend validates joints and writes whole poses into the scene. CmdsBackend goes
+    through maya.cmds, reads the world matrices of the joints of a pose with one xform
+    query, solves their local channels in Python and sets them, so a pose costs two
+    setAttr per joint and the scene is not evaluated between joints. LocalCmdsBackend
+    solves with NumPy instead, for the whole hierarchy of the rig at once, and keeps
+    the hierarchy between poses.
+    OpenMayaBackend uses the Maya Python API 2.0, keeps handles to the joints it has
+    seen and writes every channel of a pose with one MDGModifier, so the scene is only
+    dirtied once per pose. The modifier is done through the command of
+    td_maya_tools.poser_commands, so the pose goes into the undo queue.
+    They take the module they talk to as an argument, so they can run against a stand
+    in such as td_maya_testing.fake_scene.FakeScene outside of Maya. Backends can also
+    read the current pose of a set of joints back from the scene, in the same world
+    space values that poses store, take a snapshot of their local channels to put them
+    back later, and key whole animation curves at once. Writes done inside without_undo
+    stay out of the undo queue, for previews that are put back before anything is
+    committed.
+    Contains the following classes:
+        PoseBackend
+        CmdsBackend
+        LocalCmdsBackend
+        OpenMayaBackend
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.poser
+    td_maya_tools.pose_solver
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from array import array
+from contextlib import contextmanager
+import math
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation, pose_solver
+from td_maya_tools.joint_registry import JointRegistry
+from td_maya_tools.pose import Pose, CHANNELS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# the attribute of each of td_maya_tools.pose.CHANNELS
+CHANNEL_ATTRIBUTES = dict(zip(CHANNELS, ('translateX', 'translateY', 'translateZ',
+                                         'rotateX', 'rotateY', 'rotateZ')))
+
+def _run_undoable(operation=None, cmds=None):
+    """
+    Do a change made through the API, such as an MDGModifier, with the undoable
+    command of td_maya_tools.poser_commands so that it goes into the undo queue
+    """
+    from td_maya_tools import poser_commands
+    instrumentation.count(f'cmds.{poser_commands.COMMAND_NAME}')
+    poser_commands.run(operation, cmds)
+
+
+@contextmanager
+def _undo_chunk(cmds=None, name=None):
+    """
+    Group everything done inside the context into a single undo step
+    """
+    instrumentation.count('cmds.undoInfo', 2)
+    cmds.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+
+@contextmanager
+def _without_undo(cmds=None):
+    """
+    Turn the undo queue off inside the context
+    """
+    instrumentation.count('cmds.undoInfo')
+    if not cmds.undoInfo(query=True, state=True):
+        yield
+        return
+    # turning the queue off without flushing it keeps the steps already in it
+    instrumentation.count('cmds.undoInfo', 2)
+    cmds.undoInfo(stateWithoutFlush=False)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(stateWithoutFlush=True)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseBackend(object):
+    """
+    The interface shared by all backends.
+    """
+    name = None
+
+    def verify_joints(self, nodes=None):
+        """
+        Verify a whole list of nodes at once
+
+        :param nodes: The nodes you want to verify
+        :type: list
+
+        :return: A tuple containing 2 items
+                 1. A set of the nodes that are joints
+                 2. A dictionary of the other nodes and why they failed
+        :type: tuple
+        """
+        raise NotImplementedError
+
+    def apply(self, entries=None):
+        """
+        Write the channels of a pose to joints that have already been verified
+
+        :param entries: Pairs of joint names and their six channels, in the order of
+                        td_maya_tools.pose.CHANNELS, NaN for the ones that are not set
+        :type: list
+
+        :return: A dictionary of the joints that could not be posed and why
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def read_pose(self, joints=None, name=None):
+        """
+        Read the current world space translations and rotations of joints that have
+        already been verified, in the rotate order of each joint
+
+        :param joints: The names of the joints
+        :type: list
+
+        :param name: The name of the pose
+        :type: str
+
+        :return: The current pose of the joints
+        :type: td_maya_tools.pose.Pose
+        """
+        raise NotImplementedError
+
+    def rotate_orders(self, joints=None):
+        """
+        :param joints: The names of joints that have already been verified
+        :type: list
+
+        :return: A dictionary of joint names to their rotate order, such as xyz
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def dag_paths(self, joints=None):
+        """
+        :param joints: The names of joints that have already been verified
+        :type: list
+
+        :return: A dictionary of joint names to their full dag path, such as |root|spine
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def snapshot(self, joints=None):
+        """
+        Read the local translate and rotate channels of joints that have already been
+        verified, to be put back with restore
+
+        :param joints: The names of the joints
+        :type: list
+
+        :return: A dictionary of joint names to their translate and rotate values
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def restore(self, snapshot=None):
+        """
+        Set the local channels of joints back to a snapshot
+
+        :param snapshot: A dictionary of joint names to their translate and rotate
+                         values, as returned by snapshot
+        :type: dict
+
+        :return: A dictionary of the joints that could not be restored and why
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def joint_states(self, joints=None):
+        """
+        Read what the pose solver needs to know about joints that have already been
+        verified. A joint whose parent is one of the joints has that joint as parent.
+
+        :param joints: The names of the joints
+        :type: list
+
+        :return: A dictionary of joint names to their state
+        :type: dict
+        """
+        raise NotImplementedError
+
+    def set_keys(self, curves=None):
+        """
+        Key the channels of joints that have already been verified, a whole curve at a
+        time. Keys already on the keyed frames are replaced.
+
+        :param curves: A dictionary of (joint name, channel) to a list of frames and a
+                       list of the local channel values at those frames, the channels
+                       being td_maya_tools.pose.CHANNELS and the rotations in degrees
+        :type: dict
+
+        :return: A dictionary of the joints that could not be keyed and why
+        :type: dict
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def undo_chunk(self, name=None):
+        """
+        Group everything done inside the context into a single undo step
+
+        :param name: The name of the undo chunk
+        :type: str
+        """
+        yield
+
+    @contextmanager
+    def without_undo(self):
+        """
+        Keep everything done inside the context out of the undo queue, and out of what
+        the backend would otherwise revert
+        """
+        yield
+
+
+class CmdsBackend(PoseBackend):
+    """
+    Apply poses through maya.cmds, by solving the local channels of the joints of a
+    pose and setting them. The result does not depend on the order of the joints in
+    the pose.
+    With a joint registry that follows the scene, the dag paths, joint orients, rotate
+    axes and rotate orders of the joints are kept until the registry sees them change,
+    so applying a pose again only queries the world matrices.
+    """
+    name = 'cmds'
+
+    def __init__(self, cmds=None, registry=None):
+        """
+        :param cmds: The maya.cmds module, or a stand in with the same functions
+        :type: module
+
+        :param registry: A registry of the joints in the scene to verify joints with,
+                         instead of querying the scene
+        :type: td_maya_tools.joint_registry.JointRegistry
+        """
+        if cmds is None:
+            from maya import cmds
+        self.cmds = cmds
+        self.registry = registry
+        # (registry generation, joint name -> what static_states reads)
+        self._static_states = None
+
+    def verify_joints(self, nodes=None):
+        # a registry without callbacks queries the scene for the nodes every time
+        registry = self.registry if self.registry is not None else JointRegistry(self.cmds)
+        return registry.verify_joints(nodes)
+
+    def apply(self, entries=None):
+        entries = list(entries or ())
+        if not entries:
+            return {}
+        states = self.joint_states([joint for joint, _ in entries])
+        # the channels are solved from the world matrices before anything is set, the
+        # solver works parents first so a joint set after its child does not move it
+        with instrumentation.phase('cmds.solve'):
+            solved = pose_solver.solve_local_channels(entries, states)
+        return self._set_local(solved)
+
+    def _set_local(self, channels=None):
+        """
+        Set local translate and rotate channels, a command for each
+
+        :param channels: A dictionary of joint names to their translate and rotate
+                         values, either one None to leave it alone
+        :type: dict
+
+        :return: A dictionary of the joints that could not be set and why
+        :type: dict
+        """
+        failures = {}
+        for joint, (translate, rotate) in (channels or {}).items():
+            try:
+                if translate is not None:
+                    instrumentation.count('cmds.setAttr')
+                    self.cmds.setAttr(f'{joint}.translate', *translate)
+                if rotate is not None:
+                    instrumentation.count('cmds.setAttr')
+                    self.cmds.setAttr(f'{joint}.rotate', *rotate)
+            except RuntimeError as error:
+                failures[joint] = str(error).strip()
+        return failures
+
+    def read_pose(self, joints=None, name=None):
+        joints = tuple(joints or ())
+        if not joints:
+            return Pose(name)
+        # a query of several joints gives their values one after another, so the
+        # whole pose only takes two commands
+        instrumentation.count('cmds.xform', 2)
+        translations = self.cmds.xform(joints, query=True, worldSpace=True,
+                                       translation=True)
+        rotations = self.cmds.xform(joints, query=True, worldSpace=True, rotation=True)
+        values = array('d')
+        for position in range(0, len(joints) * 3, 3):
+            values.extend(translations[position:position + 3])
+            values.extend(rotations[position:position + 3])
+        return Pose(name, joints, values)
+
+    def rotate_orders(self, joints=None):
+        statics = self.static_states(joints)
+        return {joint: statics[joint][3] for joint in joints or ()}
+
+    def dag_paths(self, joints=None):
+        joints = list(joints or ())
+        if not joints:
+            return {}
+        instrumentation.count('cmds.ls')
+        paths = self.cmds.ls(joints, long=True) or []
+        if len(paths) == len(joints):
+            # ls gives the nodes back in the order they were asked for
+            return dict(zip(joints, paths))
+        # the same joint was asked for twice under different names
+        instrumentation.count('cmds.ls', len(joints))
+        return {joint: self.cmds.ls(joint, long=True)[0] for joint in joints}
+
+    def snapshot(self, joints=None):
+        instrumentation.count('cmds.getAttr', len(joints or ()) * 2)
+        return {joint: (tuple(self.cmds.getAttr(f'{joint}.translate')[0]),
+                        tuple(self.cmds.getAttr(f'{joint}.rotate')[0]))
+                for joint in joints or ()}
+
+    def restore(self, snapshot=None):
+        return self._set_local(snapshot)
+
+    def static_states(self, joints=None):
+        """
+        Read what does not change between poses about joints that have already been
+        verified. While the registry follows the scene, it is kept until the registry
+        sees joints being renamed or reparented, or their joint orients, rotate axes or
+        rotate orders change
+
+        :param joints: The names of the joints
+        :type: list
+
+        :return: A dictionary of joint names to their full dag path, joint orient,
+                 rotate axis and rotate order
+        :type: dict
+        """
+        statics = {}
+        if self.registry is not None and self.registry.follows_scene:
+            if (self._static_states is None
+                    or self._static_states[0] != self.registry.generation):
+                self._static_states = (self.registry.generation, {})
+            statics = self._static_states[1]
+        missing = [joint for joint in joints or () if joint not in statics]
+        if missing:
+            paths = self.dag_paths(missing)
+            instrumentation.count('cmds.getAttr', len(missing) * 3)
+            for joint in missing:
+                statics[joint] = (
+                    paths[joint], self.cmds.getAttr(f'{joint}.jointOrient')[0],
+                    self.cmds.getAttr(f'{joint}.rotateAxis')[0],
+                    pose_solver.ROTATE_ORDERS[self.cmds.getAttr(f'{joint}.rotateOrder')])
+        return statics
+
+    def joint_states(self, joints=None):
+        joints = list(joints or ())
+        if not joints:
+            return {}
+        statics = self.static_states(joints)
+        paths = {joint: statics[joint][0] for joint in joints}
+        path_joints = {path: joint for joint, path in paths.items()}
+        parents = {joint: path.rpartition('|')[0] or None for joint, path in paths.items()}
+        # the world matrices of all the joints, and of the parents that are not joints
+        # being read, each come from a single query
+        instrumentation.count('cmds.xform')
+        matrices = self.cmds.xform(joints, query=True, worldSpace=True, matrix=True)
+        worlds = {paths[joint]: matrices[position * 16:position * 16 + 16]
+                  for position, joint in enumerate(joints)}
+        others = sorted({parent for parent in parents.values()
+                         if parent is not None and parent not in worlds})
+        if others:
+            instrumentation.count('cmds.xform')
+            matrices = self.cmds.xform(others, query=True, worldSpace=True, matrix=True)
+            worlds.update((parent, matrices[position * 16:position * 16 + 16])
+                          for position, parent in enumerate(others))
+
+        states = {}
+        for joint in joints:
+            parent = parents[joint]
+            _, joint_orient, rotate_axis, rotate_order = statics[joint]
+            states[joint] = pose_solver.JointState(
+                name=joint, parent=path_joints.get(parent, parent),
+                world=worlds[paths[joint]],
+                parent_world=None if parent is None else worlds[parent],
+                joint_orient=joint_orient, rotate_axis=rotate_axis,
+                rotate_order=rotate_order)
+        return states
+
+    def set_keys(self, curves=None):
+        # cmds has no command that sets several keys with different values, so the
+        # curves are keyed through the API, a whole curve with each addKeys, by the
+        # undoable command of td_maya_tools.poser_commands
+        import maya.api.OpenMaya as om
+        import maya.api.OpenMayaAnim as oma
+        failures = {}
+        plugs = {}
+        for joint, channel in curves or {}:
+            if joint in failures:
+                continue
+            selection = om.MSelectionList()
+            try:
+                selection.add(joint)
+            except RuntimeError as error:
+                failures[joint] = str(error).strip()
+                continue
+            plugs[joint, channel] = om.MFnDependencyNode(
+                selection.getDependNode(0)).findPlug(CHANNEL_ATTRIBUTES[channel], False)
+        operation = _CurveKeys(om, oma, {
+            (joint, channel): (plug, channel in CHANNELS[3:], *curves[joint, channel])
+            for (joint, channel), plug in plugs.items()})
+        try:
+            _run_undoable(operation, self.cmds)
+        except RuntimeError as error:
+            failures.update((joint, str(error).strip()) for joint, _ in plugs)
+            return failures
+        failures.update(operation.failures)
+        return failures
+
+    def undo_chunk(self, name=None):
+        return _undo_chunk(self.cmds, name)
+
+    def without_undo(self):
+        return _without_undo(self.cmds)
+
+    def set_translation(self, joint=None, tx=None, ty=None, tz=None):
+        """
+        Move a joint that is known to exist. All three axes are moved with one command
+        when they are all provided.
+        """
+        # using "!= None" so that the value of 0 evalutes to True
+        if tx != None and ty != None and tz != None:
+            instrumentation.count('cmds.move')
+            self.cmds.move(tx, ty, tz, joint, absolute=True)
+            return
+        instrumentation.count('cmds.move', 3 - (tx, ty, tz).count(None))
+        if tx != None:
+            self.cmds.move(tx, joint, moveX=True, absolute=True)
+        if ty != None:
+            self.cmds.move(ty, joint, moveY=True, absolute=True)
+        if tz != None:
+            self.cmds.move(tz, joint, moveZ=True, absolute=True)
+
+    def set_rotation(self, joint=None, rx=None, ry=None, rz=None):
+        """
+        Rotate a joint that is known to exist. All three axes are rotated with one
+        command when they are all provided.
+        """
+        # using "!= None" so that the value of 0 evaluate to True
+        if rx != None and ry != None and rz != None:
+            instrumentation.count('cmds.rotate')
+            self.cmds.rotate(rx, ry, rz, joint, absolute=True)
+            return
+        instrumentation.count('cmds.rotate', 3 - (rx, ry, rz).count(None))
+        if rx != None:
+            self.cmds.rotate(rx, joint, rotateX=True, absolute=True)
+        if ry != None:
+            self.cmds.rotate(ry, joint, rotateY=True, absolute=True)
+        if rz != None:
+            self.cmds.rotate(rz, joint, rotateZ=True, absolute=True)
+
+
+class LocalCmdsBackend(CmdsBackend):
+    """
+    Apply poses through maya.cmds like CmdsBackend, but solve the local channels with
+    NumPy, for every joint of the hierarchy at once. Requires NumPy.
+    With a joint registry that follows the scene, the hierarchy, joint orients, rotate
+    axes and rotate orders of every joint in the scene are read once and kept until
+    the registry sees them change, so applying a pose only queries the world matrices.
+    """
+    name = 'cmds_local'
+
+    def __init__(self, cmds=None, registry=None):
+        """
+        :param cmds: The maya.cmds module, or a stand in with the same functions
+        :type: module
+
+        :param registry: A registry of the joints in the scene to verify joints with
+                         and to build the hierarchy from. Without one, or when it does
+                         not follow the scene, the hierarchy of the joints of every
+                         pose is read again
+        :type: td_maya_tools.joint_registry.JointRegistry
+        """
+        super().__init__(cmds, registry)
+        # (registry generation, solver)
+        self._solver = None
+
+    def apply(self, entries=None):
+        entries = list(entries or ())
+        if not entries:
+            return {}
+        renamed = {}
+        if self.registry is not None and self.registry.follows_scene:
+            # the solver knows the joints by the names ls gives them, not by longer paths
+            renamed = self.registry.shortest_paths(
+                [joint for joint, _ in entries if joint not in self.registry.joints])
+            entries = [(renamed.get(joint, joint), channels) for joint, channels in entries]
+        solver = self.hierarchy_solver([joint for joint, _ in entries])
+        instrumentation.count('cmds.xform', 2 if solver.outside_parents else 1)
+        worlds = self.cmds.xform(list(solver.joints), query=True, worldSpace=True,
+                                 matrix=True)
+        outside_worlds = None
+        if solver.outside_parents:
+            outside_worlds = self.cmds.xform(list(solver.outside_parents), query=True,
+                                             worldSpace=True, matrix=True)
+        with instrumentation.phase('cmds_local.solve'):
+            solved = solver.solve(entries, worlds, outside_worlds)
+        failures = self._set_local(solved)
+        if renamed:
+            given = {name: joint for joint, name in renamed.items()}
+            failures = {given.get(joint, joint): error for joint, error in failures.items()}
+        return failures
+
+    def hierarchy_solver(self, joints=None):
+        """
+        Get a solver for the hierarchy of a set of joints that have already been
+        verified. With a joint registry that follows the scene, the solver covers every
+        joint in the scene and is kept until the registry sees joints being added,
+        removed, renamed or reparented, or their joint orients, rotate axes or rotate
+        orders change
+
+        :param joints: The names of the joints
+        :type: list
+
+        :return: The solver
+        :type: td_maya_tools.hierarchy_solver.HierarchySolver
+        """
+        from td_maya_tools.hierarchy_solver import HierarchySolver
+        if self.registry is None or not self.registry.follows_scene:
+            instrumentation.count('cmds_local.solvers_built')
+            return HierarchySolver(self.joint_states(joints))
+        if self._solver is None or self._solver[0] != self.registry.generation:
+            states = self.joint_states(self.registry.sorted_joints())
+            instrumentation.count('cmds_local.solvers_built')
+            self._solver = (self.registry.generation, HierarchySolver(states))
+        return self._solver[1]
+
+
+class OpenMayaBackend(PoseBackend):
+    """
+    Apply poses through the Maya Python API 2.0 with a single MDGModifier per pose.
+    The modifier is done by an undoable command, so every pose is a step of the undo
+    queue, except inside without_undo where the modifier is done directly.
+    """
+    name = 'openmaya'
+    _channel_plugs = tuple(CHANNEL_ATTRIBUTES.values())
+    _state_plugs = ('jointOrientX', 'jointOrientY', 'jointOrientZ',
+                    'rotateAxisX', 'rotateAxisY', 'rotateAxisZ', 'rotateOrder')
+
+    def __init__(self, om=None, oma=None, cmds=None):
+        """
+        :param om: The maya.api.OpenMaya module, or a stand in with the same classes
+        :type: module
+
+        :param oma: The maya.api.OpenMayaAnim module, only needed to set keys.
+                    Defaults to importing it the first time keys are set
+        :type: module
+
+        :param cmds: The maya.cmds module, or a stand in with the same functions, that
+                     runs the undoable command and the undo queue
+        :type: module
+        """
+        if om is None:
+            import maya.api.OpenMaya as om
+        if cmds is None:
+            from maya import cmds
+        self.om = om
+        self.oma = oma
+        self.cmds = cmds
+        self._undoable = True
+        self._handles = {}
+
+    def verify_joints(self, nodes=None):
+        valid_joints = set()
+        failures = {}
+        for node in nodes or ():
+            status = self._find(node)
+            if status is True:
+                valid_joints.add(node)
+            else:
+                failures[node] = status
+        return valid_joints, failures
+
+    def apply(self, entries=None):
+        entries = list(entries or ())
+        states = {joint: self.joint_state(joint) for joint, _ in entries}
+        return self._write(pose_solver.solve_local_channels(entries, states))
+
+    def snapshot(self, joints=None):
+        snapshot = {}
+        for joint in joints or ():
+            plugs = self._handles[joint].plugs
+            snapshot[joint] = (
+                tuple(plugs[plug].asDouble() for plug in self._channel_plugs[:3]),
+                tuple(plugs[plug].asMAngle().asDegrees()
+                      for plug in self._channel_plugs[3:]))
+        return snapshot
+
+    def restore(self, snapshot=None):
+        return self._write(snapshot)
+
+    def _write(self, channels=None):
+        """
+        Set local channels with a single MDGModifier
+
+        :param channels: A dictionary of joint names to their translate and rotate
+                         values, either one None to leave it alone
+        :type: dict
+
+        :return: A dictionary of the joints that could not be set and why
+        :type: dict
+        """
+        channels = channels or {}
+        modifier = self.om.MDGModifier()
+        for joint, (translate, rotate) in channels.items():
+            plugs = self._handles[joint].plugs
+            if translate is not None:
+                for plug, value in zip(self._channel_plugs[:3], translate):
+                    modifier.newPlugValueDouble(plugs[plug], value)
+            if rotate is not None:
+                for plug, value in zip(self._channel_plugs[3:], rotate):
+                    angle = self.om.MAngle(value, self.om.MAngle.kDegrees)
+                    modifier.newPlugValueMAngle(plugs[plug], angle)
+        instrumentation.count('openmaya.plug_writes', len(channels) * 6)
+        try:
+            self._run(modifier)
+        except RuntimeError as error:
+            return {joint: str(error).strip() for joint in channels}
+        return {}
+
+    def _run(self, operation=None):
+        """
+        Do a modifier, or anything else with doIt and undoIt, through the undoable
+        command, or directly inside without_undo
+        """
+        instrumentation.count('openmaya.MDGModifier.doIt')
+        if not self._undoable:
+            operation.doIt()
+            return
+        _run_undoable(operation, self.cmds)
+
+    def read_pose(self, joints=None, name=None):
+        joints = tuple(joints or ())
+        values = array('d')
+        for joint in joints:
+            state = self.joint_state(joint)
+            rotation, translation = pose_solver.split_matrix(state.world)
+            values.extend(translation)
+            values.extend(pose_solver.matrix_to_euler(
+                pose_solver.orthonormalize(rotation), state.rotate_order))
+        return Pose(name, joints, values)
+
+    def rotate_orders(self, joints=None):
+        return {joint: pose_solver.ROTATE_ORDERS[
+                    self._handles[joint].plugs['rotateOrder'].asInt()]
+                for joint in joints or ()}
+
+    def dag_paths(self, joints=None):
+        return {joint: self._handles[joint].dag_path.fullPathName() for joint in joints or ()}
+
+    def joint_states(self, joints=None):
+        states = {joint: self.joint_state(joint) for joint in joints or ()}
+        # joint_state names parents by their shortest unique path, give the parents that
+        # are being read the name they were asked for
+        names = {self._handles[joint].dag_path.partialPathName(): joint for joint in states}
+        for state in states.values():
+            state.parent = names.get(state.parent, state.parent)
+        return states
+
+    def set_keys(self, curves=None):
+        if self.oma is None:
+            import maya.api.OpenMayaAnim as oma
+            self.oma = oma
+        operation = _CurveKeys(self.om, self.oma, {
+            (joint, channel): (self._handles[joint].plugs[CHANNEL_ATTRIBUTES[channel]],
+                               channel in CHANNELS[3:], frames, values)
+            for (joint, channel), (frames, values) in (curves or {}).items()})
+        try:
+            self._run(operation)
+        except RuntimeError as error:
+            return {joint: str(error).strip() for joint, _ in curves}
+        return operation.failures
+
+    def undo(self):
+        """
+        Undo the last step of the undo queue, such as the last pose that was applied
+        or the last keys that were set
+
+        :return: The success of the operation
+        :type: bool
+        """
+        self.cmds.undo()
+        return True
+
+    def undo_chunk(self, name=None):
+        return _undo_chunk(self.cmds, name)
+
+    @contextmanager
+    def without_undo(self):
+        undoable, self._undoable = self._undoable, False
+        try:
+            with _without_undo(self.cmds):
+                yield
+        finally:
+            self._undoable = undoable
+
+    def joint_state(self, joint=None):
+        """
+        Read what the solver needs to know about a joint that has been verified
+
+        :param joint: The name of the joint
+        :type: str
+
+        :return: The state of the joint
+        :type: td_maya_tools.pose_solver.JointState
+        """
+        handle = self._handles[joint]
+        plugs = handle.plugs
+        values = [plugs[plug].asMAngle().asDegrees() for plug in self._state_plugs[:6]]
+        parent_path = self.om.MDagPath(handle.dag_path)
+        parent_path.pop()
+        parent = parent_path.partialPathName() if parent_path.length() else None
+        return pose_solver.JointState(
+            name=joint, parent=parent,
+            world=self._flatten(handle.dag_path.inclusiveMatrix()),
+            parent_world=self._flatten(handle.dag_path.exclusiveMatrix()),
+            joint_orient=values[:3], rotate_axis=values[3:],
+            rotate_order=pose_solver.ROTATE_ORDERS[plugs['rotateOrder'].asInt()])
+
+    def _find(self, node=None):
+        """
+        Look a node up, reusing the cached handle while the node is still alive
+
+        :return: True if the node is a joint, or the reason it is not
+        :type: bool or str
+        """
+        cached = self._handles.get(node)
+        if (cached is not None and cached.handle.isValid() and cached.handle.isAlive()
+                and node in (cached.dag_path.partialPathName(),
+                             cached.dag_path.fullPathName())):
+            return True
+        self._handles.pop(node, None)
+
+        selection = self.om.MSelectionList()
+        try:
+            selection.add(node)
+        except RuntimeError:
+            return 'does not exist'
+        mobject = selection.getDependNode(0)
+        if not mobject.hasFn(self.om.MFn.kJoint):
+            return 'not a joint'
+        transform_fn = self.om.MFnTransform(selection.getDagPath(0))
+        plugs = {plug: transform_fn.findPlug(plug, False)
+                 for plug in self._channel_plugs + self._state_plugs}
+        self._handles[node] = _JointHandle(self.om.MObjectHandle(mobject),
+                                           selection.getDagPath(0), transform_fn, plugs)
+        return True
+
+    @staticmethod
+    def _flatten(matrix=None):
+        """
+        Convert an MMatrix into a flat list of 16 values
+        """
+        return [matrix.getElement(row, column) for row in range(4) for column in range(4)]
+
+
+class _CurveKeys(object):
+    """
+    Keys whole animation curves, making the curves that are not there yet with one
+    MDGModifier first. Can be undone and done again, so it can go through the undoable
+    command of td_maya_tools.poser_commands.
+    """
+    def __init__(self, om=None, oma=None, curves=None):
+        """
+        :param om: The maya.api.OpenMaya module
+        :type: module
+
+        :param oma: The maya.api.OpenMayaAnim module
+        :type: module
+
+        :param curves: A dictionary of (joint name, channel) to the plug of the
+                       channel, whether it is a rotation, and the frames and values
+                       of its keys, in degrees for rotations
+        :type: dict
+        """
+        self.om = om
+        self.oma = oma
+        self.curves = curves
+        self.failures = {}
+        self.modifier = None
+        self.change = None
+
+    def doIt(self):
+        if self.modifier is not None:
+            # done again after an undo
+            self.modifier.doIt()
+            self.change.redoIt()
+            return
+        self.modifier = self.om.MDGModifier()
+        self.change = self.oma.MAnimCurveChange()
+        curve_fns = {}
+        for key, (plug, is_rotation, _, _) in self.curves.items():
+            curve_fn = self.oma.MFnAnimCurve()
+            sources = plug.connectedTo(True, False)
+            if sources and sources[0].node().hasFn(self.om.MFn.kAnimCurve):
+                curve_fn.setObject(sources[0].node())
+            else:
+                curve_type = (self.oma.MFnAnimCurve.kAnimCurveTA if is_rotation
+                              else self.oma.MFnAnimCurve.kAnimCurveTL)
+                curve_fn.create(plug, curve_type, self.modifier)
+            curve_fns[key] = curve_fn
+        self.modifier.doIt()
+
+        unit = self.om.MTime.uiUnit()
+        for (joint, channel), curve_fn in curve_fns.items():
+            _, is_rotation, frames, values = self.curves[joint, channel]
+            if is_rotation:
+                values = [math.radians(value) for value in values]
+            times = self.om.MTimeArray([self.om.MTime(frame, unit) for frame in frames])
+            instrumentation.count('openmaya.MFnAnimCurve.addKeys')
+            try:
+                # keep the keys on other frames, the ones on these frames are replaced
+                curve_fn.addKeys(times, self.om.MDoubleArray(values),
+                                 self.oma.MFnAnimCurve.kTangentAuto,
+                                 self.oma.MFnAnimCurve.kTangentAuto, True, self.change)
+            except RuntimeError as error:
+                self.failures[joint] = str(error).strip()
+
+    def undoIt(self):
+        self.change.undoIt()
+        self.modifier.undoIt()
+
+
+class _JointHandle(object):
+    """
+    Everything the OpenMaya backend keeps about a joint between poses.
+    """
+    __slots__ = ('handle', 'dag_path', 'transform_fn', 'plugs')
+
+    def __init__(self, handle=None, dag_path=None, transform_fn=None, plugs=None):
+        self.handle = handle
+        self.dag_path = dag_path
+        self.transform_fn = transform_fn
+        self.plugs = plugs
+
+
+# the backends that can be chosen by name
+BACKENDS = {CmdsBackend.name: CmdsBackend,
+            LocalCmdsBackend.name: LocalCmdsBackend,
+            OpenMayaBackend.name: OpenMayaBackend}
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Blend several poses together with weights.
+
+:description:
+    A PoseStack holds the channels of a few poses for the same joints in NumPy
+    arrays, with the rotations converted to quaternions once. Every blend after that
+    is a handful of array operations over all of the joints at once, fast enough to
+    run on every step of a slider drag.
+    Translations are mixed linearly. Rotations are mixed with a normalized weighted sum
+    of the quaternions (nlerp), or with slerp when going between two poses. A channel
+    that is not set in a pose leaves that pose out of the mix for the channel, and the
+    weights of the other poses are scaled up to make up for it. A rotation counts as
+    set only when all three of its axes are set.
+    Euler angles are in degrees, in the rotate order of each joint, the same values
+    that poses store.
+    Contains the following functions:
+        euler_to_quaternions
+        quaternions_to_euler
+        blend_poses
+        interpolate_poses
+    Contains the following classes:
+        PoseStack
+
+:applications:
+    None, requires NumPy
+
+:see_also:
+    td_maya_tools.pose
+    td_maya_tools.pose_solver
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from array import array
+import numpy as np
+
+# Imports That You Wrote
+from td_maya_tools.pose import Pose, CHANNELS
+from td_maya_tools.pose_solver import ROTATE_ORDERS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+BLEND_METHODS = ('nlerp', 'slerp')
+_AXES = {'x': 0, 'y': 1, 'z': 2}
+# below this the two rotations of a slerp are too close for the sine to be divided by
+_SLERP_EPSILON = 1e-6
+
+
+def euler_to_quaternions(angles=None, orders=None):
+    """
+    Convert euler rotations into quaternions
+
+    :param angles: The x, y and z angles in degrees, in an array of shape (..., N, 3)
+    :type: numpy.ndarray
+
+    :param orders: The index of the rotate order of each of the N rotations, see
+                   td_maya_tools.pose_solver.ROTATE_ORDERS. Defaults to xyz
+    :type: numpy.ndarray
+
+    :return: The w, x, y, z quaternions, in an array of shape (..., N, 4)
+    :type: numpy.ndarray
+    """
+    angles = np.radians(np.asarray(angles, dtype=float)) * 0.5
+    orders = _orders_array(orders, angles.shape[-2])
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    quaternions = np.empty(angles.shape[:-1] + (4,))
+    for order_index in np.unique(orders):
+        columns = orders == order_index
+        result = None
+        # the first axis of the order is applied first, so it is the rightmost factor
+        for axis in ROTATE_ORDERS[order_index]:
+            axis_index = _AXES[axis]
+            factor = np.zeros(angles[..., columns, :].shape[:-1] + (4,))
+            factor[..., 0] = cos[..., columns, axis_index]
+            factor[..., axis_index + 1] = sin[..., columns, axis_index]
+            result = factor if result is None else _multiply(factor, result)
+        quaternions[..., columns, :] = result
+    return quaternions
+
+
+def quaternions_to_euler(quaternions=None, orders=None):
+    """
+    Convert quaternions into euler rotations, the inverse of euler_to_quaternions
+
+    :param quaternions: The w, x, y, z quaternions, in an array of shape (..., N, 4)
+    :type: numpy.ndarray
+
+    :param orders: The index of the rotate order of each of the N rotations
+    :type: numpy.ndarray
+
+    :return: The x, y and z angles in degrees, in an array of shape (..., N, 3)
+    :type: numpy.ndarray
+    """
+    quaternions = np.asarray(quaternions, dtype=float)
+    orders = _orders_array(orders, quaternions.shape[-2])
+    col = _rotation_matrices(quaternions)
+    angles = np.empty(quaternions.shape[:-1] + (3,))
+    # the same decomposition as td_maya_tools.pose_solver.matrix_to_euler
+    for order_index in np.unique(orders):
+        columns = orders == order_index
+        i, j, k = (_AXES[axis] for axis in ROTATE_ORDERS[order_index])
+        sign = 1.0 if (j - i) % 3 == 1 else -1.0
+        matrix = col[..., columns, :, :]
+        first = np.arctan2(sign * matrix[..., k, j], matrix[..., k, k])
+        second = np.arcsin(np.clip(-sign * matrix[..., k, i], -1.0, 1.0))
+        third = np.arctan2(sign * matrix[..., j, i], matrix[..., i, i])
+        # gimbal lock, put all of the rotation on the first axis
+        locked = np.abs(matrix[..., k, i]) > 0.9999999
+        third = np.where(locked, 0.0, third)
+        first = np.where(locked, np.arctan2(-sign * matrix[..., j, k], matrix[..., j, j]),
+                         first)
+        angles[..., columns, i] = first
+        angles[..., columns, j] = second
+        angles[..., columns, k] = third
+    return np.degrees(angles)
+
+
+def blend_poses(poses=None, weights=None, rotate_orders=None, name=None):
+    """
+    Mix several poses with weights
+
+    :param poses: The poses to mix
+    :type: list
+
+    :param weights: The weight of each pose, they do not need to add up to one
+    :type: list
+
+    :param rotate_orders: A dictionary of joint names to their rotate order, such as
+                          xyz. Defaults to xyz
+    :type: dict
+
+    :param name: The name of the blended pose
+    :type: str
+
+    :return: The blended pose
+    :type: td_maya_tools.pose.Pose
+    """
+    return PoseStack(poses, rotate_orders=rotate_orders).blend(weights, name=name)
+
+
+def interpolate_poses(start=None, end=None, amount=0.0, rotate_orders=None,
+                      method='slerp', name=None):
+    """
+    Go part of the way from one pose to another
+
+    :param start: The pose at 0
+    :type: td_maya_tools.pose.Pose
+
+    :param end: The pose at 1
+    :type: td_maya_tools.pose.Pose
+
+    :param amount: How far to go, from 0 to 1
+    :type: float
+
+    :param rotate_orders: A dictionary of joint names to their rotate order
+    :type: dict
+
+    :param method: How rotations are mixed, see BLEND_METHODS
+    :type: str
+
+    :param name: The name of the pose
+    :type: str
+
+    :return: The pose in between
+    :type: td_maya_tools.pose.Pose
+    """
+    stack = PoseStack((start, end), rotate_orders=rotate_orders)
+    return stack.interpolate(amount, method=method, name=name)
+
+
+def _orders_array(orders=None, size=0):
+    """
+    :return: The rotate order indices as an array, all xyz when none are given
+    :type: numpy.ndarray
+    """
+    if orders is None:
+        return np.zeros(size, dtype=int)
+    return np.asarray(orders, dtype=int)
+
+
+def _multiply(a=None, b=None):
+    """
+    :return: The Hamilton products of two arrays of quaternions
+    :type: numpy.ndarray
+    """
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack((aw * bw - ax * bx - ay * by - az * bz,
+                     aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw), axis=-1)
+
+
+def _rotation_matrices(quaternions=None):
+    """
+    :return: The column vector rotation matrices of unit quaternions, shape (..., 3, 3)
+    :type: numpy.ndarray
+    """
+    w, x, y, z = np.moveaxis(quaternions, -1, 0)
+    return np.stack((
+        np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)), -1),
+        np.stack((2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)), -1),
+        np.stack((2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)), -1),
+    ), -2)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseStack(object):
+    """
+    The channels of several poses for the same joints, ready to be blended.
+    """
+    def __init__(self, poses=None, joints=None, rotate_orders=None):
+        """
+        :param poses: The poses to blend
+        :type: list
+
+        :param joints: The joints to blend. Defaults to every joint in any of the poses
+        :type: list
+
+        :param rotate_orders: A dictionary of joint names to their rotate order, such as
+                              xyz. Defaults to xyz
+        :type: dict
+        """
+        self.poses = list(poses or ())
+        if joints is None:
+            joints = {}
+            for pose in self.poses:
+                joints.update(dict.fromkeys(pose.joints))
+        self.joints = tuple(joints)
+        self._index = {joint: i for i, joint in enumerate(self.joints)}
+        rotate_orders = rotate_orders or {}
+        self.orders = np.array([ROTATE_ORDERS.index(rotate_orders.get(joint, 'xyz'))
+                                for joint in self.joints], dtype=int)
+
+        values = np.full((len(self.poses), len(self.joints), len(CHANNELS)), np.nan)
+        for position, pose in enumerate(self.poses):
+            if pose.joints == self.joints:
+                values[position] = np.frombuffer(pose.values, dtype=float).reshape(
+                    len(self.joints), len(CHANNELS))
+                continue
+            for joint in pose.joints:
+                if joint in self._index:
+                    values[position, self._index[joint]] = pose.channels(joint)
+
+        self.translation_set = ~np.isnan(values[..., :3])
+        self.translations = np.where(self.translation_set, values[..., :3], 0.0)
+        self.rotation_set = ~np.isnan(values[..., 3:]).any(axis=-1)
+        rotations = np.where(self.rotation_set[..., None], values[..., 3:], 0.0)
+        self.quaternions = euler_to_quaternions(rotations, self.orders)
+        if len(self.poses):
+            # q and -q are the same rotation, flip every quaternion into the same half
+            # as the first pose that sets it, so that mixing takes the short way round
+            reference = self.quaternions[np.argmax(self.rotation_set, axis=0),
+                                         np.arange(len(self.joints))]
+            flip = np.einsum('pjc,jc->pj', self.quaternions, reference) < 0.0
+            self.quaternions[flip] *= -1.0
+
+    def __len__(self):
+        return len(self.poses)
+
+    def blend(self, weights=None, name=None):
+        """
+        Mix the poses with a weighted sum, the rotations with nlerp
+
+        :param weights: The weight of each pose, they do not need to add up to one
+        :type: list
+
+        :param name: The name of the blended pose
+        :type: str
+
+        :return: The blended pose
+        :type: td_maya_tools.pose.Pose
+        """
+        weights = np.asarray(weights, dtype=float)
+        if weights.shape != (len(self.poses),):
+            raise ValueError(f'Expected {len(self.poses)} weights, got {weights.size}')
+
+        translation_weights = weights[:, None, None] * self.translation_set
+        totals = translation_weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            translations = (translation_weights * self.translations).sum(axis=0) / totals
+        translations[totals == 0.0] = np.nan
+
+        rotation_weights = weights[:, None] * self.rotation_set
+        quaternions = (rotation_weights[..., None] * self.quaternions).sum(axis=0)
+        return self._pose(translations, quaternions, name)
+
+    def interpolate(self, amount=0.0, method='slerp', name=None):
+        """
+        Go part of the way from the first pose of the stack to the second
+
+        :param amount: How far to go, from 0 to 1
+        :type: float
+
+        :param method: How rotations are mixed, see BLEND_METHODS
+        :type: str
+
+        :param name: The name of the pose
+        :type: str
+
+        :return: The pose in between
+        :type: td_maya_tools.pose.Pose
+        """
+        if len(self.poses) != 2:
+            raise ValueError(f'Interpolating needs 2 poses, the stack has {len(self.poses)}')
+        if method not in BLEND_METHODS:
+            raise ValueError(f'Unknown blend method {method}, expected one of '
+                             f'{", ".join(BLEND_METHODS)}')
+        pose = self.blend((1.0 - amount, amount), name=name)
+        if method == 'nlerp':
+            return pose
+
+        # only joints rotated in both poses are slerped, the others keep what blend did
+        both = self.rotation_set.all(axis=0)
+        start, end = self.quaternions[0, both], self.quaternions[1, both]
+        dot = np.clip(np.einsum('jc,jc->j', start, end), -1.0, 1.0)
+        angle = np.arccos(dot)
+        sin = np.sin(angle)
+        close = sin < _SLERP_EPSILON
+        sin[close] = 1.0
+        start_weight = np.where(close, 1.0 - amount, np.sin((1.0 - amount) * angle) / sin)
+        end_weight = np.where(close, amount, np.sin(amount * angle) / sin)
+        quaternions = start_weight[:, None] * start + end_weight[:, None] * end
+
+        values = np.frombuffer(pose.values, dtype=float).reshape(
+            len(self.joints), len(CHANNELS))
+        values[both, 3:] = self._euler(quaternions, self.orders[both])
+        return pose
+
+    def _pose(self, translations=None, quaternions=None, name=None):
+        """
+        Turn blended translations and unnormalized quaternions into a pose
+        """
+        values = np.empty((len(self.joints), len(CHANNELS)))
+        values[:, :3] = translations
+        values[:, 3:] = self._euler(quaternions, self.orders)
+        return Pose(name, self.joints, array('d', values.ravel().tobytes()), self._index)
+
+    @staticmethod
+    def _euler(quaternions=None, orders=None):
+        """
+        Normalize quaternions and convert them to euler angles, NaN where they are zero
+        """
+        lengths = np.linalg.norm(quaternions, axis=-1)
+        unset = lengths < _SLERP_EPSILON
+        lengths[unset] = 1.0
+        angles = quaternions_to_euler(quaternions / lengths[:, None], orders)
+        angles[unset] = np.nan
+        return angles
@@ -0,0 +1,528 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Compile pose xml files into binary caches that load without parsing.
+
+:description:
+    A pose cache sits next to its xml file and holds a table of joint names, a table
+    of poses sorted by name and one block of channel values as doubles. Loading a cache
+    maps the file into memory and only reads its header, a pose is found in the tables
+    with a binary search and read when it is looked up. The channels of the xml file
+    whose value is not a number are kept with each pose, so the library can be checked
+    without scanning the file again. The cache records the modified time, size and
+    hash of the xml file it was made from, and is rebuilt when the xml file has
+    changed.
+    Caches for a whole library folder can be built ahead of time with
+        python -m td_maya_tools.pose_cache <library folder>
+    Contains the following functions:
+        load_pose_library
+        write_pose_cache
+        open_pose_cache
+        build_library_caches
+        main
+    Contains the following classes:
+        PoseCache
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.xml_utils
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from array import array
+from collections.abc import Mapping
+import argparse
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation, xml_utils
+from td_maya_tools.pose import Pose, CHANNELS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+logger = logging.getLogger(__name__)
+
+CACHE_EXTENSION = '.posecache'
+CACHE_VERSION = 3
+# magic, version, source mtime in ns, source size, source sha1, joint count, pose count,
+# offsets of the joint table, the pose table, the poses sorted by name and the channel
+# values, and the number of channel values
+_HEADER = struct.Struct('<4sHxxqQ20sIIQQQQQ')
+_MAGIC = b'TDPC'
+# offset of the utf-8 name, its length in bytes
+_NAME_ENTRY = struct.Struct('<QI')
+# offset of the name, its length, joint count, offset of the joint ids, index of the
+# first value, number of joints with values that are not numbers, offset of those joints
+_POSE_ENTRY = struct.Struct('<QIIQQIQ')
+_POSITION = struct.Struct('<I')
+# position of a joint in its pose, one bit per channel whose value is not a number
+_FLAG = struct.Struct('<IB')
+
+
+@instrumentation.timed('pose_cache.load_pose_library')
+def load_pose_library(path=None, cache_path=None):
+    """
+    Load the poses of an xml file through its cache. The xml file is only parsed when
+    it has changed since the cache was made, and the cache is then rebuilt.
+
+    :param path: Full path to the xml file
+    :type: str
+
+    :param cache_path: Full path to the cache. Defaults to the xml path with the
+                       .posecache extension added
+    :type: str
+
+    :return: A mapping of pose names to poses
+    :type: PoseCache or dict
+    """
+    if not path or not os.path.isfile(path):
+        return xml_utils.read_pose_xml(path)
+    cache_path = cache_path or path + CACHE_EXTENSION
+    source_stat = os.stat(path)
+
+    cache = open_pose_cache(cache_path)
+    digest = None
+    if cache is not None:
+        if cache.matches(source_stat):
+            return cache
+        # the file was touched, it only needs rebuilding if its content changed
+        digest = file_digest(path)
+        cache.close()
+        if digest == cache.digest:
+            _update_cache_stat(cache_path, source_stat)
+            return open_pose_cache(cache_path)
+
+    pose_dict = xml_utils.read_pose_xml(path)
+    if pose_dict is None:
+        return None
+    try:
+        write_pose_cache(pose_dict, cache_path, source_stat, digest or file_digest(path),
+                         xml_utils.find_non_numeric_channels(path))
+    except OSError as error:
+        # a read only library still loads, it just can not be cached
+        logger.warning(f'Could not write the pose cache {cache_path}: {error}')
+    return pose_dict
+
+
+def write_pose_cache(pose_dict=None, cache_path=None, source_stat=None, digest=None,
+                     non_numeric=None):
+    """
+    Write poses into a cache file. The file is written next to the cache and moved in
+    place once it is complete, so readers never see half a cache.
+
+    :param pose_dict: A mapping of pose names to poses
+    :type: dict
+
+    :param cache_path: Full path to the cache
+    :type: str
+
+    :param source_stat: The os.stat of the xml file the poses were read from
+    :type: os.stat_result
+
+    :param digest: The sha1 of the xml file the poses were read from
+    :type: bytes
+
+    :param non_numeric: The channels of the xml file whose value is not a number, see
+                        td_maya_tools.xml_utils.find_non_numeric_channels
+    :type: dict
+
+    :return: The path to the cache
+    :type: str
+    """
+    names = bytearray()
+    joint_ids = {}
+    # (name offset, length) of every joint, and (name offset, length, joint count,
+    # index of the first joint id, index of the first value) of every pose, with the
+    # offsets into names
+    joint_entries = []
+    pose_entries = []
+    pose_names = []
+    ids = array('I')
+    values = array('d')
+    flags = bytearray()
+    non_numeric = non_numeric or {}
+    for name, pose in pose_dict.items():
+        first_id = len(ids)
+        for joint in pose.joints:
+            if joint not in joint_ids:
+                joint_ids[joint] = len(joint_ids)
+                joint_entries.append(_add_name(names, joint))
+            ids.append(joint_ids[joint])
+        first_flag = len(flags)
+        flagged = non_numeric.get(name, {})
+        for position, joint in enumerate(pose.joints):
+            if joint in flagged:
+                mask = sum(1 << CHANNELS.index(channel) for channel in flagged[joint])
+                flags += _FLAG.pack(position, mask)
+        pose_names.append(name.encode('utf-8'))
+        pose_entries.append(_add_name(names, name) + (
+            len(pose.joints), first_id, len(values),
+            (len(flags) - first_flag) // _FLAG.size, first_flag))
+        values.extend(pose.values)
+
+    joint_table_offset = _HEADER.size
+    pose_table_offset = joint_table_offset + len(joint_entries) * _NAME_ENTRY.size
+    order_offset = pose_table_offset + len(pose_entries) * _POSE_ENTRY.size
+    flags_offset = order_offset + len(pose_entries) * _POSITION.size
+    names_offset = flags_offset + len(flags)
+    ids_offset = names_offset + len(names)
+    values_offset = ids_offset + len(ids) * ids.itemsize
+    padding = -values_offset % values.itemsize
+    values_offset += padding
+
+    tables = bytearray()
+    for offset, length in joint_entries:
+        tables += _NAME_ENTRY.pack(names_offset + offset, length)
+    for offset, length, count, first_id, first_value, flag_count, first_flag \
+            in pose_entries:
+        tables += _POSE_ENTRY.pack(names_offset + offset, length, count,
+                                   ids_offset + first_id * ids.itemsize, first_value,
+                                   flag_count, flags_offset + first_flag)
+    # the positions of the poses in the pose table, sorted by name to be searched
+    for position in sorted(range(len(pose_names)), key=pose_names.__getitem__):
+        tables += _POSITION.pack(position)
+    tables += flags
+    tables += names
+    if sys.byteorder != 'little':
+        ids.byteswap()
+        values.byteswap()
+
+    header = _HEADER.pack(_MAGIC, CACHE_VERSION, source_stat.st_mtime_ns,
+                          source_stat.st_size, digest, len(joint_entries),
+                          len(pose_entries), joint_table_offset, pose_table_offset,
+                          order_offset, values_offset, len(values))
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'wb') as cache_fh:
+            cache_fh.write(header)
+            cache_fh.write(tables)
+            ids.tofile(cache_fh)
+            cache_fh.write(b'\0' * padding)
+            values.tofile(cache_fh)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return cache_path
+
+
+def open_pose_cache(cache_path=None):
+    """
+    Open a cache file
+
+    :param cache_path: Full path to the cache
+    :type: str
+
+    :return: The cache, None if there is no cache or it can not be read
+    :type: PoseCache
+    """
+    if not cache_path or not os.path.isfile(cache_path):
+        return None
+    try:
+        return PoseCache(cache_path)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def build_library_caches(library_dir=None, force=False):
+    """
+    Build or refresh the caches of every xml file in a folder
+
+    :param library_dir: The folder containing the xml files
+    :type: str
+
+    :param force: Rebuild caches that are already up to date
+    :type: bool
+
+    :return: A dictionary of xml paths to the error raised while caching them, None
+             for the files that were cached
+    :type: dict
+    """
+    results = {}
+    for file_name in sorted(os.listdir(library_dir)):
+        if not file_name.endswith('.xml'):
+            continue
+        path = os.path.join(library_dir, file_name)
+        cache_path = path + CACHE_EXTENSION
+        try:
+            if force and os.path.exists(cache_path):
+                os.remove(cache_path)
+            library = load_pose_library(path)
+            if library is None:
+                raise ValueError('the file could not be read')
+            if isinstance(library, PoseCache):
+                library.close()
+            results[path] = None
+        except Exception as error:
+            results[path] = error
+    return results
+
+
+def file_digest(path=None):
+    """
+    :return: The sha1 of a file
+    :type: bytes
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file_fh:
+        for chunk in iter(lambda: file_fh.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.digest()
+
+
+def main(argv=None):
+    """
+    Build the pose caches of a library folder from the command line
+
+    :param argv: The command line arguments, defaults to sys.argv
+    :type: list
+
+    :return: The exit code, 1 if any file failed
+    :type: int
+    """
+    parser = argparse.ArgumentParser(
+        description='Build the binary pose caches of a pose library folder.')
+    parser.add_argument('library_dir', help='Folder containing the pose xml files')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild caches that are already up to date')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.library_dir):
+        parser.error(f'{args.library_dir} is not a folder')
+    results = build_library_caches(args.library_dir, args.force)
+    for path, error in results.items():
+        if error is None:
+            print(f'cached {path}')
+        else:
+            print(f'failed {path}: {error}', file=sys.stderr)
+    return 1 if any(results.values()) else 0
+
+
+def _add_name(names=None, name=None):
+    """
+    Add the utf-8 bytes of a name to the names of a cache
+
+    :return: The offset of the name in the names and its length in bytes
+    :type: tuple
+    """
+    data = name.encode('utf-8')
+    names += data
+    return len(names) - len(data), len(data)
+
+
+def _update_cache_stat(cache_path=None, source_stat=None):
+    """
+    Record a new modified time and size for the xml file of an up to date cache
+    """
+    with open(cache_path, 'r+b') as cache_fh:
+        header = list(_HEADER.unpack(cache_fh.read(_HEADER.size)))
+        header[2] = source_stat.st_mtime_ns
+        header[3] = source_stat.st_size
+        cache_fh.seek(0)
+        cache_fh.write(_HEADER.pack(*header))
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseCache(Mapping):
+    """
+    A read only mapping over the poses of a cache file. The file is memory mapped and
+    only its header is read when it is opened, a pose is found with a binary search
+    over the poses sorted by name and its values are read when it is looked up.
+    """
+    def __init__(self, cache_path=None):
+        """
+        :param cache_path: Full path to the cache
+        :type: str
+        """
+        self.path = cache_path
+        with open(cache_path, 'rb') as cache_fh:
+            self._buffer = mmap.mmap(cache_fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.source_mtime_ns, self.source_size, self.digest,
+             self.joint_count, self.pose_count, self._joint_table_offset,
+             self._pose_table_offset, self._order_offset, self._values_offset,
+             value_count) = _HEADER.unpack_from(self._buffer)
+        except struct.error:
+            self.close()
+            raise ValueError(f'{cache_path} is not a pose cache')
+        if magic != _MAGIC or version != CACHE_VERSION:
+            self.close()
+            raise ValueError(f'{cache_path} is not a version {CACHE_VERSION} pose cache')
+        if len(self._buffer) != self._values_offset + value_count * 8:
+            self.close()
+            raise ValueError(f'{cache_path} is not complete')
+        # the names and positions found so far
+        self._joint_names = {}
+        self._positions = {}
+        self._joint_tables = {}
+
+    def __getitem__(self, pose):
+        position = self._find(pose)
+        if position is None:
+            raise KeyError(pose)
+        _, _, count, ids_offset, first_value, _, _ = self._pose_entry(position)
+        joints, index = self._joint_table(count, ids_offset)
+
+        start = self._values_offset + first_value * 8
+        values = array('d')
+        values.frombytes(self._buffer[start:start + count * len(CHANNELS) * 8])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        return Pose(pose, joints, values, index)
+
+    def __iter__(self):
+        for position in range(self.pose_count):
+            name_offset, length = self._pose_entry(position)[:2]
+            yield self._name(name_offset, length)
+
+    def __len__(self):
+        return self.pose_count
+
+    def __contains__(self, pose):
+        return self._find(pose) is not None
+
+    def pose_joints(self, pose=None):
+        """
+        :param pose: The name of a pose
+        :type: str
+
+        :return: The joints of a pose, without reading its values
+        :type: tuple
+        """
+        position = self._find(pose)
+        if position is None:
+            raise KeyError(pose)
+        _, _, count, ids_offset, _, _, _ = self._pose_entry(position)
+        return self._joint_table(count, ids_offset)[0]
+
+    def non_numeric(self, pose=None):
+        """
+        :param pose: The name of a pose
+        :type: str
+
+        :return: A dictionary of the joints of the pose to the names of their channels
+                 whose value is not a number in the xml file
+        :type: dict
+        """
+        position = self._find(pose)
+        if position is None:
+            raise KeyError(pose)
+        _, _, count, ids_offset, _, flag_count, flags_offset = self._pose_entry(position)
+        if not flag_count:
+            return {}
+        joints = self._joint_table(count, ids_offset)[0]
+        found = {}
+        for joint_position, mask in _FLAG.iter_unpack(
+                self._buffer[flags_offset:flags_offset + flag_count * _FLAG.size]):
+            found[joints[joint_position]] = tuple(
+                channel for bit, channel in enumerate(CHANNELS) if mask & 1 << bit)
+        return found
+
+    def matches(self, source_stat=None):
+        """
+        :param source_stat: The os.stat of the xml file
+        :type: os.stat_result
+
+        :return: Whether the xml file has the modified time and size of the cache
+        :type: bool
+        """
+        return (source_stat.st_mtime_ns == self.source_mtime_ns
+                and source_stat.st_size == self.source_size)
+
+    def close(self):
+        """
+        Release the memory map
+        """
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+
+    def _find(self, pose=None):
+        """
+        :return: The position of a pose in the pose table, None if it is not there
+        :type: int
+        """
+        position = self._positions.get(pose)
+        if position is not None or not isinstance(pose, str):
+            return position
+        target = pose.encode('utf-8')
+        low, high = 0, self.pose_count
+        while low < high:
+            middle = (low + high) // 2
+            candidate, = _POSITION.unpack_from(
+                self._buffer, self._order_offset + middle * _POSITION.size)
+            name_offset, length = self._pose_entry(candidate)[:2]
+            name = self._buffer[name_offset:name_offset + length]
+            if name == target:
+                self._positions[pose] = candidate
+                return candidate
+            if name < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _pose_entry(self, position=0):
+        """
+        :return: The name offset, name length, joint count, offset of the joint ids,
+                 index of the first value, number of flagged joints and offset of the
+                 flags of the pose at a position of the pose table
+        :type: tuple
+        """
+        return _POSE_ENTRY.unpack_from(
+            self._buffer, self._pose_table_offset + position * _POSE_ENTRY.size)
+
+    def _joint_table(self, count=0, ids_offset=0):
+        """
+        :return: The joint names of a pose and their index. Poses with the same joints
+                 share them
+        :type: tuple
+        """
+        ids = self._buffer[ids_offset:ids_offset + count * 4]
+        if ids not in self._joint_tables:
+            joints = tuple(self._joint_name(i) for i in struct.unpack(f'<{count}I', ids))
+            self._joint_tables[ids] = (joints, {joint: i for i, joint in enumerate(joints)})
+        return self._joint_tables[ids]
+
+    def _joint_name(self, joint_id=0):
+        """
+        :return: The name of a joint of the joint table
+        :type: str
+        """
+        name = self._joint_names.get(joint_id)
+        if name is None:
+            name_offset, length = _NAME_ENTRY.unpack_from(
+                self._buffer, self._joint_table_offset + joint_id * _NAME_ENTRY.size)
+            name = self._joint_names[joint_id] = self._name(name_offset, length)
+        return name
+
+    def _name(self, offset=0, length=0):
+        """
+        :return: The name stored at an offset of the file
+        :type: str
+        """
+        return self._buffer[offset:offset + length].decode('utf-8')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Merge the poses of many xml files into one index.
+
+:description:
+    Pose libraries are split into several xml files. build_pose_index loads all of
+    them at the same time with a pool of workers and merges them into a PoseIndex,
+    which remembers the file every pose came from. The index keeps the library of
+    every file and only reads a pose from it when the pose is looked up, poses are
+    only read up front in worker processes, to send them back. When two files have a
+    pose with the same name, the conflict policy decides which one is kept:
+        first - the pose from the file that comes first is kept
+        last  - the pose from the file that comes last is kept
+        error - a ValueError is raised
+    The poses that lose a conflict are kept in their library, so when a file is
+    removed or loaded again, the poses it had are merged again from the other files.
+    Contains the following functions:
+        build_pose_index
+    Contains the following classes:
+        PoseIndex
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.pose_cache
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections.abc import Mapping
+from concurrent import futures
+import logging
+import os
+import sys
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation, pose_cache
+from td_maya_tools.pose import Pose
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_POLICIES = ('first', 'last', 'error')
+
+
+@instrumentation.timed('pose_index.build_pose_index')
+def build_pose_index(paths=None, policy='first', max_workers=None, use_processes=None):
+    """
+    Load several pose xml files at once and merge them into one index. The files are
+    merged in the order they are given, whatever order they finish loading in.
+
+    :param paths: Full paths to the xml files
+    :type: list
+
+    :param policy: What to do with poses that have the same name, see CONFLICT_POLICIES
+    :type: str
+
+    :param max_workers: The number of workers, defaults to the number of cores
+    :type: int
+
+    :param use_processes: Load the files in worker processes rather than threads.
+                          Defaults to processes, except inside an interactive Maya
+                          session where new processes would start Maya itself
+    :type: bool
+
+    :return: The merged poses
+    :type: PoseIndex
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f'Unknown conflict policy {policy}, expected one of '
+                         f'{", ".join(CONFLICT_POLICIES)}')
+    paths = list(paths or ())
+    pose_index = PoseIndex(policy)
+    if not paths:
+        return pose_index
+
+    if len(paths) == 1:
+        libraries = [_load_library(paths[0])]
+    else:
+        if use_processes is None:
+            use_processes = not _in_maya_session()
+        if max_workers is None:
+            max_workers = min(len(paths), os.cpu_count() or 1)
+        if use_processes:
+            executor = futures.ProcessPoolExecutor(max_workers=max_workers)
+            load = _load_poses
+        else:
+            executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+            load = _load_library
+        with executor:
+            libraries = list(executor.map(load, paths))
+
+    for path, poses in zip(paths, libraries):
+        if poses is None:
+            continue
+        pose_index.add_poses(path, poses)
+    return pose_index
+
+
+def _load_library(path=None):
+    """
+    Load the poses of one file without reading them, they are read from the file or
+    its cache when they are looked up
+
+    :return: A mapping of pose names to poses, None if the file could not be read
+    :type: td_maya_tools.pose_cache.PoseCache or dict
+    """
+    return pose_cache.load_pose_library(path)
+
+
+def _load_poses(path=None):
+    """
+    Load the poses of one file into a plain dictionary, so that they can be sent back
+    from a worker process
+
+    :return: A dictionary of pose names to poses, None if the file could not be read
+    :type: dict
+    """
+    library = pose_cache.load_pose_library(path)
+    if library is None:
+        return None
+    poses = dict(library.items())
+    if isinstance(library, pose_cache.PoseCache):
+        library.close()
+    return poses
+
+
+def _close_library(library=None):
+    """
+    Release the memory map of a library loaded from a cache
+    """
+    if isinstance(library, pose_cache.PoseCache):
+        library.close()
+
+
+def _in_maya_session():
+    """
+    :return: Whether this is running inside an interactive Maya rather than mayapy or
+             a plain Python
+    :type: bool
+    """
+    executable = os.path.basename(sys.executable).lower()
+    return executable.startswith('maya') and not executable.startswith('mayapy')
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseIndex(Mapping):
+    """
+    A mapping of pose names to poses gathered from several files. The index keeps the
+    library of each file, a pose is read from the library it was kept from when it is
+    looked up.
+    """
+    def __init__(self, policy='first'):
+        """
+        :param policy: What to do with poses that have the same name, see
+                       CONFLICT_POLICIES
+        :type: str
+        """
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f'Unknown conflict policy {policy}, expected one of '
+                             f'{", ".join(CONFLICT_POLICIES)}')
+        self.policy = policy
+        self.sources = {}
+        # pose name -> the files whose pose of that name was not kept
+        self._dropped = {}
+        self._libraries = {}
+        # the names of the poses of every file, read once as a closed cache can not be
+        self._names = {}
+        self._joint_tables = {}
+
+    def __getitem__(self, pose):
+        return self._libraries[self.sources[pose]][pose]
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __contains__(self, pose):
+        return pose in self.sources
+
+    @property
+    def conflicts(self):
+        """
+        :return: A tuple of the pose name, the file it was kept from and the file it
+                 was not kept from, for every pose that is in more than one file
+        :type: list
+        """
+        return [(name, self.sources[name], dropped)
+                for name, dropped_paths in self._dropped.items()
+                for dropped in dropped_paths]
+
+    def source(self, pose=None):
+        """
+        :param pose: The name of a pose
+        :type: str
+
+        :return: The file the pose came from, None if it is not in the index
+        :type: str
+        """
+        return self.sources.get(pose)
+
+    def pose_joints(self, pose=None):
+        """
+        :param pose: The name of a pose
+        :type: str
+
+        :return: The joints of the pose, without reading its values when it comes from
+                 a cache
+        :type: tuple
+        """
+        library = self._libraries[self.sources[pose]]
+        pose_joints = getattr(library, 'pose_joints', None)
+        return pose_joints(pose) if pose_joints else library[pose].joints
+
+    def non_numeric(self, pose=None):
+        """
+        :param pose: The name of a pose
+        :type: str
+
+        :return: A dictionary of the joints of the pose to the names of their channels
+                 whose value is not a number, as kept in the cache of its file. None
+                 when the file has no cache
+        :type: dict
+        """
+        library = self._libraries[self.sources[pose]]
+        non_numeric = getattr(library, 'non_numeric', None)
+        return non_numeric(pose) if non_numeric else None
+
+    def add_poses(self, path=None, poses=None, policy=None):
+        """
+        Merge the poses of a file into the index. The poses of a file that is already
+        in the index are replaced, and the file keeps its place in the merge order.
+
+        :param path: The file the poses came from
+        :type: str
+
+        :param poses: A mapping of pose names to poses, such as the library of the file.
+                      It is kept and the poses are read from it when they are looked up
+        :type: dict
+
+        :param policy: What to do with poses that are already in the index, see
+                       CONFLICT_POLICIES. Defaults to the policy of the index
+        :type: str
+        """
+        policy = policy or self.policy
+        if policy == 'error':
+            for name in poses:
+                if self.sources.get(name, path) != path:
+                    raise ValueError(f'The pose {name} is in both {self.sources[name]} '
+                                     f'and {path}')
+        if isinstance(poses, dict):
+            # already read, such as the poses sent back from a worker process
+            poses = {name: self._share_joints(pose) for name, pose in poses.items()}
+
+        previous = self._libraries.get(path)
+        previous_names = self._names.get(path, ())
+        self._libraries[path] = poses
+        self._names[path] = names = tuple(poses)
+        if previous is not None:
+            if previous is not poses:
+                _close_library(previous)
+            self._merge(list(dict.fromkeys([*previous_names, *names])), policy)
+            return
+        for name in names:
+            kept = self.sources.get(name)
+            if kept is None:
+                self.sources[name] = path
+                continue
+            dropped = self._dropped.setdefault(name, [])
+            if policy == 'last':
+                kept, dropped_path = path, kept
+                self.sources[name] = path
+            else:
+                dropped_path = path
+            dropped.append(dropped_path)
+            logger.warning(f'The pose {name} is in both {dropped_path} and {kept}, using '
+                           f'the one from {kept}')
+
+    def load_source(self, path=None, policy=None):
+        """
+        Load the poses of a file into the index, replacing the ones it had before
+
+        :param path: Full path to the xml file
+        :type: str
+
+        :param policy: What to do with poses that are already in the index from
+                       another file, see CONFLICT_POLICIES. Defaults to the policy of
+                       the index
+        :type: str
+
+        :return: The names of the poses the file had before and has now
+        :type: list
+        """
+        previous = self._libraries.get(path)
+        names = list(self._names.get(path, ()))
+        # the cache may be rebuilt, and a file that is mapped can not be replaced on
+        # every platform
+        _close_library(previous)
+        try:
+            poses = _load_library(path)
+            if poses is not None:
+                self.add_poses(path, poses, policy)
+        except Exception:
+            self.remove_source(path)
+            raise
+        if poses is None:
+            self.remove_source(path)
+            return names
+        known = set(names)
+        names.extend(name for name in poses if name not in known)
+        return names
+
+    def remove_source(self, path=None):
+        """
+        Remove a file from the index. The poses it had are merged again from the other
+        files that have them
+
+        :param path: The file to remove
+        :type: str
+
+        :return: The names of the poses that came from the file
+        :type: list
+        """
+        library = self._libraries.pop(path, None)
+        if library is None:
+            return []
+        names = self._names.pop(path)
+        removed = [name for name in names if self.sources.get(name) == path]
+        self._merge(names, self.policy)
+        _close_library(library)
+        return removed
+
+    def close(self):
+        """
+        Release the caches of every file, the index is empty afterwards
+        """
+        for library in self._libraries.values():
+            _close_library(library)
+        self._libraries.clear()
+        self._names.clear()
+        self.sources.clear()
+        self._dropped.clear()
+
+    def _merge(self, names=None, policy=None):
+        """
+        Choose again the file every one of the names is kept from, out of all the files
+        that have it
+        """
+        for name in names:
+            found = [path for path, library in self._libraries.items() if name in library]
+            if not found:
+                self.sources.pop(name, None)
+                self._dropped.pop(name, None)
+                continue
+            kept = found[-1] if policy == 'last' else found[0]
+            dropped = [path for path in found if path != kept]
+            known = self._dropped.get(name, ())
+            for dropped_path in dropped:
+                if dropped_path not in known:
+                    logger.warning(f'The pose {name} is in both {dropped_path} and '
+                                   f'{kept}, using the one from {kept}')
+            self.sources[name] = kept
+            if dropped:
+                self._dropped[name] = dropped
+            else:
+                self._dropped.pop(name, None)
+
+    def _share_joints(self, pose=None):
+        """
+        Poses coming back from worker processes each have their own copy of their joint
+        names, give poses with the same joints the same table again
+        """
+        joints, index = self._joint_tables.setdefault(
+            pose.joints, (pose.joints, {joint: i for i, joint in enumerate(pose.joints)}))
+        if pose.joints is joints:
+            return pose
+        return Pose(pose.name, joints, pose.values, index)
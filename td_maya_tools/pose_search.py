@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Find the poses of a library that are closest to a given pose.
+
+:description:
+    PoseSearchIndex turns every pose of a library into a row of a NumPy matrix, with
+    the channels of the joints in a fixed order. Each joint gives its translation and
+    the nine values of its rotation matrix, so rotations compare the same whatever
+    euler angles they were saved with. A query only looks at the joints and channels
+    set in the query pose, and the distance is the root mean square of the
+    differences over the channels set in both poses.
+    When SciPy is available and the columns of a query are set in every pose, the
+    query goes through a KD-tree built for those columns and kept for the next query,
+    otherwise through a single pass over the whole matrix.
+    Contains the following classes:
+        PoseSearchIndex
+
+:applications:
+    None, requires NumPy, uses SciPy when it is available
+
+:see_also:
+    td_maya_tools.pose_blend
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections import OrderedDict
+from collections.abc import Mapping
+import numpy as np
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Imports That You Wrote
+from td_maya_tools.pose import CHANNELS
+from td_maya_tools.pose_blend import euler_to_quaternions
+from td_maya_tools.pose_solver import ROTATE_ORDERS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# a translation followed by a flattened rotation matrix
+FEATURES_PER_JOINT = 12
+# a rotation matrix value moves by about 0.017 per degree, this makes a degree weigh
+# about as much as a tenth of a scene unit
+DEFAULT_ROTATION_WEIGHT = 6.0
+# how many KD-trees for different sets of columns are kept
+TREE_CACHE_SIZE = 8
+
+
+def _features(values=None, orders=None, translation_weight=1.0, rotation_weight=1.0):
+    """
+    Turn pose channels into search features
+
+    :param values: The channels, in an array of shape (P, J, 6)
+    :type: numpy.ndarray
+
+    :param orders: The index of the rotate order of each of the J joints
+    :type: numpy.ndarray
+
+    :return: The features, in an array of shape (P, J * FEATURES_PER_JOINT), NaN for
+             the channels that are not set. A rotation is set when all of its axes are
+    :type: numpy.ndarray
+    """
+    rotation_set = ~np.isnan(values[..., 3:]).any(axis=-1)
+    rotations = np.where(rotation_set[..., None], values[..., 3:], 0.0)
+    w, x, y, z = np.moveaxis(euler_to_quaternions(rotations, orders), -1, 0)
+    matrices = np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y),
+                         2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+                         2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)),
+                        axis=-1)
+    matrices[~rotation_set] = np.nan
+    features = np.concatenate((values[..., :3] * translation_weight,
+                               matrices * rotation_weight), axis=-1)
+    return features.reshape(values.shape[0], values.shape[1] * FEATURES_PER_JOINT)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseSearchIndex(object):
+    """
+    The poses of a library as rows of a matrix, to be searched for the closest ones.
+    """
+    def __init__(self, poses=None, joints=None, rotate_orders=None, translation_weight=1.0,
+                 rotation_weight=DEFAULT_ROTATION_WEIGHT, use_tree=None):
+        """
+        :param poses: The poses to search, or a mapping of pose names to poses
+        :type: list
+
+        :param joints: The joints to index. Defaults to every joint in any of the poses
+        :type: list
+
+        :param rotate_orders: A dictionary of joint names to their rotate order, such as
+                              xyz. Defaults to xyz
+        :type: dict
+
+        :param translation_weight: How much a scene unit of translation counts
+        :type: float
+
+        :param rotation_weight: How much a rotation matrix value counts, see
+                                DEFAULT_ROTATION_WEIGHT
+        :type: float
+
+        :param use_tree: Search with KD-trees. Defaults to using them when SciPy is
+                         available
+        :type: bool
+        """
+        if isinstance(poses, Mapping):
+            poses = poses.values()
+        poses = list(poses or ())
+        if joints is None:
+            joints = {}
+            for pose in poses:
+                joints.update(dict.fromkeys(pose.joints))
+        self.joints = tuple(joints)
+        self.names = [pose.name for pose in poses]
+        self._index = {joint: i for i, joint in enumerate(self.joints)}
+        rotate_orders = rotate_orders or {}
+        self.orders = np.array([ROTATE_ORDERS.index(rotate_orders.get(joint, 'xyz'))
+                                for joint in self.joints], dtype=int)
+        self.translation_weight = translation_weight
+        self.rotation_weight = rotation_weight
+        self.use_tree = cKDTree is not None if use_tree is None else use_tree
+        if self.use_tree and cKDTree is None:
+            raise ImportError('Searching with KD-trees needs SciPy')
+
+        values = np.full((len(poses), len(self.joints), len(CHANNELS)), np.nan)
+        for position, pose in enumerate(poses):
+            if pose.joints == self.joints:
+                values[position] = np.frombuffer(pose.values, dtype=float).reshape(
+                    len(self.joints), len(CHANNELS))
+                continue
+            for joint in pose.joints:
+                if joint in self._index:
+                    values[position, self._index[joint]] = pose.channels(joint)
+        self.features = _features(values, self.orders, translation_weight,
+                                  rotation_weight)
+        # the columns that every pose sets, only those can go into a KD-tree
+        self._complete = ~np.isnan(self.features).any(axis=0)
+        self._trees = OrderedDict()
+
+    def __repr__(self):
+        return f'PoseSearchIndex({len(self.names)} poses, {len(self.joints)} joints)'
+
+    def __len__(self):
+        return len(self.names)
+
+    def query(self, pose=None, count=10, joints=None, exclude=None):
+        """
+        Find the poses closest to a pose
+
+        :param pose: The pose to compare with, such as the current pose of the rig
+        :type: td_maya_tools.pose.Pose
+
+        :param count: How many poses to return
+        :type: int
+
+        :param joints: Only compare these joints. Defaults to all the joints of the pose
+        :type: list
+
+        :param exclude: The names of poses to leave out, such as the query pose itself
+        :type: set
+
+        :return: Pairs of pose names and their distance, closest first. Poses that
+                 share no set channel with the query are left out
+        :type: list
+        """
+        joints = [joint for joint in (pose.joints if joints is None else joints)
+                  if joint in self._index and joint in pose]
+        if not joints or not self.names or count <= 0:
+            return []
+        positions = np.array([self._index[joint] for joint in joints], dtype=int)
+        values = np.array([pose.channels(joint) for joint in joints], dtype=float)
+        query = _features(values[None], self.orders[positions], self.translation_weight,
+                          self.rotation_weight)[0]
+        columns = (positions[:, None] * FEATURES_PER_JOINT
+                   + np.arange(FEATURES_PER_JOINT)).ravel()
+        is_set = ~np.isnan(query)
+        columns, query = columns[is_set], query[is_set]
+        if not columns.size:
+            return []
+
+        exclude = exclude or ()
+        # ask for extra poses to make up for the ones that are excluded
+        wanted = min(len(self.names), count + len(exclude))
+        if self.use_tree and self._complete[columns].all():
+            distances, rows = self._tree(columns).query(query, k=wanted)
+            distances = np.atleast_1d(distances) / np.sqrt(columns.size)
+            rows = np.atleast_1d(rows)
+        else:
+            features = self.features
+            if columns.size != features.shape[1]:
+                features = features[:, columns]
+            squares = (features - query) ** 2
+            if self._complete[columns].all():
+                distances = np.sqrt(squares.mean(axis=1))
+            else:
+                shared = (~np.isnan(squares)).sum(axis=1)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    distances = np.sqrt(np.nansum(squares, axis=1) / shared)
+                distances[shared == 0] = np.inf
+            rows = np.argpartition(distances, wanted - 1)[:wanted]
+            rows = rows[np.argsort(distances[rows], kind='stable')]
+            distances = distances[rows]
+
+        results = []
+        for row, distance in zip(rows, distances):
+            name = self.names[row]
+            if np.isinf(distance) or name in exclude:
+                continue
+            results.append((name, float(distance)))
+            if len(results) == count:
+                break
+        return results
+
+    def _tree(self, columns=None):
+        """
+        Get the KD-tree over a set of columns, building it the first time
+        """
+        key = columns.tobytes()
+        tree = self._trees.get(key)
+        if tree is None:
+            tree = cKDTree(self.features[:, columns])
+            self._trees[key] = tree
+            if len(self._trees) > TREE_CACHE_SIZE:
+                self._trees.popitem(last=False)
+        else:
+            self._trees.move_to_end(key)
+        return tree
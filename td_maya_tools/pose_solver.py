@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Convert absolute pose values into the local channels of joints.
+
+:description:
+    Poses store absolute world space translations and rotations, the same values that
+    move and rotate take with the absolute flag. This module works out which translate
+    and rotate channel values give those world transforms, so that a whole pose can be
+    written as plain attribute values. Joints are solved parents first, so the result
+    does not depend on the order of the joints in the pose.
+    Matrices follow the Maya convention of row vectors, a 3x3 matrix is a list of rows.
+    Contains the following functions:
+        euler_to_matrix
+        matrix_to_euler
+        rotation_angle
+        multiply
+        transpose
+        inverse
+        orthonormalize
+        split_matrix
+        compose
+        local_matrix
+        solve_local_channels
+    Contains the following classes:
+        JointState
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.pose_backends
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import math
+
+# Imports That You Wrote
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# in the order of the rotateOrder attribute of transforms
+ROTATE_ORDERS = ('xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx')
+IDENTITY = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))
+_AXES = {'x': 0, 'y': 1, 'z': 2}
+
+
+def axis_matrix(axis=None, degrees=0.0):
+    """
+    Build the matrix of a rotation around a single axis
+
+    :param axis: x, y or z
+    :type: str
+
+    :param degrees: The angle of the rotation
+    :type: float
+
+    :return: A 3x3 rotation matrix
+    :type: tuple
+    """
+    radians = math.radians(degrees)
+    cos = math.cos(radians)
+    sin = math.sin(radians)
+    if axis == 'x':
+        return ((1.0, 0.0, 0.0), (0.0, cos, sin), (0.0, -sin, cos))
+    if axis == 'y':
+        return ((cos, 0.0, -sin), (0.0, 1.0, 0.0), (sin, 0.0, cos))
+    return ((cos, sin, 0.0), (-sin, cos, 0.0), (0.0, 0.0, 1.0))
+
+
+def euler_to_matrix(rotation=(0.0, 0.0, 0.0), order='xyz'):
+    """
+    Build the matrix of an euler rotation
+
+    :param rotation: The x, y and z angles in degrees
+    :type: tuple
+
+    :param order: The rotate order, the first axis is applied first
+    :type: str
+
+    :return: A 3x3 rotation matrix
+    :type: tuple
+    """
+    matrix = IDENTITY
+    for axis in order:
+        matrix = multiply(matrix, axis_matrix(axis, rotation[_AXES[axis]]))
+    return matrix
+
+
+def matrix_to_euler(matrix=IDENTITY, order='xyz'):
+    """
+    Extract the euler angles of a rotation matrix
+
+    :param matrix: A 3x3 rotation matrix without scale
+    :type: tuple
+
+    :param order: The rotate order of the angles to extract
+    :type: str
+
+    :return: The x, y and z angles in degrees
+    :type: tuple
+    """
+    # work on the column vector form of the matrix, where the first axis of the order
+    # is the rightmost rotation
+    col = transpose(matrix)
+    i, j, k = (_AXES[axis] for axis in order)
+    # even orders are the cyclic ones, xyz, yzx and zxy
+    sign = 1.0 if (j - i) % 3 == 1 else -1.0
+    first = math.atan2(sign * col[k][j], col[k][k])
+    second = math.asin(max(-1.0, min(1.0, -sign * col[k][i])))
+    third = math.atan2(sign * col[j][i], col[i][i])
+    if abs(col[k][i]) > 0.9999999:
+        # gimbal lock, put all of the rotation on the first axis
+        third = 0.0
+        first = math.atan2(-sign * col[j][k], col[j][j])
+    angles = [0.0, 0.0, 0.0]
+    angles[i] = math.degrees(first)
+    angles[j] = math.degrees(second)
+    angles[k] = math.degrees(third)
+    return tuple(angles)
+
+
+def rotation_angle(a=IDENTITY, b=IDENTITY):
+    """
+    Measure how far apart two rotations are, whatever euler angles they came from
+
+    :param a: A 3x3 rotation matrix without scale
+    :type: tuple
+
+    :param b: A 3x3 rotation matrix without scale
+    :type: tuple
+
+    :return: The angle of the rotation from one to the other, in degrees
+    :type: float
+    """
+    # the matrices are 2 * sqrt(2) * sin(angle / 2) apart, which unlike the trace stays
+    # precise for the tiny angles tolerances are about
+    distance = math.sqrt(sum((x - y) ** 2 for row_a, row_b in zip(a, b)
+                             for x, y in zip(row_a, row_b)))
+    return math.degrees(2.0 * math.asin(min(1.0, distance / (2.0 * math.sqrt(2.0)))))
+
+
+def multiply(a=IDENTITY, b=IDENTITY):
+    """
+    :return: The product of two 3x3 matrices
+    :type: tuple
+    """
+    return tuple(tuple(a[r][0] * b[0][c] + a[r][1] * b[1][c] + a[r][2] * b[2][c]
+                       for c in range(3)) for r in range(3))
+
+
+def transpose(matrix=IDENTITY):
+    """
+    :return: The transpose of a 3x3 matrix
+    :type: tuple
+    """
+    return tuple(zip(*matrix))
+
+
+def inverse(matrix=IDENTITY):
+    """
+    :return: The inverse of a 3x3 matrix
+    :type: tuple
+    """
+    (a, b, c), (d, e, f), (g, h, i) = matrix
+    det = a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+    if not det:
+        raise ValueError('The matrix can not be inverted')
+    return ((( e * i - f * h) / det, -(b * i - c * h) / det, ( b * f - c * e) / det),
+            (-(d * i - f * g) / det, ( a * i - c * g) / det, -(a * f - c * d) / det),
+            (( d * h - e * g) / det, -(a * h - b * g) / det, ( a * e - b * d) / det))
+
+
+def orthonormalize(matrix=IDENTITY):
+    """
+    Remove the scale from the rows of a 3x3 matrix
+
+    :return: The normalized matrix
+    :type: tuple
+    """
+    rows = []
+    for row in matrix:
+        length = math.sqrt(sum(value * value for value in row)) or 1.0
+        rows.append(tuple(value / length for value in row))
+    return tuple(rows)
+
+
+def transform_vector(vector=(0.0, 0.0, 0.0), matrix=IDENTITY):
+    """
+    :return: A row vector multiplied by a 3x3 matrix
+    :type: tuple
+    """
+    return tuple(vector[0] * matrix[0][c] + vector[1] * matrix[1][c]
+                 + vector[2] * matrix[2][c] for c in range(3))
+
+
+def split_matrix(matrix=None):
+    """
+    Split a flat, row major 4x4 matrix, as returned by xform, into its 3x3 part and
+    its translation
+
+    :param matrix: 16 values
+    :type: list
+
+    :return: The 3x3 matrix and the translation
+    :type: tuple
+    """
+    if matrix is None:
+        return IDENTITY, (0.0, 0.0, 0.0)
+    return ((tuple(matrix[0:3]), tuple(matrix[4:7]), tuple(matrix[8:11])),
+            tuple(matrix[12:15]))
+
+
+def flatten_matrix(transform=None):
+    """
+    The inverse of split_matrix
+
+    :param transform: A 3x3 matrix and a translation
+    :type: tuple
+
+    :return: 16 values
+    :type: list
+    """
+    matrix, translation = transform
+    return (list(matrix[0]) + [0.0] + list(matrix[1]) + [0.0] + list(matrix[2])
+            + [0.0] + list(translation) + [1.0])
+
+
+def compose(child=None, parent=None):
+    """
+    Combine a transform with the transform of its parent
+
+    :param child: A 3x3 matrix and a translation
+    :type: tuple
+
+    :param parent: A 3x3 matrix and a translation
+    :type: tuple
+
+    :return: The combined 3x3 matrix and translation
+    :type: tuple
+    """
+    matrix = multiply(child[0], parent[0])
+    offset = transform_vector(child[1], parent[0])
+    return matrix, tuple(o + p for o, p in zip(offset, parent[1]))
+
+
+def invert(transform=None):
+    """
+    :param transform: A 3x3 matrix and a translation
+    :type: tuple
+
+    :return: The inverse transform
+    :type: tuple
+    """
+    matrix = inverse(transform[0])
+    offset = transform_vector(transform[1], matrix)
+    return matrix, tuple(-value for value in offset)
+
+
+def local_matrix(translate=(0.0, 0.0, 0.0), rotate=(0.0, 0.0, 0.0), order='xyz',
+                 joint_orient=(0.0, 0.0, 0.0), rotate_axis=(0.0, 0.0, 0.0)):
+    """
+    Build the local transform of a joint from its channels, ignoring scale
+
+    :return: The 3x3 matrix and translation
+    :type: tuple
+    """
+    matrix = multiply(multiply(euler_to_matrix(rotate_axis), euler_to_matrix(rotate, order)),
+                      euler_to_matrix(joint_orient))
+    return matrix, tuple(translate)
+
+
+def solve_local_channels(targets=None, states=None):
+    """
+    Work out the local channel values that place a set of joints at absolute world
+    space translations and rotations.
+    Channels that are not set in a target keep their current world value, carried
+    along with the parent if the parent is also being posed.
+
+    :param targets: Pairs of joint names and their six target channels, NaN for the
+                    ones that are not set, in the order of td_maya_tools.pose.CHANNELS
+    :type: list
+
+    :param states: The current state of every joint in targets
+    :type: dict
+
+    :return: A dictionary of joint names to their local translate and rotate values.
+             Either one is None if none of its channels were set in the target.
+    :type: dict
+    """
+    targets = dict(targets or ())
+    new_worlds = {}
+    solved = {}
+    for joint in hierarchy_order(targets, states):
+        state = states[joint]
+        channels = targets[joint]
+        old_parent = split_matrix(state.parent_world)
+        new_parent = new_worlds.get(state.parent, old_parent)
+        # the current local transform, carried along with the new parent transform
+        default = compose(compose(split_matrix(state.world), invert(old_parent)),
+                          new_parent)
+
+        translation = _fill(channels[:3], default[1])
+        rotation = _fill(channels[3:], matrix_to_euler(orthonormalize(default[0]),
+                                                       state.rotate_order))
+        world_rotation = euler_to_matrix(rotation, state.rotate_order)
+        new_worlds[joint] = (world_rotation, translation)
+
+        local_translate = None
+        if not all(math.isnan(value) for value in channels[:3]):
+            offset = tuple(t - p for t, p in zip(translation, new_parent[1]))
+            local_translate = transform_vector(offset, inverse(new_parent[0]))
+        local_rotate = None
+        if not all(math.isnan(value) for value in channels[3:]):
+            # world = rotateAxis * rotate * jointOrient * parent
+            local = multiply(multiply(multiply(
+                transpose(euler_to_matrix(state.rotate_axis)), world_rotation),
+                transpose(orthonormalize(new_parent[0]))),
+                transpose(euler_to_matrix(state.joint_orient)))
+            local_rotate = matrix_to_euler(local, state.rotate_order)
+        solved[joint] = (local_translate, local_rotate)
+    return solved
+
+
+def hierarchy_order(joints=None, states=None):
+    """
+    Sort joints so that parents come before their children
+
+    :param joints: The names of the joints
+    :type: iterable
+
+    :param states: The state of every joint, used to find their parents
+    :type: dict
+
+    :return: The sorted joint names
+    :type: list
+    """
+    joints = list(joints or ())
+    depths = {}
+    for joint in joints:
+        # walk up to the first joint whose depth is known, then count back down, a
+        # recursive walk would run out of stack on long chains
+        chain = []
+        while joint not in depths and joint in states:
+            chain.append(joint)
+            joint = states[joint].parent
+        depth = depths.get(joint, -1)
+        for joint in reversed(chain):
+            depth += 1
+            depths[joint] = depth
+    return sorted(joints, key=depths.__getitem__)
+
+
+def _fill(values=None, defaults=None):
+    """
+    Replace the NaN values of a triple with the defaults
+    """
+    return tuple(d if math.isnan(v) else v for v, d in zip(values, defaults))
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class JointState(object):
+    """
+    What the solver needs to know about a joint in the scene.
+    """
+    __slots__ = ('name', 'parent', 'world', 'parent_world', 'joint_orient',
+                 'rotate_axis', 'rotate_order')
+
+    def __init__(self, name=None, parent=None, world=None, parent_world=None,
+                 joint_orient=(0.0, 0.0, 0.0), rotate_axis=(0.0, 0.0, 0.0),
+                 rotate_order='xyz'):
+        """
+        :param name: The name of the joint
+        :type: str
+
+        :param parent: The name of the parent, None for joints at the top
+        :type: str
+
+        :param world: The flat world matrix of the joint
+        :type: list
+
+        :param parent_world: The flat world matrix of the parent, None for identity
+        :type: list
+
+        :param joint_orient: The joint orient in degrees
+        :type: tuple
+
+        :param rotate_axis: The rotate axis in degrees
+        :type: tuple
+
+        :param rotate_order: One of ROTATE_ORDERS
+        :type: str
+        """
+        self.name = name
+        self.parent = parent
+        self.world = world
+        self.parent_world = parent_world
+        self.joint_orient = tuple(joint_orient)
+        self.rotate_axis = tuple(rotate_axis)
+        self.rotate_order = rotate_order
@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Check the poses of a library against the joints of a scene.
+
+:description:
+    validate_library checks every pose of a library in one pass and reports, per pose,
+    the joints that are missing from the scene, the scene joints that the pose does not
+    drive, the channels that are empty and the channels whose value is not a number.
+    Poses that share the same joints are compared with the scene once, with set
+    operations. The channels that are not numbers are read from the pose caches of a
+    pose index, only the files without a cache are scanned for them, and again only
+    when they change. The empty channels of a pose are only found when its report is
+    first asked for them, so checking a library does not read the values of its poses.
+    Contains the following functions:
+        validate_library
+        non_numeric_channels
+    Contains the following classes:
+        PoseReport
+        LibraryReport
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.guis.poser_gui
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from collections.abc import Mapping
+import logging
+import os
+from xml.parsers import expat
+
+# Imports That You Wrote
+from td_maya_tools import instrumentation, xml_utils
+from td_maya_tools.pose import CHANNELS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+logger = logging.getLogger(__name__)
+
+# path -> (modified time in ns, size, channels that are not numbers)
+_non_numeric_cache = {}
+
+
+@instrumentation.timed('pose_validation.validate_library')
+def validate_library(pose_dict=None, scene_joints=None, retarget_map=None, paths=None):
+    """
+    Check every pose of a library against the joints of a scene
+
+    :param pose_dict: A mapping of pose names to poses
+    :type: dict
+
+    :param scene_joints: The names of all the joints in the scene
+    :type: iterable
+
+    :param retarget_map: Maps the joints of the poses to the scene joints, the way
+                         they are applied. Defaults to matching the names as they are
+    :type: td_maya_tools.retarget.RetargetMap
+
+    :param paths: The xml files to look for values that are not numbers in. Defaults
+                  to the caches of the files of a td_maya_tools.pose_index.PoseIndex,
+                  scanning the files that have no cache
+    :type: list
+
+    :return: A report for each pose
+    :type: LibraryReport
+    """
+    pose_dict = pose_dict or {}
+    scene_joints = frozenset(scene_joints or ())
+    sources = getattr(pose_dict, 'sources', None)
+    # a pose index reads the joints and the channels that are not numbers from the
+    # caches of its files
+    pose_joints = getattr(pose_dict, 'pose_joints', None)
+    cached_non_numeric = None
+    if paths is None:
+        cached_non_numeric = getattr(pose_dict, 'non_numeric', None)
+        if cached_non_numeric is not None:
+            paths = ()
+        else:
+            paths = sorted(set(sources.values())) if sources else ()
+    # pose name -> joint name -> channels, taken from the file each pose was kept from
+    non_numeric = {}
+    for path in paths:
+        for name, joints in non_numeric_channels(path).items():
+            if sources is None or sources.get(name) == path:
+                non_numeric.setdefault(name, joints)
+
+    # poses sharing the same joints share the same joint table, so they are only
+    # compared with the scene once
+    groups = {}
+    reports = {}
+    for name in pose_dict:
+        joints = pose_joints(name) if pose_joints else pose_dict[name].joints
+        group = groups.get(joints)
+        if group is None:
+            if retarget_map is None:
+                targets = dict(zip(joints, joints))
+            else:
+                targets = {joint: retarget_map.resolve(joint) for joint in joints}
+            found = {joint for joint, target in targets.items() if target in scene_joints}
+            missing = frozenset(joints).difference(found)
+            extra = scene_joints.difference(targets[joint] for joint in found)
+            group = groups[joints] = (missing, frozenset(extra))
+        missing, extra = group
+        if cached_non_numeric:
+            pose_non_numeric = cached_non_numeric(name)
+            if pose_non_numeric is None:
+                # the file of the pose has no cache
+                pose_non_numeric = non_numeric_channels(sources[name]).get(name, {})
+        else:
+            pose_non_numeric = non_numeric.get(name, {})
+        reports[name] = PoseReport(name, len(joints), missing, extra,
+                                   non_numeric=pose_non_numeric, pose_dict=pose_dict)
+    instrumentation.count('pose_validation.joint_sets', len(groups))
+    return LibraryReport(reports, scene_joints)
+
+
+def non_numeric_channels(path=None):
+    """
+    Find the channels of an xml file whose value is not a number. The result is kept
+    until the file changes.
+
+    :param path: Full path to the xml file
+    :type: str
+
+    :return: A dictionary of pose names to dictionaries of joint names to the names of
+             their channels that are not numbers
+    :type: dict
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {}
+    cached = _non_numeric_cache.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    try:
+        found = xml_utils.find_non_numeric_channels(path)
+    except expat.ExpatError as error:
+        logger.warning(f'Could not scan {path}: {error}')
+        found = {}
+    _non_numeric_cache[path] = (stat.st_mtime_ns, stat.st_size, found)
+    return found
+
+
+def _empty_channels(pose=None):
+    """
+    :return: A dictionary of the joints of a pose to the names of their channels that
+             are not set
+    :type: dict
+    """
+    empty = {}
+    count = len(CHANNELS)
+    for position, value in enumerate(pose.values):
+        # NaN is the only value that is not equal to itself
+        if value != value:
+            joint = pose.joints[position // count]
+            empty[joint] = empty.get(joint, ()) + (CHANNELS[position % count],)
+    return empty
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PoseReport(object):
+    """
+    What is wrong with a single pose.
+    """
+    __slots__ = ('name', 'joint_count', 'missing', 'extra', 'non_numeric', '_empty',
+                 '_pose_dict')
+
+    def __init__(self, name=None, joint_count=0, missing=frozenset(), extra=frozenset(),
+                 empty=None, non_numeric=None, pose_dict=None):
+        """
+        :param name: The name of the pose
+        :type: str
+
+        :param joint_count: The number of joints in the pose
+        :type: int
+
+        :param missing: The joints of the pose that are not in the scene
+        :type: frozenset
+
+        :param extra: The scene joints that the pose does not drive
+        :type: frozenset
+
+        :param empty: A dictionary of joint names to their channels that are not set.
+                      The channels that are in non_numeric are left out of it
+        :type: dict
+
+        :param non_numeric: A dictionary of joint names to their channels whose value
+                            is not a number
+        :type: dict
+
+        :param pose_dict: The poses to read the pose from to find its empty channels,
+                          the first time they are asked for, when empty is not given
+        :type: dict
+        """
+        self.name = name
+        self.joint_count = joint_count
+        self.missing = missing
+        self.extra = extra
+        self.non_numeric = non_numeric or {}
+        self._empty = None
+        self._pose_dict = pose_dict
+        if empty is not None or pose_dict is None:
+            self._set_empty(empty)
+
+    def __repr__(self):
+        return f'PoseReport({self.name!r}, {self.coverage:.0%} coverage)'
+
+    def __bool__(self):
+        return not self.missing and not self.non_numeric
+
+    @property
+    def empty(self):
+        """
+        A dictionary of joint names to their channels that are not set, leaving out
+        the ones that are not numbers
+        """
+        if self._empty is None:
+            self._set_empty(_empty_channels(self._pose_dict[self.name]))
+            self._pose_dict = None
+        return self._empty
+
+    @property
+    def found_count(self):
+        """
+        The number of joints of the pose that are in the scene
+        """
+        return self.joint_count - len(self.missing)
+
+    @property
+    def coverage(self):
+        """
+        The part of the joints of the pose that are in the scene, from 0 to 1
+        """
+        if not self.joint_count:
+            return 0.0
+        return self.found_count / self.joint_count
+
+    def summary(self):
+        """
+        :return: A short description of the problems of the pose
+        :type: str
+        """
+        lines = [f'{self.name}: {self.found_count} of {self.joint_count} joints are in '
+                 f'the scene']
+        if self.missing:
+            lines.append(f'missing joints: {", ".join(sorted(self.missing))}')
+        if self.non_numeric:
+            lines.append('values that are not numbers: ' + ', '.join(
+                f'{joint}.{channel}' for joint, channels in sorted(self.non_numeric.items())
+                for channel in channels))
+        if self.empty:
+            lines.append(f'{sum(map(len, self.empty.values()))} empty channels on '
+                         f'{len(self.empty)} joints')
+        if self.extra:
+            lines.append(f'{len(self.extra)} scene joints are not in the pose')
+        return '\n'.join(lines)
+
+    def as_dict(self):
+        """
+        :return: The report as plain values, to be saved as JSON
+        :type: dict
+        """
+        return {'name': self.name,
+                'joint_count': self.joint_count,
+                'coverage': self.coverage,
+                'missing': sorted(self.missing),
+                'extra': sorted(self.extra),
+                'empty': {joint: list(channels) for joint, channels in self.empty.items()},
+                'non_numeric': {joint: list(channels)
+                                for joint, channels in self.non_numeric.items()}}
+
+    def _set_empty(self, empty=None):
+        """
+        Keep the empty channels, without the ones that are not numbers
+        """
+        self._empty = {}
+        for joint, channels in (empty or {}).items():
+            channels = tuple(channel for channel in channels
+                             if channel not in self.non_numeric.get(joint, ()))
+            if channels:
+                self._empty[joint] = channels
+
+
+class LibraryReport(Mapping):
+    """
+    The reports of every pose of a library, by pose name.
+    """
+    def __init__(self, reports=None, scene_joints=frozenset()):
+        """
+        :param reports: A dictionary of pose names to their reports
+        :type: dict
+
+        :param scene_joints: The joints of the scene the poses were checked against
+        :type: frozenset
+        """
+        self._reports = reports or {}
+        self.scene_joints = scene_joints
+
+    def __repr__(self):
+        return (f'LibraryReport({len(self.invalid())} of {len(self._reports)} poses '
+                f'with problems)')
+
+    def __getitem__(self, pose):
+        return self._reports[pose]
+
+    def __iter__(self):
+        return iter(self._reports)
+
+    def __len__(self):
+        return len(self._reports)
+
+    def invalid(self):
+        """
+        :return: The names of the poses with missing joints or values that are not
+                 numbers
+        :type: list
+        """
+        return [name for name, report in self._reports.items() if not report]
@@ -14,9 +14,26 @@
     This module include functions that perform simple operations on joints in Maya
     Contains the following functions:
         create_joints
+        apply_pose
+        apply_pose_to_characters
+        capture_pose
+        bake_poses
         position_joint
         rotate_joint
         verify_joint
+        verify_joints
+        get_backend
+        fastest_backend
+        set_backend
+        get_joint_registry
+        get_retarget_map
+        character_joints
+    Contains the following classes:
+        ApplyResult
+        BakeResult
+        ChunkedApply
+        PosePreview
+        DiffReport
 
 :applications:
     Maya
@@ -26,13 +43,48 @@
 #----------------------------------------------------------------------------- IMPORTS --#
 
 # Default Python Imports
-import maya.cmds as cmds
+from array import array
+from contextlib import ExitStack
+import importlib.util
+import logging
+import math
+import os
+import time
 
 # Imports That You Wrote
+from td_maya_tools import instrumentation, pose_solver
+from td_maya_tools.joint_registry import JointRegistry
+from td_maya_tools.pose import CHANNELS
+from td_maya_tools.pose_backends import BACKENDS, CmdsBackend, PoseBackend
+from td_maya_tools.retarget import RetargetMap, RetargetRules, find_namespaces
 
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+logger = logging.getLogger(__name__)
+
+# the backend used when none is given, can be picked with the environment variable
+BACKEND_ENV_VAR = 'TD_POSER_BACKEND'
+_default_backend = None
+_backend_instances = {}
+_joint_registry = None
+# retarget rules, or retarget rules and a root -> (joint registry, registry generation,
+# compiled map)
+_retarget_maps = {}
+# (joint registry, registry generation, joint names -> full dag paths)
+_scene_paths = None
+# how far a channel can be from its target and still be left alone, in scene units for
+# translations and degrees for rotations
+DEFAULT_TOLERANCE = 1e-4
+# how long a chunk of a ChunkedApply should take, in seconds, and how many joints the
+# first chunk has before the cost of a joint is known
+CHUNK_BUDGET = 0.05
+INITIAL_CHUNK_SIZE = 16
+# the backends a preview tries, fastest first, with the module each one needs
+FAST_BACKENDS = (('openmaya', 'maya.api.OpenMaya'), ('cmds_local', 'numpy'))
+
+
+@instrumentation.timed('poser.create_joints')
 def create_joints(joint_list=[]):
     """
     Create joints with the provided list of names. Each joint will be paretned to the one
@@ -45,15 +97,556 @@ def create_joints(joint_list=[]):
     :type: list
     """
     if not joint_list:
-        cmds.warning("You must provide names for the joints!")
+        logger.warning("You must provide names for the joints!")
     else:
+        from maya import cmds
         joint_names = []
         for joint in joint_list:
             if isinstance(joint, str):
+                instrumentation.count('cmds.joint')
                 joint_names.append(cmds.joint(name=joint))
         return joint_names
-    
 
+
+@instrumentation.timed('poser.apply_pose')
+def apply_pose(pose=None, joints=None, backend=None, tolerance=None, retarget=None):
+    """
+    Apply the translations and rotations of a pose to a set of joints. All joints are
+    validated in one pass before anything is changed, and the whole pose is applied
+    inside a single undo chunk so that it can be undone at once.
+    With a tolerance, the current values of the joints are read first and only the
+    channels further than the tolerance from the pose are written. Rotations are
+    compared by the angle between the rotation of the pose and the current one, and the
+    rotate channels of a joint are written together. Joints under a joint that is
+    written are always written too, as they move with it.
+
+    :param pose: The pose to apply
+    :type: td_maya_tools.pose.Pose
+
+    :param joints: The joints to pose. Defaults to all the joints in the pose
+    :type: list
+
+    :param backend: The backend, or the name of the backend, to apply the pose with.
+                    Defaults to the current backend, see set_backend
+    :type: str
+
+    :param tolerance: Only write the channels that are further than this from the
+                      pose, see DEFAULT_TOLERANCE. Defaults to writing every channel
+    :type: float
+
+    :param retarget: Rules or a compiled map that rename the joints of the pose to
+                     the scene joints, see get_retarget_map. The applied joints are
+                     then given by their scene names
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :return: The joints that were posed and the ones that failed, with a DiffReport
+             of what was written when a tolerance is given
+    :type: ApplyResult
+    """
+    result = ApplyResult(pose)
+    if pose is None:
+        logger.warning("You must provide a pose!")
+        return result
+    backend = get_backend(backend)
+    pose, entries = _prepare_entries(result, pose, joints, backend, tolerance, retarget)
+    if not entries:
+        # nothing to change, do not leave an empty step on the undo queue
+        return result
+    with backend.undo_chunk(f'apply_pose {pose.name}'):
+        failures = backend.apply(entries)
+    result.failures.update(failures)
+    result.applied.extend(joint for joint, _ in entries if joint not in failures)
+    instrumentation.count('poser.joints_applied', len(result.applied))
+    instrumentation.count('poser.joints_failed', len(result.failures))
+    return result
+
+
+@instrumentation.timed('poser.apply_pose_to_characters')
+def apply_pose_to_characters(pose=None, characters=None, joints=None, backend=None,
+                             tolerance=None, retarget=None):
+    """
+    Apply a pose to several characters at once, such as the referenced or instanced
+    characters of a crowd. The joints of every character are resolved and verified
+    first, then the channels of all of them are written with a single call to the
+    backend, inside a single undo chunk.
+
+    :param pose: The pose to apply
+    :type: td_maya_tools.pose.Pose
+
+    :param characters: The namespaces of the characters, such as crowd01, or the root
+                       nodes of characters that are not in a namespace, such as
+                       |crowd|agent01
+    :type: list
+
+    :param joints: The joints of the pose to apply. Defaults to all of them
+    :type: list
+
+    :param backend: The backend, or the name of the backend, to apply the pose with
+    :type: str
+
+    :param tolerance: Only write the channels that are further than this from the
+                      pose, see apply_pose
+    :type: float
+
+    :param retarget: The rules the names of the pose joints go through before they are
+                     looked up on each character. Their namespace is replaced with the
+                     one of each character. Defaults to stripping namespaces
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :return: A dictionary of characters to the joints that were posed on them and the
+             ones that failed. With a tolerance, they share the DiffReport of the
+             whole apply
+    :type: dict
+    """
+    results = {}
+    if pose is None:
+        logger.warning("You must provide a pose!")
+        return results
+    backend = get_backend(backend)
+    entries, owners = _character_entries(results, pose, characters, joints, backend,
+                                         retarget)
+    if tolerance is not None:
+        entries, diff = _changed_entries(entries, backend, tolerance)
+        for result in results.values():
+            result.diff = diff
+        # the joints already in the pose count as posed
+        for joint in diff.unchanged:
+            results[owners[joint]].applied.append(joint)
+    if not entries:
+        return results
+    with backend.undo_chunk(f'apply_pose {pose.name} on {len(results)} characters'):
+        failures = backend.apply(entries)
+    for joint, _ in entries:
+        result = results[owners[joint]]
+        if joint in failures:
+            result.failures[joint] = failures[joint]
+        else:
+            result.applied.append(joint)
+    instrumentation.count('poser.joints_applied', len(entries) - len(failures))
+    instrumentation.count('poser.characters_applied', len(results))
+    return results
+
+
+@instrumentation.timed('poser.bake_poses')
+def bake_poses(sequence=None, joints=None, backend=None, retarget=None):
+    """
+    Key a sequence of poses on the timeline. The joints are verified and read from the
+    scene once, the local channels of every pose are solved in memory, and each channel
+    is then keyed with all of its frames at once, inside a single undo chunk. The time
+    is never changed while baking.
+    The poses are solved against the rig as it is when baking, so parents that are not
+    in the poses are taken to stay where they are over the whole sequence. Channels that
+    a pose does not set are not keyed on its frame, and rotations are kept continuous
+    from one key to the next so that they do not flip.
+
+    :param sequence: Pairs of frames and the pose to key on them. When a frame is
+                     given twice the last pose is used
+    :type: list
+
+    :param joints: The joints to key. Defaults to all the joints in the poses
+    :type: list
+
+    :param backend: The backend, or the name of the backend, to key the poses with
+    :type: str
+
+    :param retarget: Rules or a compiled map that rename the joints of the poses to the
+                     scene joints, see get_retarget_map
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :return: The joints that were keyed and the ones that failed
+    :type: BakeResult
+    """
+    sequence = sorted(dict(sequence or ()).items())
+    result = BakeResult([frame for frame, _ in sequence])
+    if not sequence:
+        logger.warning("You must provide poses to bake!")
+        return result
+    backend = get_backend(backend)
+    wanted = None if joints is None else set(joints)
+    if retarget is not None:
+        retarget_map = get_retarget_map(retarget, backend)
+        retargeted = []
+        for frame, pose in sequence:
+            pose, failures = retarget_map.retarget(pose, joints)
+            result.failures.update(failures)
+            retargeted.append((frame, pose))
+        sequence = retargeted
+        wanted = None
+
+    # every joint of every pose is verified and read once for the whole sequence
+    targets = {}
+    for _, pose in sequence:
+        targets.update(dict.fromkeys(joint for joint in pose.joints
+                                     if wanted is None or joint in wanted))
+    valid_joints, failures = backend.verify_joints(list(targets))
+    result.failures.update(failures)
+    states = backend.joint_states([joint for joint in targets if joint in valid_joints])
+
+    # (joint, channel) -> (frames, values)
+    curves = {}
+    with instrumentation.phase('poser.bake_poses.solve'):
+        for frame, pose in sequence:
+            entries = [(joint, pose.channels(joint)) for joint in pose.joints
+                       if joint in states]
+            solved = pose_solver.solve_local_channels(entries, states)
+            for joint, groups in solved.items():
+                for channels, values in zip((CHANNELS[:3], CHANNELS[3:]), groups):
+                    if values is None:
+                        continue
+                    for channel, value in zip(channels, values):
+                        frames, keys = curves.setdefault((joint, channel), ([], []))
+                        frames.append(frame)
+                        keys.append(value)
+    for (_, channel), (_, keys) in curves.items():
+        if channel in CHANNELS[3:]:
+            _unwrap_angles(keys)
+
+    if curves:
+        with backend.undo_chunk(f'bake_poses {len(sequence)} poses'):
+            failures = backend.set_keys(curves)
+        result.failures.update(failures)
+    keyed = {joint for joint, _ in curves}
+    result.applied.extend(joint for joint in states
+                          if joint in keyed and joint not in result.failures)
+    result.key_count = sum(len(frames) for (joint, _), (frames, _) in curves.items()
+                           if joint not in result.failures)
+    instrumentation.count('poser.keys_set', result.key_count)
+    return result
+
+
+def _unwrap_angles(angles=None):
+    """
+    Move each angle of a list by whole turns to be as close as it can to the one before
+    it, in place
+    """
+    for position in range(1, len(angles)):
+        previous = angles[position - 1]
+        angles[position] += 360.0 * round((previous - angles[position]) / 360.0)
+
+
+@instrumentation.timed('poser.capture_pose')
+def capture_pose(joints=None, name=None, backend=None):
+    """
+    Read the current world space translations and rotations of a set of joints into a
+    pose, in one pass over the joints. The pose can be applied again with apply_pose,
+    or saved with td_maya_tools.xml_utils.write_pose_xml, which leaves out the
+    namespaces of the joints. Apply a saved pose to a namespaced rig with the
+    namespace in retarget rules, or with apply_pose_to_characters.
+
+    :param joints: The joints to capture. Defaults to every joint in the scene
+    :type: list
+
+    :param name: The name of the pose
+    :type: str
+
+    :param backend: The backend, or the name of the backend, to read the scene with
+    :type: str
+
+    :return: The pose, holding the joints that could be read
+    :type: td_maya_tools.pose.Pose
+    """
+    backend = get_backend(backend)
+    if joints is None:
+        joints = get_joint_registry().sorted_joints()
+    valid_joints, failures = backend.verify_joints(joints)
+    if failures:
+        logger.warning(f'{len(failures)} joints could not be captured: '
+                       f'{", ".join(sorted(failures))}')
+    return backend.read_pose([joint for joint in joints if joint in valid_joints], name)
+
+
+def _prepare_entries(result=None, pose=None, joints=None, backend=None, tolerance=None,
+                     retarget=None):
+    """
+    Retarget a pose and verify its joints, recording the joints that fail in the
+    result, see apply_pose
+
+    :return: The retargeted pose, and pairs of the joints to write and their channels
+    :type: tuple
+    """
+    if retarget is not None:
+        pose, failures = get_retarget_map(retarget, backend).retarget(pose, joints)
+        result.failures.update(failures)
+        joints = None
+    if joints is None:
+        joints = pose.joints
+
+    targets = []
+    for joint in joints:
+        if joint in pose:
+            targets.append(joint)
+        else:
+            result.failures[joint] = 'not in the pose'
+    valid_joints, failures = backend.verify_joints(targets)
+    result.failures.update(failures)
+
+    entries = [(joint, pose.channels(joint)) for joint in targets if joint in valid_joints]
+    if tolerance is not None:
+        entries, result.diff = _changed_entries(entries, backend, tolerance)
+        # the joints already in the pose count as posed
+        result.applied.extend(result.diff.unchanged)
+    return pose, entries
+
+
+def _character_entries(results=None, pose=None, characters=None, joints=None,
+                       backend=None, retarget=None):
+    """
+    Retarget a pose to several characters and verify their joints, adding the result
+    of each character to results, see apply_pose_to_characters
+
+    :return: A tuple containing 2 items
+             1. Pairs of the joints of all the characters to write and their channels
+             2. A dictionary of those joints to the character they belong to
+    :type: tuple
+    """
+    registry = getattr(backend, 'registry', None) or get_joint_registry()
+    if isinstance(retarget, RetargetMap):
+        retarget = retarget.rules
+    rules = retarget or RetargetRules()
+    namespaces = set(find_namespaces(registry.joints))
+
+    # scene joint -> character, a joint is only posed for the first character it is in
+    owners = {}
+    entries = []
+    for character in characters or ():
+        result = results[character] = ApplyResult(pose)
+        namespace = character.strip(':')
+        if namespace in namespaces:
+            retarget_map = get_retarget_map(rules.with_namespace(namespace), backend)
+        else:
+            retarget_map = get_retarget_map(rules, backend, root=character)
+        _, character_entries = _prepare_entries(result, pose, joints, backend,
+                                                retarget=retarget_map)
+        for joint, channels in character_entries:
+            if joint in owners:
+                result.failures[joint] = f'already posed for {owners[joint]}'
+                continue
+            owners[joint] = character
+            entries.append((joint, channels))
+    return entries, owners
+
+
+def _changed_entries(entries=None, backend=None, tolerance=DEFAULT_TOLERANCE):
+    """
+    Leave out the channels that are already at their value, the way apply_pose does
+    with a tolerance
+
+    :param entries: Pairs of verified joint names and their six channels
+    :type: list
+
+    :return: A tuple containing 2 items
+             1. The entries with the unchanged channels set to NaN, and the joints with
+                nothing left to write removed
+             2. What was left out
+    :type: tuple
+    """
+    report = DiffReport(tolerance)
+    joints = [joint for joint, _ in entries]
+    current = backend.read_pose(joints)
+    paths = backend.dag_paths(joints)
+    orders = backend.rotate_orders(joints)
+    entries = dict(entries)
+
+    changed = {}
+    for joint, channels in entries.items():
+        values = current.channels(joint)
+        differs = []
+        for target, value in zip(channels[:3], values[:3]):
+            if math.isnan(target):
+                continue
+            report.channels_checked += 1
+            differs.append(abs(target - value) > tolerance)
+        rotation_count = sum(not math.isnan(target) for target in channels[3:])
+        if rotation_count:
+            # many sets of euler angles give the same rotation, such as a y beyond 90
+            # degrees, so the rotations themselves are compared and written together
+            report.channels_checked += rotation_count
+            target = tuple(value if math.isnan(target) else target
+                           for target, value in zip(channels[3:], values[3:]))
+            angle = pose_solver.rotation_angle(
+                pose_solver.euler_to_matrix(target, orders[joint]),
+                pose_solver.euler_to_matrix(values[3:], orders[joint]))
+            differs.extend([angle > tolerance] * rotation_count)
+        changed[joint] = differs
+
+    # parents first, a joint under a joint that is written moves with it, so it has to
+    # be written in full to stay where the pose puts it
+    written_paths = set()
+    changed_entries = []
+    for joint in sorted(entries, key=lambda joint: paths[joint].count('|')):
+        path = paths[joint]
+        channels = entries[joint]
+        ancestors = path.split('|')
+        moved = any('|'.join(ancestors[:depth]) in written_paths
+                    for depth in range(2, len(ancestors)))
+        differs = iter(changed[joint])
+        kept = tuple(value if not math.isnan(value) and (next(differs) or moved)
+                     else math.nan for value in channels)
+        written = tuple(channel for channel, value in zip(CHANNELS, kept)
+                        if not math.isnan(value))
+        if written:
+            written_paths.add(path)
+            report.changed[joint] = written
+            report.channels_changed += len(written)
+            changed_entries.append((joint, kept))
+        else:
+            report.unchanged.append(joint)
+    instrumentation.count('poser.channels_skipped', report.channels_skipped)
+    return changed_entries, report
+
+
+def get_backend(backend=None):
+    """
+    Get the backend that poses are applied with
+
+    :param backend: A backend, or the name of one. Defaults to the backend set with
+                    set_backend, then to the TD_POSER_BACKEND environment variable,
+                    then to cmds
+    :type: str
+
+    :return: The backend
+    :type: td_maya_tools.pose_backends.PoseBackend
+    """
+    if isinstance(backend, PoseBackend):
+        return backend
+    if backend is None:
+        if _default_backend is not None:
+            return _default_backend
+        backend = os.environ.get(BACKEND_ENV_VAR, 'cmds')
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}, expected one of '
+                         f'{", ".join(sorted(BACKENDS))}')
+    # backends keep their caches between poses, so only make one of each
+    if backend not in _backend_instances:
+        if issubclass(BACKENDS[backend], CmdsBackend):
+            _backend_instances[backend] = BACKENDS[backend](registry=get_joint_registry())
+        else:
+            _backend_instances[backend] = BACKENDS[backend]()
+    return _backend_instances[backend]
+
+
+def fastest_backend():
+    """
+    Get the fastest backend that can run here, the first of FAST_BACKENDS whose module
+    can be imported. Defaults to the current backend
+
+    :return: The backend
+    :type: td_maya_tools.pose_backends.PoseBackend
+    """
+    for backend, module in FAST_BACKENDS:
+        try:
+            if importlib.util.find_spec(module) is not None:
+                return get_backend(backend)
+        except (ImportError, ValueError):
+            # the parent package is a stand in, or the backend could not load it
+            continue
+    return get_backend()
+
+
+def get_retarget_map(rules=None, backend=None, root=None):
+    """
+    Get retarget rules compiled against the joints in the scene. A compiled map is
+    kept and reused until the joints in the scene change.
+
+    :param rules: The rules, or a compiled map that is returned as it is
+    :type: td_maya_tools.retarget.RetargetRules
+
+    :param backend: The backend, or the name of the backend, whose joint registry
+                    lists the scene joints. Defaults to the shared registry
+    :type: str
+
+    :param root: Only map to the joints under this node, see character_joints
+    :type: str
+
+    :return: The compiled map
+    :type: td_maya_tools.retarget.RetargetMap
+    """
+    if isinstance(rules, RetargetMap):
+        return rules
+    backend = get_backend(backend)
+    registry = getattr(backend, 'registry', None) or get_joint_registry()
+    key = rules if root is None else (rules, root)
+    cached = _retarget_maps.get(key)
+    if (cached is not None and cached[0] is registry
+            and cached[1] == registry.generation):
+        return cached[2]
+    scene_joints = registry.joints if root is None else character_joints(root, backend)
+    retarget_map = RetargetMap(rules, scene_joints)
+    _retarget_maps[key] = (registry, registry.generation, retarget_map)
+    instrumentation.count('poser.retarget_maps_compiled')
+    return retarget_map
+
+
+def character_joints(root=None, backend=None):
+    """
+    Find the joints of a character that is not in a namespace from its root node. The
+    full dag paths of the joints in the scene are read once and kept until the joints
+    in the scene change.
+
+    :param root: The name or dag path of the root node of the character, such as a
+                 root joint or the group the character is under
+    :type: str
+
+    :param backend: The backend, or the name of the backend, whose joint registry
+                    lists the scene joints. Defaults to the shared registry
+    :type: str
+
+    :return: The scene joints under the root, with the root itself if it is a joint
+    :type: list
+    """
+    global _scene_paths
+    backend = get_backend(backend)
+    registry = getattr(backend, 'registry', None) or get_joint_registry()
+    if (_scene_paths is None or _scene_paths[0] is not registry
+            or _scene_paths[1] != registry.generation):
+        valid_joints, _ = backend.verify_joints(registry.sorted_joints())
+        paths = backend.dag_paths(sorted(valid_joints))
+        _scene_paths = (registry, registry.generation, paths)
+    # a trailing | makes the root itself match as well as the nodes under it
+    token = f'|{root.strip("|")}|'
+    return [joint for joint, path in _scene_paths[2].items() if token in f'{path}|']
+
+
+def set_backend(backend=None):
+    """
+    Change the backend that poses are applied with
+
+    :param backend: A backend, or the name of one. None goes back to the default
+    :type: str
+
+    :return: The new backend
+    :type: td_maya_tools.pose_backends.PoseBackend
+    """
+    global _default_backend
+    _default_backend = None
+    if backend is not None:
+        _default_backend = get_backend(backend)
+    return get_backend()
+
+
+def get_joint_registry():
+    """
+    Get the registry of the joints in the scene shared by the poser tools. It is made
+    the first time it is needed and follows the scene through callbacks afterwards.
+
+    :return: The joint registry
+    :type: td_maya_tools.joint_registry.JointRegistry
+    """
+    global _joint_registry
+    if _joint_registry is None:
+        from maya import cmds
+        _joint_registry = JointRegistry(cmds)
+        try:
+            _joint_registry.install_callbacks()
+        except ImportError:
+            # outside of Maya there are no scene messages, whoever changes the scene
+            # has to invalidate the registry
+            logger.warning('The Maya API is not available, the joint registry will not '
+                           'follow changes to the scene')
+    return _joint_registry
+
+
+@instrumentation.timed('poser.position_joint')
 def position_joint(joint=None, tx=None, ty=None, tz=None):
     """
     move a joint to the absolute position x, y and z
@@ -75,16 +668,11 @@ def position_joint(joint=None, tx=None, ty=None, tz=None):
     """
     if not verify_joint(joint):
         return None
-    # using "!= None" so that the value of 0 evalutes to True
-    if tx != None:
-        cmds.move(tx, joint, moveX=True, absolute=True)
-    if ty != None:
-        cmds.move(ty, joint, moveY=True, absolute=True)
-    if tz != None:
-        cmds.move(tz, joint, moveZ=True, absolute=True)
+    get_backend('cmds').set_translation(joint, tx, ty, tz)
     return True
 
 
+@instrumentation.timed('poser.rotate_joint')
 def rotate_joint(joint=None, rx=None, ry=None, rz=None):
     """
     rotate a joint to the absolute degree x, y, and z
@@ -106,16 +694,11 @@ def rotate_joint(joint=None, rx=None, ry=None, rz=None):
     """
     if not verify_joint(joint):
         return None
-    # using "!= None" so that the value of 0 evaluate to True
-    if rx != None:
-        cmds.rotate(rx, joint, rotateX=True, absolute=True)
-    if ry != None:
-        cmds.rotate(ry, joint, rotateY=True, absolute=True)
-    if rz != None:
-        cmds.rotate(rz, joint, rotateZ=True, absolute=True)
+    get_backend('cmds').set_rotation(joint, rx, ry, rz)
     return True
 
 
+@instrumentation.timed('poser.verify_joint')
 def verify_joint(node=None):
     """
     Verify if the input node is a joint or not
@@ -126,14 +709,437 @@ def verify_joint(node=None):
     :return: The status of the verification
     :type: bool
     """
+    if get_joint_registry().is_joint(node):
+        return True
+    from maya import cmds
+    instrumentation.count('cmds.objExists')
     if not cmds.objExists(node):
-        cmds.warning(f"The node {node} does not exist!")
+        logger.warning(f"The node {node} does not exist!")
         return None
-    elif cmds.nodeType(node) != "joint":
-        cmds.warning(f"{node} is not a joint!")
+    instrumentation.count('cmds.nodeType')
+    if cmds.nodeType(node) != "joint":
+        logger.warning(f"{node} is not a joint!")
         return None
     return True
 
+
+def verify_joints(nodes=None, backend=None):
+    """
+    Verify a whole list of nodes at once. The scene is only queried once for all of
+    the joints, and once more for the nodes that are not joints.
+
+    :param nodes: The nodes you want to verify
+    :type: list
+
+    :param backend: The backend, or the name of the backend, to query the scene with
+    :type: str
+
+    :return: A tuple containing 2 items
+             1. A set of the nodes that are joints
+             2. A dictionary of the other nodes and why they failed
+    :type: tuple
+    """
+    return get_backend(backend).verify_joints(nodes)
+
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
 
+class ApplyResult(object):
+    """
+    The outcome of applying a pose, listing the joints that were posed and the ones
+    that failed along with the reason.
+    """
+    def __init__(self, pose=None):
+        self.pose = pose
+        self.applied = []
+        self.failures = {}
+        self.diff = None
+
+    def __repr__(self):
+        return (f'ApplyResult({len(self.applied)} applied, '
+                f'{len(self.failures)} failed)')
+
+    def __bool__(self):
+        return bool(self.applied) and not self.failures
+
+
+class BakeResult(ApplyResult):
+    """
+    The outcome of baking a sequence of poses, listing the joints that were keyed and
+    the ones that failed along with the reason.
+    """
+    def __init__(self, frames=None):
+        super().__init__()
+        self.frames = list(frames or ())
+        self.key_count = 0
+
+    def __repr__(self):
+        return (f'BakeResult({self.key_count} keys on {len(self.applied)} joints over '
+                f'{len(self.frames)} frames, {len(self.failures)} failed)')
+
+
+class ChunkedApply(object):
+    """
+    Apply a pose a chunk of joints at a time, so that the host can handle its events in
+    between, see td_maya_tools.guis.apply_progress. The joints are applied parents
+    first, and the size of each chunk is worked out from how long the joints before it
+    took, to keep every chunk close to the time budget.
+    The local channels of the joints are read before anything is changed, and
+    cancelling puts back every joint that was already applied. The chunks and the
+    rollback all go into one undo chunk, which stays open until the apply is finished
+    or cancelled.
+    """
+    def __init__(self, pose=None, joints=None, backend=None, tolerance=None, retarget=None,
+                 budget=CHUNK_BUDGET):
+        """
+        :param pose: The pose to apply
+        :type: td_maya_tools.pose.Pose
+
+        :param joints: The joints to pose. Defaults to all the joints in the pose
+        :type: list
+
+        :param backend: The backend, or the name of the backend, to apply the pose with
+        :type: str
+
+        :param tolerance: Only write the channels that are further than this from the
+                          pose, see apply_pose
+        :type: float
+
+        :param retarget: Rules or a compiled map that rename the joints of the pose to
+                         the scene joints, see get_retarget_map
+        :type: td_maya_tools.retarget.RetargetRules
+
+        :param budget: How long a chunk should take, in seconds
+        :type: float
+        """
+        self.pose = pose
+        self.joints = joints
+        self.backend = get_backend(backend)
+        self.tolerance = tolerance
+        self.retarget = retarget
+        self.budget = budget
+        self.result = ApplyResult(pose)
+        self.state = 'pending'
+        self.done = 0
+        self.chunk_size = INITIAL_CHUNK_SIZE
+        self.seconds_per_joint = None
+        self._entries = []
+        self._snapshot = {}
+        self._undo = None
+
+    def __repr__(self):
+        return f'ChunkedApply({self.state}, {self.done} of {self.total} joints)'
+
+    @property
+    def total(self):
+        """
+        The number of joints to write, known once the apply has started
+        """
+        return len(self._entries)
+
+    @property
+    def progress(self):
+        """
+        The part of the joints that were written, from 0 to 1
+        """
+        if self.state == 'finished':
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    def start(self):
+        """
+        Verify the joints, work out what to write and read the channels to put back if
+        the apply is cancelled. Called by the first step
+        """
+        if self.state != 'pending':
+            return
+        if self.pose is None:
+            logger.warning("You must provide a pose!")
+            self.state = 'finished'
+            return
+        pose, entries = _prepare_entries(self.result, self.pose, self.joints,
+                                         self.backend, self.tolerance, self.retarget)
+        if not entries:
+            self.state = 'finished'
+            return
+        if self.tolerance is None:
+            # a joint applied after its child would move the child again
+            paths = self.backend.dag_paths([joint for joint, _ in entries])
+            entries.sort(key=lambda entry: paths[entry[0]].count('|'))
+        self._entries = entries
+        self._snapshot = self.backend.snapshot([joint for joint, _ in entries])
+        self._undo = ExitStack()
+        self._undo.enter_context(self.backend.undo_chunk(f'apply_pose {pose.name}'))
+        self.state = 'running'
+
+    def step(self):
+        """
+        Apply the next chunk of joints
+
+        :return: Whether there are joints left to apply
+        :type: bool
+        """
+        self.start()
+        if self.state != 'running':
+            return False
+        chunk = self._entries[self.done:self.done + self.chunk_size]
+        start = time.perf_counter()
+        try:
+            failures = self.backend.apply(chunk)
+        except Exception:
+            self.cancel()
+            raise
+        self._measure(time.perf_counter() - start, len(chunk))
+        self.result.failures.update(failures)
+        self.result.applied.extend(joint for joint, _ in chunk if joint not in failures)
+        self.done += len(chunk)
+        instrumentation.count('poser.chunks_applied')
+        if self.done >= self.total:
+            self._close('finished')
+        return self.state == 'running'
+
+    def run(self):
+        """
+        Apply every chunk left, without giving the host a chance to run in between
+
+        :return: The joints that were posed and the ones that failed
+        :type: ApplyResult
+        """
+        while self.step():
+            pass
+        return self.result
+
+    def cancel(self):
+        """
+        Stop applying and put back every joint that was already applied
+
+        :return: Whether every joint was put back
+        :type: bool
+        """
+        if self.state == 'pending':
+            self.state = 'cancelled'
+            return True
+        if self.state != 'running':
+            return False
+        written = {joint: self._snapshot[joint] for joint, _ in self._entries[:self.done]}
+        try:
+            failures = self.backend.restore(written)
+        finally:
+            self._close('cancelled')
+        if failures:
+            logger.warning(f'{len(failures)} joints could not be put back: '
+                           f'{", ".join(sorted(failures))}')
+        self.result.applied = []
+        return not failures
+
+    def _measure(self, seconds=0.0, count=0):
+        """
+        Size the next chunk from how long the last one took
+        """
+        if not count:
+            return
+        cost = seconds / count
+        if self.seconds_per_joint is None:
+            self.seconds_per_joint = cost
+        else:
+            # smooth it, one slow chunk should not shrink the next one to nothing
+            self.seconds_per_joint = (self.seconds_per_joint + cost) / 2.0
+        if self.seconds_per_joint > 0.0:
+            self.chunk_size = max(1, int(self.budget / self.seconds_per_joint))
+        else:
+            self.chunk_size *= 2
+
+    def _close(self, state=None):
+        """
+        Close the undo chunk and record how the apply ended
+        """
+        self.state = state
+        if self._undo is not None:
+            self._undo.close()
+            self._undo = None
+
+
+class PosePreview(object):
+    """
+    Show poses on the rig for a moment, such as while the cursor is over their tile,
+    without going through the undo queue. The local channels of the joints are kept in
+    a flat array when the preview starts, and every pose shown is written over them
+    with the fastest backend. Showing another pose or clearing the preview first puts
+    back the joints the last pose wrote, in one write.
+    A preview is committed by clearing it and applying the pose as usual, so the undo
+    queue only holds the pose that was applied.
+    """
+    def __init__(self, backend=None, retarget=None, targets=None):
+        """
+        :param backend: The backend, or the name of the backend, to show poses with.
+                        Defaults to fastest_backend
+        :type: str
+
+        :param retarget: Rules or a compiled map that rename the joints of the poses to
+                         the scene joints, see get_retarget_map
+        :type: td_maya_tools.retarget.RetargetRules
+
+        :param targets: The characters to show poses on, see apply_pose_to_characters.
+                        Defaults to the joints named in the poses
+        :type: list
+        """
+        self.backend = fastest_backend() if backend is None else get_backend(backend)
+        self.retarget = retarget
+        self.targets = targets
+        self.pose = None
+        # the joints of the snapshot, and their six local channels one after another
+        self._joints = {}
+        self._values = array('d')
+        self._shown = []
+
+    def __repr__(self):
+        return (f'PosePreview({self.pose.name if self.pose is not None else None}, '
+                f'{len(self._joints)} joints kept)')
+
+    @property
+    def active(self):
+        """
+        Whether the channels of the joints are kept to be put back
+        """
+        return bool(self._joints)
+
+    def start(self, joints=None):
+        """
+        Keep the current channels of the joints that poses may change, putting back the
+        pose that is shown first
+
+        :param joints: The joints to keep. Defaults to all the joints in the scene,
+                       joints that are written but not kept are kept as they are written
+        :type: list
+
+        :return: The number of joints that are kept
+        :type: int
+        """
+        self.clear()
+        if joints is None:
+            registry = getattr(self.backend, 'registry', None) or get_joint_registry()
+            joints = registry.sorted_joints()
+        valid_joints, _ = self.backend.verify_joints(joints)
+        self._joints = {}
+        self._values = array('d')
+        with instrumentation.phase('poser.PosePreview.start'):
+            self._keep([joint for joint in joints if joint in valid_joints])
+        return len(self._joints)
+
+    def show(self, pose=None):
+        """
+        Put back the pose that is shown and show another one
+
+        :param pose: The pose to show, or None to only put back the one that is shown
+        :type: td_maya_tools.pose.Pose
+
+        :return: The joints that were posed and the ones that failed, None when no pose
+                 is shown
+        :type: ApplyResult
+        """
+        if not self._joints:
+            self.start()
+        with instrumentation.phase('poser.PosePreview.show'):
+            self.clear()
+            if pose is None:
+                return None
+            if self.targets:
+                results = {}
+                entries, _ = _character_entries(results, pose, self.targets, None,
+                                                self.backend, self.retarget)
+                result = ApplyResult(pose)
+                for character_result in results.values():
+                    result.failures.update(character_result.failures)
+            else:
+                result = ApplyResult(pose)
+                _, entries = _prepare_entries(result, pose, None, self.backend,
+                                              retarget=self.retarget)
+            self._keep([joint for joint, _ in entries if joint not in self._joints])
+            with self.backend.without_undo():
+                failures = self.backend.apply(entries)
+        self.pose = pose
+        self._shown = [joint for joint, _ in entries]
+        result.failures.update(failures)
+        result.applied.extend(joint for joint in self._shown if joint not in failures)
+        instrumentation.count('poser.poses_previewed')
+        return result
+
+    def clear(self):
+        """
+        Put back the joints the pose that is shown wrote, in one write
+
+        :return: A dictionary of the joints that could not be put back and why
+        :type: dict
+        """
+        if not self._shown:
+            return {}
+        values = self._values
+        snapshot = {}
+        for joint in self._shown:
+            start = self._joints[joint] * 6
+            snapshot[joint] = (tuple(values[start:start + 3]),
+                               tuple(values[start + 3:start + 6]))
+        with self.backend.without_undo():
+            failures = self.backend.restore(snapshot)
+        self.pose = None
+        self._shown = []
+        return failures
+
+    def stop(self):
+        """
+        Put back the pose that is shown and let go of the channels that were kept
+
+        :return: A dictionary of the joints that could not be put back and why
+        :type: dict
+        """
+        failures = self.clear()
+        self._joints = {}
+        self._values = array('d')
+        return failures
+
+    def _keep(self, joints=None):
+        """
+        Add the current channels of joints that have been verified to the ones kept
+        """
+        if not joints:
+            return
+        for joint, (translate, rotate) in self.backend.snapshot(joints).items():
+            self._joints[joint] = len(self._joints)
+            self._values.extend(translate)
+            self._values.extend(rotate)
+
+
+class DiffReport(object):
+    """
+    What an apply with a tolerance wrote, and what it left alone because it was
+    already at its value.
+    """
+    def __init__(self, tolerance=DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        self.changed = {}
+        self.unchanged = []
+        self.channels_checked = 0
+        self.channels_changed = 0
+
+    def __repr__(self):
+        return (f'DiffReport({self.channels_changed} of {self.channels_checked} '
+                f'channels changed on {len(self.changed)} joints)')
+
+    @property
+    def channels_skipped(self):
+        """
+        The number of channels that were not written
+        """
+        return self.channels_checked - self.channels_changed
+
+    def as_dict(self):
+        """
+        :return: The report as plain values, to be saved as JSON
+        :type: dict
+        """
+        return {'tolerance': self.tolerance,
+                'channels_checked': self.channels_checked,
+                'channels_changed': self.channels_changed,
+                'channels_skipped': self.channels_skipped,
+                'changed': {joint: list(channels) for joint, channels in self.changed.items()},
+                'unchanged': list(self.unchanged)}
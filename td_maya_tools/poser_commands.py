@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    A Maya command that puts the scene changes made through the API into the undo
+    queue.
+
+:description:
+    Changes done with an MDGModifier or an MAnimCurveChange outside of a command never
+    reach the undo queue, so Ctrl+Z would not revert them. run hands such a change to
+    the tdPoserOperation command, loading this file as a plugin the first time, and the
+    command does it and keeps it to undo and redo. The change becomes a step of the
+    undo queue like any other, and undo chunks group it with the rest.
+    A change is anything with a doIt and an undoIt method, where calling doIt again
+    after undoIt redoes it, such as an MDGModifier.
+    Contains the following functions:
+        run
+        maya_useNewAPI
+        initializePlugin
+        uninitializePlugin
+    Contains the following classes:
+        OperationCommand
+
+:applications:
+    Maya
+
+:see_also:
+    td_maya_tools.pose_backends
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+import maya.api.OpenMaya as om
+
+# Imports That You Wrote
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+PLUGIN_NAME = 'poser_commands'
+COMMAND_NAME = 'tdPoserOperation'
+
+# the changes handed to the command, Maya commands only take strings and numbers
+_pending = []
+
+
+def run(operation=None, cmds=None):
+    """
+    Do a change through the tdPoserOperation command, so that it goes into the undo
+    queue
+
+    :param operation: The change, such as an MDGModifier
+    :type: object
+
+    :param cmds: The maya.cmds module, or a stand in with the same functions
+    :type: module
+
+    :return: The change
+    :type: object
+    """
+    if cmds is None:
+        from maya import cmds
+    if not cmds.pluginInfo(PLUGIN_NAME, query=True, loaded=True):
+        cmds.loadPlugin(__file__, quiet=True)
+    _pending.append(operation)
+    try:
+        getattr(cmds, COMMAND_NAME)()
+    finally:
+        # the command takes it, unless it failed before it could
+        if _pending and _pending[-1] is operation:
+            _pending.pop()
+    return operation
+
+
+def maya_useNewAPI():
+    """
+    Tell Maya that the plugin uses the Python API 2.0
+    """
+    pass
+
+
+def initializePlugin(plugin=None):
+    om.MFnPlugin(plugin, 'trashgraphicard', '1.0').registerCommand(
+        COMMAND_NAME, OperationCommand.creator)
+
+
+def uninitializePlugin(plugin=None):
+    om.MFnPlugin(plugin).deregisterCommand(COMMAND_NAME)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class OperationCommand(om.MPxCommand):
+    """
+    Does the change handed to run, and keeps it to undo and redo.
+    """
+    def __init__(self):
+        super().__init__()
+        self.operation = None
+
+    @staticmethod
+    def creator():
+        return OperationCommand()
+
+    def doIt(self, args=None):
+        # Maya loads the plugin as a module of its own, the change is waiting in the
+        # module run was called from
+        from td_maya_tools import poser_commands
+        if not poser_commands._pending:
+            raise RuntimeError(f'{COMMAND_NAME} is only called by poser_commands.run')
+        self.operation = poser_commands._pending.pop()
+        self.operation.doIt()
+
+    def undoIt(self):
+        self.operation.undoIt()
+
+    def redoIt(self):
+        self.operation.doIt()
+
+    def isUndoable(self):
+        return True
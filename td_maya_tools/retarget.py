@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+#SETMODE 777
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    trashgraphicard
+
+:synopsis:
+    Map the joint names of poses onto the joints of a rig.
+
+:description:
+    Poses name their joints the way the rig they were made on did. RetargetRules
+    describe how those names become the names of another rig, by stripping or adding
+    a namespace, swapping prefixes and suffixes, regex substitutions and swapping the
+    left and right side of a mirrored pose. A RetargetMap compiles the rules against
+    the joints of a scene once, after which every joint name resolves with a
+    dictionary lookup, and retargets whole poses onto the scene joints.
+    When mirroring, every value is mirrored across a plane through the world origin,
+    so channels along the mirror axis flip their sign.
+    Contains the following functions:
+        mirror_signs
+        short_name
+        find_namespaces
+    Contains the following classes:
+        RetargetRules
+        RetargetMap
+
+:applications:
+    None
+
+:see_also:
+    td_maya_tools.poser
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Default Python Imports
+from array import array
+import copy
+import re
+
+# Imports That You Wrote
+from td_maya_tools.pose import Pose, CHANNELS
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+# left and right name tokens, each swapped when found at the start or end of a name
+DEFAULT_MIRROR_PAIRS = (('_L', '_R'), ('_l', '_r'), ('L_', 'R_'), ('l_', 'r_'),
+                        ('Left', 'Right'), ('left', 'right'))
+MIRROR_AXES = ('x', 'y', 'z')
+
+
+def mirror_signs(axis='x'):
+    """
+    The signs that mirror the channels of a joint across the plane facing an axis.
+    The translation along the axis flips, and so do the rotations around the two
+    other axes.
+
+    :param axis: x, y or z, the axis the mirror plane faces
+    :type: str
+
+    :return: One sign per channel, in the order of td_maya_tools.pose.CHANNELS
+    :type: tuple
+    """
+    if axis not in MIRROR_AXES:
+        raise ValueError(f'Unknown mirror axis {axis}, expected one of '
+                         f'{", ".join(MIRROR_AXES)}')
+    position = MIRROR_AXES.index(axis)
+    translate = tuple(-1.0 if i == position else 1.0 for i in range(3))
+    rotate = tuple(1.0 if i == position else -1.0 for i in range(3))
+    return translate + rotate
+
+
+def short_name(name=None):
+    """
+    :return: A node name without its dag path and namespaces
+    :type: str
+    """
+    return name.rpartition('|')[2].rpartition(':')[2]
+
+
+def find_namespaces(scene_joints=None):
+    """
+    Find the namespaces of the joints of a scene, such as the referenced characters
+
+    :param scene_joints: The names of all the joints in the scene
+    :type: iterable
+
+    :return: The namespaces, sorted
+    :type: list
+    """
+    namespaces = set()
+    for joint in scene_joints or ():
+        namespace = joint.rpartition('|')[2].rpartition(':')[0]
+        if namespace:
+            namespaces.add(namespace)
+    return sorted(namespaces)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class RetargetRules(object):
+    """
+    How the joint names of a pose become the joint names of a rig. The rules are
+    applied in the order of the parameters below. Rules compare equal when they make
+    the same names, so they can be used to look up compiled maps.
+    """
+    def __init__(self, namespace=None, strip_namespaces=True, prefixes=None,
+                 suffixes=None, patterns=None, mirror=False, mirror_pairs=None,
+                 mirror_axis='x', signs=None):
+        """
+        :param namespace: The namespace of the rig, added to every name, such as char1
+        :type: str
+
+        :param strip_namespaces: Remove the namespaces the pose was saved with
+        :type: bool
+
+        :param prefixes: Pairs of a prefix and the prefix it is swapped for
+        :type: list
+
+        :param suffixes: Pairs of a suffix and the suffix it is swapped for
+        :type: list
+
+        :param patterns: Pairs of a regular expression and its replacement, as
+                         taken by re.sub
+        :type: list
+
+        :param mirror: Swap the left and right side of the pose
+        :type: bool
+
+        :param mirror_pairs: Pairs of left and right name tokens, see
+                             DEFAULT_MIRROR_PAIRS
+        :type: list
+
+        :param mirror_axis: The axis the mirror plane faces, see mirror_signs
+        :type: str
+
+        :param signs: One sign per channel to multiply the values with, instead of the
+                      ones of the mirror axis
+        :type: tuple
+        """
+        self.namespace = namespace.strip(':') if namespace else None
+        self.strip_namespaces = strip_namespaces
+        self.prefixes = tuple(tuple(pair) for pair in prefixes or ())
+        self.suffixes = tuple(tuple(pair) for pair in suffixes or ())
+        self.patterns = tuple((re.compile(pattern), replacement)
+                              for pattern, replacement in patterns or ())
+        self.mirror = mirror
+        self.mirror_pairs = tuple(tuple(pair) for pair in
+                                  (DEFAULT_MIRROR_PAIRS if mirror_pairs is None
+                                   else mirror_pairs))
+        if signs is None and mirror:
+            signs = mirror_signs(mirror_axis)
+        if signs is not None:
+            signs = tuple(float(sign) for sign in signs)
+            if len(signs) != len(CHANNELS):
+                raise ValueError(f'Expected {len(CHANNELS)} signs, got {len(signs)}')
+            if all(sign == 1.0 for sign in signs):
+                signs = None
+        self.signs = signs
+
+    def __repr__(self):
+        return f'RetargetRules(namespace={self.namespace!r}, mirror={self.mirror})'
+
+    def __eq__(self, other):
+        return isinstance(other, RetargetRules) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    @property
+    def key(self):
+        """
+        Everything that changes the names or values the rules make
+        """
+        return (self.namespace, self.strip_namespaces, self.prefixes, self.suffixes,
+                tuple((pattern.pattern, replacement)
+                      for pattern, replacement in self.patterns),
+                self.mirror, self.mirror_pairs if self.mirror else (), self.signs)
+
+    def with_namespace(self, namespace=None):
+        """
+        :param namespace: The namespace of another rig
+        :type: str
+
+        :return: A copy of the rules that adds another namespace
+        :type: RetargetRules
+        """
+        rules = copy.copy(self)
+        rules.namespace = namespace.strip(':') if namespace else None
+        return rules
+
+    def target_name(self, joint=None):
+        """
+        Apply the rules to the name of a joint
+
+        :param joint: The name of the joint in the pose
+        :type: str
+
+        :return: The name the joint should have in the rig
+        :type: str
+        """
+        namespace, _, name = joint.rpartition(':')
+        if not self.strip_namespaces and namespace:
+            name = joint
+        if self.mirror:
+            name = self.mirror_name(name)
+        for old, new in self.prefixes:
+            if name.startswith(old):
+                name = new + name[len(old):]
+        for old, new in self.suffixes:
+            if name.endswith(old):
+                name = name[:len(name) - len(old)] + new
+        for pattern, replacement in self.patterns:
+            name = pattern.sub(replacement, name)
+        if self.namespace:
+            name = f'{self.namespace}:{name}'
+        return name
+
+    def mirror_name(self, name=None):
+        """
+        Swap the first left or right token found at the start or end of a name for
+        the other side
+
+        :param name: The name of a joint without its namespace
+        :type: str
+
+        :return: The name of the joint on the other side, the same name for joints
+                 in the middle
+        :type: str
+        """
+        for left, right in self.mirror_pairs:
+            for old, new in ((left, right), (right, left)):
+                if name.endswith(old):
+                    return name[:len(name) - len(old)] + new
+                if name.startswith(old):
+                    return new + name[len(old):]
+        return name
+
+
+class RetargetMap(object):
+    """
+    Retargeting rules compiled against the joints of one scene. The scene joints are
+    indexed once, and each pose joint is resolved the first time it is seen and
+    remembered afterwards.
+    """
+    def __init__(self, rules=None, scene_joints=None):
+        """
+        :param rules: The rules to map names with, defaults to stripping namespaces
+        :type: RetargetRules
+
+        :param scene_joints: The names of all the joints in the scene
+        :type: iterable
+        """
+        self.rules = rules or RetargetRules()
+        self.scene_joints = frozenset(scene_joints or ())
+        # names without their namespace -> the scene joints with that name
+        self._short_names = {}
+        for joint in self.scene_joints:
+            self._short_names.setdefault(short_name(joint), []).append(joint)
+        self.joints = {}
+        self.failures = {}
+
+    def __repr__(self):
+        return (f'RetargetMap({len(self.joints)} joints resolved, '
+                f'{len(self.failures)} failed)')
+
+    def resolve(self, joint=None):
+        """
+        Find the scene joint a pose joint maps to. A name without a namespace that is
+        not in the scene also matches a single joint with the same name in a namespace
+        or under a parent, as Maya names joints whose name is not unique.
+
+        :param joint: The name of the joint in the pose
+        :type: str
+
+        :return: The name of the scene joint, None if there is none
+        :type: str
+        """
+        if joint in self.joints:
+            return self.joints[joint]
+        name = self.rules.target_name(joint)
+        target = None
+        if name in self.scene_joints:
+            target = name
+        elif ':' in name:
+            self.failures[joint] = f'{name} does not exist'
+        else:
+            matches = self._short_names.get(name, ())
+            if len(matches) == 1:
+                target = matches[0]
+            elif matches:
+                self.failures[joint] = (f'{name} matches several joints: '
+                                        f'{", ".join(sorted(matches))}')
+            else:
+                self.failures[joint] = f'{name} does not exist'
+        self.joints[joint] = target
+        return target
+
+    def retarget(self, pose=None, joints=None):
+        """
+        Rename the joints of a pose to the scene joints, and mirror its values if the
+        rules mirror. A pose that needs neither is returned as it is.
+
+        :param pose: The pose to retarget
+        :type: td_maya_tools.pose.Pose
+
+        :param joints: The pose joints to keep. Defaults to all the joints in the pose
+        :type: list
+
+        :return: A tuple containing 2 items
+                 1. The pose with the scene joint names
+                 2. A dictionary of the pose joints that could not be mapped and why
+        :type: tuple
+        """
+        failures = {}
+        if joints is None:
+            joints = pose.joints
+        targets = []
+        sources = {}
+        for joint in joints:
+            if joint not in pose:
+                failures[joint] = 'not in the pose'
+                continue
+            target = self.resolve(joint)
+            if target is None:
+                failures[joint] = self.failures[joint]
+            elif target in sources:
+                failures[joint] = f'{target} is already posed by {sources[target]}'
+            else:
+                sources[target] = joint
+                targets.append(target)
+
+        signs = self.rules.signs
+        if (signs is None and len(targets) == len(pose.joints)
+                and all(target == joint for target, joint in zip(targets, pose.joints))):
+            return pose, failures
+        values = array('d')
+        for target in targets:
+            channels = pose.channels(sources[target])
+            if signs is not None:
+                channels = [value * sign for value, sign in zip(channels, signs)]
+            values.extend(channels)
+        return Pose(pose.name, targets, values), failures
@@ -13,13 +13,29 @@
 
 :description:
     Utilitary functions and classes that help working with xml files.
+    Poses are written in the same layout they are read in:
+        <root>
+            <pose>
+                <joint>
+                    <translations tx="0.0" ty="0.0" tz="0.0"/>
+                    <rotations rx="0.0" ry="0.0" rz="0.0"/>
+                </joint>
+            </pose>
+        </root>
+    Channels that are not set are left out, and so are the namespaces of pose and
+    joint names, which can not be part of an element name.
     Contains the following funtions:
         read_pose_xml
+        index_pose_xml
+        write_pose_xml
+        update_pose_xml
+        find_non_numeric_channels
     Contains the following classes:
         Autovivification
+        PoseLibrary
 
 :applications:
-    Maya
+    None
 
 :see_also:
     td_maaya_tools.guis.maya_gui_utils
@@ -29,23 +45,36 @@
 #----------------------------------------------------------------------------- IMPORTS --#
 
 # Default Python Imports
-from maya import cmds
+from array import array
+from collections.abc import Mapping
+import logging
+import math
 import os
+import re
 import xml.etree.ElementTree as et
+from xml.parsers import expat
 
 # Imports That You Wrote
+from td_maya_tools import instrumentation
+from td_maya_tools.pose import Pose, CHANNELS, CHANNEL_GROUPS, parse_channel
 
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+logger = logging.getLogger(__name__)
+# pose and joint names become element names, so they have to be valid ones
+_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_.-]*$')
+_INDENT = '    '
+
+@instrumentation.timed('xml_utils.read_pose_xml')
 def read_pose_xml(path=None):
     """
     Read an xml file containing information on poses and their properties, and convert
-    them into a dictionary
+    them into a dictionary of poses. The channel values are parsed into floats once.
     The dictionary should look something like this:
-        dict[pose][joint][translations/rotations][x/y/x value] = '<x/y/z value>'
+        dict[pose] = Pose
     For example:
-        dict[dance][Spine][rotations][ry] = 48.45
+        dict[dance].rotation(Spine) = (53.32, 48.45, 40.89)
 
     :param path: Full path the the xml file
     :type: string
@@ -54,26 +83,362 @@ def read_pose_xml(path=None):
     :type: dict
     """
     if not path:
-        cmds.warning('You must provide a file path')
+        logger.warning('You must provide a file path')
         return None
     if not os.path.isfile(path):
-        cmds.warning(f'The file path, {path}, is not a file')
+        logger.warning(f'The file path, {path}, is not a file')
         return None
     
-    pose_dict = Autovivification()
-    xml_fh = et.parse(path)
-    root = xml_fh.getroot()
-    for xml_pose in root:
-        pose = xml_pose.tag
-        for xml_joint in xml_pose:
-            joint = xml_joint.tag
-            for xml_attr in xml_joint:
-                attr_type = xml_attr.tag
-                attr_value = xml_attr.attrib
-                pose_dict[pose][joint][attr_type] = attr_value
+    pose_dict = {}
+    joint_tables = {}
+    # stream the file instead of building the whole tree, each pose element is
+    # cleared as soon as it has been converted to a Pose
+    depth = 0
+    root = None
+    for event, element in et.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if depth == 0:
+                root = element
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            pose_dict[element.tag] = _build_pose(element, joint_tables)
+            element.clear()
+            root.remove(element)
     return pose_dict
 
 
+@instrumentation.timed('xml_utils.index_pose_xml')
+def index_pose_xml(path=None):
+    """
+    Scan an xml file containing poses and record where each pose lives in the file,
+    without parsing any of the joints. The poses are parsed on demand when they are
+    looked up in the returned mapping.
+
+    :param path: Full path the the xml file
+    :type: string
+
+    :return: A lazy, read only mapping of pose names to poses
+    :type: PoseLibrary
+    """
+    if not path:
+        logger.warning('You must provide a file path')
+        return None
+    if not os.path.isfile(path):
+        logger.warning(f'The file path, {path}, is not a file')
+        return None
+
+    return PoseLibrary(path, _scan_pose_offsets(path)[0])
+
+
+@instrumentation.timed('xml_utils.write_pose_xml')
+def write_pose_xml(poses=None, path=None):
+    """
+    Write poses to a new xml file, or replace an existing one, in the layout that
+    read_pose_xml reads. The poses are written one at a time as they come, so a
+    generator of poses is never held in memory all at once. The file is written next
+    to the destination and moved in place once it is complete. The names are written
+    without their namespaces.
+
+    :param poses: The poses to write, or a mapping of pose names to poses
+    :type: iterable
+
+    :param path: Full path to the xml file
+    :type: str
+
+    :return: The number of poses written
+    :type: int
+    """
+    if isinstance(poses, Mapping):
+        poses = poses.values()
+    count = 0
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as xml_fh:
+            xml_fh.write('<?xml version="1.0" ?>\n<root>\n')
+            for pose in poses or ():
+                xml_fh.write(f'{_INDENT}{_format_pose(pose)}\n')
+                count += 1
+            xml_fh.write('</root>\n')
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return count
+
+
+@instrumentation.timed('xml_utils.update_pose_xml')
+def update_pose_xml(poses=None, path=None):
+    """
+    Add poses to an existing xml file, replacing the poses that have the same name.
+    The untouched poses are copied over byte for byte, a chunk at a time, so the file
+    is never held in memory. The new file is written next to the old one and moved in
+    place once it is complete. A file that does not exist yet is written with
+    write_pose_xml.
+
+    :param poses: The poses to add, or a mapping of pose names to poses
+    :type: iterable
+
+    :param path: Full path to the xml file
+    :type: str
+
+    :return: A tuple containing 2 items
+             1. The names of the poses that were replaced
+             2. The names of the poses that were added
+    :type: tuple
+    """
+    if isinstance(poses, Mapping):
+        poses = poses.values()
+    poses = {_element_name(pose.name, 'pose'): pose for pose in poses or ()}
+    if not os.path.isfile(path):
+        write_pose_xml(poses, path)
+        return [], list(poses)
+
+    offsets, root_end = _scan_pose_offsets(path)
+    replaced = [name for name in offsets if name in poses]
+    added = [name for name in poses if name not in offsets]
+    if not poses:
+        return replaced, added
+    # text for every pose first, so a bad pose fails before the file is touched
+    texts = {name: _format_pose(pose) for name, pose in poses.items()}
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(path, 'rb') as xml_fh, open(temp_path, 'wb') as temp_fh:
+            # the poses that are replaced, in the order they are in the file, with the
+            # end of their closing tag
+            spans = []
+            for name in replaced:
+                start, end = offsets[name]
+                spans.append((start, _element_end(xml_fh, name, start, end), name))
+            spans.sort()
+
+            position = 0
+            for start, end, name in spans:
+                _copy_bytes(xml_fh, temp_fh, position, start)
+                temp_fh.write(texts[name].encode('utf-8'))
+                position = end
+            # everything between the last replaced pose and the end of the root,
+            # including the untouched poses
+            _copy_bytes(xml_fh, temp_fh, position, root_end)
+            for name in added:
+                temp_fh.write(f'{_INDENT}{texts[name]}\n'.encode('utf-8'))
+            _copy_bytes(xml_fh, temp_fh, root_end)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return replaced, added
+
+
+@instrumentation.timed('xml_utils.find_non_numeric_channels')
+def find_non_numeric_channels(path=None):
+    """
+    Find the channels of an xml file whose value is not a number. Those channels are
+    read as not set, this tells them apart from the ones that are empty. The file is
+    scanned without building any elements.
+
+    :param path: Full path to the xml file
+    :type: str
+
+    :return: A dictionary of pose names to dictionaries of joint names to the names of
+             their channels that are not numbers
+    :type: dict
+    """
+    found = {}
+    state = {'depth': 0, 'pose': None, 'joint': None}
+    parser = expat.ParserCreate()
+
+    def start_element(name, attrs):
+        state['depth'] += 1
+        if state['depth'] == 2:
+            state['pose'] = name
+        elif state['depth'] == 3:
+            state['joint'] = name
+        elif state['depth'] == 4 and name in CHANNEL_GROUPS:
+            for channel in CHANNEL_GROUPS[name]:
+                try:
+                    parse_channel(attrs.get(channel))
+                except ValueError:
+                    joints = found.setdefault(state['pose'], {})
+                    joints[state['joint']] = joints.get(state['joint'], ()) + (channel,)
+
+    def end_element(name):
+        state['depth'] -= 1
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    with open(path, 'rb') as xml_fh:
+        parser.ParseFile(xml_fh)
+    return found
+
+
+def _scan_pose_offsets(path=None):
+    """
+    Find where every pose, and the closing tag of the root, are in an xml file
+
+    :return: A tuple containing 2 items
+             1. A dictionary of pose names to the byte index of their start tag and
+                of their closing tag
+             2. The byte index of the closing tag of the root
+    :type: tuple
+    """
+    offsets = {}
+    state = {'depth': 0, 'pose': None, 'start': None, 'root_end': None}
+    parser = expat.ParserCreate()
+
+    def start_element(name, attrs):
+        state['depth'] += 1
+        if state['depth'] == 2:
+            state['pose'] = name
+            state['start'] = parser.CurrentByteIndex
+
+    def end_element(name):
+        if state['depth'] == 2:
+            # the byte index points at the closing tag, or right after the tag of a
+            # self closing pose element
+            offsets[state['pose']] = (state['start'], parser.CurrentByteIndex)
+        elif state['depth'] == 1:
+            state['root_end'] = parser.CurrentByteIndex
+        state['depth'] -= 1
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    with open(path, 'rb') as xml_fh:
+        while True:
+            chunk = xml_fh.read(PoseLibrary.chunk_size)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+    return offsets, state['root_end']
+
+
+def _element_end(xml_fh=None, name=None, start=0, end=0):
+    """
+    :return: The byte index right after a pose element, given the offsets recorded
+             by _scan_pose_offsets
+    :type: int
+    """
+    xml_fh.seek(end - 2)
+    if xml_fh.read(2) == b'/>':
+        # self closing, it ends with its only tag
+        return end
+    return end + len(f'</{name}>'.encode('utf-8'))
+
+
+def _copy_bytes(source_fh=None, target_fh=None, start=0, end=None):
+    """
+    Copy part of a file to another a chunk at a time, from start up to end or to the
+    end of the file
+    """
+    source_fh.seek(start)
+    remaining = None if end is None else end - start
+    while remaining is None or remaining > 0:
+        size = PoseLibrary.chunk_size if remaining is None \
+            else min(PoseLibrary.chunk_size, remaining)
+        chunk = source_fh.read(size)
+        if not chunk:
+            break
+        target_fh.write(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def _format_pose(pose=None):
+    """
+    Write a pose as xml text, starting at its start tag and ending at its closing tag,
+    with the lines in between indented under a pose at the first level of the root
+
+    :param pose: The pose, its name and the names of its joints are written without
+                 their namespaces
+    :type: Pose
+
+    :return: The xml text
+    :type: str
+    """
+    pose_name = _element_name(pose.name, 'pose')
+    indent = _INDENT * 2
+    lines = [f'<{pose_name}>']
+    written = set()
+    for joint in pose.joints:
+        element = _element_name(joint, 'joint')
+        if element in written:
+            raise ValueError(f'The pose {pose.name} has more than one joint named '
+                             f'{element} once namespaces are removed')
+        written.add(element)
+        lines.append(f'{indent}<{element}>')
+        values = dict(zip(CHANNELS, pose.channels(joint)))
+        for group, channels in CHANNEL_GROUPS.items():
+            attributes = ' '.join(f'{channel}="{values[channel]!r}"' for channel in channels
+                                  if not math.isnan(values[channel]))
+            if attributes:
+                lines.append(f'{indent}{_INDENT}<{group} {attributes}/>')
+        lines.append(f'{indent}</{element}>')
+    lines.append(f'{_INDENT}</{pose_name}>')
+    return '\n'.join(lines)
+
+
+def _element_name(name=None, kind=None):
+    """
+    The name a pose or joint is written with. Namespaces can not be part of an element
+    name, so they are left out, the poses are applied to namespaced rigs through
+    td_maya_tools.retarget.RetargetRules
+
+    :raises: ValueError if the name can not be written
+    """
+    if isinstance(name, str):
+        name = name.rpartition(':')[2]
+    _check_name(name, kind)
+    return name
+
+
+def _check_name(name=None, kind=None):
+    """
+    Make sure a pose or joint name can be written as an element name
+
+    :raises: ValueError if it can not
+    """
+    if not isinstance(name, str) or not _NAME_PATTERN.match(name) \
+            or name.lower().startswith('xml'):
+        raise ValueError(f'The {kind} name {name!r} can not be written to an xml file')
+
+
+def _build_pose(xml_pose=None, joint_tables=None):
+    """
+    Convert a single pose element into a Pose.
+
+    :param xml_pose: The xml element of the pose
+    :type: xml.etree.ElementTree.Element
+
+    :param joint_tables: Joint names and indices already used by other poses, so that
+                         poses with the same joints share them instead of copying them
+    :type: dict
+
+    :return: The pose
+    :type: Pose
+    """
+    joints = []
+    values = array('d')
+    for xml_joint in xml_pose:
+        joints.append(xml_joint.tag)
+        channel_dict = {}
+        for xml_attr in xml_joint:
+            if xml_attr.tag in CHANNEL_GROUPS:
+                channel_dict.update(xml_attr.attrib)
+        for channel in CHANNELS:
+            try:
+                values.append(parse_channel(channel_dict.get(channel)))
+            except ValueError:
+                logger.warning(f'{xml_pose.tag}: {xml_joint.tag}.{channel} is not a number')
+                values.append(parse_channel())
+
+    joints = tuple(joints)
+    index = None
+    if joint_tables is not None:
+        joints, index = joint_tables.setdefault(
+            joints, (joints, {joint: i for i, joint in enumerate(joints)}))
+    return Pose(xml_pose.tag, joints, values, index)
 
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
@@ -81,6 +446,7 @@ def read_pose_xml(path=None):
 class Autovivification(dict):
     """
     This is a Python implementation of Perl's autovivification feature.
+    It is no longer used to store poses, see td_maya_tools.pose.Pose.
     """
     def __getitem__(self, item):
         try:
@@ -88,5 +454,36 @@ class Autovivification(dict):
         except KeyError:
             value = self[item] = type(self)()
             return value
-        
-        
\ No newline at end of file
+
+
+class PoseLibrary(Mapping):
+    """
+    A read only mapping over the poses of an xml file. Only the byte offsets of the
+    poses are kept, each pose is read and parsed from the file when it is accessed.
+    """
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path=None, offsets=None):
+        self.path = path
+        self.offsets = offsets or {}
+
+    def __getitem__(self, pose):
+        start, end = self.offsets[pose]
+        with open(self.path, 'rb') as xml_fh:
+            xml_fh.seek(start)
+            fragment = xml_fh.read(end - start)
+        if fragment.endswith(b'/>'):
+            # self closing pose element, it has no joints
+            return Pose(pose)
+        # the recorded range stops right before the closing tag of the pose
+        fragment += f'</{pose}>'.encode('utf-8')
+        return _build_pose(et.fromstring(fragment))
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, pose):
+        return pose in self.offsets
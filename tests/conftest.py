@@ -0,0 +1,119 @@
+"""
+Fixtures shared by the tests, a fake scene with a small rig that maya.cmds and
+maya.api.OpenMaya answer from.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+from td_maya_testing.fake_api import install_maya_api
+from td_maya_testing.fake_scene import FakeScene, install_maya_cmds
+from td_maya_tools import poser
+
+# name, parent, translate, joint orient, rotate axis, rotate order
+RIG = (
+    ('root', 'rig', (0.0, 10.0, 0.0), (0.0, 0.0, 90.0), (0.0, 0.0, 0.0), 0),
+    ('spine', 'root', (5.0, 0.0, 0.0), (0.0, 0.0, -15.0), (0.0, 0.0, 0.0), 0),
+    ('chest', 'spine', (5.0, 0.0, 0.0), (10.0, 0.0, 0.0), (0.0, 20.0, 0.0), 3),
+    ('neck', 'chest', (4.0, 0.0, 0.0), (0.0, 30.0, 0.0), (0.0, 0.0, 0.0), 5),
+    ('arm_l', 'chest', (2.0, 3.0, 0.0), (0.0, -90.0, 45.0), (5.0, 0.0, 0.0), 1),
+    ('hand_l', 'arm_l', (6.0, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0), 2),
+)
+JOINTS = tuple(joint for joint, *_ in RIG)
+
+# local channels that put the rig in a pose it is not in
+POSED = {'root': ((1.0, 9.0, -2.0), (10.0, 20.0, 30.0)),
+         'spine': ((5.0, 1.0, 0.5), (-40.0, 5.0, 100.0)),
+         'chest': ((5.0, 0.0, 0.0), (170.0, -80.0, 25.0)),
+         'neck': ((4.0, 0.0, 1.0), (0.0, 95.0, 0.0)),
+         'arm_l': ((2.0, 3.0, 0.0), (33.0, -120.0, 12.0)),
+         'hand_l': ((6.0, 0.0, 0.0), (-5.0, 45.0, 175.0))}
+
+
+def build_rig(scene=None):
+    """
+    Add the rig to a scene, under a group that is moved and rotated
+    """
+    scene.createNode('transform', 'rig')
+    scene.setAttr('rig.translate', 1.0, 2.0, 3.0)
+    scene.setAttr('rig.rotate', 0.0, 45.0, 0.0)
+    for name, parent, translate, orient, axis, order in RIG:
+        scene.createNode('joint', name, parent)
+        scene.setAttr(f'{name}.translate', *translate)
+        scene.setAttr(f'{name}.jointOrient', *orient)
+        scene.setAttr(f'{name}.rotateAxis', *axis)
+        scene.setAttr(f'{name}.rotateOrder', order)
+    # the rig is part of the scene, not of what the tests undo
+    scene.undo_queue = []
+
+
+def world_matrices(scene=None):
+    return {joint: scene.xform(joint, query=True, worldSpace=True, matrix=True)
+            for joint in JOINTS}
+
+
+def assert_worlds_equal(first=None, second=None):
+    for joint in JOINTS:
+        assert first[joint] == pytest.approx(second[joint], abs=1e-6), joint
+
+
+def posed_pose(scene=None, backend=None):
+    """
+    The world space pose of POSED, read back from the scene, which is then put back
+    """
+    rest = backend.snapshot(JOINTS)
+    for joint, (translate, rotate) in POSED.items():
+        scene.setAttr(f'{joint}.translate', *translate)
+        scene.setAttr(f'{joint}.rotate', *rotate)
+    pose = backend.read_pose(JOINTS, 'posed')
+    worlds = world_matrices(scene)
+    backend.restore(rest)
+    scene.undo_queue = []
+    return pose, worlds
+
+
+@pytest.fixture
+def scene():
+    scene = FakeScene()
+    install_maya_cmds(scene)
+    install_maya_api(scene)
+    build_rig(scene)
+    return scene
+
+
+@pytest.fixture(autouse=True)
+def poser_state(monkeypatch):
+    """
+    Give every test its own backends and joint registry
+    """
+    monkeypatch.setattr(poser, '_default_backend', None)
+    monkeypatch.setattr(poser, '_backend_instances', {})
+    monkeypatch.setattr(poser, '_joint_registry', None)
+    monkeypatch.setattr(poser, '_retarget_maps', {})
+    monkeypatch.setattr(poser, '_scene_paths', None)
+
+
+@pytest.fixture(scope='session')
+def qt_app():
+    """
+    The application the widgets of the tests live in, drawn off screen
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    QtWidgets = pytest.importorskip('PySide2.QtWidgets')
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def poser_gui(qt_app, scene, monkeypatch):
+    """
+    The poser_gui module, with no Maya main window to parent its dialogs to
+    """
+    ui_module = types.ModuleType('maya.OpenMayaUI')
+    ui_module.MQtUtil = types.SimpleNamespace(mainWindow=lambda: None)
+    monkeypatch.setitem(sys.modules, 'maya.OpenMayaUI', ui_module)
+    monkeypatch.setattr(sys.modules['maya'], 'OpenMayaUI', ui_module, raising=False)
+    from td_maya_tools.guis import poser_gui
+    monkeypatch.setattr(poser_gui, 'get_maya_window', lambda: None)
+    return poser_gui
@@ -0,0 +1,67 @@
+"""
+Check the progress dialog of td_maya_tools.guis.apply_progress against the fake scene.
+"""
+import pytest
+
+from td_maya_tools import poser
+
+from conftest import JOINTS, assert_worlds_equal, posed_pose, world_matrices
+
+pytest.importorskip('PySide2.QtWidgets')
+
+from PySide2 import QtCore, QtWidgets  # noqa: E402
+
+from td_maya_tools.guis.apply_progress import ApplyProgressDialog  # noqa: E402
+
+
+@pytest.fixture
+def dialog(qt_app, scene):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    job = poser.ChunkedApply(pose)
+    job.chunk_size = 2
+    job.budget = 0.0
+    dialog = ApplyProgressDialog(job)
+    results = []
+    dialog.applied.connect(results.append)
+    yield dialog, worlds, results
+    dialog.deleteLater()
+
+
+def test_blocks_input_before_the_first_chunk(dialog):
+    dialog, _, _ = dialog
+    dialog.start()
+    assert dialog.windowModality() == QtCore.Qt.ApplicationModal
+    assert dialog.isVisible()
+    assert dialog.job.state == 'pending'
+    dialog.cancel()
+
+
+def test_finish(scene, dialog):
+    dialog, worlds, results = dialog
+    rest = world_matrices(scene)
+    dialog.start()
+    while dialog.apply_chunk():
+        pass
+    assert not dialog.isVisible()
+    assert sorted(results[0].applied) == sorted(JOINTS)
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
+
+
+def test_cancel_mid_apply(scene, dialog):
+    dialog, _, results = dialog
+    rest = world_matrices(scene)
+    dialog.start()
+    assert dialog.apply_chunk()
+    assert 0 < dialog.job.done < len(JOINTS)
+    dialog.findChild(QtWidgets.QPushButton).click()
+    assert dialog.job.state == 'cancelled'
+    assert not dialog.isVisible()
+    assert results[0].applied == []
+    assert_worlds_equal(world_matrices(scene), rest)
+    # the applied chunk and putting it back are a single undo
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
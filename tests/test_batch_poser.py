@@ -0,0 +1,116 @@
+"""
+Run batches with td_maya_tools.batch_poser on fake_scene JSON scenes.
+"""
+from array import array
+import json
+
+import pytest
+
+from td_maya_testing.fake_scene import FakeScene
+from td_maya_tools import batch_poser, poser, xml_utils
+from td_maya_tools.pose import Pose
+
+from conftest import JOINTS, assert_worlds_equal, build_rig, posed_pose, world_matrices
+
+
+@pytest.fixture
+def batch(tmp_path, scene):
+    """
+    A saved rig scene and a library with a pose of the rig and one with a joint it
+    does not have
+    """
+    scene_path = str(tmp_path / 'shot_010.json')
+    scene.save(scene_path)
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    tail = Pose('tail', pose.joints + ('tail',),
+                array('d', list(pose.values) + [1.0] * 6))
+    library_path = str(tmp_path / 'poses.xml')
+    xml_utils.write_pose_xml([pose, tail], library_path)
+    return scene_path, library_path, worlds
+
+
+@pytest.fixture(autouse=True)
+def worker_session(monkeypatch):
+    """
+    Jobs run in this process start their session here, give every test its own
+    """
+    monkeypatch.setattr(batch_poser, '_session', None)
+
+
+def test_fake_scene_round_trip(tmp_path):
+    scene = FakeScene()
+    build_rig(scene)
+    path = str(tmp_path / 'rig.json')
+    scene.save(path)
+    assert_worlds_equal(world_matrices(FakeScene.open(path)), world_matrices(scene))
+
+
+def test_build_jobs(tmp_path):
+    jobs = batch_poser.build_jobs(['/shots/shot_010.ma'], ['wave', 'sit'],
+                                  str(tmp_path), 'FBX export')
+    assert [job.pose for job in jobs] == ['wave', 'sit']
+    assert jobs[0].output == str(tmp_path / 'shot_010_wave.fbx')
+
+
+@pytest.mark.parametrize('max_workers', (0, 2))
+def test_run_batch(tmp_path, batch, max_workers):
+    scene_path, library_path, worlds = batch
+    missing_scene = str(tmp_path / 'missing.json')
+    jobs = [batch_poser.BatchJob(scene_path, 'posed', str(tmp_path / 'out' / 'posed.json')),
+            batch_poser.BatchJob(scene_path, 'tail', str(tmp_path / 'out' / 'tail.json')),
+            batch_poser.BatchJob(scene_path, 'missing', str(tmp_path / 'out' / 'no.json')),
+            batch_poser.BatchJob(missing_scene, 'posed', str(tmp_path / 'out' / 'no.json'))]
+    summary = batch_poser.run_batch(jobs, [library_path], 'fake', max_workers)
+    assert (summary['jobs'], summary['ok'], summary['partial'], summary['failed']) == \
+        (4, 1, 1, 2)
+    ok, partial, missing_pose, failed = summary['results']
+    assert ok['status'] == 'ok' and ok['applied'] == len(JOINTS)
+    assert_worlds_equal(world_matrices(FakeScene.open(ok['output'])), worlds)
+    assert partial['status'] == 'partial'
+    assert list(partial['failures']) == ['tail']
+    assert missing_pose['error'] == 'The pose missing is not in the library'
+    assert failed['status'] == 'failed'
+    assert failed['error'].startswith('FileNotFoundError')
+    assert not (tmp_path / 'out' / 'no.json').exists()
+
+
+def test_unknown_session(batch):
+    with pytest.raises(ValueError):
+        batch_poser.run_batch([], [batch[1]], 'houdini')
+
+
+@pytest.mark.parametrize('poses, exit_code, counts', (
+    (['posed'], 0, '1 ok, 0 partial, 0 failed'),
+    (['posed', 'tail'], 0, '1 ok, 1 partial, 0 failed'),
+    (['posed', 'missing'], 1, '1 ok, 0 partial, 1 failed'),
+))
+def test_main(tmp_path, capsys, batch, poses, exit_code, counts):
+    scene_path, library_path, _ = batch
+    summary_path = str(tmp_path / 'summary.json')
+    argv = [scene_path, '--library', library_path, '--session', 'fake', '--workers', '0',
+            '--output-dir', str(tmp_path / 'out'), '--summary', summary_path]
+    for pose in poses:
+        argv += ['--pose', pose]
+    assert batch_poser.main(argv) == exit_code
+    assert counts in capsys.readouterr().out
+    with open(summary_path) as summary_fh:
+        summary = json.load(summary_fh)
+    assert [result['pose'] for result in summary['results']] == poses
+
+
+def test_main_job_file(tmp_path, batch):
+    scene_path, library_path, worlds = batch
+    job_path = tmp_path / 'jobs.json'
+    job_path.write_text(json.dumps([{'scene': scene_path, 'pose': 'posed',
+                                     'output': 'out/posed.json'},
+                                    {'scene': 'missing.json', 'pose': 'posed',
+                                     'output': 'out/missing.json'}]))
+    assert batch_poser.main(['--jobs', str(job_path), '--library', library_path,
+                             '--session', 'fake', '--workers', '0']) == 1
+    assert_worlds_equal(world_matrices(FakeScene.open(str(tmp_path / 'out' / 'posed.json'))),
+                        worlds)
+
+
+def test_main_needs_jobs(batch):
+    with pytest.raises(SystemExit):
+        batch_poser.main(['--library', batch[1], '--session', 'fake'])
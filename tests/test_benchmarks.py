@@ -0,0 +1,56 @@
+"""
+Check the benchmark harness in benchmarks.run_benchmarks runs end to end on small rigs.
+"""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'benchmarks', 'run_benchmarks.py')
+
+
+def run_benchmarks(*args):
+    """
+    Run the harness in its own Python, as it replaces maya.cmds with a fake scene
+    """
+    return subprocess.run([sys.executable, SCRIPT, '--repeat', '1', *args], cwd=ROOT,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_benchmarks_run(tmp_path):
+    output = str(tmp_path / 'results.json')
+    process = run_benchmarks('--joints', '5', '12', '--poses', '1', '3',
+                             '--max-entries', '20', '--output', output)
+    with open(output) as output_fh:
+        results = json.load(output_fh)
+    import_time = results['import_time']
+    assert import_time['host_modules'] == []
+    # going over the import budget is the only reason to fail
+    assert process.returncode == (0 if import_time['within_budget'] else 1), process.stderr
+    assert results['environment']['repeat'] == 1
+
+    # libraries over max entries are skipped
+    assert [(result['joints'], result['poses']) for result in results['read_pose_xml']] == [
+        (5, 1), (5, 3), (12, 1)]
+    for name in ('create_joints', 'apply_pose', 'apply_pose_local', 'apply_per_joint',
+                 'preview_pose'):
+        assert [result['joints'] for result in results[name]] == [5, 12], name
+        for result in results[name]:
+            assert result['seconds'] >= 0.0
+            # counts are per run, each rounded down on its own
+            commands = sum(result['commands'].values())
+            assert commands <= result['commands_total'] <= commands + len(result['commands'])
+    assert results['create_joints'][1]['commands'] == {'joint': 12}
+    assert results['apply_per_joint'][1]['commands'] == {'move': 12, 'rotate': 12}
+    # the batched apply validates the joints once and does not move them one by one
+    for result in results['apply_pose']:
+        assert result['commands'].get('ls', 0) <= 1
+        assert 'move' not in result['commands'] and 'rotate' not in result['commands']
+
+
+def test_benchmarks_print_their_results():
+    process = run_benchmarks('--joints', '3', '--poses', '1')
+    results = json.loads(process.stdout)
+    assert results['read_pose_xml'][0]['poses'] == 1
+    assert results['apply_pose'][0]['joints'] == 3
@@ -0,0 +1,37 @@
+"""
+Check the core of td_maya_tools imports in a plain Python, without Maya or Qt.
+"""
+import importlib
+import sys
+
+import pytest
+
+# poser_commands is a Maya plug-in and the guis need Qt, everything else is the core
+CORE_MODULES = ('batch_poser', 'folder_index', 'hierarchy_solver', 'instrumentation',
+                'joint_registry', 'pose', 'pose_backends', 'pose_blend', 'pose_cache',
+                'pose_index', 'pose_search', 'pose_solver', 'pose_validation', 'poser',
+                'retarget', 'xml_utils')
+HOST_MODULES = ('maya', 'PySide2', 'shiboken2')
+
+
+@pytest.fixture
+def no_hosts(monkeypatch):
+    """
+    Block the Maya and Qt modules, and forget every module of td_maya_tools so that
+    they are imported again
+    """
+    for name in list(sys.modules):
+        if name.split('.')[0] in HOST_MODULES + ('td_maya_tools',):
+            monkeypatch.delitem(sys.modules, name)
+    for name in HOST_MODULES:
+        monkeypatch.setitem(sys.modules, name, None)
+
+
+@pytest.mark.parametrize('module', CORE_MODULES)
+def test_core_imports_without_hosts(no_hosts, module):
+    importlib.import_module(f'td_maya_tools.{module}')
+    with pytest.raises(ImportError):
+        importlib.import_module('maya.cmds')
+    loaded = [name for name in sys.modules
+              if name.split('.')[0] in HOST_MODULES and sys.modules[name] is not None]
+    assert loaded == []
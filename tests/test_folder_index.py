@@ -0,0 +1,82 @@
+"""
+Check following the files of a folder with td_maya_tools.folder_index.
+"""
+import logging
+import os
+
+from td_maya_tools.folder_index import FolderChanges, FolderIndex
+
+
+def touch(path=None, content=b'', shift=0):
+    """
+    Write a file, moving its modified time by shift seconds
+    """
+    with open(path, 'wb') as file_fh:
+        file_fh.write(content)
+    if shift:
+        file_stat = os.stat(path)
+        os.utime(path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + shift * 10 ** 9))
+
+
+def test_scan(tmp_path):
+    touch(tmp_path / 'wave.png')
+    touch(tmp_path / 'poses.xml', b'<poses/>')
+    touch(tmp_path / 'notes.txt')
+    os.mkdir(tmp_path / 'folder.png')
+    index = FolderIndex(str(tmp_path))
+
+    changes = index.scan()
+    assert changes.added == ['poses.xml', 'wave.png']
+    assert not changes.changed and not changes.removed
+    assert 'wave.png' in index and 'notes.txt' not in index
+    assert index.files_of_type('png') == ['wave.png']
+    assert index.full_path('wave.png') == os.path.join(str(tmp_path), 'wave.png')
+
+    assert not index.scan()
+
+    touch(tmp_path / 'sit.png')
+    # a file saved over within the same second still changes size
+    touch(tmp_path / 'poses.xml', b'<poses></poses>')
+    touch(tmp_path / 'wave.png', shift=5)
+    changes = index.scan()
+    assert changes.added == ['sit.png']
+    assert changes.changed == ['poses.xml', 'wave.png']
+    assert changes.removed == []
+
+    os.remove(tmp_path / 'sit.png')
+    changes = index.scan()
+    assert (changes.added, changes.changed, changes.removed) == ([], [], ['sit.png'])
+    assert index.files_of_type('png') == ['wave.png']
+
+
+def test_scan_missing_folder(tmp_path, caplog):
+    touch(tmp_path / 'wave.png')
+    index = FolderIndex(str(tmp_path))
+    index.scan()
+    os.remove(tmp_path / 'wave.png')
+    os.rmdir(tmp_path)
+    with caplog.at_level(logging.WARNING):
+        changes = index.scan()
+    assert 'Could not list' in caplog.text
+    assert changes.removed == ['wave.png']
+    assert index.files == {}
+
+
+def test_extensions(tmp_path):
+    touch(tmp_path / 'wave.png')
+    touch(tmp_path / 'wave.jpg')
+    assert FolderIndex(str(tmp_path), ('jpg',)).scan().added == ['wave.jpg']
+
+
+def test_changes_of_type():
+    changes = FolderChanges(added=['a.png', 'a.xml'], changed=['b.xml'],
+                            removed=['c.png', 'c.png.bak'])
+    png_changes = changes.of_type('png')
+    assert (png_changes.added, png_changes.changed, png_changes.removed) == (
+        ['a.png'], [], ['c.png'])
+    xml_changes = changes.of_type('xml')
+    assert (xml_changes.added, xml_changes.changed, xml_changes.removed) == (
+        ['a.xml'], ['b.xml'], [])
+    assert changes.of_type('png')
+    assert not changes.of_type('jpg')
+    assert not FolderChanges()
@@ -0,0 +1,40 @@
+"""
+Check the timing and profiling hooks of td_maya_tools.instrumentation.
+"""
+import os
+
+import pytest
+
+from td_maya_tools import instrumentation
+
+
+@pytest.fixture
+def profile_folder(tmp_path):
+    instrumentation.reset()
+    instrumentation.enable(str(tmp_path))
+    yield tmp_path
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_nested_profiles_dump_once(profile_folder):
+    with instrumentation.profile('outer'):
+        with instrumentation.profile('inner'):
+            with instrumentation.profile('inner'):
+                pass
+    dumps = os.listdir(profile_folder)
+    assert len(dumps) == 1
+    assert dumps[0].startswith('outer-')
+    phases = instrumentation.report()['phases']
+    assert phases['outer']['calls'] == 1
+    assert phases['inner']['calls'] == 2
+
+
+def test_profile_after_failure(profile_folder):
+    with pytest.raises(ValueError):
+        with instrumentation.profile('failed'):
+            raise ValueError('failed')
+    with instrumentation.profile('next'):
+        pass
+    assert sorted(name.split('-')[0] for name in os.listdir(profile_folder)) == [
+        'failed', 'next']
@@ -0,0 +1,117 @@
+"""
+Check the joint registry follows the scene through its callbacks, and checks the scene
+itself without them.
+"""
+import logging
+
+import pytest
+
+from td_maya_tools import poser
+from td_maya_tools.joint_registry import JointRegistry
+
+from conftest import JOINTS
+
+
+def make_registry(scene=None):
+    registry = JointRegistry(scene)
+    registry.install_callbacks()
+    assert registry.joints == set(JOINTS)
+    return registry
+
+
+def test_follows_added_removed_renamed(scene):
+    registry = make_registry(scene)
+    generation = registry.generation
+    scene.createNode('joint', 'toe', 'hand_l')
+    scene.createNode('transform', 'group')
+    scene.rename('neck', 'head')
+    scene.delete('arm_l')
+    assert registry.joints == {'root', 'spine', 'chest', 'head'}
+    assert registry.sorted_joints() == ['chest', 'head', 'root', 'spine']
+    assert registry.generation > generation
+    # none of it needed another query of the scene
+    assert registry._joints is registry.joints
+
+
+def test_follows_reparenting(scene):
+    registry = make_registry(scene)
+    generation = registry.generation
+    scene.parent('neck', 'spine')
+    assert registry.generation > generation
+    generation = registry.generation
+    scene.createNode('transform', 'offset')
+    assert registry.generation == generation
+    scene.parent('offset', 'rig')
+    # a new group has no joints under it, nothing built from the joints changed
+    assert registry.generation == generation
+    scene.parent('root', 'offset')
+    assert registry.generation > generation
+    assert registry.joints == set(JOINTS)
+
+
+def test_new_scene(scene):
+    registry = make_registry(scene)
+    scene.file(new=True, force=True)
+    assert registry.joints == set()
+
+
+def test_remove_callbacks(scene):
+    count = scene.callback_count
+    registry = make_registry(scene)
+    assert scene.callback_count > count
+    registry.remove_callbacks()
+    assert scene.callback_count == count
+    assert not registry.follows_scene
+
+
+def test_ambiguous_names_take_a_new_snapshot(scene):
+    registry = make_registry(scene)
+    generation = registry.generation
+    registry.node_added('spine|chest')
+    assert registry._joints is None
+    registry.joints
+    registry.node_renamed('missing', 'head')
+    assert registry._joints is None
+    registry.joints
+    registry.other_node_renamed('group', 'neck')
+    assert registry._joints is None
+    assert registry.generation > generation
+
+
+def test_without_callbacks_checks_the_scene(scene):
+    registry = JointRegistry(scene)
+    assert registry.verify_joints(['neck'])[0] == {'neck'}
+    registry.joints
+    scene.delete('neck')
+    valid_joints, failures = registry.verify_joints(['neck', 'spine', 'rig'])
+    assert valid_joints == {'spine'}
+    assert failures == {'neck': 'does not exist', 'rig': 'not a joint'}
+    assert not registry.is_joint('neck')
+
+
+@pytest.mark.parametrize('callbacks', (True, False))
+def test_joints_named_by_path(scene, callbacks):
+    registry = make_registry(scene) if callbacks else JointRegistry(scene)
+    nodes = ['|rig|root', 'root|spine', '|root', '|rig|missing', 'rig|root|rig']
+    valid_joints, failures = registry.verify_joints(nodes + ['|rig'])
+    assert valid_joints == {'|rig|root', 'root|spine'}
+    assert failures == {'|root': 'does not exist', '|rig|missing': 'does not exist',
+                        'rig|root|rig': 'does not exist', '|rig': 'not a joint'}
+    assert registry.is_joint('|rig|root|spine')
+    assert not registry.is_joint('|spine')
+
+
+def test_verify_joint_follows_deletes(scene):
+    assert poser.verify_joint('neck')
+    scene.delete('neck')
+    assert poser.verify_joint('neck') is None
+
+
+def test_missing_callbacks_are_logged(scene, monkeypatch, caplog):
+    def install_callbacks(self, om=None):
+        raise ImportError('No module named maya.api')
+    monkeypatch.setattr(JointRegistry, 'install_callbacks', install_callbacks)
+    with caplog.at_level(logging.WARNING, logger=poser.__name__):
+        registry = poser.get_joint_registry()
+    assert not registry.follows_scene
+    assert 'will not follow' in caplog.text
@@ -0,0 +1,74 @@
+"""
+Check the channels that are not set, stored as NaN by td_maya_tools.pose.
+"""
+from array import array
+import math
+import pickle
+
+import pytest
+
+from td_maya_tools import xml_utils
+from td_maya_tools.pose import CHANNELS, Pose, parse_channel
+
+NAN = math.nan
+
+
+@pytest.fixture
+def pose():
+    return Pose('wave', ('root', 'spine'), array('d', (1.0, NAN, 3.0, NAN, 0.0, NAN,
+                                                       NAN, NAN, NAN, NAN, NAN, NAN)))
+
+
+@pytest.mark.parametrize('value, expected', ((None, NAN), ('', NAN), ('  ', NAN),
+                                             (' 1.5 ', 1.5), ('-0', 0.0), ('1e3', 1000.0)))
+def test_parse_channel(value, expected):
+    assert parse_channel(value) == pytest.approx(expected, nan_ok=True)
+
+
+def test_parse_channel_that_is_not_a_number():
+    with pytest.raises(ValueError):
+        parse_channel('abc')
+
+
+def test_new_pose_is_not_set():
+    pose = Pose('empty', ('root', 'spine'))
+    assert len(pose.values) == 2 * len(CHANNELS)
+    assert all(math.isnan(value) for value in pose.values)
+    assert pose.translation('root') == (None, None, None)
+
+
+def test_unset_channels_are_none(pose):
+    assert pose.translation('root') == (1.0, None, 3.0)
+    assert pose.rotation('root') == (None, 0.0, None)
+    assert pose['root'].get('tx') == 1.0
+    assert pose['root'].get('ty') is None
+    # a joint whose channels are all unset is still in the pose
+    assert 'spine' in pose and pose['spine']
+    assert pose.rotation('spine') == (None, None, None)
+
+
+def test_missing_joint_is_not_added(pose):
+    assert not pose['tail']
+    assert pose.get('tail') is None
+    assert all(math.isnan(value) for value in pose.channels('tail'))
+    assert pose.translation('tail') == (None, None, None)
+    assert pose.joints == ('root', 'spine')
+    assert len(pose.values) == 2 * len(CHANNELS)
+
+
+def test_unset_channels_are_written_empty(pose):
+    assert pose.as_dict()['root'] == {'translations': {'tx': '1.0', 'ty': '', 'tz': '3.0'},
+                                      'rotations': {'rx': '', 'ry': '0.0', 'rz': ''}}
+
+
+def test_unset_channels_round_trip(pose, tmp_path):
+    path = str(tmp_path / 'poses.xml')
+    xml_utils.write_pose_xml([pose], path)
+    read = xml_utils.read_pose_xml(path)['wave']
+    assert read.channels('root') == pytest.approx(pose.channels('root'), nan_ok=True)
+    assert read.rotation('spine') == (None, None, None)
+
+    copied = pickle.loads(pickle.dumps(pose))
+    assert copied.joints == pose.joints
+    assert copied.channels('root') == pytest.approx(pose.channels('root'), nan_ok=True)
+    assert copied.get('tail') is None
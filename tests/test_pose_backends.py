@@ -0,0 +1,267 @@
+"""
+Run every backend against the fake scene and check they pose, undo and key the rig the
+same way.
+"""
+import math
+
+import pytest
+
+from td_maya_testing.fake_scene import CountingCmds
+from td_maya_tools import poser
+from td_maya_tools.joint_registry import JointRegistry
+from td_maya_tools.pose_backends import CmdsBackend, LocalCmdsBackend, OpenMayaBackend
+
+from conftest import JOINTS, POSED, assert_worlds_equal, posed_pose, world_matrices
+
+BACKENDS = ('cmds', 'cmds_local', 'openmaya')
+def make_backend(name=None, scene=None):
+    if name == 'openmaya':
+        return OpenMayaBackend(cmds=scene)
+    registry = JointRegistry(scene)
+    registry.install_callbacks()
+    return {'cmds': CmdsBackend, 'cmds_local': LocalCmdsBackend}[name](scene, registry)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, scene):
+    backend = make_backend(request.param, scene)
+    valid_joints, failures = backend.verify_joints(list(JOINTS))
+    assert valid_joints == set(JOINTS) and not failures
+    return backend
+
+
+def test_verify_joints(backend):
+    valid_joints, failures = backend.verify_joints(['root', 'rig', 'missing'])
+    assert valid_joints == {'root'}
+    assert failures == {'rig': 'not a joint', 'missing': 'does not exist'}
+
+
+def test_verify_joints_by_path(scene, backend):
+    valid_joints, failures = backend.verify_joints(['|rig|root', 'root|spine', '|spine'])
+    assert valid_joints == {'|rig|root', 'root|spine'}
+    assert failures == {'|spine': 'does not exist'}
+    channels = (math.nan,) * 3 + (10.0, 20.0, 30.0)
+    assert not backend.apply([('|rig|root', channels)])
+    assert backend.read_pose(['|rig|root'], 'root').channels('|rig|root')[3:] == \
+        pytest.approx(channels[3:])
+
+
+@pytest.mark.parametrize('order', ('parents first', 'children first'))
+def test_apply(scene, backend, order):
+    pose, worlds = posed_pose(scene, backend)
+    entries = list(pose.items())
+    if order == 'children first':
+        entries.reverse()
+    failures = backend.apply([(joint, pose.channels(joint)) for joint, _ in entries])
+    assert not failures
+    assert_worlds_equal(world_matrices(scene), worlds)
+
+
+def test_apply_unset_channels(scene, backend):
+    before = world_matrices(scene)
+    channels = (math.nan, 20.0, math.nan, math.nan, math.nan, math.nan)
+    assert not backend.apply([('spine', channels)])
+    after = world_matrices(scene)
+    assert after['spine'][13] == pytest.approx(20.0)
+    assert after['spine'][12] == pytest.approx(before['spine'][12])
+    assert after['spine'][:12] == pytest.approx(before['spine'][:12])
+
+
+def test_undo_chunk(scene, backend):
+    pose, worlds = posed_pose(scene, backend)
+    before = world_matrices(scene)
+    with backend.undo_chunk('apply_pose posed'):
+        backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    assert len(scene.undo_queue) == 1
+    assert_worlds_equal(world_matrices(scene), worlds)
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), before)
+    scene.redo()
+    assert_worlds_equal(world_matrices(scene), worlds)
+
+
+def test_without_undo(scene, backend):
+    pose, _ = posed_pose(scene, backend)
+    with backend.without_undo():
+        backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    assert scene.undo_queue == []
+    assert scene.undo_enabled
+
+
+def test_chunked_apply_undoes_every_chunk(scene, backend):
+    pose, worlds = posed_pose(scene, backend)
+    before = world_matrices(scene)
+    chunked = poser.ChunkedApply(pose, backend=backend)
+    chunked.chunk_size = 1
+    chunked.budget = 0.0
+    while chunked.step():
+        pass
+    assert sorted(chunked.result.applied) == sorted(JOINTS)
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), before)
+
+
+def test_chunked_apply_cancel(scene, backend):
+    pose, _ = posed_pose(scene, backend)
+    before = world_matrices(scene)
+    chunked = poser.ChunkedApply(pose, backend=backend)
+    chunked.chunk_size = 2
+    chunked.budget = 0.0
+    chunked.step()
+    assert chunked.cancel()
+    assert_worlds_equal(world_matrices(scene), before)
+
+
+def test_snapshot_restore(scene, backend):
+    snapshot = backend.snapshot(JOINTS)
+    scene.setAttr('chest.rotate', 1.0, 2.0, 3.0)
+    scene.setAttr('neck.translate', 7.0, 8.0, 9.0)
+    assert not backend.restore(snapshot)
+    assert backend.snapshot(JOINTS) == pytest.approx(snapshot)
+
+
+def test_joint_states(scene, backend):
+    states = backend.joint_states(['chest', 'neck', 'arm_l'])
+    assert states['neck'].parent == 'chest'
+    assert states['arm_l'].parent == 'chest'
+    assert states['chest'].rotate_order == 'xzy'
+    assert list(states['chest'].rotate_axis) == pytest.approx([0.0, 20.0, 0.0])
+
+
+def test_set_keys(scene, backend):
+    curves = {('spine', 'tx'): ([1.0, 5.0, 10.0], [0.0, 2.5, 5.0]),
+              ('spine', 'rz'): ([1.0, 10.0], [0.0, 90.0])}
+    with backend.undo_chunk('bake_poses'):
+        assert not backend.set_keys(curves)
+    assert scene.keys['spine', 'translateX'] == {1.0: 0.0, 5.0: 2.5, 10.0: 5.0}
+    assert scene.keys['spine', 'rotateZ'] == pytest.approx({1.0: 0.0, 10.0: 90.0})
+    assert scene.curve('spine', 'rotateZ').type == 'animCurveTA'
+    scene.undo()
+    assert not scene.keys.get(('spine', 'translateX'))
+    assert scene.curve('spine', 'translateX') is None
+
+
+def test_set_keys_replaces_keys(scene, backend):
+    scene.setKeyframe('spine', attribute='translateX', time=5.0, value=1.0)
+    scene.setKeyframe('spine', attribute='translateX', time=20.0, value=1.0)
+    with backend.undo_chunk('bake_poses'):
+        assert not backend.set_keys({('spine', 'tx'): ([5.0, 10.0], [3.0, 4.0])})
+    assert scene.keys['spine', 'translateX'] == {5.0: 3.0, 10.0: 4.0, 20.0: 1.0}
+    scene.undo()
+    assert scene.keys['spine', 'translateX'] == {5.0: 1.0, 20.0: 1.0}
+
+
+def test_openmaya_follows_renames(scene):
+    backend = make_backend('openmaya', scene)
+    assert backend.verify_joints(['neck'])[0] == {'neck'}
+    scene.rename('neck', 'head')
+    assert backend.verify_joints(['neck'])[1] == {'neck': 'does not exist'}
+    assert backend.verify_joints(['head'])[0] == {'head'}
+    scene.delete('head')
+    assert backend.verify_joints(['head'])[1] == {'head': 'does not exist'}
+
+
+def test_openmaya_undo(scene):
+    backend = make_backend('openmaya', scene)
+    backend.verify_joints(['spine'])
+    before = scene.getAttr('spine.rotate')
+    backend.apply([('spine', (math.nan,) * 3 + (10.0, 20.0, 30.0))])
+    assert scene.getAttr('spine.rotate') != before
+    assert backend.undo()
+    assert scene.getAttr('spine.rotate') == pytest.approx(before)
+
+
+@pytest.mark.parametrize('change', (
+    lambda scene: scene.setAttr('chest.jointOrient', 40.0, 10.0, -5.0),
+    lambda scene: scene.setAttr('chest.rotateAxis', 0.0, 0.0, 60.0),
+    lambda scene: scene.setAttr('chest.rotateOrder', 4),
+    lambda scene: scene.parent('arm_l', 'spine'),
+))
+def test_local_solver_follows_static_changes(scene, change):
+    backend = make_backend('cmds_local', scene)
+    backend.verify_joints(list(JOINTS))
+    pose, _ = posed_pose(scene, backend)
+    backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    solver = backend.hierarchy_solver(JOINTS)
+    change(scene)
+    assert backend.hierarchy_solver(JOINTS) is not solver
+    with backend.undo_chunk():
+        backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    local_worlds = world_matrices(scene)
+    scene.undo()
+    # a backend that reads the joints again for every pose gives the same result
+    CmdsBackend(scene).apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    assert_worlds_equal(local_worlds, world_matrices(scene))
+
+
+def test_local_solver_kept_between_poses(scene):
+    backend = make_backend('cmds_local', scene)
+    backend.verify_joints(list(JOINTS))
+    pose, _ = posed_pose(scene, backend)
+    solver = backend.hierarchy_solver(JOINTS)
+    backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    assert backend.hierarchy_solver(JOINTS) is solver
+
+
+def test_cmds_apply_is_batched(scene):
+    cmds = CountingCmds(scene)
+    registry = JointRegistry(cmds)
+    registry.install_callbacks()
+    backend = CmdsBackend(cmds, registry)
+    backend.verify_joints(list(JOINTS))
+    pose, worlds = posed_pose(scene, backend)
+    backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    cmds.reset_counts()
+    backend.apply([(joint, pose.channels(joint)) for joint in JOINTS])
+    # the joint orients and hierarchy are kept, only the world matrices are read
+    assert cmds.reset_counts() == {'xform': 2, 'setAttr': len(JOINTS) * 2}
+    assert_worlds_equal(world_matrices(scene), worlds)
+
+
+def test_cmds_rereads_without_callbacks(scene):
+    cmds = CountingCmds(scene)
+    backend = CmdsBackend(cmds, JointRegistry(cmds))
+    backend.apply([('spine', (math.nan,) * 3 + (1.0, 2.0, 3.0))])
+    scene.setAttr('spine.jointOrient', 0.0, 0.0, 0.0)
+    backend.apply([('spine', (math.nan,) * 3 + (1.0, 2.0, 3.0))])
+    assert cmds.call_counts['getAttr'] == 6
+
+
+def test_cmds_set_keys_a_curve_at_a_time(scene):
+    cmds = CountingCmds(scene)
+    backend = CmdsBackend(cmds, JointRegistry(cmds))
+    curves = {('spine', channel): (list(range(1, 101)), [float(i) for i in range(100)])
+              for channel in ('tx', 'ty', 'rz')}
+    assert not backend.set_keys(curves)
+    # one command for every key of every curve, no setKeyframe
+    assert cmds.reset_counts() == {'pluginInfo': 1, 'loadPlugin': 1, 'tdPoserOperation': 1}
+    assert len(scene.keys['spine', 'rotateZ']) == 100
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert not scene.keys.get(('spine', 'rotateZ'))
+    scene.redo()
+    assert len(scene.keys['spine', 'rotateZ']) == 100
+
+
+def test_cmds_set_keys_missing_joint(scene):
+    backend = make_backend('cmds', scene)
+    failures = backend.set_keys({('missing', 'tx'): ([1.0], [0.0]),
+                                 ('spine', 'tx'): ([1.0], [2.0])})
+    assert list(failures) == ['missing']
+    assert scene.keys['spine', 'translateX'] == {1.0: 2.0}
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_bake_poses(scene, name):
+    backend = make_backend(name, scene)
+    backend.verify_joints(list(JOINTS))
+    pose, _ = posed_pose(scene, backend)
+    rest = backend.read_pose(JOINTS, 'rest')
+    result = poser.bake_poses([(1, rest), (10, pose)], backend=backend)
+    assert sorted(result.applied) == sorted(JOINTS)
+    assert result.key_count == len(JOINTS) * 6 * 2
+    assert scene.keys['chest', 'rotateX'][10.0] == pytest.approx(POSED['chest'][1][0])
+    scene.undo()
+    assert not any(scene.keys.values())
@@ -0,0 +1,141 @@
+"""
+Check blending and interpolating poses with td_maya_tools.pose_blend.
+"""
+from array import array
+import math
+
+import numpy as np
+import pytest
+
+from td_maya_tools import pose_blend
+from td_maya_tools.pose import Pose
+from td_maya_tools.pose_blend import PoseStack
+
+JOINTS = ('root', 'spine')
+NAN = math.nan
+
+
+def make_pose(name=None, *channels):
+    return Pose(name, JOINTS, array('d', [value for joint in channels for value in joint]))
+
+
+def rotations(pose=None):
+    """
+    The rotation matrices of a pose, to compare rotations that are the same with
+    different euler angles
+    """
+    angles = np.frombuffer(pose.values, dtype=float).reshape(len(pose.joints), 6)[:, 3:]
+    quaternions = pose_blend.euler_to_quaternions(angles)
+    return pose_blend._rotation_matrices(quaternions)
+
+
+START = make_pose('start', (0.0, 1.0, 2.0, 10.0, 20.0, 30.0),
+                  (5.0, 0.0, 0.0, -45.0, 80.0, 170.0))
+END = make_pose('end', (4.0, -1.0, 0.0, 100.0, -60.0, 5.0),
+                (5.0, 2.0, 0.0, 30.0, -10.0, -150.0))
+
+
+@pytest.mark.parametrize('orders', (None, {'root': 'zxy', 'spine': 'yzx'}))
+def test_euler_round_trip(orders):
+    angles = np.array([[10.0, 20.0, 30.0], [-45.0, 80.0, 170.0]])
+    order_indices = [pose_blend.ROTATE_ORDERS.index((orders or {}).get(joint, 'xyz'))
+                     for joint in JOINTS]
+    quaternions = pose_blend.euler_to_quaternions(angles, order_indices)
+    result = pose_blend.quaternions_to_euler(quaternions, order_indices)
+    # the angles can come back as a different set for the same rotation
+    assert pose_blend._rotation_matrices(
+        pose_blend.euler_to_quaternions(result, order_indices)) == \
+        pytest.approx(pose_blend._rotation_matrices(quaternions), abs=1e-9)
+    assert result[0] == pytest.approx(angles[0])
+
+
+@pytest.mark.parametrize('weights, expected', (((1.0, 0.0), START), ((0.0, 1.0), END),
+                                               ((0.0, 2.5), END)))
+def test_blend_weights_give_the_end_poses(weights, expected):
+    pose = PoseStack((START, END)).blend(weights, name='blend')
+    assert pose.name == 'blend'
+    assert pose.joints == JOINTS
+    for joint in JOINTS:
+        assert pose.channels(joint)[:3] == pytest.approx(expected.channels(joint)[:3])
+    assert rotations(pose) == pytest.approx(rotations(expected), abs=1e-9)
+
+
+@pytest.mark.parametrize('method', pose_blend.BLEND_METHODS)
+@pytest.mark.parametrize('amount, expected', ((0.0, START), (1.0, END)))
+def test_interpolate_ends(method, amount, expected):
+    pose = pose_blend.interpolate_poses(START, END, amount, method=method)
+    assert rotations(pose) == pytest.approx(rotations(expected), abs=1e-9)
+
+
+def test_slerp_turns_at_a_constant_speed():
+    start = make_pose('start', (0.0,) * 6, (0.0,) * 6)
+    end = make_pose('end', (0.0, 0.0, 0.0, 120.0, 0.0, 0.0),
+                    (0.0, 0.0, 0.0, 0.0, 0.0, 90.0))
+    stack = PoseStack((start, end))
+    slerp = stack.interpolate(0.25, 'slerp')
+    nlerp = stack.interpolate(0.25, 'nlerp')
+    assert slerp.channels('root')[3:] == pytest.approx((30.0, 0.0, 0.0))
+    assert slerp.channels('spine')[3:] == pytest.approx((0.0, 0.0, 22.5))
+    # nlerp lags behind away from the middle
+    assert nlerp.channels('root')[3] == pytest.approx(
+        math.degrees(2.0 * math.atan2(0.25 * math.sin(math.radians(60.0)),
+                                      0.75 + 0.25 * math.cos(math.radians(60.0)))))
+    assert nlerp.channels('root')[3] < 30.0
+    # half way they agree
+    assert stack.interpolate(0.5, 'nlerp').channels('root')[3:] == pytest.approx(
+        stack.interpolate(0.5, 'slerp').channels('root')[3:])
+
+
+@pytest.mark.parametrize('method', pose_blend.BLEND_METHODS)
+def test_opposite_hemispheres_take_the_short_way(method):
+    # the quaternions of 170 and -170 degrees point into opposite halves
+    start = make_pose('start', (0.0, 0.0, 0.0, 170.0, 0.0, 0.0),
+                      (0.0, 0.0, 0.0, 0.0, 0.0, 10.0))
+    end = make_pose('end', (0.0, 0.0, 0.0, -170.0, 0.0, 0.0),
+                    (0.0, 0.0, 0.0, 0.0, 0.0, 370.0))
+    pose = PoseStack((start, end)).interpolate(0.5, method)
+    half_turn = make_pose('half', (0.0, 0.0, 0.0, 180.0, 0.0, 0.0),
+                          (0.0, 0.0, 0.0, 0.0, 0.0, 10.0))
+    assert rotations(pose) == pytest.approx(rotations(half_turn), abs=1e-9)
+    assert not np.isnan(pose.values).any()
+
+
+def test_channels_set_in_one_pose():
+    start = make_pose('start', (1.0, NAN, NAN, 10.0, 0.0, 0.0),
+                      (NAN, 0.0, 0.0, NAN, 5.0, 5.0))
+    end = make_pose('end', (3.0, 2.0, NAN, NAN, NAN, NAN), (NAN, 4.0, 0.0, 0.0, 0.0, 40.0))
+    pose = PoseStack((start, end)).blend((0.5, 0.5))
+    root = pose.channels('root')
+    # the weights of the poses that set a channel are scaled up to one
+    assert root[:2] == pytest.approx((2.0, 2.0))
+    assert math.isnan(root[2])
+    assert root[3:] == pytest.approx((10.0, 0.0, 0.0))
+    spine = pose.channels('spine')
+    assert math.isnan(spine[0])
+    assert spine[1:3] == pytest.approx((2.0, 0.0))
+    # a rotation with an unset axis is left out of the mix
+    assert spine[3:] == pytest.approx((0.0, 0.0, 40.0))
+    for method in pose_blend.BLEND_METHODS:
+        assert PoseStack((start, end)).interpolate(0.25, method).channels('root')[3:] == \
+            pytest.approx((10.0, 0.0, 0.0))
+
+
+def test_joints_missing_from_a_pose():
+    root_only = Pose('root only', ('root',), array('d', (1.0, 1.0, 1.0, 0.0, 0.0, 90.0)))
+    pose = PoseStack((START, root_only)).blend((0.0, 1.0))
+    assert pose.channels('root')[3:] == pytest.approx((0.0, 0.0, 90.0))
+    # only a pose without any weight sets the spine
+    assert all(math.isnan(value) for value in pose.channels('spine'))
+    pose = PoseStack((START, root_only)).blend((0.25, 0.75))
+    assert pose.channels('spine')[:3] == pytest.approx(START.channels('spine')[:3])
+    assert rotations(pose)[1] == pytest.approx(rotations(START)[1], abs=1e-9)
+
+
+def test_bad_arguments():
+    stack = PoseStack((START, END))
+    with pytest.raises(ValueError):
+        stack.blend((1.0,))
+    with pytest.raises(ValueError):
+        stack.interpolate(0.5, 'cubic')
+    with pytest.raises(ValueError):
+        PoseStack((START, END, START)).interpolate(0.5)
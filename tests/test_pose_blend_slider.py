@@ -0,0 +1,72 @@
+"""
+Check dragging the slider of td_maya_tools.guis.pose_blend_slider against the fake scene.
+"""
+import pytest
+
+from td_maya_tools import poser
+
+from conftest import assert_worlds_equal, posed_pose, world_matrices
+
+pytest.importorskip('PySide2.QtWidgets')
+
+from td_maya_tools.guis.pose_blend_slider import PoseBlendSlider  # noqa: E402
+
+
+@pytest.fixture
+def slider(qt_app, scene):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    slider = PoseBlendSlider()
+    slider.set_target(pose)
+    yield slider, worlds
+    slider.deleteLater()
+
+
+def drag(slider=None, values=()):
+    slider.slider.setSliderDown(True)
+    for value in values:
+        slider.slider.setValue(value)
+        slider.apply_blend()
+    slider.slider.setSliderDown(False)
+
+
+def test_drag_is_one_undo(scene, slider):
+    slider, worlds = slider
+    rest = world_matrices(scene)
+    drag(slider, range(10, 101, 10))
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
+
+
+def test_merged_steps_applied_on_release(scene, slider):
+    slider, worlds = slider
+    slider.slider.setSliderDown(True)
+    for value in (20, 60, 100):
+        slider.slider.setValue(value)
+    # the steps wait for the event loop, releasing applies the last one
+    slider.slider.setSliderDown(False)
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+
+
+def test_each_drag_is_its_own_undo(scene, slider):
+    slider, worlds = slider
+    rest = world_matrices(scene)
+    drag(slider, (50,))
+    half = world_matrices(scene)
+    drag(slider, (100,))
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 2
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), half)
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
+
+
+def test_without_a_target(scene, slider):
+    slider, _ = slider
+    slider.set_target(None)
+    assert not slider.slider.isEnabled()
+    assert slider.apply_blend() is None
+    assert scene.undo_queue == []
@@ -0,0 +1,133 @@
+"""
+Check the pose tiles of td_maya_tools.guis.pose_browser.
+"""
+from collections.abc import Mapping
+
+import pytest
+
+from td_maya_tools import poser
+from td_maya_tools.pose import Pose
+
+from conftest import JOINTS, posed_pose
+
+pytest.importorskip('PySide2.QtWidgets')
+
+from td_maya_tools.guis.pose_browser import PoseBrowser, PoseListModel  # noqa: E402
+
+
+class FreshPoses(Mapping):
+    """
+    Gives a new Pose on every look up, like the pose index and caches do
+    """
+    def __init__(self, poses=None):
+        self.poses = poses
+
+    def __getitem__(self, name):
+        pose = self.poses[name]
+        return Pose(name, pose.joints, pose.values)
+
+    def __iter__(self):
+        return iter(self.poses)
+
+    def __len__(self):
+        return len(self.poses)
+
+
+@pytest.fixture
+def browser(qt_app, scene, monkeypatch):
+    pose, _ = posed_pose(scene, poser.get_backend())
+    poses = FreshPoses({'posed': pose, 'rest': poser.capture_pose(JOINTS, 'rest')})
+    browser = PoseBrowser()
+    browser.set_poses(poses, ['/images/posed.png', '/images/rest.png'])
+    preview = poser.PosePreview()
+    shown = []
+    show = preview.show
+    monkeypatch.setattr(preview, 'show',
+                        lambda pose: shown.append(pose and pose.name) or show(pose))
+    browser.set_preview(preview)
+    browser.shown = shown
+    yield browser
+    browser.set_preview(None)
+    browser.deleteLater()
+
+
+def test_hover_shows_each_tile_once(browser, scene):
+    model = browser.pose_model
+    for _ in range(3):
+        browser.hover_index(model.index(0))
+    assert browser.shown == ['posed']
+    browser.hover_index(model.index(1))
+    browser.hover_index(model.index(1))
+    browser.hover_index(model.index(-1))
+    assert browser.shown == ['posed', 'rest', None]
+    assert scene.undo_queue == []
+
+
+def image_paths(*names):
+    return [f'/images/{name}.png' for name in names]
+
+
+@pytest.fixture
+def model(qt_app):
+    model = PoseListModel()
+    model.signals = []
+    model.modelReset.connect(lambda: model.signals.append(('reset',)))
+    model.rowsInserted.connect(
+        lambda parent, first, last: model.signals.append(('inserted', first, last)))
+    model.rowsRemoved.connect(
+        lambda parent, first, last: model.signals.append(('removed', first, last)))
+    model.dataChanged.connect(
+        lambda first, last, roles=None: model.signals.append(('changed', first.row())))
+    poses = dict.fromkeys('abc')
+    model.set_poses(poses, image_paths('a', 'b', 'c', 'no_pose'))
+    yield model
+    model.deleteLater()
+
+
+def rows(model=None):
+    return [model.index(row).data() for row in range(model.rowCount())]
+
+
+def test_model_rows_need_a_pose_and_an_image(model):
+    assert rows(model) == ['a', 'b', 'c']
+    assert model.signals == [('reset',)]
+    assert model.index(1).data(PoseListModel.ImagePathRole) == '/images/b.png'
+
+
+def test_model_update_added(model):
+    model.signals = []
+    model.update_poses(dict.fromkeys('abcd'), image_paths('a', 'b', 'c', 'd'))
+    assert rows(model) == ['a', 'b', 'c', 'd']
+    assert model.signals == [('inserted', 3, 3)]
+    model.signals = []
+    model.update_poses(dict.fromkeys('0abcd'), image_paths('0', 'a', 'b', 'c', 'd'))
+    assert rows(model) == ['0', 'a', 'b', 'c', 'd']
+    assert model.signals == [('inserted', 0, 0)]
+
+
+def test_model_update_removed(model):
+    model.signals = []
+    model.update_poses(dict.fromkeys('abc'), image_paths('a', 'c'))
+    assert rows(model) == ['a', 'c']
+    assert model.signals == [('removed', 1, 1)]
+    model.signals = []
+    # the image is still there, but its pose was removed from the library
+    model.update_poses(dict.fromkeys('a'), image_paths('a', 'c'))
+    assert rows(model) == ['a']
+    assert model.signals == [('removed', 1, 1)]
+
+
+def test_model_update_changed(model):
+    model.signals = []
+    model.update_poses(dict.fromkeys('abc'), image_paths('a', 'b', 'c'),
+                       image_paths('c', 'missing'))
+    assert rows(model) == ['a', 'b', 'c']
+    assert model.signals == [('changed', 2)]
+
+
+def test_model_update_moved_rows_reset(model):
+    model.signals = []
+    model.update_poses(dict.fromkeys('abc'), image_paths('c', 'a', 'b'))
+    assert rows(model) == ['c', 'a', 'b']
+    assert ('reset',) in model.signals
+    assert model.index(0).data(PoseListModel.ImagePathRole) == '/images/c.png'
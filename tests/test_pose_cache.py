@@ -0,0 +1,161 @@
+"""
+Check compiling pose xml files into caches with td_maya_tools.pose_cache.
+"""
+from array import array
+import math
+import os
+
+import pytest
+
+from td_maya_tools import pose_cache, xml_utils
+from td_maya_tools.pose import Pose
+
+NAN = math.nan
+
+
+def make_poses():
+    shared = ('root', 'spine', 'arm_l')
+    return [Pose('walk', shared, array('d', range(18))),
+            Pose('run', shared, array('d', [1.5] * 17 + [NAN])),
+            Pose('empty'),
+            Pose('wave', ('hand_r', 'root'), array('d', [NAN, 2.0] * 6))]
+
+
+def assert_poses_equal(first=None, second=None):
+    assert first.name == second.name
+    assert first.joints == second.joints
+    assert [None if math.isnan(value) else value for value in first.values] == \
+        [None if math.isnan(value) else value for value in second.values]
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = str(tmp_path / 'poses.xml')
+    xml_utils.write_pose_xml(make_poses(), path)
+    return path
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    """
+    The xml files parsed into poses
+    """
+    paths = []
+    read_pose_xml = xml_utils.read_pose_xml
+
+    def counted(path=None):
+        paths.append(path)
+        return read_pose_xml(path)
+    monkeypatch.setattr(xml_utils, 'read_pose_xml', counted)
+    return paths
+
+
+def test_round_trip(library, parses):
+    first = pose_cache.load_pose_library(library)
+    assert isinstance(first, dict)
+    assert os.path.isfile(library + pose_cache.CACHE_EXTENSION)
+    cache = pose_cache.load_pose_library(library)
+    assert isinstance(cache, pose_cache.PoseCache)
+    assert parses == [library]
+    try:
+        assert list(cache) == [pose.name for pose in make_poses()]
+        assert len(cache) == 4
+        for pose in make_poses():
+            assert pose.name in cache
+            assert_poses_equal(cache[pose.name], pose)
+        assert 'missing' not in cache and 3 not in cache
+        with pytest.raises(KeyError):
+            cache['missing']
+        # poses with the same joints share their joint names
+        assert cache['walk'].joints is cache['run'].joints
+    finally:
+        cache.close()
+
+
+def test_open_reads_the_header_only(library):
+    pose_cache.load_pose_library(library)
+    cache = pose_cache.open_pose_cache(library + pose_cache.CACHE_EXTENSION)
+    assert (cache.pose_count, cache.joint_count) == (4, 4)
+    assert not cache._positions and not cache._joint_names
+    assert cache['run'].joints == ('root', 'spine', 'arm_l')
+    assert list(cache._positions) == ['run']
+    cache.close()
+
+
+def test_changed_content_is_read_again(library, parses):
+    pose_cache.load_pose_library(library)
+    xml_utils.update_pose_xml([Pose('walk', ('root',), array('d', [7.0] * 6))], library)
+    poses = pose_cache.load_pose_library(library)
+    assert isinstance(poses, dict)
+    assert poses['walk'].joints == ('root',)
+    cache = pose_cache.load_pose_library(library)
+    assert cache['walk'].values[0] == 7.0
+    assert len(parses) == 2
+    cache.close()
+
+
+def test_touched_file_keeps_its_cache(library, parses):
+    pose_cache.load_pose_library(library)
+    stat = os.stat(library)
+    os.utime(library, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+    cache = pose_cache.load_pose_library(library)
+    assert isinstance(cache, pose_cache.PoseCache)
+    assert parses == [library]
+    assert cache.matches(os.stat(library))
+    cache.close()
+
+
+@pytest.mark.parametrize('damage', (
+    lambda data: data[:len(data) // 2],
+    lambda data: data[:-1],
+    lambda data: b'',
+    lambda data: b'TDPC' + bytes(len(data) - 4),
+    lambda data: b'junk' + data[4:],
+))
+def test_damaged_cache_is_rebuilt(library, parses, damage):
+    pose_cache.load_pose_library(library)
+    cache_path = library + pose_cache.CACHE_EXTENSION
+    with open(cache_path, 'rb') as cache_fh:
+        data = cache_fh.read()
+    with open(cache_path, 'wb') as cache_fh:
+        cache_fh.write(damage(data))
+    assert pose_cache.open_pose_cache(cache_path) is None
+    poses = pose_cache.load_pose_library(library)
+    assert_poses_equal(poses['run'], make_poses()[1])
+    assert len(parses) == 2
+    cache = pose_cache.open_pose_cache(cache_path)
+    assert cache is not None
+    cache.close()
+
+
+def test_main_builds_a_folder(tmp_path, library, capsys):
+    broken = tmp_path / 'broken.xml'
+    broken.write_text('<root><pose>')
+    (tmp_path / 'notes.txt').write_text('not a library')
+    assert pose_cache.main([str(tmp_path)]) == 1
+    out, err = capsys.readouterr()
+    assert f'cached {library}' in out
+    assert str(broken) in err
+    cache_path = library + pose_cache.CACHE_EXTENSION
+    assert pose_cache.open_pose_cache(cache_path) is not None
+
+    broken.unlink()
+    os.utime(cache_path, ns=(0, 0))
+    assert pose_cache.main([str(tmp_path), '--force']) == 0
+    assert os.stat(cache_path).st_mtime_ns != 0
+    with pytest.raises(SystemExit):
+        pose_cache.main([str(tmp_path / 'missing')])
+
+
+def test_every_pose_of_a_large_cache_is_found(tmp_path):
+    names = [f'pose_{(i * 7919) % 1000:03d}_{i}' for i in range(500)]
+    path = str(tmp_path / 'large.xml')
+    xml_utils.write_pose_xml([Pose(name, ('root',), array('d', [float(i)] * 6))
+                              for i, name in enumerate(names)], path)
+    pose_cache.load_pose_library(path)
+    cache = pose_cache.load_pose_library(path)
+    assert list(cache) == names
+    for i, name in enumerate(names):
+        assert cache[name].values[0] == float(i)
+        assert name + '_' not in cache
+    cache.close()
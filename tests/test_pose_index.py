@@ -0,0 +1,138 @@
+"""
+Check merging pose xml files with td_maya_tools.pose_index.
+"""
+from array import array
+
+import pytest
+
+from td_maya_tools import pose_cache, pose_index, xml_utils
+from td_maya_tools.pose import Pose
+
+JOINTS = ('root', 'spine', 'arm_l')
+
+
+def make_pose(name=None, value=0.0):
+    return Pose(name, JOINTS, array('d', [value] * len(JOINTS) * 6))
+
+
+def write_library(folder=None, file_name=None, poses=None):
+    """
+    Write a pose xml file, poses maps pose names to the value of all their channels
+    """
+    path = str(folder / file_name)
+    xml_utils.write_pose_xml([make_pose(name, value) for name, value in poses.items()],
+                             path)
+    return path
+
+
+def pose_value(pose_dict=None, name=None):
+    return pose_dict[name].values[0]
+
+
+@pytest.fixture
+def libraries(tmp_path):
+    return [write_library(tmp_path, 'a.xml', {'walk': 1.0, 'run': 2.0}),
+            write_library(tmp_path, 'b.xml', {'run': 3.0, 'jump': 4.0})]
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """
+    The names of the poses read from caches
+    """
+    names = []
+    getitem = pose_cache.PoseCache.__getitem__
+
+    def counted(cache, pose):
+        names.append(pose)
+        return getitem(cache, pose)
+    monkeypatch.setattr(pose_cache.PoseCache, '__getitem__', counted)
+    return names
+
+
+@pytest.mark.parametrize('use_processes', (False, True))
+def test_build_merges_in_order(libraries, use_processes):
+    index = pose_index.build_pose_index(libraries, use_processes=use_processes)
+    assert sorted(index) == ['jump', 'run', 'walk']
+    assert pose_value(index, 'run') == 2.0
+    assert index.source('run') == libraries[0]
+    assert index.source('jump') == libraries[1]
+    assert index.conflicts == [('run', libraries[0], libraries[1])]
+    index = pose_index.build_pose_index(libraries, policy='last',
+                                        use_processes=use_processes)
+    assert pose_value(index, 'run') == 3.0
+
+
+def test_build_error_policy(libraries):
+    with pytest.raises(ValueError):
+        pose_index.build_pose_index(libraries, policy='error', use_processes=False)
+
+
+@pytest.mark.parametrize('paths', ((0,), (0, 1)))
+def test_build_reads_poses_when_looked_up(libraries, lookups, paths):
+    # the first build writes the caches
+    pose_index.build_pose_index(libraries, use_processes=False)
+    lookups.clear()
+    index = pose_index.build_pose_index([libraries[i] for i in paths],
+                                        use_processes=False)
+    assert lookups == []
+    assert pose_value(index, 'walk') == 1.0
+    assert lookups == ['walk']
+    index.close()
+    assert len(index) == 0
+
+
+def test_load_source_reads_changes(tmp_path, libraries, lookups):
+    index = pose_index.build_pose_index(libraries, use_processes=False)
+    write_library(tmp_path, 'a.xml', {'walk': 5.0, 'crawl': 6.0})
+    lookups.clear()
+    assert sorted(index.load_source(libraries[0])) == ['crawl', 'run', 'walk']
+    assert lookups == []
+    assert pose_value(index, 'walk') == 5.0
+    assert pose_value(index, 'crawl') == 6.0
+
+
+@pytest.mark.parametrize('policy, kept', (('first', 2.0), ('last', 3.0)))
+def test_remove_source_merges_the_other_files(libraries, policy, kept):
+    index = pose_index.build_pose_index(libraries, policy=policy, use_processes=False)
+    assert pose_value(index, 'run') == kept
+    removed = libraries[0] if policy == 'first' else libraries[1]
+    index.remove_source(removed)
+    assert 'run' in index
+    assert index.source('run') != removed
+    assert pose_value(index, 'run') == 5.0 - kept
+    assert index.conflicts == []
+    # a file loaded again after it was removed is merged last
+    index.load_source(removed)
+    assert index.source('run') == libraries[1]
+    assert len(index.conflicts) == 1
+
+
+def test_load_source_keeps_the_merge_order(libraries):
+    index = pose_index.build_pose_index(libraries, use_processes=False)
+    for _ in range(3):
+        index.load_source(libraries[0])
+        index.load_source(libraries[1])
+    assert pose_value(index, 'run') == 2.0
+    assert index.conflicts == [('run', libraries[0], libraries[1])]
+
+
+def test_conflicts_of_three_files(tmp_path, libraries):
+    libraries.append(write_library(tmp_path, 'c.xml', {'run': 7.0}))
+    index = pose_index.build_pose_index(libraries, policy='last', use_processes=False)
+    assert pose_value(index, 'run') == 7.0
+    assert sorted(index.conflicts) == [('run', libraries[2], libraries[0]),
+                                       ('run', libraries[2], libraries[1])]
+    index.remove_source(libraries[2])
+    assert index.conflicts == [('run', libraries[1], libraries[0])]
+
+
+def test_load_source_error_policy(tmp_path, libraries):
+    index = pose_index.build_pose_index(libraries[:1], policy='error')
+    write_library(tmp_path, 'b.xml', {'jump': 4.0})
+    index.load_source(libraries[1])
+    write_library(tmp_path, 'b.xml', {'walk': 4.0})
+    with pytest.raises(ValueError):
+        index.load_source(libraries[1])
+    assert sorted(index) == ['run', 'walk']
+    assert index.source('walk') == libraries[0]
@@ -0,0 +1,166 @@
+"""
+Check finding the closest poses with td_maya_tools.pose_search, through the KD-trees
+and through the whole matrix.
+"""
+from array import array
+import math
+
+import numpy as np
+import pytest
+
+from td_maya_tools import pose_search, poser
+from td_maya_tools.pose import Pose
+from td_maya_tools.pose_search import PoseSearchIndex
+
+from conftest import JOINTS, posed_pose
+
+SEARCH_JOINTS = ('a', 'b', 'c')
+NAN = math.nan
+
+
+class BruteForceTree(object):
+    """
+    Answers queries like scipy.spatial.cKDTree, by measuring every row
+    """
+    built = []
+
+    def __init__(self, data=None):
+        self.data = np.asarray(data)
+        BruteForceTree.built.append(self)
+
+    def query(self, x=None, k=1):
+        distances = np.sqrt(((self.data - x) ** 2).sum(axis=1))
+        rows = np.argsort(distances, kind='stable')[:k]
+        if k == 1:
+            return distances[rows[0]], rows[0]
+        return distances[rows], rows
+
+
+def make_pose(name=None, rx=0.0, tx=0.0, joints=SEARCH_JOINTS):
+    return Pose(name, joints, array('d', (tx, 0.0, 0.0, rx, 0.0, 0.0) * len(joints)))
+
+
+POSES = [make_pose('rest'), make_pose('small', rx=5.0), make_pose('big', rx=90.0),
+         make_pose('moved', tx=3.0), make_pose('turned', rx=179.0)]
+
+
+@pytest.fixture(params=('matrix', 'tree'))
+def use_tree(request, monkeypatch):
+    BruteForceTree.built = []
+    if request.param == 'tree' and pose_search.cKDTree is None:
+        monkeypatch.setattr(pose_search, 'cKDTree', BruteForceTree)
+    return request.param == 'tree'
+
+
+def test_closest_poses(use_tree):
+    search = PoseSearchIndex(POSES, use_tree=use_tree)
+    assert len(search) == len(POSES)
+    results = search.query(make_pose('query', rx=6.0), count=3)
+    assert [name for name, _ in results] == ['small', 'rest', 'moved']
+    assert results[0][1] < results[1][1] < results[2][1]
+    assert search.query(POSES[3], count=1) == [('moved', pytest.approx(0.0, abs=1e-9))]
+    assert [name for name, _ in search.query(POSES[1], count=2, exclude={'small'})] == [
+        'rest', 'moved']
+    assert search.query(POSES[1], count=0) == []
+
+
+def test_tree_and_matrix_agree(monkeypatch):
+    if pose_search.cKDTree is None:
+        monkeypatch.setattr(pose_search, 'cKDTree', BruteForceTree)
+    query = make_pose('query', rx=40.0, tx=1.0)
+    with_tree = PoseSearchIndex(POSES, use_tree=True).query(query, count=len(POSES))
+    without = PoseSearchIndex(POSES, use_tree=False).query(query, count=len(POSES))
+    assert [name for name, _ in with_tree] == [name for name, _ in without]
+    assert [distance for _, distance in with_tree] == pytest.approx(
+        [distance for _, distance in without])
+
+
+def test_distance_is_the_root_mean_square():
+    search = PoseSearchIndex(POSES, use_tree=False, rotation_weight=1.0)
+    distance = dict(search.query(make_pose('query', tx=2.0, joints=('a',)), count=5))
+    # only the three translations and nine rotation values of a are compared
+    assert distance['rest'] == pytest.approx(math.sqrt(4.0 / 12))
+    assert distance['moved'] == pytest.approx(math.sqrt(1.0 / 12))
+
+
+def test_trees_are_kept(monkeypatch):
+    monkeypatch.setattr(pose_search, 'cKDTree', BruteForceTree)
+    monkeypatch.setattr(pose_search, 'TREE_CACHE_SIZE', 2)
+    BruteForceTree.built = []
+    search = PoseSearchIndex(POSES, use_tree=True)
+    query = make_pose('query', rx=6.0)
+    search.query(query)
+    search.query(query)
+    assert len(BruteForceTree.built) == 1
+    search.query(query, joints=['a'])
+    search.query(query, joints=['b'])
+    assert len(BruteForceTree.built) == 3
+    # the tree over every joint was the least recently used
+    search.query(query)
+    assert len(BruteForceTree.built) == 4
+
+
+def test_tree_needs_scipy(monkeypatch):
+    monkeypatch.setattr(pose_search, 'cKDTree', None)
+    with pytest.raises(ImportError):
+        PoseSearchIndex(POSES, use_tree=True)
+    assert not PoseSearchIndex(POSES).use_tree
+
+
+def test_rotations_compare_as_matrices(use_tree):
+    flipped = Pose('flipped', ('a',), array('d', (0.0, 0.0, 0.0, 180.0, 0.0, 0.0)))
+    search = PoseSearchIndex([flipped, make_pose('rest', joints=('a',))], use_tree=use_tree)
+    # the same rotation with other euler angles
+    query = Pose('query', ('a',), array('d', (0.0, 0.0, 0.0, 0.0, 180.0, 180.0)))
+    assert search.query(query, count=1) == [('flipped', pytest.approx(0.0, abs=1e-9))]
+
+
+def test_unset_channels(use_tree):
+    poses = POSES + [Pose('no c', ('a', 'b'), array('d', (0.0, 0.0, 0.0, 5.0, 0.0, 0.0,
+                                                          0.0, 0.0, 0.0, 5.0, 0.0, 0.0))),
+                     Pose('c only', ('c',), array('d', (9.0, 9.0, 9.0, NAN, NAN, NAN)))]
+    search = PoseSearchIndex(poses, use_tree=use_tree)
+    results = dict(search.query(make_pose('query', rx=5.0), count=len(poses)))
+    # compared over the channels both poses set
+    assert results['no c'] == pytest.approx(0.0, abs=1e-9)
+    assert results['small'] == pytest.approx(0.0, abs=1e-9)
+    assert results['c only'] > results['big']
+    # a pose that shares no channel with the query is left out
+    query = Pose('query', ('a',), array('d', (0.0, 0.0, 0.0, 5.0, 0.0, 0.0)))
+    assert 'c only' not in dict(search.query(query, count=len(poses)))
+    # unset channels of the query are not compared
+    query = Pose('query', ('a',), array('d', (3.0, 0.0, 0.0, NAN, 1.0, 1.0)))
+    assert search.query(query, count=1)[0][0] == 'moved'
+    assert search.query(Pose('query', ('a',), array('d', (NAN,) * 6))) == []
+    assert search.query(make_pose('query', joints=('tail',))) == []
+
+
+def test_similar_poses_filter(poser_gui, scene):
+    backend = poser.get_backend()
+    posed, _ = posed_pose(scene, backend)
+    gui = poser_gui.PoserGUI()
+    gui.joint_registry = poser.get_joint_registry()
+    poses = {'posed': posed, 'rest': backend.read_pose(JOINTS, 'rest')}
+    for amount in (0.25, 0.5, 0.75):
+        values = array('d', (rest + (pose - rest) * amount for rest, pose in
+                             zip(poses['rest'].values, posed.values)))
+        poses[f'{amount:.0%}'] = Pose(f'{amount:.0%}', JOINTS, values)
+    gui.pose_dict = poses
+    gui.pose_names = list(poses)
+    gui.build_xml_list_layout()
+
+    gui.similar_btn.setChecked(True)
+    results = gui.find_similar_poses()
+    assert [name for name, _ in results] == ['rest', '25%', '50%', '75%', 'posed']
+    listed = [gui.xml_lw.item(row).text().split()[0] for row in range(gui.xml_lw.count())]
+    assert listed == ['rest', '25%', '50%', '75%', 'posed']
+    assert 'away from the rig' in gui.xml_lw.item(0).toolTip()
+
+    poser.apply_pose(posed)
+    assert gui.find_similar_poses(count=2)[0] == ('posed', pytest.approx(0.0, abs=1e-6))
+    # the index is built once for the library
+    assert gui.get_pose_search() is gui.pose_search
+
+    gui.similar_btn.setChecked(False)
+    assert gui.xml_lw.count() == len(poses)
+    gui.deleteLater()
@@ -0,0 +1,25 @@
+"""
+Check the pure Python solver.
+"""
+from td_maya_tools import pose_solver
+
+
+class State(object):
+    def __init__(self, parent=None):
+        self.parent = parent
+
+
+def test_hierarchy_order_long_chain():
+    # deeper than the recursion limit
+    joints = [f'joint_{i:05d}' for i in range(5000)]
+    states = {joint: State(joints[i - 1] if i else 'group') for i, joint in enumerate(joints)}
+    assert pose_solver.hierarchy_order(reversed(joints), states) == joints
+
+
+def test_hierarchy_order_branches():
+    states = {'root': State(), 'arm': State('root'), 'hand': State('arm'),
+              'leg': State('root'), 'foot': State('leg')}
+    order = pose_solver.hierarchy_order(['foot', 'hand', 'leg', 'arm', 'root'], states)
+    assert order.index('root') == 0
+    assert order.index('arm') < order.index('hand')
+    assert order.index('leg') < order.index('foot')
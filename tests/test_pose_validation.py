@@ -0,0 +1,138 @@
+"""
+Check the library reports of td_maya_tools.pose_validation.
+"""
+from array import array
+
+import pytest
+
+from td_maya_tools import pose_cache, pose_index, pose_validation, xml_utils
+from td_maya_tools.pose import Pose
+from td_maya_tools.retarget import RetargetMap, RetargetRules
+
+from conftest import JOINTS
+
+LIBRARY = """<?xml version="1.0" ?>
+<root>
+    <walk>
+        <root>
+            <translations tx="1.0" ty="oops" tz="2.0"/>
+            <rotations rx="0.0" ry="0.0" rz="nope"/>
+        </root>
+        <spine>
+            <rotations rx="0.0" ry="0.0" rz="0.0"/>
+        </spine>
+    </walk>
+    <run>
+        <root>
+            <translations tx="1.0" ty="1.0" tz="1.0"/>
+            <rotations rx="0.0" ry="0.0" rz="0.0"/>
+        </root>
+        <tail>
+            <translations tx="1.0" ty="1.0" tz="1.0"/>
+            <rotations rx="0.0" ry="0.0" rz="0.0"/>
+        </tail>
+    </run>
+</root>
+"""
+
+
+def full_pose(name=None, joints=None):
+    return Pose(name, joints, array('d', [0.0] * len(joints) * 6))
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = tmp_path / 'poses.xml'
+    path.write_text(LIBRARY)
+    return str(path)
+
+
+def test_missing_and_extra_joints():
+    poses = {'walk': full_pose('walk', ('root', 'spine')),
+             'run': full_pose('run', ('root', 'tail')),
+             'jump': full_pose('jump', ('root', 'spine'))}
+    poses['jump'] = Pose('jump', poses['walk'].joints, poses['jump'].values)
+    report = pose_validation.validate_library(poses, ('root', 'spine', 'chest'))
+    assert report['walk'] and report['jump']
+    assert report['walk'].missing == frozenset()
+    assert report['walk'].extra == {'chest'}
+    assert not report['run']
+    assert report['run'].missing == {'tail'}
+    assert report['run'].extra == {'spine', 'chest'}
+    assert report['run'].coverage == 0.5
+    assert report.invalid() == ['run']
+    assert 'missing joints: tail' in report['run'].summary()
+
+
+def test_retargeted_joints():
+    poses = {'walk': full_pose('walk', ('spine', 'tail'))}
+    scene_joints = ['char1:spine', 'char2:spine']
+    retarget_map = RetargetMap(RetargetRules(namespace='char1'), scene_joints)
+    report = pose_validation.validate_library(poses, scene_joints, retarget_map)
+    assert report['walk'].missing == {'tail'}
+    assert report['walk'].extra == {'char2:spine'}
+
+
+def test_non_numeric_and_empty_channels(library):
+    report = pose_validation.validate_library(xml_utils.read_pose_xml(library),
+                                              JOINTS, paths=[library])
+    walk = report['walk']
+    assert not walk
+    assert walk.non_numeric == {'root': ('ty', 'rz')}
+    # the channels that are not numbers are not counted as empty
+    assert walk.empty == {'spine': ('tx', 'ty', 'tz')}
+    assert 'root.ty, root.rz' in walk.summary()
+    assert report['run'].non_numeric == {}
+
+
+def test_index_reads_the_cache(library, monkeypatch):
+    # the first load writes the cache
+    pose_index.build_pose_index([library]).close()
+    index = pose_index.build_pose_index([library])
+    assert isinstance(index._libraries[library], pose_cache.PoseCache)
+
+    def scan(path=None):
+        raise AssertionError(f'{path} was scanned')
+    monkeypatch.setattr(xml_utils, 'find_non_numeric_channels', scan)
+    read = []
+    getitem = pose_cache.PoseCache.__getitem__
+    monkeypatch.setattr(pose_cache.PoseCache, '__getitem__',
+                        lambda cache, pose: read.append(pose) or getitem(cache, pose))
+
+    report = pose_validation.validate_library(index, JOINTS)
+    assert report['walk'].non_numeric == {'root': ('ty', 'rz')}
+    assert report.invalid() == ['walk', 'run']
+    assert read == []
+    assert report['walk'].empty == {'spine': ('tx', 'ty', 'tz')}
+    assert read == ['walk']
+
+
+def test_files_without_a_cache_are_scanned_when_they_change(library, monkeypatch):
+    monkeypatch.setattr(pose_cache, 'write_pose_cache', lambda *args: None)
+    index = pose_index.build_pose_index([library])
+    assert pose_validation.validate_library(index, JOINTS)['walk'].non_numeric
+    with open(library, 'w') as xml_fh:
+        xml_fh.write(LIBRARY.replace('"oops"', '"3.0" ').replace('"nope"', '"4.0" '))
+    index.load_source(library)
+    assert pose_validation.validate_library(index, JOINTS)['walk'].non_numeric == {}
+
+
+def test_gui_checks_again_when_the_joints_change(poser_gui, scene, library, monkeypatch):
+    gui = poser_gui.PoserGUI()
+    gui.joint_registry = poser_gui.poser.get_joint_registry()
+    gui.pose_dict = pose_index.build_pose_index([library])
+    calls = []
+    validate = pose_validation.validate_library
+    monkeypatch.setattr(pose_validation, 'validate_library',
+                        lambda *args: calls.append(args) or validate(*args))
+
+    first = gui.get_validation()
+    assert gui.get_validation() is first
+    assert len(calls) == 1
+    assert first['run'].missing == {'tail'}
+
+    scene.createNode('joint', 'tail', 'root')
+    second = gui.get_validation()
+    assert len(calls) == 2
+    assert second['run'].missing == frozenset()
+    gui.deleteLater()
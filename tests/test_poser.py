@@ -0,0 +1,209 @@
+"""
+Check applying poses through td_maya_tools.poser.
+"""
+from array import array
+import os
+
+import pytest
+
+from td_maya_testing.fake_api import install_maya_api
+from td_maya_testing.fake_scene import FakeScene, install_maya_cmds
+from td_maya_tools import poser, xml_utils
+from td_maya_tools.pose import Pose
+
+from conftest import JOINTS, RIG, assert_worlds_equal, posed_pose, world_matrices
+
+POSES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          'td_maya_tools', 'guis', 'images', 'poses.xml')
+
+
+@pytest.fixture(scope='module')
+def poses():
+    return xml_utils.read_pose_xml(POSES_PATH)
+
+
+def make_rig(joints=None, chained=False):
+    """
+    A scene with the joints of a pose, each under the one before when chained
+    """
+    scene = FakeScene()
+    install_maya_cmds(scene)
+    install_maya_api(scene)
+    parent = None
+    for joint in joints:
+        scene.createNode('joint', joint, parent)
+        scene.setAttr(f'{joint}.jointOrient', 10.0, 0.0, 5.0)
+        if chained:
+            parent = joint
+    return scene
+
+
+@pytest.mark.parametrize('backend', ('cmds', 'cmds_local', 'openmaya'))
+@pytest.mark.parametrize('chained', (False, True))
+def test_apply_twice_changes_nothing(poses, backend, chained):
+    pose = poses['dance']
+    make_rig(pose.joints, chained)
+    first = poser.apply_pose(pose, backend=backend)
+    assert not first.failures
+    result = poser.apply_pose(pose, backend=backend, tolerance=poser.DEFAULT_TOLERANCE)
+    assert result.diff.channels_checked == len(pose.joints) * 6
+    assert result.diff.channels_changed == 0
+    assert sorted(result.diff.unchanged) == sorted(pose.joints)
+
+
+def test_rotation_change_is_found(poses):
+    pose = poses['dance']
+    scene = make_rig(pose.joints)
+    poser.apply_pose(pose)
+    scene.setAttr('Spine.rotateX', scene.getAttr('Spine.rotateX') + 0.01)
+    result = poser.apply_pose(pose, tolerance=poser.DEFAULT_TOLERANCE)
+    assert result.diff.changed == {'Spine': ('rx', 'ry', 'rz')}
+    assert result.diff.channels_changed == 3
+
+
+def test_equivalent_euler_angles_are_unchanged(poses):
+    scene = make_rig(['joint1'])
+    scene.setAttr('joint1.jointOrient', 0.0, 0.0, 0.0)
+    scene.setAttr('joint1.rotate', 30.0, 120.0, 45.0)
+    pose = poser.capture_pose(['joint1'], 'flipped')
+    # the same rotation, with y past 90 degrees the other way
+    pose.values[3:6] = type(pose.values)('d', (-150.0, 60.0, -135.0))
+    result = poser.apply_pose(pose, tolerance=poser.DEFAULT_TOLERANCE)
+    assert result.diff.channels_changed == 0
+
+
+def test_preview_leaves_the_undo_queue(scene):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    rest = world_matrices(scene)
+    preview = poser.PosePreview()
+    assert preview.start() == len(JOINTS)
+    result = preview.show(pose)
+    assert sorted(result.applied) == sorted(JOINTS)
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert preview.show(None) is None
+    assert_worlds_equal(world_matrices(scene), rest)
+
+    preview.show(pose)
+    assert not preview.clear()
+    assert_worlds_equal(world_matrices(scene), rest)
+    preview.show(pose)
+    assert not preview.stop()
+    assert not preview.active
+    assert_worlds_equal(world_matrices(scene), rest)
+    assert scene.undo_queue == []
+
+
+def test_preview_then_apply_is_one_undo(scene):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    rest = world_matrices(scene)
+    preview = poser.PosePreview()
+    preview.show(pose)
+    preview.clear()
+    poser.apply_pose(pose)
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
+
+
+@pytest.mark.parametrize('backend', ('cmds', 'cmds_local', 'openmaya'))
+def test_apply_reports_missing_joints(scene, backend):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    rest = world_matrices(scene)
+    tail = Pose(pose.name, pose.joints + ('tail',), pose.values + array('d', [0.0] * 6))
+    result = poser.apply_pose(tail, backend=backend)
+    assert result.failures == {'tail': 'does not exist'}
+    assert sorted(result.applied) == sorted(JOINTS)
+    assert not result
+    # the joints that exist are still posed, in a single step of the undo queue
+    assert_worlds_equal(world_matrices(scene), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    assert_worlds_equal(world_matrices(scene), rest)
+
+
+def test_apply_nothing(scene):
+    assert not poser.apply_pose(None)
+    result = poser.apply_pose(Pose('tail', ('tail',), array('d', [0.0] * 6)))
+    assert result.applied == [] and list(result.failures) == ['tail']
+    assert scene.undo_queue == []
+
+
+def add_character(scene=None, namespace=None, skip=()):
+    """
+    Add a copy of the rig in a namespace, without the joints in skip
+    """
+    scene.createNode('transform', f'{namespace}:rig')
+    for name, parent, translate, orient, axis, order in RIG:
+        if name in skip:
+            continue
+        scene.createNode('joint', f'{namespace}:{name}', f'{namespace}:{parent}')
+        scene.setAttr(f'{namespace}:{name}.translate', *translate)
+        scene.setAttr(f'{namespace}:{name}.jointOrient', *orient)
+        scene.setAttr(f'{namespace}:{name}.rotateAxis', *axis)
+        scene.setAttr(f'{namespace}:{name}.rotateOrder', order)
+    scene.undo_queue = []
+
+
+def character_worlds(scene=None, namespace=None):
+    return {joint: scene.xform(f'{namespace}:{joint}', query=True, worldSpace=True,
+                               matrix=True)
+            for joint in JOINTS}
+
+
+@pytest.mark.parametrize('backend', ('cmds', 'cmds_local', 'openmaya'))
+def test_apply_to_characters_is_one_batch(scene, monkeypatch, backend):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    for namespace in ('char1', 'char2'):
+        add_character(scene, namespace)
+    rest = character_worlds(scene, 'char1')
+    backend = poser.get_backend(backend)
+    calls = []
+    apply = backend.apply
+    monkeypatch.setattr(backend, 'apply', lambda entries: calls.append(entries)
+                        or apply(entries))
+
+    results = poser.apply_pose_to_characters(pose, ['char1', 'char2'], backend=backend)
+    assert len(calls) == 1
+    assert len(calls[0]) == len(JOINTS) * 2
+    for namespace in ('char1', 'char2'):
+        assert sorted(results[namespace].applied) == sorted(f'{namespace}:{joint}'
+                                                            for joint in JOINTS)
+        assert not results[namespace].failures
+        assert_worlds_equal(character_worlds(scene, namespace), worlds)
+    assert len(scene.undo_queue) == 1
+    scene.undo()
+    for namespace in ('char1', 'char2'):
+        assert_worlds_equal(character_worlds(scene, namespace), rest)
+
+
+def test_apply_to_characters_reports_missing_joints(scene):
+    pose, worlds = posed_pose(scene, poser.get_backend())
+    add_character(scene, 'char1')
+    add_character(scene, 'char2', skip=('neck', 'hand_l'))
+    results = poser.apply_pose_to_characters(pose, ['char1', 'char2', 'nobody'])
+    assert not results['char1'].failures
+    assert_worlds_equal(character_worlds(scene, 'char1'), worlds)
+    # the rest of a character with missing joints is still posed
+    assert results['char2'].failures == {'neck': 'char2:neck does not exist',
+                                         'hand_l': 'char2:hand_l does not exist'}
+    assert len(results['char2'].applied) == len(JOINTS) - 2
+    assert scene.xform('char2:chest', query=True, worldSpace=True, matrix=True) == \
+        pytest.approx(worlds['chest'], abs=1e-6)
+    assert results['nobody'].applied == []
+    assert sorted(results['nobody'].failures) == sorted(JOINTS)
+    assert len(scene.undo_queue) == 1
+
+
+def test_apply_to_characters_with_tolerance(scene):
+    pose, _ = posed_pose(scene, poser.get_backend())
+    add_character(scene, 'char1')
+    add_character(scene, 'char2')
+    poser.apply_pose_to_characters(pose, ['char1'])
+    results = poser.apply_pose_to_characters(pose, ['char1', 'char2'],
+                                             tolerance=poser.DEFAULT_TOLERANCE)
+    # the characters share the diff of the whole apply
+    assert results['char1'].diff is results['char2'].diff
+    assert sorted(results['char1'].diff.unchanged) == sorted(f'char1:{joint}'
+                                                             for joint in JOINTS)
+    assert len(results['char1'].applied) == len(results['char2'].applied) == len(JOINTS)
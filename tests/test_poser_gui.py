@@ -0,0 +1,113 @@
+"""
+Check the main window of td_maya_tools.guis.poser_gui reading and following its images
+folder.
+"""
+import os
+
+import pytest
+
+from td_maya_tools import poser, xml_utils
+
+from conftest import JOINTS, posed_pose
+
+
+class AnyFlags(object):
+    def __or__(self, other=None):
+        return self
+
+
+@pytest.fixture
+def images_dir(poser_gui, tmp_path, monkeypatch):
+    monkeypatch.setattr(poser_gui, 'IMAGES_DIR', str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def quiet_gui(poser_gui):
+    """
+    The main window, keeping the titles of its messages instead of showing them
+    """
+    class QuietGUI(poser_gui.PoserGUI):
+        messages = []
+
+        @classmethod
+        def display_message(cls, title=None, message=None):
+            cls.messages.append(title)
+
+        # flags of some PySide2 builds cannot be combined on newer Pythons, and the
+        # window is never seen offscreen anyway
+        def windowFlags(self):
+            return AnyFlags()
+
+        def setWindowFlags(self, flags=None):
+            pass
+    return QuietGUI
+
+
+@pytest.fixture
+def gui(quiet_gui, images_dir):
+    gui = quiet_gui()
+    gui.init_gui()
+    yield gui
+    gui.close()
+    gui.deleteLater()
+
+
+def write_image(path=None, color='#3366CC'):
+    from PySide2 import QtGui
+    image = QtGui.QImage(8, 8, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(color))
+    assert image.save(str(path), 'PNG')
+
+
+def browser_rows(gui=None):
+    model = gui.pose_browser.pose_model
+    return [model.index(row).data() for row in range(model.rowCount())]
+
+
+def test_get_images_of_an_empty_folder(quiet_gui, images_dir):
+    assert quiet_gui.get_images() == ([], [])
+    assert quiet_gui.messages == ['No Images']
+
+
+def test_get_images(quiet_gui, images_dir):
+    write_image(images_dir / 'wave.png')
+    (images_dir / 'notes.txt').write_text('')
+    paths, names = quiet_gui.get_images()
+    assert paths == [os.path.join(str(images_dir), 'wave.png')]
+    assert names == ['wave']
+
+
+def test_empty_folder(gui):
+    assert gui.messages == ['No Images', 'No XML']
+    assert browser_rows(gui) == []
+    assert gui.xml_lw.count() == 0
+
+
+def test_refresh_follows_the_folder(gui, images_dir, scene):
+    pose, _ = posed_pose(scene, poser.get_backend())
+    rest = poser.capture_pose(JOINTS, 'rest')
+    xml_utils.write_pose_xml([pose, rest], str(images_dir / 'poses.xml'))
+    write_image(images_dir / 'posed.png')
+    write_image(images_dir / 'rest.png')
+    changes = gui.refresh_library()
+    assert changes.added == ['posed.png', 'poses.xml', 'rest.png']
+    assert browser_rows(gui) == ['posed', 'rest']
+    assert gui.xml_lw.count() == 2
+
+    changed = []
+    gui.pose_browser.pose_model.dataChanged.connect(
+        lambda first, last, roles=None: changed.append(first.row()))
+    write_image(images_dir / 'rest.png', '#000000')
+    image_stat = os.stat(images_dir / 'rest.png')
+    os.utime(images_dir / 'rest.png', ns=(image_stat.st_atime_ns,
+                                          image_stat.st_mtime_ns + 10 ** 9))
+    assert gui.refresh_library().changed == ['rest.png']
+    assert changed == [1]
+
+    os.remove(images_dir / 'posed.png')
+    assert gui.refresh_library().removed == ['posed.png']
+    assert browser_rows(gui) == ['rest']
+    assert [gui.xml_lw.item(row).data(256) for row in range(gui.xml_lw.count())] == [
+        'rest']
+    assert not gui.refresh_library()
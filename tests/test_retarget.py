@@ -0,0 +1,148 @@
+"""
+Check mapping pose joints onto rigs with td_maya_tools.retarget.
+"""
+from array import array
+
+import pytest
+
+from td_maya_tools import poser, retarget
+from td_maya_tools.pose import Pose
+from td_maya_tools.retarget import RetargetMap, RetargetRules
+
+CHANNELS = (1.0, 2.0, 3.0, 10.0, 20.0, 30.0)
+SCENE_JOINTS = ('char1:root', 'char1:arm_l', 'char1:arm_r', 'char1:spine',
+                'char2:root', 'char2:arm_l', 'char2:arm_r', 'head', 'rig|spine')
+
+
+def make_pose(joints=None):
+    return Pose('wave', joints, array('d', CHANNELS * len(joints)))
+
+
+@pytest.mark.parametrize('joint, rules, expected', (
+    ('old:arm_l', RetargetRules(), 'arm_l'),
+    ('old:arm_l', RetargetRules(namespace='char1:'), 'char1:arm_l'),
+    ('old:arm_l', RetargetRules(strip_namespaces=False), 'old:arm_l'),
+    ('a:b:arm_l', RetargetRules(namespace='char2'), 'char2:arm_l'),
+    ('arm_l', RetargetRules(prefixes=[('arm', 'Arm')], suffixes=[('_l', 'Left')]),
+     'ArmLeft'),
+    ('arm_l_01', RetargetRules(patterns=[(r'_(\d+)$', r'\1')]), 'arm_l01'),
+))
+def test_target_name(joint, rules, expected):
+    assert rules.target_name(joint) == expected
+
+
+@pytest.mark.parametrize('name, expected', (
+    ('arm_l', 'arm_r'), ('arm_R', 'arm_L'), ('L_hand', 'R_hand'), ('l_leg', 'r_leg'),
+    ('footLeft', 'footRight'), ('right_eye', 'left_eye'), ('spine', 'spine'),
+    # only the start and the end of a name are swapped
+    ('lower_l_arm', 'lower_l_arm'),
+))
+def test_mirror_name(name, expected):
+    assert RetargetRules(mirror=True).mirror_name(name) == expected
+
+
+def test_mirror_pairs_are_swapped_both_ways():
+    rules = RetargetRules(mirror=True, mirror_pairs=[('Lf', 'Rt')])
+    assert rules.target_name('char:armLf') == 'armRt'
+    assert rules.target_name('armRt') == 'armLf'
+    assert rules.target_name('arm_l') == 'arm_l'
+
+
+@pytest.mark.parametrize('axis, signs', (('x', (-1, 1, 1, 1, -1, -1)),
+                                         ('y', (1, -1, 1, -1, 1, -1)),
+                                         ('z', (1, 1, -1, -1, -1, 1))))
+def test_mirror_signs(axis, signs):
+    assert retarget.mirror_signs(axis) == signs
+    assert RetargetRules(mirror=True, mirror_axis=axis).signs == signs
+
+
+def test_bad_signs():
+    with pytest.raises(ValueError):
+        retarget.mirror_signs('w')
+    with pytest.raises(ValueError):
+        RetargetRules(signs=(1.0, -1.0))
+    # signs that change nothing are dropped
+    assert RetargetRules(signs=(1,) * 6).signs is None
+
+
+def test_mirrored_pose_flips_sides_and_signs():
+    retarget_map = RetargetMap(RetargetRules(namespace='char1', mirror=True), SCENE_JOINTS)
+    pose, failures = retarget_map.retarget(make_pose(('arm_l', 'arm_r', 'spine')))
+    assert not failures
+    assert pose.joints == ('char1:arm_r', 'char1:arm_l', 'char1:spine')
+    for joint in pose.joints:
+        assert pose.channels(joint) == pytest.approx((-1.0, 2.0, 3.0, 10.0, -20.0, -30.0))
+
+
+def test_resolve():
+    retarget_map = RetargetMap(RetargetRules(), SCENE_JOINTS)
+    assert retarget_map.resolve('old:head') == 'head'
+    # a name that is unique without its namespace or parents finds its joint
+    assert retarget_map.resolve('spine') is None
+    assert 'matches several joints' in retarget_map.failures['spine']
+    assert retarget_map.resolve('arm_l') is None
+    assert retarget_map.resolve('tail') is None
+    assert retarget_map.failures['tail'] == 'tail does not exist'
+    assert RetargetMap(RetargetRules(namespace='char3'), SCENE_JOINTS).resolve(
+        'root') is None
+
+
+def test_unique_short_name():
+    retarget_map = RetargetMap(RetargetRules(), ('rig|spine', 'char1:root'))
+    assert retarget_map.resolve('spine') == 'rig|spine'
+    assert retarget_map.resolve('root') == 'char1:root'
+
+
+def test_retarget_reports_failures():
+    retarget_map = RetargetMap(RetargetRules(namespace='char1'), SCENE_JOINTS)
+    pose, failures = retarget_map.retarget(make_pose(('a:root', 'b:root', 'tail')),
+                                           ['a:root', 'b:root', 'tail', 'neck'])
+    assert pose.joints == ('char1:root',)
+    assert failures == {'b:root': 'char1:root is already posed by a:root',
+                        'tail': 'char1:tail does not exist', 'neck': 'not in the pose'}
+
+
+def test_pose_that_needs_nothing_is_kept():
+    pose = make_pose(('head',))
+    assert RetargetMap(RetargetRules(), SCENE_JOINTS).retarget(pose)[0] is pose
+
+
+def test_joints_resolved_once(monkeypatch):
+    rules = RetargetRules(namespace='char2')
+    calls = []
+    target_name = rules.target_name
+    monkeypatch.setattr(rules, 'target_name', lambda joint: calls.append(joint)
+                        or target_name(joint))
+    retarget_map = RetargetMap(rules, SCENE_JOINTS)
+    pose = make_pose(('root', 'arm_l', 'tail'))
+    for _ in range(3):
+        retarget_map.retarget(pose)
+    assert sorted(calls) == ['arm_l', 'root', 'tail']
+
+
+def test_find_namespaces():
+    assert retarget.find_namespaces(SCENE_JOINTS + ('|grp|char3:a:root',)) == \
+        ['char1', 'char2', 'char3:a']
+    assert retarget.short_name('|grp|char3:a:root') == 'root'
+
+
+def test_rules_compiled_once_per_rig(scene):
+    first = poser.get_retarget_map(RetargetRules(namespace='char1'))
+    # equal rules find the same map while the joints do not change
+    assert poser.get_retarget_map(RetargetRules(namespace='char1')) is first
+    assert poser.get_retarget_map(first) is first
+    assert poser.get_retarget_map(RetargetRules(namespace='char2')) is not first
+    scene.createNode('joint', 'char1:root')
+    second = poser.get_retarget_map(RetargetRules(namespace='char1'))
+    assert second is not first
+    assert second.resolve('root') == 'char1:root'
+    assert poser.get_retarget_map(RetargetRules(namespace='char1')) is second
+
+
+def test_rules_compiled_once_per_character(scene):
+    rules = RetargetRules()
+    whole_scene = poser.get_retarget_map(rules)
+    arm = poser.get_retarget_map(rules, root='arm_l')
+    assert arm is not whole_scene
+    assert poser.get_retarget_map(rules, root='arm_l') is arm
+    assert arm.scene_joints == {'arm_l', 'hand_l'}
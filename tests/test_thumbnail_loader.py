@@ -0,0 +1,163 @@
+"""
+Check the thumbnail folder and the pixmaps kept by td_maya_tools.guis.thumbnail_loader.
+"""
+import os
+
+import pytest
+
+from td_maya_tools import instrumentation
+
+pytest.importorskip('PySide2.QtWidgets')
+
+from PySide2 import QtCore, QtGui  # noqa: E402
+
+from td_maya_tools.guis import thumbnail_loader  # noqa: E402
+from td_maya_tools.guis.thumbnail_loader import ThumbnailLoader, _ThumbnailJob  # noqa: E402
+
+
+def make_image(path=None, width=120, height=60, color='#3366CC'):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(color))
+    assert image.save(path, 'PNG')
+    return path
+
+
+@pytest.fixture
+def image_path(qt_app, tmp_path):
+    return make_image(str(tmp_path / 'wave.png'))
+
+
+def test_cache_dir_from_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv(thumbnail_loader.CACHE_DIR_ENV_VAR, str(tmp_path))
+    assert thumbnail_loader.thumbnail_cache_dir() == str(tmp_path)
+    monkeypatch.delenv(thumbnail_loader.CACHE_DIR_ENV_VAR)
+    assert thumbnail_loader.thumbnail_cache_dir().endswith('td_maya_tools_thumbnails')
+
+
+def test_cache_path_changes_with_the_image(image_path, tmp_path):
+    cache_dir = str(tmp_path / 'thumbnails')
+    path = thumbnail_loader.thumbnail_cache_path(image_path, 60, cache_dir)
+    assert os.path.dirname(path) == cache_dir
+    assert path == thumbnail_loader.thumbnail_cache_path(image_path, 60, cache_dir)
+    assert path != thumbnail_loader.thumbnail_cache_path(image_path, 90, cache_dir)
+
+    image_stat = os.stat(image_path)
+    os.utime(image_path, ns=(image_stat.st_atime_ns, image_stat.st_mtime_ns + 10 ** 9))
+    touched = thumbnail_loader.thumbnail_cache_path(image_path, 60, cache_dir)
+    assert touched != path
+
+    # a new image with the same modified time still differs by its size
+    make_image(image_path, 300, 200)
+    os.utime(image_path, ns=(image_stat.st_atime_ns, image_stat.st_mtime_ns + 10 ** 9))
+    assert thumbnail_loader.thumbnail_cache_path(image_path, 60, cache_dir) != touched
+
+
+def test_cache_path_of_a_missing_image(tmp_path):
+    with pytest.raises(OSError):
+        thumbnail_loader.thumbnail_cache_path(str(tmp_path / 'missing.png'))
+
+
+@pytest.fixture
+def decoded(tmp_path):
+    instrumentation.reset()
+    instrumentation.enable(str(tmp_path / 'profiles'))
+    yield lambda: instrumentation.report()['counters'].get('thumbnail_loader.decoded', 0)
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_job_decodes_once(image_path, tmp_path, decoded):
+    cache_dir = str(tmp_path / 'thumbnails')
+    job = _ThumbnailJob(image_path, 60, cache_dir)
+    image = job._load()
+    assert (image.width(), image.height()) == (60, 30)
+    assert decoded() == 1
+    cache_path = thumbnail_loader.thumbnail_cache_path(image_path, 60, cache_dir)
+    assert os.listdir(cache_dir) == [os.path.basename(cache_path)]
+    image = _ThumbnailJob(image_path, 60, cache_dir)._load()
+    assert (image.width(), image.height()) == (60, 30)
+    assert decoded() == 1
+
+
+def test_job_of_a_broken_image(qt_app, tmp_path):
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+    cache_dir = str(tmp_path / 'thumbnails')
+    assert _ThumbnailJob(str(broken), 60, cache_dir)._load().isNull()
+    assert _ThumbnailJob(str(tmp_path / 'missing.png'), 60, cache_dir)._load().isNull()
+    assert not os.path.exists(cache_dir)
+
+
+def test_save_is_atomic(qt_app, tmp_path, monkeypatch):
+    image = QtGui.QImage(8, 8, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor('#FFFFFF'))
+    cache_path = str(tmp_path / 'thumbnails' / 'thumb.png')
+    _ThumbnailJob._save(image, cache_path)
+    assert os.listdir(tmp_path / 'thumbnails') == ['thumb.png']
+    assert not QtGui.QImage(cache_path).isNull()
+
+    # a save that fails half way leaves the thumbnail before it alone
+    def replace(source=None, target=None):
+        raise OSError('disk full')
+    monkeypatch.setattr(thumbnail_loader.os, 'replace', replace)
+    with open(cache_path, 'rb') as cache_fh:
+        before = cache_fh.read()
+    other = QtGui.QImage(16, 16, QtGui.QImage.Format_RGB32)
+    other.fill(QtGui.QColor('#000000'))
+    _ThumbnailJob._save(other, cache_path)
+    with open(cache_path, 'rb') as cache_fh:
+        assert cache_fh.read() == before
+    assert os.listdir(tmp_path / 'thumbnails') == ['thumb.png']
+
+    monkeypatch.undo()
+    _ThumbnailJob._save(QtGui.QImage(), str(tmp_path / 'thumbnails' / 'null.png'))
+    assert os.listdir(tmp_path / 'thumbnails') == ['thumb.png']
+
+
+def test_least_recently_used_pixmaps_are_dropped(qt_app, tmp_path):
+    loader = ThumbnailLoader(max_pixmaps=2, cache_dir=str(tmp_path))
+    image = QtGui.QImage(4, 4, QtGui.QImage.Format_RGB32)
+    loaded = []
+    for name in ('a', 'b'):
+        loader._callbacks[name] = [loaded.append]
+        loader._job_finished(name, image)
+    assert len(loaded) == 2
+    # asking for a keeps it, b is the least recently used
+    assert loader.request('a') is loader.cached_pixmap('a')
+    loader._job_finished('c', image)
+    assert loader.cached_pixmap('b') is None
+    assert loader.cached_pixmap('a') is not None
+    assert loader.cached_pixmap('c') is not None
+    loader.forget('a')
+    assert loader.cached_pixmap('a') is None
+
+
+def test_job_finished(qt_app, tmp_path):
+    loader = ThumbnailLoader(cache_dir=str(tmp_path))
+    ready = []
+    loader.pixmap_ready.connect(lambda path, pixmap: ready.append(path))
+
+    def deleted_widget(pixmap=None):
+        raise RuntimeError('Internal C++ object already deleted.')
+    loaded = []
+    loader._callbacks['a'] = [deleted_widget, loaded.append]
+    loader._job_finished('a', QtGui.QImage(4, 4, QtGui.QImage.Format_RGB32))
+    assert len(loaded) == 1 and ready == ['a']
+    # an image that could not be read is not kept, and it can be asked for again
+    loader._callbacks['b'] = [loaded.append]
+    loader._job_finished('b', QtGui.QImage())
+    assert loader.cached_pixmap('b') is None
+    assert 'b' not in loader._callbacks
+    assert len(loaded) == 1
+
+
+def test_request(image_path, tmp_path):
+    loader = ThumbnailLoader(cache_dir=str(tmp_path / 'thumbnails'))
+    loaded = []
+    assert loader.request(image_path, loaded.append) is loader.placeholder
+    assert loader.request(image_path, loaded.append) is loader.placeholder
+    loader.thread_pool.waitForDone()
+    QtCore.QCoreApplication.processEvents()
+    assert len(loaded) == 2
+    assert loader.request(image_path) is loaded[0]
+    assert loaded[0].width() == 60
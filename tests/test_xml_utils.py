@@ -0,0 +1,133 @@
+"""
+Check writing and updating pose xml files with td_maya_tools.xml_utils.
+"""
+from array import array
+import logging
+import xml.etree.ElementTree as et
+from xml.parsers import expat
+
+import pytest
+
+from td_maya_testing.fake_api import install_maya_api
+from td_maya_testing.fake_scene import FakeScene, install_maya_cmds
+from td_maya_tools import poser, xml_utils
+from td_maya_tools.pose import Pose
+from td_maya_tools.retarget import RetargetRules
+
+JOINTS = ('root', 'spine', 'arm_l')
+
+
+def make_pose(name=None, value=0.0, joints=JOINTS):
+    return Pose(name, joints, array('d', [value] * len(joints) * 6))
+
+
+@pytest.fixture
+def library(tmp_path):
+    path = str(tmp_path / 'poses.xml')
+    xml_utils.write_pose_xml([make_pose(name, value) for name, value in
+                              (('walk', 1.0), ('run', 2.0), ('jump', 3.0))], path)
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', (7, 1024 * 1024))
+def test_update_replaces_and_adds(monkeypatch, library, chunk_size):
+    monkeypatch.setattr(xml_utils.PoseLibrary, 'chunk_size', chunk_size)
+    replaced, added = xml_utils.update_pose_xml(
+        [make_pose('run', 5.0), make_pose('crawl', 6.0), make_pose('walk', 7.0)], library)
+    assert replaced == ['walk', 'run']
+    assert added == ['crawl']
+    poses = xml_utils.read_pose_xml(library)
+    assert list(poses) == ['walk', 'run', 'jump', 'crawl']
+    assert [pose.values[0] for pose in poses.values()] == [7.0, 5.0, 3.0, 6.0]
+    assert dict(xml_utils.index_pose_xml(library).items()).keys() == poses.keys()
+
+
+def test_update_is_all_or_nothing(tmp_path, library):
+    with open(library, 'rb') as xml_fh:
+        before = xml_fh.read()
+    with pytest.raises(ValueError):
+        xml_utils.update_pose_xml([make_pose('run', 5.0), make_pose('bad name')], library)
+    with open(library, 'rb') as xml_fh:
+        assert xml_fh.read() == before
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['poses.xml']
+
+
+def test_namespaces_are_left_out(library):
+    xml_utils.update_pose_xml([make_pose('char1:run', 5.0,
+                                         tuple(f'char1:{joint}' for joint in JOINTS))],
+                              library)
+    pose = xml_utils.read_pose_xml(library)['run']
+    assert pose.joints == JOINTS
+    assert pose.values[0] == 5.0
+    with pytest.raises(ValueError):
+        xml_utils.update_pose_xml([make_pose('run', 1.0, ('a:root', 'b:root'))], library)
+
+
+def test_save_captured_namespaced_pose(tmp_path):
+    scene = FakeScene()
+    install_maya_cmds(scene)
+    install_maya_api(scene)
+    parent = None
+    for joint in JOINTS:
+        scene.createNode('joint', f'char1:{joint}', parent)
+        scene.setAttr(f'char1:{joint}.translate', 1.0, 2.0, 3.0)
+        parent = f'char1:{joint}'
+    pose = poser.capture_pose(name='idle')
+    path = str(tmp_path / 'poses.xml')
+    xml_utils.write_pose_xml([pose], path)
+    saved = xml_utils.read_pose_xml(path)['idle']
+    assert sorted(saved.joints) == sorted(JOINTS)
+
+    scene.setAttr('char1:spine.translate', 0.0, 0.0, 0.0)
+    result = poser.apply_pose(saved, retarget=RetargetRules(namespace='char1'))
+    assert not result.failures
+    assert scene.getAttr('char1:spine.translate')[0] == pytest.approx((1.0, 2.0, 3.0))
+
+
+def write_xml(tmp_path=None, text=None):
+    path = tmp_path / 'poses.xml'
+    path.write_text(text)
+    return str(path)
+
+
+def test_read_without_a_file(tmp_path):
+    assert xml_utils.read_pose_xml() is None
+    assert xml_utils.read_pose_xml(str(tmp_path / 'missing.xml')) is None
+    assert xml_utils.read_pose_xml(str(tmp_path)) is None
+    assert xml_utils.index_pose_xml(str(tmp_path / 'missing.xml')) is None
+
+
+@pytest.mark.parametrize('text', ('', '<root><wave><root>', '<root><wave></root>',
+                                  '<root/><extra/>', 'not xml'))
+def test_read_broken_file(tmp_path, text):
+    path = write_xml(tmp_path, text)
+    with pytest.raises(et.ParseError):
+        xml_utils.read_pose_xml(path)
+    with pytest.raises(expat.ExpatError):
+        xml_utils.index_pose_xml(path)
+
+
+def test_read_bad_channels(tmp_path, caplog):
+    path = write_xml(tmp_path, '''<root>
+    <wave>
+        <root>
+            <translations tx="1.5" ty="" tz="abc"/>
+            <rotations rx=" 90 " ry="nope"/>
+            <scales sx="2.0"/>
+        </root>
+        <spine/>
+    </wave>
+    <empty/>
+</root>''')
+    with caplog.at_level(logging.WARNING):
+        poses = xml_utils.read_pose_xml(path)
+    assert 'wave: root.tz is not a number' in caplog.text
+    assert 'wave: root.ry is not a number' in caplog.text
+    wave = poses['wave']
+    # channels that are empty, missing or not numbers are all read as not set
+    assert wave.translation('root') == (1.5, None, None)
+    assert wave.rotation('root') == (90.0, None, None)
+    assert wave.rotation('spine') == (None, None, None)
+    assert len(poses['empty']) == 0
+    assert xml_utils.find_non_numeric_channels(path) == {'wave': {'root': ('tz', 'ry')}}
+    assert xml_utils.index_pose_xml(path)['wave'].translation('root') == (1.5, None, None)